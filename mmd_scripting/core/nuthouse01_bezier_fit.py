@@ -0,0 +1,280 @@
+import array
+import functools
+import math
+from typing import List, Sequence, Tuple
+
+import mmd_scripting.core.nuthouse01_core as core
+
+_SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 8/22/2021"
+
+################################################################################
+# this file defines a curve fitter for MMD interpolation curves
+# an MMD interpolation curve is a cubic bezier from (0,0) to (1,1) whose two control points are integers [0-127],
+# stored as [ax, ay, bx, by] same as the interp_x/interp_y/etc members of the VMD frames.
+# X is time and Y is the value, so the value at a given time is found by solving x(t) for t and then computing y(t).
+
+# the largest value a control point can have, this is the (1,1) corner
+BEZIER_BOX_SIZE = 127
+
+# when searching for the X coordinates of the control points, first try every combination on a grid with this spacing,
+# then refine the best few by repeatedly halving the spacing. smaller = slower but less likely to miss the best fit.
+COARSE_GRID_SPACING = 16
+# how many of the best grid points to refine
+REFINE_HOW_MANY = 5
+# after refining, also try every X coordinate within this distance of where each refinement ended
+FINAL_SWEEP_RADIUS = 1
+
+# how precisely to solve x(t) for t, this is far below anything that matters after rounding to integers
+_T_TOLERANCE = 1e-10
+_T_MAX_ITER = 40
+
+# how many (X positions, ax, bx) combinations to remember the solved t values for
+T_CACHE_SIZE = 20000
+
+
+def _solve_t(u: float, a: float, b: float) -> float:
+	# find t where x(t) = u, for x control coords a/b in [0-1]. x(t) is nondecreasing so this is always solvable.
+	# newton's method, but fall back to bisection whenever a step would leave the current bracket
+	lo, hi = 0.0, 1.0
+	t = u
+	for _ in range(_T_MAX_ITER):
+		s = 1.0 - t
+		x = 3*a*s*s*t + 3*b*s*t*t + t*t*t - u
+		if abs(x) < _T_TOLERANCE:
+			break
+		if x > 0: hi = t
+		else:     lo = t
+		dx = 3*a*s*s + 6*(b-a)*s*t + 3*(1-b)*t*t
+		newt = t - x/dx if dx > 0 else -1.0
+		if not (lo < newt < hi):
+			newt = (lo + hi) / 2
+		t = newt
+	return t
+
+
+# the datapoints are usually every frame between two keyframes, so the same normalized X positions come up over and over
+@functools.lru_cache(maxsize=T_CACHE_SIZE)
+def _solve_t_many(u_points: Tuple[float, ...], ax: int, bx: int) -> array.array:
+	# _solve_t() for each point, stored compactly because there can be many of these cached
+	# NOTE: the returned array is shared, don't modify it
+	a = ax / BEZIER_BOX_SIZE
+	b = bx / BEZIER_BOX_SIZE
+	return array.array('d', [_solve_t(u, a, b) for u in u_points])
+
+
+def _basis(u_points: Tuple[float, ...], ax: int, bx: int) -> List[Tuple[float,float,float]]:
+	# for each point, the weights of ay, by, and the fixed (1,1) corner in y(t) at the t where x(t) = that point
+	ret = []
+	for t in _solve_t_many(u_points, ax, bx):
+		s = 1.0 - t
+		ret.append((3*s*s*t, 3*s*t*t, t*t*t))
+	return ret
+
+
+def _errors(basis: List[Tuple[float,float,float]], v_points: Sequence[float], p: float, q: float) -> Tuple[float,float]:
+	# sum of squared errors & max abs error, in normalized units, for Y control coords p/q in [0-1]
+	sq = 0.0
+	worst = 0.0
+	for (b1, b2, b3), v in zip(basis, v_points):
+		e = abs(b1*p + b2*q + b3 - v)
+		sq += e * e
+		if e > worst: worst = e
+	return sq, worst
+
+
+def _least_squares_y(basis: List[Tuple[float,float,float]], v_points: Sequence[float], ax: int, bx: int) -> Tuple[float,float]:
+	# once the X coordinates of the control points are chosen, the Y value at each point is linear in the Y coordinates
+	# of the control points, so the least-squares Y coordinates can be found exactly. returns them clamped to [0-1].
+	# normal equations for minimizing sum((b1*p + b2*q + b3 - v)^2)
+	s11 = s12 = s22 = r1 = r2 = 0.0
+	for (b1, b2, b3), v in zip(basis, v_points):
+		w = v - b3
+		s11 += b1 * b1
+		s12 += b1 * b2
+		s22 += b2 * b2
+		r1 += b1 * w
+		r2 += b2 * w
+	det = s11 * s22 - s12 * s12
+	if abs(det) > 1e-12:
+		p = (r1 * s22 - r2 * s12) / det
+		q = (s11 * r2 - s12 * r1) / det
+	elif s11 + s22 > 0:
+		# the two weights are proportional (or only one point), any split with the right sum is equally good
+		p = q = (r1 + r2) / (s11 + 2 * s12 + s22)
+	else:
+		p, q = ax / BEZIER_BOX_SIZE, bx / BEZIER_BOX_SIZE
+	return core.clamp(p, 0.0, 1.0), core.clamp(q, 0.0, 1.0)
+
+
+def _smooth_errors(u_points: Tuple[float, ...], v_points: Sequence[float], ax: int, bx: int) -> Tuple[float,float]:
+	"""
+	Errors of the best curve with these X coordinates if the Y coordinates didn't have to be integers. This changes
+	smoothly as the X coordinates change, unlike the errors after rounding, so it is much better for guiding a search.
+
+	:return: tuple(sum of squared errors, max error)
+	"""
+	basis = _basis(u_points, ax, bx)
+	p, q = _least_squares_y(basis, v_points, ax, bx)
+	return _errors(basis, v_points, p, q)
+
+
+def _best_y_for_x(u_points: Tuple[float, ...], v_points: Sequence[float], ax: int, bx: int) -> Tuple[float,float,int,int]:
+	"""
+	Find the best integer Y coordinates of the control points, once the X coordinates are chosen.
+
+	:return: tuple(sum of squared errors, max error, ay, by) for the best integer ay/by
+	"""
+	basis = _basis(u_points, ax, bx)
+	p, q = _least_squares_y(basis, v_points, ax, bx)
+	# the best integers are not always the rounded least-squares answer, but they're always very close to it
+	ay0 = math.floor(p * BEZIER_BOX_SIZE)
+	by0 = math.floor(q * BEZIER_BOX_SIZE)
+	best = None
+	for ay in (ay0, ay0 + 1):
+		for by in (by0, by0 + 1):
+			if ay > BEZIER_BOX_SIZE or by > BEZIER_BOX_SIZE:
+				continue
+			sq, worst = _errors(basis, v_points, ay / BEZIER_BOX_SIZE, by / BEZIER_BOX_SIZE)
+			if best is None or (sq, worst) < best[0:2]:
+				best = (sq, worst, ay, by)
+	return best
+
+
+def fit_mmd_bezier(x_points: Sequence[float],
+				   y_points: Sequence[float],
+				   rms_err_tol: float=None,
+				   max_err_tol: float=None) -> Tuple[List[int], float, float]:
+	"""
+	Find the MMD interpolation curve that best matches a series of datapoints, where the first and last points are
+	the keyframes and the points in between are what the motion should look like between them.
+	The X coordinates of the control points are found with a coarse-to-fine search over the integer grid, and for each
+	candidate the Y coordinates are solved exactly by least squares. The errors are measured exactly, as the
+	difference between each datapoint and the value that MMD would actually produce at that X.
+	If both tolerances are given, the search stops as soon as any curve satisfies both of them, otherwise it keeps going
+	until it finds the best curve it can.
+	NOTE: this is a heuristic search, not an exhaustive one. When the datapoints came from a real MMD curve it usually
+	finds that exact curve, but not always; the rest of the time it finds a close one.
+	(see "tests/Core Tests/bezier_fit_test.py" for how often)
+
+	:param x_points: list of float x-vals, probably frame numbers, must be increasing
+	:param y_points: list of float y-vals, same length as x_points
+	:param rms_err_tol: optional, float, acceptable RMS error, in the same units as y_points
+	:param max_err_tol: optional, float, acceptable max error, in the same units as y_points
+	:return: tuple(list of 4 ints [ax, ay, bx, by], RMS error, max error)
+	"""
+	if len(x_points) != len(y_points) or len(x_points) < 2:
+		core.MY_PRINT_FUNC("ERROR: need at least 2 points with matching x and y, got %d x and %d y" % (
+			len(x_points), len(y_points)))
+		raise ValueError("x_points and y_points must be the same length, at least 2")
+	x_range = x_points[-1] - x_points[0]
+	if not x_range > 0:
+		core.MY_PRINT_FUNC("ERROR: x points must be increasing, got %s to %s" % (str(x_points[0]), str(x_points[-1])))
+		raise ValueError("x_points must be increasing")
+	y_range = y_points[-1] - y_points[0]
+	linear = list(core.interpolation_default_linear)
+	# the endpoints are always exact, only the points in between matter
+	inner_x = x_points[1:-1]
+	inner_y = y_points[1:-1]
+	if math.isclose(y_range, 0, abs_tol=1e-6) or not inner_x:
+		# if the start & end are the same then every curve gives the same flat line, so the error is the same for all
+		errs = [abs(y - y_points[0]) for y in inner_y]
+		if not errs:
+			return linear, 0.0, 0.0
+		return linear, math.sqrt(sum(e * e for e in errs) / len(x_points)), max(errs)
+
+	# normalize so the curve goes from (0,0) to (1,1)
+	u_points = tuple((x - x_points[0]) / x_range for x in inner_x)
+	v_points = [(y - y_points[0]) / y_range for y in inner_y]
+	scale = abs(y_range)
+	num_points = len(x_points)
+
+	def is_good_enough(result) -> bool:
+		if rms_err_tol is None or max_err_tol is None:
+			return False
+		sq, worst = result[0], result[1]
+		return (math.sqrt(sq / num_points) * scale <= rms_err_tol) and (worst * scale <= max_err_tol)
+
+	# the search is guided by the smooth errors, and the real (integer) errors are only checked for the final answers,
+	# or when the smooth errors are already good enough that this might be the one to stop at
+	smooth = {}
+	tried = {}
+	def attempt(ax: int, bx: int):
+		key = (ax, bx)
+		if key not in tried:
+			tried[key] = _best_y_for_x(u_points, v_points, ax, bx)
+		return tried[key]
+	def attempt_smooth(ax: int, bx: int):
+		# return the integer result if it is good enough to stop, otherwise None
+		key = (ax, bx)
+		if key not in smooth:
+			smooth[key] = _smooth_errors(u_points, v_points, ax, bx)
+			if is_good_enough(smooth[key]):
+				r = attempt(ax, bx)
+				if is_good_enough(r):
+					return r
+		return None
+
+	# first, the whole grid, including the edges of the box
+	grid = list(range(0, BEZIER_BOX_SIZE, COARSE_GRID_SPACING)) + [BEZIER_BOX_SIZE]
+	for ax in grid:
+		for bx in grid:
+			r = attempt_smooth(ax, bx)
+			if r is not None:
+				return _finish(r, ax, bx, num_points, scale)
+
+	# then, refine the best few by looking at their neighbors with smaller & smaller steps. at each step size, keep
+	# moving to the best neighbor until none of them are better. the error surface has some local minimums, so
+	# refining only the single best grid point sometimes misses the real answer.
+	starts = sorted(smooth.keys(), key=smooth.__getitem__)[0:REFINE_HOW_MANY]
+	ends = []
+	for key in starts:
+		step = COARSE_GRID_SPACING // 2
+		while step >= 1:
+			ax0, bx0 = key
+			for dax in (-step, 0, step):
+				for dbx in (-step, 0, step):
+					ax = ax0 + dax
+					bx = bx0 + dbx
+					if not (0 <= ax <= BEZIER_BOX_SIZE and 0 <= bx <= BEZIER_BOX_SIZE):
+						continue
+					r = attempt_smooth(ax, bx)
+					if r is not None:
+						return _finish(r, ax, bx, num_points, scale)
+					if smooth[(ax, bx)] < smooth[key]:
+						key = (ax, bx)
+			if key == (ax0, bx0):
+				step //= 2
+		ends.append(key)
+
+	# finally, rounding the Y coordinates to integers makes the best X coordinates shift a little, so check the real
+	# errors of everything close to where each refinement ended
+	best_key = None
+	for ax0, bx0 in ends:
+		for ax in range(max(0, ax0 - FINAL_SWEEP_RADIUS), min(BEZIER_BOX_SIZE, ax0 + FINAL_SWEEP_RADIUS) + 1):
+			for bx in range(max(0, bx0 - FINAL_SWEEP_RADIUS), min(BEZIER_BOX_SIZE, bx0 + FINAL_SWEEP_RADIUS) + 1):
+				r = attempt(ax, bx)
+				if is_good_enough(r):
+					return _finish(r, ax, bx, num_points, scale)
+				if best_key is None or r < tried[best_key]:
+					best_key = (ax, bx)
+	return _finish(tried[best_key], best_key[0], best_key[1], num_points, scale)
+
+
+def _finish(result, ax: int, bx: int, num_points: int, scale: float) -> Tuple[List[int], float, float]:
+	# convert from the internal result format & normalized units to the output format & the caller's units
+	sq, worst, ay, by = result
+	return [ax, ay, bx, by], math.sqrt(sq / num_points) * scale, worst * scale
+
+
+def evaluate_mmd_bezier(params: Sequence[int], x: float) -> float:
+	"""
+	Exactly compute the Y value of an MMD interpolation curve at a given X.
+
+	:param params: list of 4 ints [ax, ay, bx, by] range [0-127]
+	:param x: float [0.0-1.0]
+	:return: float [0.0-1.0]
+	"""
+	ax, ay, bx, by = params
+	t = _solve_t(core.clamp(x, 0.0, 1.0), ax / BEZIER_BOX_SIZE, bx / BEZIER_BOX_SIZE)
+	s = 1.0 - t
+	return 3*s*s*t * (ay / BEZIER_BOX_SIZE) + 3*s*t*t * (by / BEZIER_BOX_SIZE) + t*t*t
@@ -1,9 +1,15 @@
+import functools
 import math
 import sys
 import traceback
 from os import path, listdir
 from typing import Any, Tuple, List, Sequence, Callable, Iterable, TypeVar, Union
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.03 - 8/9/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
@@ -143,6 +149,22 @@ def my_list_partition(l: Iterable[THING], condition: Callable[[THING], bool]) ->
 			list_where_false.append(iiiii)
 	return list_where_true, list_where_false
 
+def my_list_compact(l: List[THING], keep: Union[Callable[[THING], bool], Iterable[bool]]) -> int:
+	"""
+	Delete every item that should not be kept, modifying the list in-place. This is one linear pass, unlike calling
+	list.pop(i) in a loop which gets very slow on big lists. The order of the kept items does not change.
+	
+	:param l: the list to be filtered, modified in-place
+	:param keep: lambda function that returns true for items to keep, OR iterable of bools parallel to the list
+	:return: number of items that were removed
+	"""
+	before = len(l)
+	if callable(keep):
+		l[:] = [x for x in l if keep(x)]
+	else:
+		l[:] = [x for x, k in zip(l, keep) if k]
+	return before - len(l)
+
 def prettyprint_file_size(size_b: int) -> str:
 	"""
 	Format a filesize in terms of bytes, KB, MB, GB, whatever is most appropriate.
@@ -695,6 +717,9 @@ class MyBezier(object):
 		xx, yy = zip(*retlist)  # unzip
 		self.xx = list(xx)
 		self.yy = list(yy)
+		# numpy copies of xx & yy for approximate_many(), only created if needed
+		self._xx_np = None
+		self._yy_np = None
 
 	def approximate(self, x: float) -> float:
 		"""
@@ -717,6 +742,54 @@ class MyBezier(object):
 		return linear_map(self.xx[pos-1], self.yy[pos-1],
 						  self.xx[pos],   self.yy[pos],
 						  x)
+	
+	def approximate_many(self, xs: Sequence[float]) -> List[float]:
+		"""
+		Same as approximate() but for many X values at once. If numpy is available then they are all done together,
+		with exactly the same math as approximate() so the results are exactly the same.
+		
+		:param xs: list of float input x [0.0-1.0]
+		:return: list of float output y [0.0-1.0]
+		"""
+		if np is None or len(xs) == 0:
+			return [self.approximate(x) for x in xs]
+		if self._xx_np is None:
+			self._xx_np = np.array(self.xx, dtype=np.float64)
+			self._yy_np = np.array(self.yy, dtype=np.float64)
+		x = np.clip(np.asarray(xs, dtype=np.float64), 0.0, 1.0)
+		# the segment that each x falls in, same as the bisect in approximate(), but 0.0 & 1.0 are handled after
+		pos = np.clip(np.searchsorted(self._xx_np, x, side='left'), 1, len(self.xx) - 1)
+		x1 = self._xx_np[pos-1]
+		y1 = self._yy_np[pos-1]
+		x2 = self._xx_np[pos]
+		y2 = self._yy_np[pos]
+		# same as linear_map()
+		m = (y2 - y1) / (x2 - x1)
+		b = y2 - (m * x2)
+		y = x * m + b
+		y[x == 0.0] = 0.0
+		y[x == 1.0] = 1.0
+		return y.tolist()
+
+# the control points are always integers [0-127] so there are a limited number of possible curves, and a motion
+# usually reuses the same few curves over and over. remember the most recently used ones instead of rebuilding them.
+BEZIER_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=BEZIER_CACHE_SIZE)
+def _get_bezier_cached(p1: Tuple[int,int], p2: Tuple[int,int], resolution: int) -> MyBezier:
+	return MyBezier(p1, p2, resolution=resolution)
+
+def get_bezier(p1: Sequence[int], p2: Sequence[int], resolution=50) -> MyBezier:
+	"""
+	Get a MyBezier object for these control points. The same object is returned each time the same control points
+	are requested (as long as it is still in the cache), so do not modify it.
+	
+	:param p1: 2x int range [0-128], XY coordinates of control point
+	:param p2: 2x int range [0-128], XY coordinates of control point
+	:param resolution: int, number of points in the linear approximation of the bezier curve
+	:return: MyBezier object
+	"""
+	return _get_bezier_cached((p1[0], p1[1]), (p2[0], p2[1]), resolution)
 
 ########################################################################################################################
 # advanced geometric math functions
@@ -1,10 +1,16 @@
+import contextlib
 import csv
+import hashlib
 import json
+import mmap
 import os
+import shutil
+import sqlite3
 import stat
 import sys
+import threading
 from os import path
-from typing import Any, List, Dict
+from typing import Any, Callable, List, Dict, Iterator, Optional
 
 import mmd_scripting.core.nuthouse01_core as core
 
@@ -14,75 +20,139 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.02 - 7/30/2021"
 
 # this is the name of my "app", the folder within "appdata" that is mine
 MY_APP_NAME = "nuthouse01_mmd_tools"
-# this is the name of the persistent json file that contains settings & history
+# this is the name of the persistent json file that used to contain settings & history
+# it is only read once, to copy its contents into the key-value store
 MY_JSON_NAME = "persist.txt"
+# this is the name of the SQLite file that contains settings & history, each key holds one JSON value
+MY_KV_STORE_NAME = "persist.sqlite3"
+# this is the name of the folder within the persistent storage folder that holds the result cache
+MY_RESULT_CACHE_NAME = "result_cache"
+# when the result cache holds more than this many bytes, the least-recently-used results are deleted
+RESULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# when it deletes results, it keeps deleting until the cache is this fraction of RESULT_CACHE_MAX_BYTES, so that it
+# doesn't have to scan the whole cache again for every result that is stored after that
+RESULT_CACHE_EVICT_TO = 0.8
+# the key in the persistent key-value store that holds the running total size of the result cache, in bytes
+_RESULT_CACHE_SIZE_KEY = "result-cache-bytes"
+# this is the name of the SQLite file within the persistent storage folder that remembers past Google translations
+MY_TRANSLATION_MEMORY_NAME = "translation_memory.sqlite3"
 
 #######################################################################################################################
 # these functions access the persistent json for settings or history
 #######################################################################################################################
 
+# one connection per process, shared by all threads, plus a cache of the JSON text of each key that was looked up
+_kv_conn = None  # type: Optional[sqlite3.Connection]
+_kv_pid = None
+_kv_data_version = None
+_kv_cache = {}  # type: Dict[str, Optional[str]]
+_kv_lock = threading.RLock()
+
+
 def get_persistent_storage_json(key:str) -> Any:
 	"""
-	Access the storage JSON dict, attempt to retrieve the item under the specified key.
-	If the key doesn't exist in the dict, return None.
-	:param key: string key in dict
-	:return: item living under the dict
-	"""
-	persist_path = _get_persistent_storage_path(MY_JSON_NAME)
-	# read the json to list-of-strings using standard read-func
-	str_data = read_txtfile_to_list(src_path=persist_path,
-									use_jis_encoding=False,
-									quiet=True)
-	# join the list-of-strings with newlines
-	str_data_joined = "\n".join(str_data)
-	if str_data_joined == "":
-		# if it's empty, the key is guaranteed not in it
-		return None
-	# parse the megastring with json library, get a dict
+	Access the persistent key-value store, attempt to retrieve the item under the specified key.
+	If the key doesn't exist, return None.
+	:param key: string key
+	:return: item living under the key
+	"""
+	with _kv_lock:
+		conn = _kv_connect()
+		if key not in _kv_cache:
+			row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+			_kv_cache[key] = None if row is None else row[0]
+		text = _kv_cache[key]
+	# parse it every time, so the caller gets its own copy that it can modify
 	# floats & ints will be properly interpreted and returned as numbers :)
-	# note: what kind of errors can the json module create????
-	data = json.loads(str_data_joined)
-	try:
-		# if the key exists in the dict, then return the value it holds
-		return data[key]
-	except KeyError:
-		# if the key is not in the dict, then return None
-		return None
+	return None if text is None else json.loads(text)
 
 
 def write_persistent_storage_json(key:str, newval:Any) -> None:
 	"""
-	Access the storage JSON dict and set a new value to hold under the specified key. Then write it to file.
-	:param key: string key in dict
-	:param newval: new data to store under that key
-	"""
-	persist_path = _get_persistent_storage_path(MY_JSON_NAME)
-	# read the json to list-of-strings using standard read-func
-	str_data = read_txtfile_to_list(src_path=persist_path,
-									use_jis_encoding=False,
-									quiet=True)
-	# join the list-of-strings with newlines
-	str_data_joined = "\n".join(str_data)
-	if str_data_joined == "":
-		# if it's empty, create a new dict that contains only this key
-		data = {key: newval}
-	else:
-		# parse the megastring with json library, get a dict
-		# note: what kind of errors can the json module create????
-		data = json.loads(str_data_joined)
-		# write the newval into the dict under new key
-		data[key] = newval
-	# serialize the dict into a big string
-	str_data = json.dumps(data, ensure_ascii=False, indent="\t")
-	# use standard write-func to write to text file
-	# 'content' is designed to be list of strings that don't contain newlines, but there's no problem if i violate that
-	write_str_to_txtfile(dest_path=persist_path,
-						 content=str_data,
-						 use_jis_encoding=False,
-						 quiet=True)
+	Access the persistent key-value store and set a new value to hold under the specified key.
+	Only this key is written, so it doesn't overwrite keys that other processes changed in the meantime.
+	:param key: string key
+	:param newval: new data to store under that key, must be JSON-serializable
+	"""
+	update_persistent_storage_json(key, lambda oldval: newval)
 	return None
 
 
+def update_persistent_storage_json(key:str, func:Callable[[Any], Any]) -> Any:
+	"""
+	Read the item under the specified key, compute a new value from it, and store that, all as one transaction.
+	Other processes cannot change the key in between, so nothing they write is lost.
+	:param key: string key
+	:param func: function that receives the current value (or None if the key doesn't exist) and returns the new value
+	:return: the new value
+	"""
+	with _kv_lock:
+		conn = _kv_connect()
+		with _kv_transaction(conn):
+			row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+			newval = func(None if row is None else json.loads(row[0]))
+			text = json.dumps(newval, ensure_ascii=False)
+			conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, text))
+		_kv_cache[key] = text
+	return newval
+
+
+@contextlib.contextmanager
+def _kv_transaction(conn: sqlite3.Connection) -> Iterator[None]:
+	# IMMEDIATE takes the write lock right away, so other processes wait instead of reading a value that is about to change
+	conn.execute("BEGIN IMMEDIATE")
+	try:
+		yield
+	except BaseException:
+		conn.execute("ROLLBACK")
+		raise
+	conn.execute("COMMIT")
+
+
+def _kv_connect() -> sqlite3.Connection:
+	"""
+	Get the connection to the key-value store, opening it if needed. Also empties the cache if any other process
+	has changed the store since the last time. Must be called while holding _kv_lock.
+	
+	:return: sqlite3 connection in autocommit mode
+	"""
+	global _kv_conn, _kv_pid, _kv_data_version
+	# a connection must not be used by a forked child process, it needs its own
+	if _kv_conn is None or _kv_pid != os.getpid():
+		kv_path = path.join(_get_persistent_storage_path(), MY_KV_STORE_NAME)
+		conn = sqlite3.connect(kv_path, timeout=30, isolation_level=None, check_same_thread=False)
+		with _kv_transaction(conn):
+			conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+			if conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] == 0:
+				_kv_import_legacy_json(conn)
+		_kv_conn = conn
+		_kv_pid = os.getpid()
+		_kv_data_version = None
+	# data_version changes whenever a different connection commits something
+	data_version = _kv_conn.execute("PRAGMA data_version").fetchone()[0]
+	if data_version != _kv_data_version:
+		_kv_cache.clear()
+		_kv_data_version = data_version
+	return _kv_conn
+
+
+def _kv_import_legacy_json(conn: sqlite3.Connection) -> None:
+	# copy everything from the old persistent json file (if it exists) into the new empty key-value store
+	json_path = path.join(_get_persistent_storage_path(), MY_JSON_NAME)
+	if not path.isfile(json_path):
+		return
+	try:
+		str_data_joined = "\n".join(read_txtfile_to_list(src_path=json_path, use_jis_encoding=False, quiet=True))
+		data = json.loads(str_data_joined) if str_data_joined.strip() else {}
+	except (OSError, ValueError) as e:
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		core.MY_PRINT_FUNC("WARNING: cannot read old settings file '%s', ignoring it" % json_path)
+		return
+	conn.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+					 [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()])
+	return
+
+
 def _get_persistent_storage_path(filename="") -> str:
 	"""
 	Get the path to a storage location that will persist between runs, usually in APPDATA folder.
@@ -111,6 +181,168 @@ def _get_persistent_storage_path(filename="") -> str:
 		return retme
 	return appdata
 
+def get_translation_memory_path() -> str:
+	"""
+	Get the path of the default translation memory database, in the persistent storage folder. It might not exist yet.
+	
+	:return: absolute file path
+	"""
+	return path.join(_get_persistent_storage_path(), MY_TRANSLATION_MEMORY_NAME)
+
+#######################################################################################################################
+# these functions manage the result cache, which remembers the outputs of slow scripts
+#######################################################################################################################
+
+def hash_file(filepath: str) -> str:
+	"""
+	:param filepath: path to any file
+	:return: hex string that identifies the contents of the file
+	"""
+	h = hashlib.sha1()
+	with open(filepath, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def result_cache_key(input_hash: str, script_version: str, options: Any) -> str:
+	"""
+	Build the key that a result is stored under. If any part of the key is different, it is a different result.
+	
+	:param input_hash: string from hash_file(), of the input file
+	:param script_version: the _SCRIPT_VERSION string of the script that produces the result
+	:param options: anything that can be shown with repr(), covering every option that affects the result
+	:return: hex string
+	"""
+	return hashlib.sha1(repr((input_hash, script_version, options)).encode("utf-8")).hexdigest()
+
+
+def result_cache_lookup(key: str) -> Optional[Dict[str, Any]]:
+	"""
+	Look for a result that was stored with result_cache_store(). If found, it becomes the most-recently-used result.
+	The "output" file lives inside the cache, so it should be copied out, never modified or moved.
+	
+	:param key: string from result_cache_key()
+	:return: None if not found, otherwise dict with "report" = list of printed lines and "output" = path to the
+	stored output file or None if no output file was stored
+	"""
+	entry = path.join(_get_result_cache_path(), key)
+	try:
+		with open(path.join(entry, "report.json"), "rt", encoding="utf-8") as f:
+			data = json.load(f)
+		# touch it, the modified-time is what decides which results are least-recently-used
+		os.utime(path.join(entry, "report.json"))
+	except (OSError, ValueError):
+		return None
+	if data["output"] is not None:
+		data["output"] = path.join(entry, data["output"])
+		if not path.isfile(data["output"]):
+			return None
+	return data
+
+
+def result_cache_store(key: str, output_path: Optional[str], report: List[str]) -> None:
+	"""
+	Store a copy of a produced output file and the lines that were printed while producing it. Afterwards, if the
+	cache is larger than RESULT_CACHE_MAX_BYTES, the least-recently-used results are deleted.
+	The size of the cache is kept as a running total, so the whole cache is only scanned when it is time to delete
+	something (or the first time, when the total isn't known yet).
+	
+	:param key: string from result_cache_key()
+	:param output_path: path to the produced file, or None if the result is only the printed report
+	:param report: list of printed lines, probably from record_printouts()
+	"""
+	cachedir = _get_result_cache_path()
+	entry = path.join(cachedir, key)
+	# build it under a temporary name and then rename it, so that other processes never see half of an entry
+	tempentry = path.join(cachedir, "%s.%d.tmp" % (key, os.getpid()))
+	try:
+		os.makedirs(tempentry, exist_ok=True)
+		output_name = None
+		if output_path is not None:
+			output_name = "output" + path.splitext(output_path)[1]
+			shutil.copyfile(output_path, path.join(tempentry, output_name))
+		with open(path.join(tempentry, "report.json"), "wt", encoding="utf-8") as f:
+			json.dump({"report": report, "output": output_name}, f, ensure_ascii=False)
+		size = _result_cache_entry_size(tempentry)
+		if path.exists(entry):
+			# an identical result is already stored, probably by a different process
+			shutil.rmtree(tempentry)
+			size = 0
+		else:
+			os.rename(tempentry, entry)
+	except OSError as e:
+		# failing to store a result doesn't hurt anything, it just means that it will be rebuilt next time
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		core.MY_PRINT_FUNC("WARNING: failed to save result into the result cache")
+		shutil.rmtree(tempentry, ignore_errors=True)
+		return None
+	# add it to the running total. None means that the total isn't known yet.
+	total = update_persistent_storage_json(_RESULT_CACHE_SIZE_KEY, lambda old: None if old is None else old + size)
+	if total is None or total > RESULT_CACHE_MAX_BYTES:
+		_result_cache_evict(cachedir, int(RESULT_CACHE_MAX_BYTES * RESULT_CACHE_EVICT_TO))
+	return None
+
+
+def _get_result_cache_path() -> str:
+	# the cache is a folder inside the persistent storage folder, each result is a folder inside that
+	cachedir = path.join(_get_persistent_storage_path(), MY_RESULT_CACHE_NAME)
+	os.makedirs(cachedir, exist_ok=True)
+	return cachedir
+
+
+def _result_cache_entry_size(entry: str) -> int:
+	# total size of the files in one entry
+	return sum(os.path.getsize(path.join(entry, f)) for f in os.listdir(entry))
+
+
+def _result_cache_evict(cachedir: str, max_bytes: int) -> None:
+	# measure every entry, then delete the least-recently-used entries until the total is small enough
+	# afterwards, save the measured total as the new running total
+	# (if another process stores something in between, the total will be a bit low until the next time this runs)
+	entries = []
+	total = 0
+	for name in os.listdir(cachedir):
+		entry = path.join(cachedir, name)
+		try:
+			last_used = os.path.getmtime(path.join(entry, "report.json"))
+			size = _result_cache_entry_size(entry)
+		except OSError:
+			# half-built or half-deleted by some other process, leave it alone
+			continue
+		entries.append((last_used, size, entry))
+		total += size
+	entries.sort()
+	# never delete the most-recently-used entry, even if it is too big all by itself
+	for last_used, size, entry in entries[:-1]:
+		if total <= max_bytes:
+			break
+		shutil.rmtree(entry, ignore_errors=True)
+		total -= size
+	write_persistent_storage_json(_RESULT_CACHE_SIZE_KEY, total)
+	return None
+
+
+@contextlib.contextmanager
+def record_printouts() -> Iterator[List[str]]:
+	"""
+	Everything printed with MY_PRINT_FUNC inside the "with" block is still printed, but is also saved into the list
+	that this yields. Progress printouts are not saved. Use it like "with record_printouts() as report:".
+	
+	:return: list of strings, one per printout, that grows while the block runs
+	"""
+	lines = []
+	saved_print_func = core.MY_PRINT_FUNC
+	def recording_print_func(*args, is_progress=False):
+		saved_print_func(*args, is_progress=is_progress)
+		if not is_progress:
+			lines.append(' '.join([str(x) for x in args]))
+	core.MY_PRINT_FUNC = recording_print_func
+	try:
+		yield lines
+	finally:
+		core.MY_PRINT_FUNC = saved_print_func
+
 #######################################################################################################################
 # these functions do CSV read/write and binary-file read/write
 #######################################################################################################################
@@ -294,6 +526,54 @@ def read_binfile_to_bytes(src_path:str, quiet=False) -> bytearray:
 	return bytearray(raw)
 
 
+@contextlib.contextmanager
+def open_binfile_mmap(src_path:str, quiet=False) -> Iterator[memoryview]:
+	"""
+	READ a BINARY file from disk by memory-mapping it instead of copying it into memory. Use it as a context manager:
+	"with open_binfile_mmap(name) as raw:". Only the parts of the file that are actually read will be loaded from disk,
+	so reading just the header of a huge file is cheap. The view is read-only and is only valid inside the "with"
+	block, so anything that is kept must be copied out (struct.unpack and bytes() both do this).
+	
+	:param src_path: source file path, as a string, relative from CWD or absolute
+	:param quiet: by default, print the absolute path being read from. if this=True, don't do this.
+	:return: read-only memoryview obj of the whole file
+	"""
+	src_path = path.abspath(path.normpath(src_path))
+	# unless disabled, print the absolute path to the file being read
+	if not quiet: core.MY_PRINT_FUNC(src_path)
+	# assert that the given path exists and is a file, not a folder
+	if not path.isfile(src_path):
+		raise RuntimeError("ERROR: attempt to read binary file '%s', but it does not exist! (or exists but is not a file)" % src_path)
+	try:
+		file = open(src_path, mode='rb')  # r=read, b=binary
+	except IOError as e:
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		core.MY_PRINT_FUNC("ERROR: error wile reading binary file '%s', maybe you typed it wrong?" % src_path)
+		raise
+	with file:
+		mm = None
+		try:
+			if os.fstat(file.fileno()).st_size == 0:
+				# mmap refuses to map an empty file, but an empty view works just the same
+				view = memoryview(b"")
+			else:
+				mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+				view = memoryview(mm)
+		except (OSError, ValueError):
+			# some filesystems can't be mapped, just read it normally instead
+			view = memoryview(file.read())
+		try:
+			yield view
+		finally:
+			try:
+				view.release()
+				if mm is not None: mm.close()
+			except BufferError:
+				# something still holds a view into the file (probably a traceback), so the map will be closed
+				# whenever that gets garbage-collected instead
+				pass
+
+
 def write_str_to_txtfile(dest_path: str, content: str, use_jis_encoding=False, quiet=False) -> None:
 	"""
 	WRITE a string from memory to a TEXT file.
@@ -0,0 +1,198 @@
+from typing import Dict, List, Sequence, Tuple
+
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+import mmd_scripting.core.nuthouse01_vmd_struct as vmdstruct
+from mmd_scripting.core.nuthouse01_pmx_utils import BoneGraph
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+_SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 8/22/2021"
+
+################################################################################
+# this file defines forward kinematics that computes every timestep of a motion at once
+# requires numpy, all quaternions are W X Y Z and all angles are in degrees, same as nuthouse01_core
+
+
+def euler_to_quaternion_many(euler) -> 'np.ndarray':
+	"""
+	Batched version of core.euler_to_quaternion(), same MMD-style conversion.
+
+	:param euler: array (..., 3) of X Y Z angles in degrees
+	:return: array (..., 4) of W X Y Z quaternions
+	"""
+	half = np.radians(np.asarray(euler, dtype=np.float64)) * 0.5
+	sx, sy, sz = np.sin(half[..., 0]), np.sin(half[..., 1]), np.sin(half[..., 2])
+	cx, cy, cz = np.cos(half[..., 0]), np.cos(half[..., 1]), np.cos(half[..., 2])
+	w = (cz * cy * cx) + (sz * sy * sx)
+	x = (cz * cy * sx) + (sz * sy * cx)
+	y = (sz * cy * sx) - (cz * sy * cx)
+	z = (cz * sy * sx) - (sz * cy * cx)
+	return np.stack((w, x, y, z), axis=-1)
+
+
+def hamilton_product_many(quat1, quat2) -> 'np.ndarray':
+	"""
+	Batched version of core.hamilton_product(), the inputs are broadcast against eachother.
+	Returns the equivalent of rotation quat2 followed by rotation quat1.
+
+	:param quat1: array (..., 4) of W X Y Z quaternions
+	:param quat2: array (..., 4) of W X Y Z quaternions
+	:return: array (..., 4) of W X Y Z quaternions
+	"""
+	a1, b1, c1, d1 = quat1[..., 0], quat1[..., 1], quat1[..., 2], quat1[..., 3]
+	a2, b2, c2, d2 = quat2[..., 0], quat2[..., 1], quat2[..., 2], quat2[..., 3]
+	a3 = (a1 * a2) - (b1 * b2) - (c1 * c2) - (d1 * d2)
+	b3 = (a1 * b2) + (b1 * a2) + (c1 * d2) - (d1 * c2)
+	c3 = (a1 * c2) - (b1 * d2) + (c1 * a2) + (d1 * b2)
+	d3 = (a1 * d2) + (b1 * c2) - (c1 * b2) + (d1 * a2)
+	return np.stack((a3, b3, c3, d3), axis=-1)
+
+
+def rotate3d_many(rotate_around, angle_quat, initial_position) -> 'np.ndarray':
+	"""
+	Batched version of core.rotate3d(), the inputs are broadcast against eachother.
+
+	:param rotate_around: array (..., 3) X Y Z, usually bone locations
+	:param angle_quat: array (..., 4) W X Y Z quaternion rotations to apply
+	:param initial_position: array (..., 3) X Y Z starting locations of the points to be rotated
+	:return: array (..., 3) X Y Z positions after rotating
+	"""
+	point = initial_position - rotate_around
+	# same as R * P * R' but without building the quaternion for P
+	w = angle_quat[..., 0:1]
+	u = angle_quat[..., 1:4]
+	t = 2.0 * np.cross(u, point)
+	return point + (w * t) + np.cross(u, t) + rotate_around
+
+
+def slerp_from_identity_many(quat, t: float) -> 'np.ndarray':
+	"""
+	Batched version of core.my_slerp([1,0,0,0], quat, t), i.e. "multiply" the rotations by the ratio t.
+
+	:param quat: array (..., 4) of W X Y Z quaternions
+	:param t: float, how far to interpolate, usually a partial-inherit ratio
+	:return: array (..., 4) of W X Y Z quaternions
+	"""
+	quat = np.asarray(quat, dtype=np.float64)
+	identity = np.zeros_like(quat)
+	identity[..., 0] = 1.0
+	# same shortcuts as my_slerp
+	if abs(t) <= 1e-6:
+		return identity
+	if abs(t - 1.0) <= 1e-6:
+		return quat.copy()
+	# the dot product with the identity is just W, flip to take the shorter path
+	flip = quat[..., 0:1] < 0.0
+	quat = np.where(flip, -quat, quat)
+	theta = np.arccos(np.clip(quat[..., 0:1], -1.0, 1.0))
+	sin_theta = np.sin(theta)
+	# where theta is 0 there's nothing to interpolate, avoid dividing by 0 & then throw those results away
+	safe = np.where(sin_theta == 0, 1.0, sin_theta)
+	factor0 = np.sin((1 - t) * theta) / safe
+	factor1 = np.sin(t * theta) / safe
+	res = (identity * factor0) + (quat * factor1)
+	return np.where(theta == 0, identity, res)
+
+
+class BatchForwardKinematics:
+	"""
+	The parts of a model's bone hierarchy that forward kinematics needs, computed once so that any number of poses can
+	be simulated with solve(). The bones are deformed in the same order and the same way as
+	make_ik_from_vmd.run_forward_kinematics_for_one_timestep(): order within the bone list, deform layer, and
+	deform_after_phys flag, including partial inherit rotation/translation.
+	"""
+	def __init__(self, bones: List[pmxstruct.PmxBone], graph: BoneGraph=None):
+		"""
+		:param bones: list of bones from pmx object
+		:param graph: optional, BoneGraph built from these bones if one already exists
+		"""
+		if graph is None:
+			graph = BoneGraph(bones)
+		self.graph = graph
+		self.rest_pos = [list(b.pos) for b in bones]
+		# sort by effective deform with current index as a tiebreaker, same as predetermine_bone_deform_order()
+		self.deform_order = sorted(range(len(bones)),
+								   key=lambda d: (bones[d].deform_layer + (2000 if bones[d].deform_after_phys else 0), d))
+		self.inherit_parent = list(graph.inherit_parent)
+		self.inherit_rot = [b.inherit_rot for b in bones]
+		self.inherit_trans = [b.inherit_trans for b in bones]
+		self.inherit_ratio = [b.inherit_ratio for b in bones]
+
+	def solve(self, posed_bones: Sequence[int], trans, quats, result_bones: Sequence[int]) -> Tuple['np.ndarray', 'np.ndarray']:
+		"""
+		Simulate the resulting positions & rotations of some bones, for every timestep at once. Any bone that is not
+		posed is not moved by itself and does not get any partial-inherit from another bone.
+
+		:param posed_bones: list of P bone indices that have poses
+		:param trans: array (T, P, 3) of the translation of each posed bone at each timestep
+		:param quats: array (T, P, 4) of the W X Y Z rotation of each posed bone at each timestep
+		:param result_bones: list of R bone indices to compute the results for
+		:return: tuple(array (T, R, 3) of positions, array (T, R, 4) of W X Y Z rotations)
+		"""
+		trans = np.asarray(trans, dtype=np.float64)
+		quats = np.asarray(quats, dtype=np.float64)
+		num_steps = trans.shape[0]
+		pose_idx = {b: d for d, b in enumerate(posed_bones)}
+		# only keep track of the bones that matter: results, plus posed bones because they are the rotation centers
+		tracked = list(dict.fromkeys(list(result_bones) + list(posed_bones)))
+		tracked_idx = {b: d for d, b in enumerate(tracked)}
+		pos = np.empty((num_steps, len(tracked), 3), dtype=np.float64)
+		pos[:] = np.array([self.rest_pos[b] for b in tracked], dtype=np.float64).reshape(1, len(tracked), 3)
+		rot = np.zeros((num_steps, len(tracked), 4), dtype=np.float64)
+		rot[..., 0] = 1.0
+
+		# NOTE: same as the one-timestep version, start from leaves & work inward
+		for b in reversed(self.deform_order):
+			if b not in pose_idx:
+				continue
+			frame_pos = trans[:, pose_idx[b]]
+			frame_rot = quats[:, pose_idx[b]]
+			src = self.inherit_parent[b]
+			if (self.inherit_rot[b] or self.inherit_trans[b]) and self.inherit_ratio[b] != 0 and src in pose_idx:
+				ratio = self.inherit_ratio[b]
+				if self.inherit_trans[b]:
+					frame_pos = frame_pos + (trans[:, pose_idx[src]] * ratio)
+				if self.inherit_rot[b]:
+					partial_rot = slerp_from_identity_many(quats[:, pose_idx[src]], ratio)
+					frame_rot = hamilton_product_many(partial_rot, frame_rot)
+			# which tracked bones does this move? itself & all its descendants
+			affected = [tracked_idx[b]] + [tracked_idx[c] for c in self.graph.descendants(b) if c in tracked_idx]
+			moving = np.array(affected)
+			# apply the position offset, then rotate around the (new) position of this bone
+			moved = pos[:, moving] + frame_pos[:, None, :]
+			center = moved[:, 0:1, :]
+			pos[:, moving] = rotate3d_many(center, frame_rot[:, None, :], moved)
+			rot[:, moving] = hamilton_product_many(frame_rot[:, None, :], rot[:, moving])
+
+		results = [tracked_idx[b] for b in result_bones]
+		return pos[:, results], rot[:, results]
+
+
+def pose_from_boneframes(framedict: Dict[str, List[vmdstruct.VmdBoneFrame]],
+						 bone_names: Sequence[str],
+						 framenums: Sequence[int]) -> Tuple['np.ndarray', 'np.ndarray']:
+	"""
+	Build the pose arrays for BatchForwardKinematics.solve() from boneframes that have a frame for every bone at every
+	timestep, like the output of fill_missing_boneframes().
+
+	:param framedict: dict with keys being bonenames and values being list of frames for that bone in sorted order
+	:param bone_names: the P bone names to take from the dict, in the same order as the bone indices given to solve()
+	:param framenums: sorted list of the T frame numbers that every bone has a frame at
+	:return: tuple(array (T, P, 3) of translations, array (T, P, 4) of W X Y Z rotations)
+	"""
+	framenums = list(framenums)
+	trans = np.zeros((len(framenums), len(bone_names), 3), dtype=np.float64)
+	euler = np.zeros((len(framenums), len(bone_names), 3), dtype=np.float64)
+	for d, name in enumerate(bone_names):
+		frames = framedict[name]
+		if [f.f for f in frames] != framenums:
+			core.MY_PRINT_FUNC("ERROR: bone '%s' does not have exactly one frame at each of the %d timesteps" % (
+				name, len(framenums)))
+			raise ValueError("every bone must have a frame at every timestep")
+		trans[:, d] = [f.pos for f in frames]
+		euler[:, d] = [f.rot for f in frames]
+	return trans, euler_to_quaternion_many(euler)
@@ -1,7 +1,8 @@
+import functools
 import math
 import struct
 from collections import defaultdict
-from typing import Any
+from typing import Any, List, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 
@@ -28,6 +29,14 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.03 - 8/9/2021"
 
 
 
+# NOTE: the module-level functions my_unpack() and my_string_unpack() keep their read position and string encoding in
+# module-level globals, so only one file can be unpacked with them at a time. The BinaryCursor class below does the
+# same thing but keeps all of that inside the cursor object, so it is safe to use several at once from different threads.
+# NOTE: on the writing side, my_string_pack() and encode_string_with_escape() use the encoding from set_encoding()
+# unless they are given one explicitly. write_pmx() still works that way (and keeps its index sizes in globals of the
+# PMX parser), so writing PMX files is single-threaded only: never write two at once from different threads.
+# (separate processes are fine, they each have their own globals.) write_vmd() passes its encoding explicitly.
+
 # variable to keep track of where to start reading from next within the raw-file
 UNPACKER_READFROM_BYTE = 0
 # this should be hardcoded and never changed, something weird that nobody would ever use in a name
@@ -57,6 +66,63 @@ def print_failed_decodes():
 			core.MY_PRINT_FUNC("    %s  %d" % (k,v))
 
 
+# index formats for a given byte-width, as stored in PMX headers
+# PMX vertex indices are unsigned when they are 1 or 2 bytes, everything else is signed
+IDX_FMT_SIGNED =   {1: "b", 2: "h", 4: "i"}
+IDX_FMT_UNSIGNED = {1: "B", 2: "H", 4: "i"}
+
+
+@functools.lru_cache(maxsize=None)
+def compile_struct(fmt: str) -> struct.Struct:
+	"""
+	Get the compiled struct.Struct for this format string, with the byte-alignment specifier "<" added.
+	These are memoized, so each distinct format string is only ever compiled once.
+	
+	:param fmt: string-type format for python "struct" lib, without the "<"
+	:return: struct.Struct object
+	"""
+	return struct.Struct("<" + fmt)
+
+
+def _decode_bytes_with_escape(r: bytearray, encoding: str) -> Tuple[str, bool]:
+	"""
+	Implementation of decode_bytes_with_escape() that does not touch any globals.
+	
+	:param r: bytearray object which represents a string through the given encoding
+	:param encoding: encoding to use
+	:return: tuple(decoded string, whether it needed escaping)
+	"""
+	if len(r) == 0:
+		# this is needed to prevent infinite recursion if something goes really really wrong
+		return "", False
+	try:
+		return r.decode(encoding), False				# try to decode the whole string
+	except UnicodeDecodeError:
+		s, _ = _decode_bytes_with_escape(r[:-1], encoding)	# if it cant, decode everything but the last byte
+		extra = r[-1]  								# this is the last byte that couldn't be decoded
+		s = "%s%s%x" % (s, _UNPACKER_ESCAPE_CHAR, extra)
+		return s, True
+
+
+def _replace_nonfinite(values: List[Any], bytepos: int) -> None:
+	"""
+	Find any NaN or INF floats in the list and replace them with real numbers, modifies the list in-place.
+	
+	:param values: list of freshly unpacked values
+	:param bytepos: read position, only used for the warning printout
+	"""
+	for i in range(len(values)):
+		foo = values[i]
+		if isinstance(foo, float):
+			if math.isnan(foo):
+				values[i] = 0.0
+				core.MY_PRINT_FUNC("Warning: found NaN in place of float shortly before bytepos %d, replaced with 0.0" % bytepos)
+			if math.isinf(foo):
+				if foo > 0: values[i] =  999999.0
+				else:       values[i] = -999999.0
+				core.MY_PRINT_FUNC("Warning: found INF in place of float shortly before bytepos %d, replaced with +/- 999999.0" % bytepos)
+
+
 def decode_bytes_with_escape(r: bytearray) -> str:
 	"""
 	Turns bytes into a string, with some special quirks. Reversible opposite of encode_string_with_escape().
@@ -71,21 +137,13 @@ def decode_bytes_with_escape(r: bytearray) -> str:
 	:return: decoded string, possibly ending with escape char and hex digits
 	"""
 	global _UNPACKER_FAILED_TRANSLATE_FLAG
-	if len(r) == 0:
-		# this is needed to prevent infinite recursion if something goes really really wrong
-		return ""
-	try:
-		s = r.decode(_UNPACKER_ENCODING)				# try to decode the whole string
-		return s
-	except UnicodeDecodeError:
+	s, failed = _decode_bytes_with_escape(r, _UNPACKER_ENCODING)
+	if failed:
 		_UNPACKER_FAILED_TRANSLATE_FLAG = True
-		s = decode_bytes_with_escape(r[:-1])		# if it cant, decode everything but the last byte
-		extra = r[-1]  								# this is the last byte that couldn't be decoded
-		s = "%s%s%x" % (s, _UNPACKER_ESCAPE_CHAR, extra)
-		return s
+	return s
 
 
-def encode_string_with_escape(a: str) -> bytearray:
+def encode_string_with_escape(a: str, encoding: str=None) -> bytearray:
 	"""
 	Turns a string into bytes, with some special quirks. Reversible opposite of decode_string_with_escape().
 	In VMDs the text fields are truncated to a set # of bytes, so it's possible that they might be cut off
@@ -96,24 +154,28 @@ def encode_string_with_escape(a: str) -> bytearray:
 	All cases I tested require at most 1 escape char, but just to be safe it recursively calls as much as needed.
 	
 	:param a: string that might contain my custom escape sequence
+	:param encoding: optional, encoding to use instead of the one from set_encoding(). giving it explicitly means this
+	doesn't depend on any globals, so it is safe to use from any thread.
 	:return: bytearray after encoding
 	"""
+	if encoding is None:
+		encoding = _UNPACKER_ENCODING
 	if len(a) == 0:
 		# this is needed to prevent infinite recursion if something goes really really wrong
 		return bytearray()
 	try:
 		if len(a) > 3:									# is it long enough to maybe contain an escape char?
 			if a[-3] == _UNPACKER_ESCAPE_CHAR:			# check if 3rd from end is an escape char
-				n = encode_string_with_escape(a[0:-3])	# convert str before escape from str to bytearray
+				n = encode_string_with_escape(a[0:-3], encoding)	# convert str before escape from str to bytearray
 				n += bytearray.fromhex(a[-2:])			# convert hex after escape char to single byte and append
 				return n
-		return bytearray(a, _UNPACKER_ENCODING)			# no escape char: convert from str to bytearray the standard way
+		return bytearray(a, encoding)					# no escape char: convert from str to bytearray the standard way
 	except UnicodeEncodeError:
 		# if the decode fails, I hope it is because the input string contains a fullwidth tilde, that's the only error i know how to handle
 		# NOTE: there are probably other things that can fail that I just dont know about yet
 		new_a = a.replace(u"\uFF5E", u"\u301c")			# replace "fullwidth tilde" with "wave dash", same as MMD does
 		try:
-			return bytearray(new_a, _UNPACKER_ENCODING)	# no escape char: convert from str to bytearray the standard way
+			return bytearray(new_a, encoding)			# no escape char: convert from str to bytearray the standard way
 		except UnicodeEncodeError as e:
 			# overwrite the 'reason' field with the original string it was trying to encode
 			e.reason = a
@@ -133,13 +195,13 @@ def my_pack(fmt:str, args_in: Any) -> bytearray:
 	:return: bytearray representation of these args
 	"""
 	try:
-		afmt = "<" + fmt
+		packer = compile_struct(fmt)
 		if isinstance(args_in, (list, tuple)):
 			# if input args are a list, then flatten the list in the args to struct.pack
-			b = struct.pack(afmt, *args_in)  # now do the actual packing
+			b = packer.pack(*args_in)  # now do the actual packing
 		else:
 			# otherwise, don't bother to listify and then delistify, just directly give it to struct.pack
-			b = struct.pack(afmt, args_in)  # now do the actual packing
+			b = packer.pack(args_in)  # now do the actual packing
 	except Exception as e:
 		core.MY_PRINT_FUNC("error in my_pack(fmt, args_in)")
 		core.MY_PRINT_FUNC("fmt=", fmt, "args_in=", args_in)
@@ -148,10 +210,10 @@ def my_pack(fmt:str, args_in: Any) -> bytearray:
 	return bytearray(b)
 
 
-def my_string_pack(S: str, L=None) -> bytearray:
+def my_string_pack(S: str, L=None, encoding: str=None) -> bytearray:
 	"""
 	Packer function exclusively for packing strings.
-	Uses the encoding that was last set with a "set_encoding()" function call.
+	Uses the encoding that was last set with a "set_encoding()" function call, unless an encoding is given.
 	If L is given, it is the integer number of bytes that should be in the resulting bytearray. If the string would
 	encode to fewer bytes, it is zero-padded. If the string would encode to more bytes, it is truncated.
 	If L is *not* given, the string is encoded with an "auto-length" scheme, i.e. encoded as an integer which holds
@@ -160,10 +222,11 @@ def my_string_pack(S: str, L=None) -> bytearray:
 	
 	:param S: the string to pack
 	:param L: optional integer length, number of bytes in the resulting bytearray
+	:param encoding: optional, encoding to use instead of the one from set_encoding()
 	:return: bytearray representation of this string
 	"""
 	try:
-		n = encode_string_with_escape(S)  # convert str to bytearray
+		n = encode_string_with_escape(S, encoding)  # convert str to bytearray
 		
 		if L is None:
 			# this mode exclusively used for PMX parsing
@@ -201,9 +264,9 @@ def my_unpack(fmt:str, data:bytearray) -> Any:
 	global UNPACKER_READFROM_BYTE
 
 	try:
-		afmt = "<" + fmt
-		r = struct.unpack_from(afmt, data, UNPACKER_READFROM_BYTE)
-		UNPACKER_READFROM_BYTE += struct.calcsize(afmt)	# increment the global read-from tracker
+		unpacker = compile_struct(fmt)
+		r = unpacker.unpack_from(data, UNPACKER_READFROM_BYTE)
+		UNPACKER_READFROM_BYTE += unpacker.size	# increment the global read-from tracker
 	except Exception as e:
 		core.MY_PRINT_FUNC("error in my_unpack(fmt, data)")
 		core.MY_PRINT_FUNC("fmt=",fmt,"data=","really big!","bytepos=", UNPACKER_READFROM_BYTE)
@@ -212,16 +275,7 @@ def my_unpack(fmt:str, data:bytearray) -> Any:
 	# r is guaranteed to be a tuple... convert from tuple to list so i can always return list objects
 	retme = list(r)
 	# new: check for NaN and replace with 0
-	for i in range(len(retme)):
-		foo = retme[i]
-		if isinstance(foo, float):
-			if math.isnan(foo):
-				retme[i] = 0.0
-				core.MY_PRINT_FUNC("Warning: found NaN in place of float shortly before bytepos %d, replaced with 0.0" % UNPACKER_READFROM_BYTE)
-			if math.isinf(foo):
-				if foo > 0: retme[i] =  999999.0
-				else:       retme[i] = -999999.0
-				core.MY_PRINT_FUNC("Warning: found INF in place of float shortly before bytepos %d, replaced with +/- 999999.0" % UNPACKER_READFROM_BYTE)
+	_replace_nonfinite(retme, UNPACKER_READFROM_BYTE)
 	# retme is guaranteed to be a list
 	# if it is only a single item, de-listify it here
 	if len(retme) == 1: return retme[0]
@@ -279,3 +333,119 @@ def my_string_unpack(data: bytearray, L=None) -> str:
 	return s
 
 
+
+
+
+class BinaryCursor:
+	"""
+	Walks through a bytearray and unpacks things from it, one after another. This does the same job as my_unpack()
+	and my_string_unpack(), except that the buffer, the read position, the string encoding, and the record of strings
+	that failed to decode all belong to this object instead of living in module globals. So, any number of cursors can
+	be used at once, from any number of threads. The compiled struct.Struct objects are shared by all cursors.
+	"""
+	def __init__(self, data: bytearray, encoding="utf8", pos=0):
+		"""
+		:param data: bytearray (or bytes, or memoryview) to read from
+		:param encoding: encoding to use when unpacking strings
+		:param pos: byte position to start reading from
+		"""
+		self.data = data
+		self.pos = pos
+		self.encoding = encoding
+		# dict to store all strings that failed to decode, plus counts
+		self.failed_decodes = defaultdict(lambda: 0)
+	
+	def remaining(self) -> int:
+		""" Return the number of bytes that have not been read yet. """
+		return len(self.data) - self.pos
+	
+	def progress(self) -> float:
+		""" Return how far through the buffer this cursor is, [0-1], for progress printouts. """
+		return self.pos / len(self.data)
+	
+	def unpack(self, fmt: str) -> Any:
+		"""
+		Cursor version of my_unpack(): parse some number of friendly Python objects according to the format string,
+		starting at the current position, and advance the position past them.
+		If exactly 1 variable would be unpacked, it is automatically de-listed and returned naked.
+		This also removes any NaN or INF values it finds and replaces them with real numbers instead.
+		
+		:param fmt: string-type format for python "struct" lib, without the "<"
+		:return: one variable or a list of variables, depending on the contents of the format string
+		"""
+		try:
+			unpacker = compile_struct(fmt)
+			r = unpacker.unpack_from(self.data, self.pos)
+			self.pos += unpacker.size
+		except Exception as e:
+			core.MY_PRINT_FUNC("error in BinaryCursor.unpack(fmt)")
+			core.MY_PRINT_FUNC("fmt=", fmt, "bytepos=", self.pos)
+			core.MY_PRINT_FUNC(e.__class__.__name__, e)
+			raise
+		retme = list(r)
+		_replace_nonfinite(retme, self.pos)
+		if len(retme) == 1: return retme[0]
+		else:               return retme
+	
+	def unpack_string(self, L=None) -> str:
+		"""
+		Cursor version of my_string_unpack(): unpack one string using this cursor's encoding.
+		If L is given, read exactly L bytes and discard everything after the first null byte (VMD style).
+		If L is *not* given, read an int and then read that many bytes (PMX style).
+		
+		:param L: optional integer length, number of bytes to read
+		:return: decoded string, possibly ending with escape char and hex digits
+		"""
+		try:
+			if L is None:
+				# auto-length str: a text type is an int followed by that many bytes
+				L = self.unpack("i")
+				b = self.unpack(str(L) + "s")
+			else:
+				# manual-length str: read that number of bytes, null-terminated
+				b = self.unpack(str(L) + "s")
+				terminator_idx = b.find(b'\x00')
+				if terminator_idx != -1:
+					b = b[0:terminator_idx]
+			s, failed = _decode_bytes_with_escape(b, self.encoding)
+		except Exception as e:
+			core.MY_PRINT_FUNC("error in BinaryCursor.unpack_string(L)")
+			core.MY_PRINT_FUNC("L=", L, "bytepos=", self.pos)
+			core.MY_PRINT_FUNC(e.__class__.__name__, e)
+			raise
+		# did it need escaping? add it to the dict for reporting later!
+		if failed:
+			self.failed_decodes[s] += 1
+		return s
+	
+	def read_f32x3(self) -> List[float]:
+		""" Read 3 floats, such as an XYZ position. """
+		return self.unpack("3f")
+	
+	def read_idx(self, n: int, unsigned=False) -> int:
+		"""
+		Read one index that is n bytes wide, as described in PMX headers.
+		
+		:param n: width of the index in bytes, 1/2/4
+		:param unsigned: if True, read 1 and 2 byte indices as unsigned (PMX uses this for vertex indices)
+		:return: int
+		"""
+		if unsigned: return self.unpack(IDX_FMT_UNSIGNED[n])
+		else:        return self.unpack(IDX_FMT_SIGNED[n])
+	
+	def read_pmx_string(self) -> str:
+		""" Read one auto-length string, the kind that PMX files use. """
+		return self.unpack_string()
+	
+	def read_vmd_string(self, L: int) -> str:
+		""" Read one fixed-length null-terminated string, the kind that VMD files use. """
+		return self.unpack_string(L)
+	
+	def print_failed_decodes(self):
+		""" Print every string that needed escaping while being unpacked by this cursor, plus counts. """
+		if len(self.failed_decodes) != 0:
+			core.MY_PRINT_FUNC("List of all strings that failed to decode, plus their occurance rate:")
+			keys = ["'" + k + "':" for k in self.failed_decodes.keys()]
+			keys_justified = core.MY_JUSTIFY_STRINGLIST(keys)
+			for k,v in zip(keys_justified, self.failed_decodes.values()):
+				core.MY_PRINT_FUNC("    %s  %d" % (k,v))
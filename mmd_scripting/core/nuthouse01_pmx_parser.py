@@ -1,12 +1,20 @@
+import copy
+import itertools
 import math
+import struct
 import time
-from typing import List, Tuple
+from typing import Dict, List, Tuple, Union
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_io as io
 import mmd_scripting.core.nuthouse01_packer as pack
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.03 - 8/9/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
@@ -76,15 +84,36 @@ BUILTIN_TOON_DICT_REVERSE = {v: k for k, v in BUILTIN_TOON_DICT.items()}
 
 ########################################################################################################################
 
-def parse_pmx_header(raw: bytearray) -> pmxstruct.PmxHeader:
+class PmxCursor(pack.BinaryCursor):
+	"""
+	BinaryCursor that also remembers the settings from the PMX header that are needed to parse the rest of the file.
+	Everything the parse_pmx_* functions need is stored in here instead of in globals, so several files can be parsed
+	at once from different threads.
+	"""
+	def __init__(self, data: bytearray, moreinfo=False):
+		super().__init__(data)
+		# flag to indicate whether more info is desired or not
+		self.moreinfo = moreinfo
+		# these are all set by parse_pmx_header()
+		# how many extra vec4s each vertex has with it
+		self.addl_vertex_vec4 = 0
+		# type used to store an index for each thing, these are concatenated to dynamically make format strings
+		self.idx_vert = "x"
+		self.idx_tex = "x"
+		self.idx_mat = "x"
+		self.idx_bone = "x"
+		self.idx_morph = "x"
+		self.idx_rb = "x"
+
+def parse_pmx_header(cur: PmxCursor) -> pmxstruct.PmxHeader:
 	##################################################################
 	# HEADER INFO PARSING
-	# collects some returnable data, mostly just sets globals
+	# collects some returnable data, mostly just sets up the cursor
 	# returnable: ver, name_jp, name_en, comment_jp, comment_en
 	
 	expectedmagic = bytearray("PMX ", "utf-8")
 	fmt_magic = "4s f b"
-	(magic, ver, numglobal) = pack.my_unpack(fmt_magic, raw)
+	(magic, ver, numglobal) = cur.unpack(fmt_magic)
 	if magic != expectedmagic:
 		core.MY_PRINT_FUNC("WARNING: This file does not begin with the correct magic bytes. Maybe it was locked? Locks wont stop me!")
 		core.MY_PRINT_FUNC("         Expected '%s' but found '%s'" % (expectedmagic.hex(), magic.hex()))
@@ -98,39 +127,35 @@ def parse_pmx_header(raw: bytearray) -> pmxstruct.PmxHeader:
 		core.MY_PRINT_FUNC("WARNING: This PMX has '%d' global flags, this behavior is undefined!!!" % numglobal)
 		core.MY_PRINT_FUNC("         Technically the format supports any number of global flags but I only know the meanings of the first 8")
 	fmt_globals = str(numglobal) + "b"
-	globalflags = pack.my_unpack(fmt_globals, raw)	# this actually returns a tuple of ints, which works just fine, dont touch it
+	globalflags = cur.unpack(fmt_globals)	# this actually returns a tuple of ints, which works just fine, dont touch it
 	if numglobal != 8:
 		core.MY_PRINT_FUNC("         Global flags = %s" % str(globalflags))
 	
 	# byte 0: encoding
-	if globalflags[0] == 0:   pack.set_encoding("utf_16_le")
-	elif globalflags[0] == 1: pack.set_encoding("utf_8")
+	if globalflags[0] == 0:   cur.encoding = "utf_16_le"
+	elif globalflags[0] == 1: cur.encoding = "utf_8"
 	else:                     raise RuntimeError("unsupported encoding value '%d'" % globalflags[0])
 	
 	# byte 1: additional vec4 per vertex
-	# store this in a global so it can be more easily passed to the vertex section
-	global ADDL_VERTEX_VEC4
-	ADDL_VERTEX_VEC4 = globalflags[1]
+	# store this in the cursor so it can be more easily passed to the vertex section
+	cur.addl_vertex_vec4 = globalflags[1]
 	
 	# bytes 2-7: data size to use for index references
-	# store these in globals as well because passing them around as arguments would be annoying
+	# store these in the cursor as well because passing them around as arguments would be annoying
 	# see comment around line 50 for more info
-	global IDX_VERT, IDX_TEX, IDX_MAT, IDX_BONE, IDX_MORPH, IDX_RB
-	vert_conv = {1:"B", 2:"H", 4:"i"}
-	IDX_VERT  = vert_conv[globalflags[2]]
-	conv =      {1:"b", 2:"h", 4:"i"}
-	IDX_TEX   = conv[globalflags[3]]
-	IDX_MAT   = conv[globalflags[4]]
-	IDX_BONE  = conv[globalflags[5]]
-	IDX_MORPH = conv[globalflags[6]]
-	IDX_RB    = conv[globalflags[7]]
+	cur.idx_vert  = pack.IDX_FMT_UNSIGNED[globalflags[2]]
+	cur.idx_tex   = pack.IDX_FMT_SIGNED[globalflags[3]]
+	cur.idx_mat   = pack.IDX_FMT_SIGNED[globalflags[4]]
+	cur.idx_bone  = pack.IDX_FMT_SIGNED[globalflags[5]]
+	cur.idx_morph = pack.IDX_FMT_SIGNED[globalflags[6]]
+	cur.idx_rb    = pack.IDX_FMT_SIGNED[globalflags[7]]
 	
 	# finally handle the model names & comments
-	# (name_jp, name_en, comment_jp, comment_en) = pack.my_unpack("t t t t", raw)
-	name_jp = pack.my_string_unpack(raw)
-	name_en = pack.my_string_unpack(raw)
-	comment_jp = pack.my_string_unpack(raw)
-	comment_en = pack.my_string_unpack(raw)
+	# (name_jp, name_en, comment_jp, comment_en) = cur.unpack("t t t t")
+	name_jp = cur.read_pmx_string()
+	name_en = cur.read_pmx_string()
+	comment_jp = cur.read_pmx_string()
+	comment_en = cur.read_pmx_string()
 	
 	# assemble all the info into a struct for returning
 	return pmxstruct.PmxHeader(ver=ver,
@@ -138,15 +163,15 @@ def parse_pmx_header(raw: bytearray) -> pmxstruct.PmxHeader:
 							   comment_jp=comment_jp, comment_en=comment_en)
 	# return retme
 
-def parse_pmx_vertices(raw: bytearray) -> List[pmxstruct.PmxVertex]:
+def parse_pmx_vertices(cur: PmxCursor) -> List[pmxstruct.PmxVertex]:
 	# first item is int, how many vertices
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of verts            =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of verts            =", i)
 	retme = []
-	bdef1_fmt = IDX_BONE
-	bdef2_fmt = "2%s f" % IDX_BONE
-	bdef4_fmt = "4%s 4f" % IDX_BONE
-	sdef_fmt =  "2%s 10f" % IDX_BONE
+	bdef1_fmt = cur.idx_bone
+	bdef2_fmt = "2%s f" % cur.idx_bone
+	bdef4_fmt = "4%s 4f" % cur.idx_bone
+	sdef_fmt =  "2%s 10f" % cur.idx_bone
 	qdef_fmt =  bdef4_fmt
 	
 	def weightbinary_to_weightpairs(wtype: pmxstruct.WeightMode, w_i: List[float]) -> List[List[float]]:
@@ -175,47 +200,47 @@ def parse_pmx_vertices(raw: bytearray) -> List[pmxstruct.PmxVertex]:
 	
 	for d in range(i):
 		# first, basic stuff
-		(posX, posY, posZ, normX, normY, normZ, u, v) = pack.my_unpack("8f", raw)
+		(posX, posY, posZ, normX, normY, normZ, u, v) = cur.unpack("8f")
 		# then, some number of vec4s (probably none)
 		addl_vec4s = []
-		for z in range(ADDL_VERTEX_VEC4):
-			this_vec4 = pack.my_unpack("4f", raw) # already returns as a list of 4 floats, no need to unpack then repack
+		for z in range(cur.addl_vertex_vec4):
+			this_vec4 = cur.unpack("4f") # already returns as a list of 4 floats, no need to unpack then repack
 			addl_vec4s.append(this_vec4)
-		weighttype_int = pack.my_unpack("b", raw)
+		weighttype_int = cur.unpack("b")
 		weighttype = pmxstruct.WeightMode(weighttype_int)
 		weights = []
 		weight_sdef = []
 		if weighttype == pmxstruct.WeightMode.BDEF1:
 			# BDEF1
-			b1 = pack.my_unpack(bdef1_fmt, raw)
+			b1 = cur.unpack(bdef1_fmt)
 			weights = [b1]
 		elif weighttype == pmxstruct.WeightMode.BDEF2:
 			# BDEF2
 			#(b1, b2, b1w) # already returns as a list of floats, no need to unpack then repack
-			weights = pack.my_unpack(bdef2_fmt, raw)
+			weights = cur.unpack(bdef2_fmt)
 		elif weighttype == pmxstruct.WeightMode.BDEF4:
 			# BDEF4
 			#(b1, b2, b3, b4, b1w, b2w, b3w, b4w) # already returns as a list of floats, no need to unpack then repack
-			weights = pack.my_unpack(bdef4_fmt, raw)
+			weights = cur.unpack(bdef4_fmt)
 		elif weighttype == pmxstruct.WeightMode.SDEF:
 			# SDEF
 			#(b1, b2, b1w, c1, c2, c3, r01, r02, r03, r11, r12, r13)
-			(b1, b2, b1w, c1, c2, c3, r01, r02, r03, r11, r12, r13) = pack.my_unpack(sdef_fmt, raw)
+			(b1, b2, b1w, c1, c2, c3, r01, r02, r03, r11, r12, r13) = cur.unpack(sdef_fmt)
 			weights = [b1, b2, b1w]
 			weight_sdef = [[c1, c2, c3], [r01, r02, r03], [r11, r12, r13]]
 		elif weighttype == pmxstruct.WeightMode.QDEF:
 			# it must be using QDEF, a type only for PMX v2.1 which I dont need to support so idgaf
 			# (b1, b2, b3, b4, b1w, b2w, b3w, b4w)
-			weights = pack.my_unpack(qdef_fmt, raw)
+			weights = cur.unpack(qdef_fmt)
 		# else:
 		# 	core.MY_PRINT_FUNC("invalid weight type for vertex", weighttype)
 		# then there is one final float after the weight crap
-		edgescale = pack.my_unpack("f", raw)
+		edgescale = cur.unpack("f")
 		
 		weight_pairs = weightbinary_to_weightpairs(weighttype, weights)
 
 		# display progress printouts
-		core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+		core.print_progress_oneline(cur.progress())
 		# assemble all the info into a struct for returning
 		thisvert = pmxstruct.PmxVertex(pos=[posX, posY, posZ], norm=[normX, normY, normZ], uv=[u, v],
 									   weighttype=weighttype, weight=weight_pairs, weight_sdef=weight_sdef,
@@ -224,53 +249,197 @@ def parse_pmx_vertices(raw: bytearray) -> List[pmxstruct.PmxVertex]:
 		retme.append(thisvert)
 	return retme
 
-def parse_pmx_surfaces(raw: bytearray) -> List[List[int]]:
+# numpy equivalents of the index formats, used by the columnar parsing/encoding
+_IDX_TO_NUMPY = {"B": "<u1", "H": "<u2", "b": "<i1", "h": "<i2", "i": "<i4"}
+
+def _records_view(raw: bytearray, dtype):
+	"""
+	View raw as an array of overlapping records of the given numpy dtype that start 1 byte apart, so that indexing the
+	view with an array of byte offsets reads (or writes) one record at each offset. Nothing is copied.
+	:param raw: bytearray being parsed or encoded
+	:param dtype: numpy structured dtype
+	:return: numpy structured array that shares memory with raw
+	"""
+	return np.ndarray(shape=(max(len(raw) - dtype.itemsize + 1, 0),), dtype=dtype, buffer=raw, offset=0, strides=(1,))
+
+def _gather_records(raw: bytearray, dtype, offsets):
+	"""
+	Read one record of the given numpy dtype at each of the given byte offsets within raw.
+	:param raw: bytearray being parsed
+	:param dtype: numpy structured dtype to read at each offset
+	:param offsets: numpy int array of byte offsets
+	:return: numpy structured array with one record per offset
+	"""
+	return _records_view(raw, dtype)[offsets]
+
+def _vertex_dtypes(addl_vertex_vec4: int, idx_bone: str):
+	"""
+	Build the numpy dtypes that describe one vertex.
+	:param addl_vertex_vec4: how many extra vec4s each vertex has
+	:param idx_bone: format char for bone indices
+	:return: (head_dtype, weight_dtypes): head_dtype is everything up to and including the weighttype byte,
+	weight_dtypes is a tuple of the weight data that comes after it, indexed by weighttype
+	"""
+	bone_dtype = np.dtype(_IDX_TO_NUMPY[idx_bone])
+	# pos, norm, uv, addl vec4s, then weighttype
+	head_dtype = np.dtype([("pos", "<f4", (3,)), ("norm", "<f4", (3,)), ("uv", "<f4", (2,)),
+						   ("addl_vec4s", "<f4", (addl_vertex_vec4, 4)), ("weighttype", "<i1")])
+	# the weight data that comes after the weighttype byte, one layout for each WeightMode
+	weight_dtypes = (
+		np.dtype([("bone", bone_dtype, (1,))]),												# BDEF1
+		np.dtype([("bone", bone_dtype, (2,)), ("value", "<f4", (1,))]),						# BDEF2
+		np.dtype([("bone", bone_dtype, (4,)), ("value", "<f4", (4,))]),						# BDEF4
+		np.dtype([("bone", bone_dtype, (2,)), ("value", "<f4", (1,)), ("sdef", "<f4", (3, 3))]),	# SDEF
+		np.dtype([("bone", bone_dtype, (4,)), ("value", "<f4", (4,))]),						# QDEF
+	)
+	return head_dtype, weight_dtypes
+
+def _fix_nonfinite(arr) -> None:
+	"""
+	Columnar equivalent of the NaN/INF replacement that my_unpack does, modifies the float array in-place.
+	:param arr: numpy float array
+	"""
+	bad = ~np.isfinite(arr)
+	if bad.any():
+		core.MY_PRINT_FUNC("Warning: found %d NaN/INF in place of floats in the vertex block, replaced with 0.0 or +/- 999999.0" % np.count_nonzero(bad))
+		np.nan_to_num(arr, copy=False, nan=0.0, posinf=999999.0, neginf=-999999.0)
+
+def _walk_pmx_vertex_offsets(cur: PmxCursor, i: int) -> List[int]:
+	"""
+	Walk through the vertex block (after the vertex count) to find where each vertex begins, without decoding them.
+	This is the only per-vertex python code needed by the columnar parser and the section scan, and it only touches
+	one byte per vertex.
+	:param cur: PmxCursor positioned at the first vertex, does NOT get moved
+	:param i: number of vertices
+	:return: list of i+1 byte offsets, the last one is where the vertex block ends
+	"""
+	# everything before the weighttype byte: pos, norm, uv, addl vec4s
+	wt_pos = 32 + (16 * cur.addl_vertex_vec4)
+	# total size of each vertex, indexed by weighttype
+	b = cur.idx_bone
+	vert_size = [wt_pos + 1 + pack.compile_struct(w).size + 4 for w in
+				 (b, "2%s f" % b, "4%s 4f" % b, "2%s 10f" % b, "4%s 4f" % b)]
+	raw = cur.data
+	offsets = [0] * (i + 1)
+	here = cur.pos
+	try:
+		for d in range(i):
+			offsets[d] = here
+			here += vert_size[raw[here + wt_pos]]
+	except IndexError:
+		# either the weighttype byte is not 0-4, or i ran off the end of the file
+		core.MY_PRINT_FUNC("error in _walk_pmx_vertex_offsets(cur)")
+		core.MY_PRINT_FUNC("invalid weighttype or unexpected end of data near bytepos", here)
+		raise
+	offsets[i] = here
+	return offsets
+
+def parse_pmx_vertices_columnar(cur: PmxCursor) -> pmxstruct.PmxVertexColumns:
+	# this reads exactly the same data as parse_pmx_vertices(), but into a few numpy arrays instead of PmxVertex objects
+	# the vertices are different sizes depending on their weighttype, so first walk the block once to find where each
+	# vertex begins, then pick out all the fields for all the vertices with a handful of numpy operations
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of verts            =", i)
+	head_dtype, weight_dtypes = _vertex_dtypes(cur.addl_vertex_vec4, cur.idx_bone)
+	raw = cur.data
+	# walk the block to find where each vertex begins
+	offsets = np.array(_walk_pmx_vertex_offsets(cur, i), dtype=np.int64)
+	here = offsets[i]
+
+	# now pick out everything
+	head = _gather_records(raw, head_dtype, offsets[:-1])
+	weighttype = head["weighttype"]
+	pos = head["pos"]
+	norm = head["norm"]
+	uv = head["uv"]
+	addl_vec4s = head["addl_vec4s"]
+	# edgescale is always the last 4 bytes of each vertex
+	edgescale = _gather_records(raw, np.dtype("<f4"), offsets[1:] - 4)
+	weight_bone = np.zeros((i, 4), dtype=np.int32)
+	weight_value = np.zeros((i, 4), dtype=np.float64)
+	weight_sdef = np.zeros((i, 3, 3), dtype=np.float32)
+	for wt, wdtype in enumerate(weight_dtypes):
+		rows = np.flatnonzero(weighttype == wt)
+		if len(rows) == 0: continue
+		w = _gather_records(raw, wdtype, offsets[rows] + head_dtype.itemsize)
+		weight_bone[rows, :w["bone"].shape[1]] = w["bone"]
+		if wt == pmxstruct.WeightMode.BDEF1.value:
+			weight_value[rows, 0] = 1.0
+			continue
+		value = w["value"]
+		_fix_nonfinite(value)
+		value = value.astype(np.float64)
+		if value.shape[1] == 1:
+			# BDEF2 and SDEF only store the weight of the first bone
+			weight_value[rows, 0] = value[:, 0]
+			weight_value[rows, 1] = 1.0 - value[:, 0]
+		else:
+			weight_value[rows] = value
+		if wt == pmxstruct.WeightMode.SDEF.value:
+			weight_sdef[rows] = w["sdef"]
+
+	# these are all copies, so it's safe to modify them in-place
+	pos = np.ascontiguousarray(pos)
+	norm = np.ascontiguousarray(norm)
+	uv = np.ascontiguousarray(uv)
+	addl_vec4s = np.ascontiguousarray(addl_vec4s)
+	for arr in (pos, norm, uv, addl_vec4s, edgescale, weight_sdef):
+		_fix_nonfinite(arr)
+
+	cur.pos = int(here)
+	# display progress printouts
+	core.print_progress_oneline(cur.progress())
+	return pmxstruct.PmxVertexColumns(pos=pos, norm=norm, uv=uv, edgescale=edgescale,
+									  weighttype=np.ascontiguousarray(weighttype), weight_bone=weight_bone,
+									  weight_value=weight_value, weight_sdef=weight_sdef, addl_vec4s=addl_vec4s)
+
+def parse_pmx_surfaces(cur: PmxCursor) -> List[List[int]]:
 	# surfaces is just another name for faces
 	# first item is int, how many vertex indices there are, NOT the actual number of faces
 	# each face is 3 vertex indices, so "i" will always be a multiple of 3
-	i = pack.my_unpack("i", raw)
+	i = cur.unpack("i")
 	retme = []
 	i = int(i / 3)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of faces            =", i)
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of faces            =", i)
 	for d in range(i):
 		# each entry is a group of 3 vertex indeces that make a face
-		thisface = pack.my_unpack("3" + IDX_VERT, raw)
+		thisface = cur.unpack("3" + cur.idx_vert)
 		# display progress printouts
-		core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+		core.print_progress_oneline(cur.progress())
 		retme.append(thisface)
 	return retme
 
-def parse_pmx_textures(raw: bytearray) -> List[str]:
+def parse_pmx_textures(cur: PmxCursor) -> List[str]:
 	# first item is int, how many textures
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of textures         =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of textures         =", i)
 	retme = []
 	for d in range(i):
-		filepath = pack.my_string_unpack(raw)
+		filepath = cur.read_pmx_string()
 		# print(filepath)
 		retme.append(filepath)
 	return retme
 
-def parse_pmx_materials(raw: bytearray, textures: List[str]) -> List[pmxstruct.PmxMaterial]:
+def parse_pmx_materials(cur: PmxCursor, textures: List[str]) -> List[pmxstruct.PmxMaterial]:
 	# first item is int, how many materials
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of materials        =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of materials        =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
 		# print(name_jp, name_en)
-		(diffR, diffG, diffB, diffA, specR, specG, specB, specpower) = pack.my_unpack("4f 4f", raw)
-		(ambR, ambG, ambB, flags, edgeR, edgeG, edgeB, edgeA, edgescale, tex_idx) = pack.my_unpack("3f B 5f" + IDX_TEX, raw)
-		(sph_idx, sph_mode_int, builtin_toon) = pack.my_unpack(IDX_TEX + "b b", raw)
+		(diffR, diffG, diffB, diffA, specR, specG, specB, specpower) = cur.unpack("4f 4f")
+		(ambR, ambG, ambB, flags, edgeR, edgeG, edgeB, edgeA, edgescale, tex_idx) = cur.unpack("3f B 5f" + cur.idx_tex)
+		(sph_idx, sph_mode_int, builtin_toon) = cur.unpack(cur.idx_tex + "b b")
 		if builtin_toon == 0:
 			# toon is using a texture reference
-			toon_idx = pack.my_unpack(IDX_TEX, raw)
+			toon_idx = cur.unpack(cur.idx_tex)
 		else:
 			# toon is using one of the builtin toons, toon01.bmp thru toon10.bmp (values 0-9)
-			toon_idx = pack.my_unpack("b", raw)
-		comment = pack.my_string_unpack(raw)
-		surface_ct = pack.my_unpack("i", raw)
+			toon_idx = cur.unpack("b")
+		comment = cur.read_pmx_string()
+		surface_ct = cur.unpack("i")
 		# note: i structure the faces list into groups of 3 vertex indices, this is divided by 3 to match
 		faces_ct = int(surface_ct / 3)
 		sph_mode = pmxstruct.SphMode(sph_mode_int)
@@ -299,15 +468,15 @@ def parse_pmx_materials(raw: bytearray, textures: List[str]) -> List[pmxstruct.P
 		retme.append(thismat)
 	return retme
 
-def parse_pmx_bones(raw: bytearray) -> List[pmxstruct.PmxBone]:
+def parse_pmx_bones(cur: PmxCursor) -> List[pmxstruct.PmxBone]:
 	# first item is int, how many bones
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of bones            =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of bones            =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(posX, posY, posZ, parent_idx, deform_layer, flags1, flags2) = pack.my_unpack("3f" + IDX_BONE + "i 2B", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(posX, posY, posZ, parent_idx, deform_layer, flags1, flags2) = cur.unpack("3f" + cur.idx_bone + "i 2B")
 		# print(name_jp, name_en)
 		tail_usebonelink =       bool(flags1 & (1<<0))
 		rotateable =             bool(flags1 & (1<<1))
@@ -328,29 +497,29 @@ def parse_pmx_bones(raw: bytearray) -> List[pmxstruct.PmxBone]:
 		local_axis_x_xyz = local_axis_z_xyz = None
 		ik_target = ik_loops = ik_anglelimit = ik_links = None
 		if tail_usebonelink:  # use index for bone its pointing at
-			tail = pack.my_unpack(IDX_BONE, raw)
+			tail = cur.unpack(cur.idx_bone)
 		else:  # use offset
-			tail = pack.my_unpack("3f", raw)
+			tail = cur.read_f32x3()
 		if inherit_rot or inherit_trans:
-			(inherit_parent, inherit_influence) = pack.my_unpack(IDX_BONE + "f", raw)
+			(inherit_parent, inherit_influence) = cur.unpack(cur.idx_bone + "f")
 		if has_fixedaxis:
 			# format is xyz obviously
-			fixedaxis = pack.my_unpack("3f", raw)
+			fixedaxis = cur.read_f32x3()
 		if has_localaxis:
-			(xx, xy, xz, zx, zy, zz) = pack.my_unpack("3f 3f", raw)
+			(xx, xy, xz, zx, zy, zz) = cur.unpack("3f 3f")
 			local_axis_x_xyz = [xx, xy, xz]
 			local_axis_z_xyz = [zx, zy, zz]
 		if has_external_parent:
-			external_parent = pack.my_unpack("i", raw)
+			external_parent = cur.unpack("i")
 		if ik:
-			(ik_target, ik_loops, ik_anglelimit, num_ik_links) = pack.my_unpack(IDX_BONE + "i f i", raw)
+			(ik_target, ik_loops, ik_anglelimit, num_ik_links) = cur.unpack(cur.idx_bone + "i f i")
 			# note: ik angle comes in as radians, i want to represent it as degrees
 			ik_anglelimit = math.degrees(ik_anglelimit)
 			ik_links = []
 			for z in range(num_ik_links):
-				(ik_link_idx, use_link_limits) = pack.my_unpack(IDX_BONE + "b", raw)
+				(ik_link_idx, use_link_limits) = cur.unpack(cur.idx_bone + "b")
 				if use_link_limits:
-					(minX, minY, minZ, maxX, maxY, maxZ) = pack.my_unpack("3f 3f", raw)
+					(minX, minY, minZ, maxX, maxY, maxZ) = cur.unpack("3f 3f")
 					# note: these vals come in as XYZXYZ radians! must convert to degrees
 					link = pmxstruct.PmxBoneIkLink(idx=ik_link_idx,
 												   limit_min=[math.degrees(minX), math.degrees(minY), math.degrees(minZ)],
@@ -380,15 +549,15 @@ def parse_pmx_bones(raw: bytearray) -> List[pmxstruct.PmxBone]:
 		retme.append(thisbone)
 	return retme
 
-def parse_pmx_morphs(raw: bytearray) -> List[pmxstruct.PmxMorph]:
+def parse_pmx_morphs(cur: PmxCursor) -> List[pmxstruct.PmxMorph]:
 	# first item is int, how many morphs
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of morphs           =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of morphs           =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(panel_int, morphtype_int, itemcount) = pack.my_unpack("b b i", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(panel_int, morphtype_int, itemcount) = cur.unpack("b b i")
 		morphtype = pmxstruct.MorphType(morphtype_int)
 		panel = pmxstruct.MorphPanel(panel_int)
 		# print(name_jp, name_en)
@@ -397,19 +566,19 @@ def parse_pmx_morphs(raw: bytearray) -> List[pmxstruct.PmxMorph]:
 		if morphtype == pmxstruct.MorphType.GROUP:
 			# group
 			for z in range(itemcount):
-				(morph_idx, influence) = pack.my_unpack(IDX_MORPH + "f", raw)
+				(morph_idx, influence) = cur.unpack(cur.idx_morph + "f")
 				item = pmxstruct.PmxMorphItemGroup(morph_idx=morph_idx, value=influence)
 				these_items.append(item)
 		elif morphtype == pmxstruct.MorphType.VERTEX:
 			# vertex
 			for z in range(itemcount):
-				(vert_idx, transX, transY, transZ) = pack.my_unpack(IDX_VERT + "3f", raw)
+				(vert_idx, transX, transY, transZ) = cur.unpack(cur.idx_vert + "3f")
 				item = pmxstruct.PmxMorphItemVertex(vert_idx=vert_idx, move=[transX, transY, transZ])
 				these_items.append(item)
 		elif morphtype == pmxstruct.MorphType.BONE:
 			# bone
 			for z in range(itemcount):
-				(bone_idx, transX, transY, transZ, rotqX, rotqY, rotqZ, rotqW) = pack.my_unpack(IDX_BONE + "3f 4f", raw)
+				(bone_idx, transX, transY, transZ, rotqX, rotqY, rotqZ, rotqW) = cur.unpack(cur.idx_bone + "3f 4f")
 				rotX, rotY, rotZ = core.quaternion_to_euler([rotqW, rotqX, rotqY, rotqZ])
 				item = pmxstruct.PmxMorphItemBone(bone_idx=bone_idx, move=[transX, transY, transZ], rot=[rotX, rotY, rotZ])
 				these_items.append(item)
@@ -422,16 +591,16 @@ def parse_pmx_morphs(raw: bytearray) -> List[pmxstruct.PmxMorph]:
 			# what these values do depends on the UV layer they are affecting, but the docs dont say what...
 			# oh well, i dont need to use them so i dont care :)
 			for z in range(itemcount):
-				(vert_idx, A, B, C, D) = pack.my_unpack(IDX_VERT + "4f", raw)
+				(vert_idx, A, B, C, D) = cur.unpack(cur.idx_vert + "4f")
 				item = pmxstruct.PmxMorphItemUV(vert_idx=vert_idx, move=[A,B,C,D])
 				these_items.append(item)
 		elif morphtype == pmxstruct.MorphType.MATERIAL:
 			# material
-			# this_item = core.my_unpack(IDX_MAT + "b 4f 3f    f 3f 4f f    4f 4f 4f", raw)
+			# this_item = cur.unpack(cur.idx_mat + "b 4f 3f    f 3f 4f f    4f 4f 4f")
 			for z in range(itemcount):
-				(mat_idx, is_add, diffR, diffG, diffB, diffA, specR, specG, specB) = pack.my_unpack(IDX_MAT + "b 4f 3f", raw)
-				(specpower, ambR, ambG, ambB, edgeR, edgeG, edgeB, edgeA, edgesize) = pack.my_unpack("f 3f 4f f", raw)
-				(texR, texG, texB, texA, sphR, sphG, sphB, sphA, toonR, toonG, toonB, toonA) = pack.my_unpack("4f 4f 4f", raw)
+				(mat_idx, is_add, diffR, diffG, diffB, diffA, specR, specG, specB) = cur.unpack(cur.idx_mat + "b 4f 3f")
+				(specpower, ambR, ambG, ambB, edgeR, edgeG, edgeB, edgeA, edgesize) = cur.unpack("f 3f 4f f")
+				(texR, texG, texB, texA, sphR, sphG, sphB, sphA, toonR, toonG, toonB, toonA) = cur.unpack("4f 4f 4f")
 				item = pmxstruct.PmxMorphItemMaterial(
 					mat_idx=mat_idx, is_add=is_add, alpha=diffA, specpower=specpower,
 					diffRGB=[diffR, diffG, diffB], specRGB=[specR, specG, specB], ambRGB=[ambR, ambG, ambB],
@@ -442,13 +611,13 @@ def parse_pmx_morphs(raw: bytearray) -> List[pmxstruct.PmxMorph]:
 		elif morphtype == pmxstruct.MorphType.FLIP:
 			# (2.1 only) flip
 			for z in range(itemcount):
-				(morph_idx, influence) = pack.my_unpack(IDX_MORPH + "f", raw)
+				(morph_idx, influence) = cur.unpack(cur.idx_morph + "f")
 				item = pmxstruct.PmxMorphItemFlip(morph_idx=morph_idx, value=influence)
 				these_items.append(item)
 		elif morphtype == pmxstruct.MorphType.IMPULSE:
 			# (2.1 only) impulse
 			for z in range(itemcount):
-				(rb_idx, is_local, movX, movY, movZ, rotX, rotY, rotZ) = pack.my_unpack(IDX_RB + "b 3f 3f", raw)
+				(rb_idx, is_local, movX, movY, movZ, rotX, rotY, rotZ) = cur.unpack(cur.idx_rb + "b 3f 3f")
 				item = pmxstruct.PmxMorphItemImpulse(rb_idx=rb_idx, is_local=is_local,
 													 move=[movX, movY, movZ], rot=[rotX, rotY, rotZ])
 				these_items.append(item)
@@ -456,27 +625,27 @@ def parse_pmx_morphs(raw: bytearray) -> List[pmxstruct.PmxMorph]:
 			raise RuntimeError("unsupported morph type value", morphtype)
 		
 		# display progress printouts
-		core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+		core.print_progress_oneline(cur.progress())
 		# assemble the data into struct for returning
 		thismorph = pmxstruct.PmxMorph(name_jp=name_jp, name_en=name_en, panel=panel, morphtype=morphtype, items=these_items)
 		retme.append(thismorph)
 	return retme
 
-def parse_pmx_dispframes(raw: bytearray) -> List[pmxstruct.PmxFrame]:
+def parse_pmx_dispframes(cur: PmxCursor) -> List[pmxstruct.PmxFrame]:
 	# first item is int, how many dispframes
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of dispframes       =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of dispframes       =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(is_special, itemcount) = pack.my_unpack("b i", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(is_special, itemcount) = cur.unpack("b i")
 		# print(name_jp, name_en)
 		these_items = []
 		for z in range(itemcount):
-			is_morph = pack.my_unpack("b", raw)
-			if is_morph: idx = pack.my_unpack(IDX_MORPH, raw)
-			else:        idx = pack.my_unpack(IDX_BONE, raw)
+			is_morph = cur.unpack("b")
+			if is_morph: idx = cur.unpack(cur.idx_morph)
+			else:        idx = cur.unpack(cur.idx_bone)
 			this_item = pmxstruct.PmxFrameItem(is_morph=is_morph, idx=idx)
 			these_items.append(this_item)
 		# assemble the data into struct for returning
@@ -484,20 +653,20 @@ def parse_pmx_dispframes(raw: bytearray) -> List[pmxstruct.PmxFrame]:
 		retme.append(thisframe)
 	return retme
 
-def parse_pmx_rigidbodies(raw: bytearray) -> List[pmxstruct.PmxRigidBody]:
+def parse_pmx_rigidbodies(cur: PmxCursor) -> List[pmxstruct.PmxRigidBody]:
 	# first item is int, how many rigidbodies
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of rigidbodies      =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of rigidbodies      =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(bone_idx, group, collide_mask, shape_int) = pack.my_unpack(IDX_BONE + "b H b", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(bone_idx, group, collide_mask, shape_int) = cur.unpack(cur.idx_bone + "b H b")
 		shape = pmxstruct.RigidBodyShape(shape_int)
 		# print(name_jp, name_en)
 		# shape: 0=sphere, 1=box, 2=capsule
-		(sizeX, sizeY, sizeZ, posX, posY, posZ, rotX, rotY, rotZ) = pack.my_unpack("3f 3f 3f", raw)
-		(mass, move_damp, rot_damp, repel, friction, physmode_int) = pack.my_unpack("5f b", raw)
+		(sizeX, sizeY, sizeZ, posX, posY, posZ, rotX, rotY, rotZ) = cur.unpack("3f 3f 3f")
+		(mass, move_damp, rot_damp, repel, friction, physmode_int) = cur.unpack("5f b")
 		physmode = pmxstruct.RigidBodyPhysMode(physmode_int)
 		# physmode: 0=follow bone, 1=physics, 2=physics rotate only (pivot on bone)
 		
@@ -515,7 +684,7 @@ def parse_pmx_rigidbodies(raw: bytearray) -> List[pmxstruct.PmxRigidBody]:
 				nocollide_set.add(a+1)
 		
 		# display progress printouts
-		core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+		core.print_progress_oneline(cur.progress())
 		# assemble the data into struct for returning
 		thisbody = pmxstruct.PmxRigidBody(name_jp=name_jp, name_en=name_en, bone_idx=bone_idx, pos=[posX, posY, posZ],
 										  rot=rot, size=[sizeX, sizeY, sizeZ], shape=shape, group=group,
@@ -525,21 +694,21 @@ def parse_pmx_rigidbodies(raw: bytearray) -> List[pmxstruct.PmxRigidBody]:
 		retme.append(thisbody)
 	return retme
 
-def parse_pmx_joints(raw: bytearray) -> List[pmxstruct.PmxJoint]:
+def parse_pmx_joints(cur: PmxCursor) -> List[pmxstruct.PmxJoint]:
 	# first item is int, how many joints
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of joints           =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of joints           =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(jointtype_int, rb1_idx, rb2_idx, posX, posY, posZ) = pack.my_unpack("b 2" + IDX_RB + "3f", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(jointtype_int, rb1_idx, rb2_idx, posX, posY, posZ) = cur.unpack("b 2" + cur.idx_rb + "3f")
 		# jointtype: 0=spring6DOF, all others are v2.1 only!!!! 1=6dof, 2=p2p, 3=conetwist, 4=slider, 5=hinge
 		jointtype = pmxstruct.JointType(jointtype_int)
 		# print(name_jp, name_en)
-		(rotX, rotY, rotZ, posminX, posminY, posminZ, posmaxX, posmaxY, posmaxZ) = pack.my_unpack("3f 3f 3f", raw)
-		(rotminX, rotminY, rotminZ, rotmaxX, rotmaxY, rotmaxZ) = pack.my_unpack("3f 3f", raw)
-		(springposX, springposY, springposZ, springrotX, springrotY, springrotZ) = pack.my_unpack("3f 3f", raw)
+		(rotX, rotY, rotZ, posminX, posminY, posminZ, posmaxX, posmaxY, posmaxZ) = cur.unpack("3f 3f 3f")
+		(rotminX, rotminY, rotminZ, rotmaxX, rotmaxY, rotmaxZ) = cur.unpack("3f 3f")
+		(springposX, springposY, springposZ, springrotX, springrotY, springrotZ) = cur.unpack("3f 3f")
 		
 		# note: rot/rotmin/rotmax all come in as XYZ radians, must convert to degrees for my struct
 		rot = [math.degrees(rotX), math.degrees(rotY), math.degrees(rotZ)]
@@ -547,7 +716,7 @@ def parse_pmx_joints(raw: bytearray) -> List[pmxstruct.PmxJoint]:
 		rotmax = [math.degrees(rotmaxX), math.degrees(rotmaxY), math.degrees(rotmaxZ)]
 		
 		# display progress printouts
-		core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+		core.print_progress_oneline(cur.progress())
 		# assemble the data into list for returning
 		thisjoint = pmxstruct.PmxJoint(name_jp=name_jp, name_en=name_en, jointtype=jointtype,
 			rb1_idx=rb1_idx, rb2_idx=rb2_idx, pos=[posX, posY, posZ], rot=rot,
@@ -558,31 +727,31 @@ def parse_pmx_joints(raw: bytearray) -> List[pmxstruct.PmxJoint]:
 		retme.append(thisjoint)
 	return retme
 
-def parse_pmx_softbodies(raw: bytearray) -> List[pmxstruct.PmxSoftBody]:
+def parse_pmx_softbodies(cur: PmxCursor) -> List[pmxstruct.PmxSoftBody]:
 	# i don't plan to support v2.1 so I'm not gonna try to hard to understand the meaning of these data fields
 	# this is mostly to consume the data so there are no bytes left over when done parsing a file to trigger warnings
 	# note: this is also untested because i dont care about it lol
-	i = pack.my_unpack("i", raw)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of softbodies       =", i)
+	i = cur.unpack("i")
+	if cur.moreinfo: core.MY_PRINT_FUNC("...# of softbodies       =", i)
 	retme = []
 	for d in range(i):
-		name_jp = pack.my_string_unpack(raw)
-		name_en = pack.my_string_unpack(raw)
-		(shape, idx_mat, group, nocollide_mask, flags) = pack.my_unpack("b" + IDX_MAT + "b H b", raw)
+		name_jp = cur.read_pmx_string()
+		name_en = cur.read_pmx_string()
+		(shape, idx_mat, group, nocollide_mask, flags) = cur.unpack("b" + cur.idx_mat + "b H b")
 		# i should upack the flags here but idgaf
-		(b_link_create_dist, num_clusters, total_mass, collision_marign, aerodynamics_model) = pack.my_unpack("iiffi", raw)
-		(vcf, dp, dg, lf, pr, vc, df, mt, rch, kch, sch, ah) = pack.my_unpack("12f", raw)
-		(srhr_cl, skhr_cl, sshr_cl, sr_splt_cl, sk_splt_cl, ss_splt_cl) = pack.my_unpack("6f", raw)
-		(v_it, p_it, d_it, c_it, mat_lst, mat_ast, mat_vst, num_anchors) = pack.my_unpack("8i", raw)
+		(b_link_create_dist, num_clusters, total_mass, collision_marign, aerodynamics_model) = cur.unpack("iiffi")
+		(vcf, dp, dg, lf, pr, vc, df, mt, rch, kch, sch, ah) = cur.unpack("12f")
+		(srhr_cl, skhr_cl, sshr_cl, sr_splt_cl, sk_splt_cl, ss_splt_cl) = cur.unpack("6f")
+		(v_it, p_it, d_it, c_it, mat_lst, mat_ast, mat_vst, num_anchors) = cur.unpack("8i")
 		anchors_list = []
 		for z in range(num_anchors):
 			# (idx_rb, idx_vert, near_mode)
-			this_anchor = pack.my_unpack(IDX_RB + IDX_VERT + "b", raw)
+			this_anchor = cur.unpack(cur.idx_rb + cur.idx_vert + "b")
 			anchors_list.append(this_anchor)
-		num_vertex_pin = pack.my_unpack("i", raw)
+		num_vertex_pin = cur.unpack("i")
 		vertex_pin_list = []
 		for z in range(num_vertex_pin):
-			vertex_pin = pack.my_unpack(IDX_VERT, raw)
+			vertex_pin = cur.unpack(cur.idx_vert)
 			vertex_pin_list.append(vertex_pin)
 
 		# assemble the data into struct for returning
@@ -596,6 +765,164 @@ def parse_pmx_softbodies(raw: bytearray) -> List[pmxstruct.PmxSoftBody]:
 		retme.append(thissoft)
 	return retme
 
+########################################################################################################################
+# the skip_pmx_* functions step a cursor over one whole section without decoding it, they are used to build the
+# section index for read_pmx_lazy(). they only read the counts/flags that determine how big each item is.
+
+def _skip_pmx_string(cur: PmxCursor) -> None:
+	L = cur.unpack("i")
+	cur.pos += L
+
+def skip_pmx_vertices(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	cur.pos = _walk_pmx_vertex_offsets(cur, i)[i]
+
+def skip_pmx_surfaces(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	cur.pos += i * pack.compile_struct(cur.idx_vert).size
+
+def skip_pmx_textures(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	for d in range(i):
+		_skip_pmx_string(cur)
+
+def skip_pmx_materials(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	# everything between the names and the "builtin_toon" byte, which determines the size of the toon index
+	before_toon = pack.compile_struct("4f 4f 3f B 5f" + cur.idx_tex + cur.idx_tex + "b").size
+	tex_size = pack.compile_struct(cur.idx_tex).size
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		cur.pos += before_toon
+		builtin_toon = cur.unpack("b")
+		cur.pos += 1 if builtin_toon else tex_size
+		_skip_pmx_string(cur)
+		cur.pos += 4  # surface_ct
+
+def skip_pmx_bones(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	idx_size = pack.compile_struct(cur.idx_bone).size
+	before_flags = pack.compile_struct("3f" + cur.idx_bone + "i").size
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		cur.pos += before_flags
+		(flags1, flags2) = cur.unpack("2B")
+		# see parse_pmx_bones() for what each of these flag bits means
+		size = idx_size if (flags1 & (1<<0)) else 12		# tail
+		if flags2 & ((1<<0) | (1<<1)): size += idx_size + 4	# inherit
+		if flags2 & (1<<2): size += 12						# fixedaxis
+		if flags2 & (1<<3): size += 24						# localaxis
+		if flags2 & (1<<5): size += 4						# external parent
+		cur.pos += size
+		if flags1 & (1<<5):
+			# IK: target, loops, angle, then a variable number of links
+			cur.pos += idx_size + 8
+			num_ik_links = cur.unpack("i")
+			for z in range(num_ik_links):
+				cur.pos += idx_size
+				use_link_limits = cur.unpack("b")
+				if use_link_limits:
+					cur.pos += 24
+
+def _pmx_morph_item_sizes(cur: PmxCursor) -> dict:
+	"""
+	Size in bytes of one morph item, for each morph type. Must match the formats used in parse_pmx_morphs().
+	:param cur: PmxCursor that has already parsed the header
+	:return: dict of MorphType -> int
+	"""
+	vert = pack.compile_struct(cur.idx_vert + "4f").size
+	retme = {
+		pmxstruct.MorphType.GROUP:    pack.compile_struct(cur.idx_morph + "f").size,
+		pmxstruct.MorphType.VERTEX:   pack.compile_struct(cur.idx_vert + "3f").size,
+		pmxstruct.MorphType.BONE:     pack.compile_struct(cur.idx_bone + "3f 4f").size,
+		pmxstruct.MorphType.UV:       vert,
+		pmxstruct.MorphType.UV_EXT1:  vert,
+		pmxstruct.MorphType.UV_EXT2:  vert,
+		pmxstruct.MorphType.UV_EXT3:  vert,
+		pmxstruct.MorphType.UV_EXT4:  vert,
+		pmxstruct.MorphType.MATERIAL: pack.compile_struct(cur.idx_mat + "b 4f 3f" + "f 3f 4f f" + "4f 4f 4f").size,
+		pmxstruct.MorphType.FLIP:     pack.compile_struct(cur.idx_morph + "f").size,
+		pmxstruct.MorphType.IMPULSE:  pack.compile_struct(cur.idx_rb + "b 3f 3f").size,
+	}
+	return retme
+
+def skip_pmx_morphs(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	item_sizes = _pmx_morph_item_sizes(cur)
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		(panel_int, morphtype_int, itemcount) = cur.unpack("b b i")
+		cur.pos += itemcount * item_sizes[pmxstruct.MorphType(morphtype_int)]
+
+def skip_pmx_dispframes(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	morph_size = pack.compile_struct(cur.idx_morph).size
+	bone_size = pack.compile_struct(cur.idx_bone).size
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		(is_special, itemcount) = cur.unpack("b i")
+		for z in range(itemcount):
+			is_morph = cur.unpack("b")
+			cur.pos += morph_size if is_morph else bone_size
+
+def skip_pmx_rigidbodies(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	size = pack.compile_struct(cur.idx_bone + "b H b" + "3f 3f 3f" + "5f b").size
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		cur.pos += size
+
+def skip_pmx_joints(cur: PmxCursor) -> None:
+	i = cur.unpack("i")
+	size = pack.compile_struct("b 2" + cur.idx_rb + "3f" + "3f 3f 3f" + "3f 3f" + "3f 3f").size
+	for d in range(i):
+		_skip_pmx_string(cur)
+		_skip_pmx_string(cur)
+		cur.pos += size
+
+# every section after the header, in file order: (name of the Pmx attribute, parse function, skip function)
+# textures are not a Pmx attribute but they are needed to decode the materials
+# softbodies are last in the file so they never need to be skipped
+PMX_SECTIONS = (
+	("verts",       parse_pmx_vertices,    skip_pmx_vertices),
+	("faces",       parse_pmx_surfaces,    skip_pmx_surfaces),
+	("textures",    parse_pmx_textures,    skip_pmx_textures),
+	("materials",   parse_pmx_materials,   skip_pmx_materials),
+	("bones",       parse_pmx_bones,       skip_pmx_bones),
+	("morphs",      parse_pmx_morphs,      skip_pmx_morphs),
+	("frames",      parse_pmx_dispframes,  skip_pmx_dispframes),
+	("rigidbodies", parse_pmx_rigidbodies, skip_pmx_rigidbodies),
+	("joints",      parse_pmx_joints,      skip_pmx_joints),
+	("softbodies",  parse_pmx_softbodies,  None),
+)
+
+def scan_pmx_sections(cur: PmxCursor, ver: float) -> Dict[str, int]:
+	"""
+	Skip through the whole file once, without decoding anything, to find the byte offset where each section begins.
+	:param cur: PmxCursor that has just parsed the header
+	:param ver: PMX version from the header, softbodies only exist in v2.1
+	:return: dict of section name (see PMX_SECTIONS) -> byte offset
+	"""
+	offsets = {}
+	for name, _, skipper in PMX_SECTIONS:
+		if name == "softbodies" and ver != 2.1:
+			break
+		offsets[name] = cur.pos
+		if skipper is not None:
+			try:
+				skipper(cur)
+			except Exception as e:
+				core.MY_PRINT_FUNC(e.__class__.__name__, e)
+				core.MY_PRINT_FUNC("section=", name, "bytepos=", cur.pos)
+				core.MY_PRINT_FUNC("Err: something went wrong while scanning, file is probably corrupt/malformed")
+				raise
+	return offsets
+
 ########################################################################################################################
 
 def build_texture_list(thispmx: pmxstruct.Pmx) -> List[str]:
@@ -627,8 +954,13 @@ def encode_pmx_lookahead(thispmx: pmxstruct.Pmx) -> Tuple[List[int], List[str]]:
 	:return: ([addl_vec4s, num_verts, num_tex, num_mat, num_bone, num_morph, num_rb, num_joint], tex_list)
 	"""
 	# specifically i need to get the "addl vec4 per vertex" and count the # of each type of thing
-	addl_vec4s = max(len(v.addl_vec4s) for v in thispmx.verts)
-	num_verts = len(thispmx.verts)
+	if thispmx.vert_columns is not None:
+		# don't convert the columns into PmxVertex objects just to count them
+		addl_vec4s = thispmx.vert_columns.addl_vec4s.shape[1]
+		num_verts = len(thispmx.vert_columns)
+	else:
+		addl_vec4s = max(len(v.addl_vec4s) for v in thispmx.verts)
+		num_verts = len(thispmx.verts)
 	# built the ordered list of unique filepaths among all materials, excluding the builtin toons
 	tex_list = build_texture_list(thispmx)
 	num_tex = len(tex_list)
@@ -687,93 +1019,185 @@ def encode_pmx_header(nice: pmxstruct.PmxHeader, lookahead: List[int]) -> bytear
 	out += pack.my_string_pack(nice.comment_en)
 	return out
 
-def encode_pmx_vertices(nice: List[pmxstruct.PmxVertex]) -> bytearray:
+def encode_pmx_vertices(nice: Union[List[pmxstruct.PmxVertex], pmxstruct.PmxVertexColumns]) -> bytearray:
+	if isinstance(nice, pmxstruct.PmxVertexColumns):
+		return encode_pmx_vertices_columnar(nice)
 	# first item is int, how many vertices
 	i = len(nice)
-	out = pack.my_pack("i", i)
 	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of verts            =", i)
 	# [posX, posY, posZ, normX, normY, normZ, u, v, addl_vec4s, weighttype, weights, edgescale]
-	bdef1_fmt = IDX_BONE
-	bdef2_fmt = "2%s f" % IDX_BONE
-	bdef4_fmt = "4%s 4f" % IDX_BONE
-	sdef_fmt1 =  "2%s f" % IDX_BONE
-	sdef_fmt2 =  "9f"
-	qdef_fmt =  bdef4_fmt
+	# 0 = BDEF1 = [b1]
+	# 1 = BDEF2 = [b1, b2, b1w]
+	# 2 = BDEF4 = [b1, b2, b3, b4, b1w, b2w, b3w, b4w]
+	# 3 = sdef =  [b1, b2, b1w] + weight_sdef = [[c1, c2, c3], [r01, r02, r03], [r11, r12, r13]]
+	# 4 = qdef =  [b1, b2, b3, b4, b1w, b2w, b3w, b4w]  (only in pmx v2.1)
+	# the entire vertex is described by one precompiled Struct, there is one Struct for each weighttype
+	fmt_head = "<8f %df b " % (4 * ADDL_VERTEX_VEC4)
+	vert_structs = {
+		pmxstruct.WeightMode.BDEF1: struct.Struct(fmt_head + "%s f" % IDX_BONE),
+		pmxstruct.WeightMode.BDEF2: struct.Struct(fmt_head + "2%s f f" % IDX_BONE),
+		pmxstruct.WeightMode.BDEF4: struct.Struct(fmt_head + "4%s 4f f" % IDX_BONE),
+		pmxstruct.WeightMode.SDEF:  struct.Struct(fmt_head + "2%s f 9f f" % IDX_BONE),
+		pmxstruct.WeightMode.QDEF:  struct.Struct(fmt_head + "4%s 4f f" % IDX_BONE),
+	}
 	
 	global ENCODE_PERCENTPOINT_SOFAR
 	progress_increment = ENCODE_PERCENTPOINT_WEIGHTS["verts"]
 	
-	def weightpairs_to_weightbinary(wtype: pmxstruct.WeightMode, w: List[List[float]]) -> List[float]:
-		# convert the list of bone-weight pairs to the format/order used in the binary file
-		# # how many pairs have a real bone or a real weight?
-		# real_weight_count = sum([(a[0] > 0 or a[1]) != 0 for a in w])
-		if wtype == pmxstruct.WeightMode.BDEF1:
-			while len(w) < 1: w.append([0, 0])  # pad with [0,0] till we have enough members
+	# first pass: sort the vertices into groups by weighttype and figure out where each one goes in the output
+	# this way the whole output can be allocated once instead of growing it a few bytes at a time
+	groups = {mode: [] for mode in vert_structs}
+	offsets = [0] * i
+	here = 4
+	for d, vert in enumerate(nice):
+		offsets[d] = here
+		here += vert_structs[vert.weighttype].size
+		groups[vert.weighttype].append(d)
+	out = bytearray(here)
+	struct.pack_into("<i", out, 0, i)
+	
+	# second pass: flatten each group into one list & pack the whole group with one call, then put each vertex in its
+	# final location. with numpy the vertices of a group are all scattered at once, otherwise one slice-copy each.
+	for mode, members in groups.items():
+		if not members: continue
+		packer = vert_structs[mode]
+		group = [nice[d] for d in members]
+		try:
+			block = struct.pack("<" + (packer.format[1:] + " ") * len(group), *_vertex_group_packlist(mode, group))
+		except Exception:
+			# find the vertex that has the problem & complain about it
+			for d in members:
+				_pack_one_vertex(packer, d, nice[d])
+			raise
+		size = packer.size
+		if np is not None:
+			vert_dtype = np.dtype((np.void, size))
+			dest = np.array([offsets[d] for d in members], dtype=np.int64)
+			_records_view(out, vert_dtype)[dest] = np.frombuffer(block, dtype=vert_dtype)
+		else:
+			for j, d in enumerate(members):
+				out[offsets[d]:offsets[d] + size] = block[j * size:(j + 1) * size]
+		# display progress printouts
+		ENCODE_PERCENTPOINT_SOFAR += progress_increment * len(members)
+		core.print_progress_oneline(ENCODE_PERCENTPOINT_SOFAR)
+	return out
+
+def _vertex_group_packlist(mode: pmxstruct.WeightMode, group: List[pmxstruct.PmxVertex]) -> list:
+	# all the values of all the vertices in the group, in the order they are written to the file
+	# every vertex in the group has the same weighttype, so the weights are converted the same way for all of them
+	numpairs = {pmxstruct.WeightMode.BDEF1: 1, pmxstruct.WeightMode.BDEF2: 2, pmxstruct.WeightMode.SDEF: 2,
+				pmxstruct.WeightMode.BDEF4: 4, pmxstruct.WeightMode.QDEF: 4}[mode]
+	is_sdef = mode is pmxstruct.WeightMode.SDEF
+	modeval = mode.value
+	zero_vec4 = [0.0, 0.0, 0.0, 0.0]
+	vals = []
+	ext = vals.extend
+	numitems = 0
+	for vert in group:
+		ext(vert.pos)
+		ext(vert.norm)
+		ext(vert.uv)
+		# then, some number of vec4s (probably none)
+		# structure it like this so even if a user modifies the vec4s incorrectly it will still write fine
+		for z in range(ADDL_VERTEX_VEC4):
+			try:				ext(vert.addl_vec4s[z])
+			except IndexError:	ext(zero_vec4)
+		vals.append(modeval)
+		w = vert.weight
+		while len(w) < numpairs: w.append([0, 0])  # pad with [0,0] till we have enough members
+		if numpairs == 1:
 			# 0 = BDEF1 = [b1]
-			return [w[0][0]]
-		elif wtype in (pmxstruct.WeightMode.BDEF2, pmxstruct.WeightMode.SDEF):
-			while len(w) < 2: w.append([0, 0])  # pad with [0,0] till we have enough members
+			vals.append(w[0][0])
+		elif numpairs == 2:
 			# 1 = BDEF2 = [b1, b2, b1w]
 			# 3 = sdef =  [b1, b2, b1w] + weight_sdef = [[c1, c2, c3], [r01, r02, r03], [r11, r12, r13]]
-			return [w[0][0],
-					w[1][0],
-					w[0][1]]
-		elif wtype in (pmxstruct.WeightMode.BDEF4, pmxstruct.WeightMode.QDEF):
-			while len(w) < 4: w.append([0, 0])  # pad with [0,0] till we have enough members
+			ext((w[0][0], w[1][0], w[0][1]))
+			if is_sdef:
+				for row in vert.weight_sdef: ext(row)
+		else:
 			# 2 = BDEF4 = [b1, b2, b3, b4, b1w, b2w, b3w, b4w]
 			# 4 = qdef =  [b1, b2, b3, b4, b1w, b2w, b3w, b4w]  (only in pmx v2.1)
-			return [w[0][0], w[1][0], w[2][0], w[3][0],
-					w[0][1], w[1][1], w[2][1], w[3][1],]
-		raise ValueError("error: weighttype is not supported", wtype)
+			ext((w[0][0], w[1][0], w[2][0], w[3][0], w[0][1], w[1][1], w[2][1], w[3][1]))
+		vals.append(vert.edgescale)
+		# if one vertex has too many values and another has too few, the total could still come out right and
+		# everything after would silently be shifted, so check as i go
+		if numitems == 0:
+			numitems = len(vals)
+		elif len(vals) % numitems:
+			raise ValueError("vertex has the wrong number of values")
+	return vals
+
+def _pack_one_vertex(packer: struct.Struct, d: int, vert: pmxstruct.PmxVertex) -> None:
+	# pack a single vertex, only to find out whether it is the one that is broken. if so, print why & raise.
+	try:
+		packer.pack(*_vertex_group_packlist(vert.weighttype, [vert]))
+	except Exception as e:
+		core.MY_PRINT_FUNC("error in encode_pmx_vertices(nice)")
+		core.MY_PRINT_FUNC("vertex=", d, "fmt=", packer.format, "vert=", vert)
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		raise
+
+def _check_idx_range(arr, fmt: str, what: str) -> None:
+	"""
+	numpy will silently wrap values that don't fit in the destination type, so check for that before converting.
+	This is the columnar equivalent of the error that my_pack would raise.
+	:param arr: numpy int array about to be converted
+	:param fmt: index format char
+	:param what: name of the thing being encoded, for the error message
+	"""
+	info = np.iinfo(np.dtype(_IDX_TO_NUMPY[fmt]))
+	if len(arr) and (arr.min() < info.min or arr.max() > info.max):
+		core.MY_PRINT_FUNC("error in encode: %s contains values outside [%d, %d], cannot pack them as '%s'" % (what, info.min, info.max, fmt))
+		raise ValueError("%s index out of range for format '%s'" % (what, fmt))
+
+def encode_pmx_vertices_columnar(cols: pmxstruct.PmxVertexColumns) -> bytearray:
+	# this writes exactly the same data as encode_pmx_vertices(), but from the numpy arrays of a PmxVertexColumns
+	# figure out where each vertex goes, build one structured array for all of the "head" data and one for each
+	# weighttype group, then drop them into their final locations in the output
+	i = len(cols)
+	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of verts            =", i)
+	head_dtype, weight_dtypes = _vertex_dtypes(ADDL_VERTEX_VEC4, IDX_BONE)
+	weighttype = cols.weighttype.astype(np.int64)
+	if i and (weighttype.min() < 0 or weighttype.max() >= len(weight_dtypes)):
+		raise ValueError("error: weighttype is not supported", weighttype.min(), weighttype.max())
+	vert_size = np.array([head_dtype.itemsize + w.itemsize + 4 for w in weight_dtypes], dtype=np.int64)
+	offsets = np.empty(i + 1, dtype=np.int64)
+	offsets[0] = 4
+	np.cumsum(vert_size[weighttype], out=offsets[1:])
+	offsets[1:] += 4
+	out = bytearray(int(offsets[-1]))
+	struct.pack_into("<i", out, 0, i)
 	
-	for d, vert in enumerate(nice):
-		# first, basic stuff
-		packme = vert.pos + vert.norm + vert.uv  # concat these
-		out += pack.my_pack("8f", packme)
-		# then, some number of vec4s (probably none)
-		# structure it like this so even if a user modifies the vec4s incorrectly it will still write fine
-		for z in range(ADDL_VERTEX_VEC4):
-			try:				out += pack.my_pack("4f", vert.addl_vec4s[z])
-			except IndexError:	out += pack.my_pack("4f", [0, 0, 0, 0])
-		
-		out += pack.my_pack("b", vert.weighttype.value)
-		# weights = vert[10]
-		# 0 = BDEF1 = [b1]
-		# 1 = BDEF2 = [b1, b2, b1w]
-		# 2 = BDEF4 = [b1, b2, b3, b4, b1w, b2w, b3w, b4w]
-		# 3 = sdef =  [b1, b2, b1w] + weight_sdef = [[c1, c2, c3], [r01, r02, r03], [r11, r12, r13]]
-		# 4 = qdef =  [b1, b2, b3, b4, b1w, b2w, b3w, b4w]  (only in pmx v2.1)
-		
-		weightlist = weightpairs_to_weightbinary(vert.weighttype, vert.weight)
-
-		if vert.weighttype == pmxstruct.WeightMode.BDEF1:
-			# BDEF1
-			out += pack.my_pack(bdef1_fmt, weightlist)
-		elif vert.weighttype == pmxstruct.WeightMode.BDEF2:
-			# BDEF2
-			# (b1, b2, b1w)
-			out += pack.my_pack(bdef2_fmt, weightlist)
-		elif vert.weighttype == pmxstruct.WeightMode.BDEF4:
-			# BDEF4
-			# (b1, b2, b3, b4, b1w, b2w, b3w, b4w)
-			out += pack.my_pack(bdef4_fmt, weightlist)
-		elif vert.weighttype == pmxstruct.WeightMode.SDEF:
-			# SDEF
-			# ([b1, b2, b1w], [c1, c2, c3], [r01, r02, r03], [r11, r12, r13])
-			out += pack.my_pack(sdef_fmt1, weightlist)
-			out += pack.my_pack(sdef_fmt2, core.flatten(vert.weight_sdef))
-		elif vert.weighttype == pmxstruct.WeightMode.QDEF:
-			# it must be using QDEF, a type only for PMX v2.1 which I dont need to support so idgaf
-			# (b1, b2, b3, b4, b1w, b2w, b3w, b4w)
-			out += pack.my_pack(qdef_fmt, weightlist)
-		# else:
-		# 	core.MY_PRINT_FUNC("invalid weight type for vertex", vert.weighttype)
-			
-		# then there is one final float after the weight crap
-		out += pack.my_pack("f", vert.edgescale)
-		# display progress printouts
-		ENCODE_PERCENTPOINT_SOFAR += progress_increment
-		core.print_progress_oneline(ENCODE_PERCENTPOINT_SOFAR)
+	head = np.zeros(i, dtype=head_dtype)
+	head["pos"] = cols.pos
+	head["norm"] = cols.norm
+	head["uv"] = cols.uv
+	# same as the normal encoder: missing vec4s become zeros, extra ones get dropped
+	k = min(ADDL_VERTEX_VEC4, cols.addl_vec4s.shape[1])
+	head["addl_vec4s"][:, :k] = cols.addl_vec4s[:, :k]
+	head["weighttype"] = cols.weighttype
+	_records_view(out, head_dtype)[offsets[:-1]] = head
+	
+	_check_idx_range(cols.weight_bone, IDX_BONE, "vertex weight bone")
+	for wt, wdtype in enumerate(weight_dtypes):
+		rows = np.flatnonzero(weighttype == wt)
+		if len(rows) == 0: continue
+		w = np.zeros(len(rows), dtype=wdtype)
+		w["bone"] = cols.weight_bone[rows, :w["bone"].shape[1]]
+		if "value" in wdtype.names:
+			# BDEF2 and SDEF only store the weight of the first bone
+			w["value"] = cols.weight_value[rows, :w["value"].shape[1]]
+		if "sdef" in wdtype.names:
+			w["sdef"] = cols.weight_sdef[rows]
+		_records_view(out, wdtype)[offsets[rows] + head_dtype.itemsize] = w
+	
+	# then there is one final float after the weight crap
+	_records_view(out, np.dtype("<f4"))[offsets[1:] - 4] = cols.edgescale
+	
+	# display progress printouts
+	global ENCODE_PERCENTPOINT_SOFAR
+	ENCODE_PERCENTPOINT_SOFAR += ENCODE_PERCENTPOINT_WEIGHTS["verts"] * i
+	core.print_progress_oneline(ENCODE_PERCENTPOINT_SOFAR)
 	return out
 
 def encode_pmx_surfaces(nice: List[List[int]]) -> bytearray:
@@ -781,18 +1205,24 @@ def encode_pmx_surfaces(nice: List[List[int]]) -> bytearray:
 	# first item is int, how many !vertex indices! there are, NOT the actual number of faces
 	# each face is 3 vertex indices
 	i = len(nice)
-	out = pack.my_pack("i", i * 3)
 	if PMX_MOREINFO: core.MY_PRINT_FUNC("...# of faces            =", i)
-	
+	# pack all the faces at once, as one long contiguous list of vertex indices
+	flat = list(itertools.chain.from_iterable(nice))
+	if len(flat) != 3 * i:
+		core.MY_PRINT_FUNC("error in encode_pmx_surfaces(nice)")
+		core.MY_PRINT_FUNC("every face must have exactly 3 vertex indices")
+		raise ValueError("face with wrong number of vertices")
+	try:
+		out = bytearray(struct.pack("<i %d%s" % (len(flat), IDX_VERT), len(flat), *flat))
+	except struct.error as e:
+		core.MY_PRINT_FUNC("error in encode_pmx_surfaces(nice)")
+		core.MY_PRINT_FUNC("some face contains a vertex index that cannot be packed with fmt '%s'" % IDX_VERT)
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		raise
+	# display progress printouts
 	global ENCODE_PERCENTPOINT_SOFAR
-	progress_increment = ENCODE_PERCENTPOINT_WEIGHTS["faces"]
-
-	for d, face in enumerate(nice):
-		# each entry is a group of 3 vertex indeces that make a face
-		out += pack.my_pack("3" + IDX_VERT, face)
-		# display progress printouts
-		ENCODE_PERCENTPOINT_SOFAR += progress_increment
-		core.print_progress_oneline(ENCODE_PERCENTPOINT_SOFAR)
+	ENCODE_PERCENTPOINT_SOFAR += ENCODE_PERCENTPOINT_WEIGHTS["faces"] * i
+	core.print_progress_oneline(ENCODE_PERCENTPOINT_SOFAR)
 	return out
 
 def encode_pmx_textures(nice: List[str]) -> bytearray:
@@ -1177,7 +1607,8 @@ def _prepare_progress_printouts_for_write_pmx(pmx: pmxstruct.Pmx) -> None:
 		"softbodies":	900,
 	}
 	total_relative_size = 0
-	total_relative_size += relative_weights["verts"] * len(pmx.verts)
+	num_verts = len(pmx.vert_columns) if pmx.vert_columns is not None else len(pmx.verts)
+	total_relative_size += relative_weights["verts"] * num_verts
 	total_relative_size += relative_weights["faces"] * len(pmx.faces)
 	total_relative_size += relative_weights["materials"] * len(pmx.materials)
 	total_relative_size += relative_weights["bones"] * len(pmx.bones)
@@ -1210,42 +1641,187 @@ def _prepare_progress_printouts_for_write_pmx(pmx: pmxstruct.Pmx) -> None:
 
 ########################################################################################################################
 
-def read_pmx(pmx_filename: str, moreinfo=False) -> pmxstruct.Pmx:
-	global PMX_MOREINFO
-	PMX_MOREINFO = moreinfo
+def read_pmx(pmx_filename: str, moreinfo=False, columnar=False) -> pmxstruct.Pmx:
+	"""
+	Read a PMX file from disk and parse it into a Pmx object.
+	The file is memory-mapped and parsed in place, it is never copied into memory as a whole.
+	If columnar=True and numpy is installed, the vertices are decoded in bulk into a PmxVertexColumns object, which
+	is MUCH faster for big models. They are automatically converted to PmxVertex objects the first time that
+	"Pmx.verts" is used, so scripts that don't know about this don't need to change.
+	:param pmx_filename: filepath to read
+	:param moreinfo: if True, print some extra info
+	:param columnar: if True, decode the vertices into numpy arrays instead of PmxVertex objects
+	:return: Pmx object
+	"""
+	pmx_filename_clean = core.filepath_splitdir(pmx_filename)[1]
+	# assumes the calling function already verified correct file extension
+	core.MY_PRINT_FUNC("Begin reading PMX file '%s'" % pmx_filename_clean)
+	with io.open_binfile_mmap(pmx_filename) as pmx_bytes:
+		core.MY_PRINT_FUNC("...total size   = %s" % core.prettyprint_file_size(len(pmx_bytes)))
+		core.MY_PRINT_FUNC("Begin parsing PMX file '%s'" % pmx_filename_clean)
+		retme = parse_pmx(pmx_bytes, moreinfo=moreinfo, columnar=columnar)
+	core.MY_PRINT_FUNC("Done parsing PMX file '%s'" % pmx_filename_clean)
+	return retme
+
+
+def read_pmx_header(pmx_filename: str) -> pmxstruct.PmxHeader:
+	"""
+	Read ONLY the header of a PMX file: the version, model names, and comments. The file is memory-mapped, so the rest
+	of it is never loaded from disk, which makes this very fast for scanning through lots of models.
+	:param pmx_filename: filepath to read
+	:return: PmxHeader object
+	"""
+	with io.open_binfile_mmap(pmx_filename, quiet=True) as pmx_bytes:
+		return parse_pmx_header(PmxCursor(pmx_bytes))
+
+
+class LazyPmx(pmxstruct.Pmx):
+	"""
+	Pmx object returned by read_pmx_lazy(). It holds onto the raw file and the byte offset of each section, and each
+	section is decoded the first time its attribute (verts, faces, materials, bones, etc) is used. Apart from that it
+	behaves exactly like a normal Pmx object. Once every section has been decoded (or replaced by assigning to it) the
+	raw file is released.
+	"""
+	def __init__(self, header: pmxstruct.PmxHeader, cur: PmxCursor, offsets: Dict[str, int], columnar=False):
+		# Pmx.__init__ is deliberately not called, that would need every section to exist already
+		self.header = header
+		self._verts = None
+		self._vert_columns = None
+		self._lazy_cur = cur
+		# sections that have not been decoded yet, name -> byte offset
+		self._lazy_pending = {k: v for k, v in offsets.items() if k != "textures"}
+		self._lazy_tex_offset = offsets["textures"]
+		self._lazy_columnar = columnar
+		self.journal = pmxstruct.PmxChangeJournal()
+		if "softbodies" not in offsets:
+			# v2.0 doesn't have softbodies
+			self.softbodies = []
+	def _lazy_decode(self, name: str):
+		# decode one section using a copy of the scan cursor, so it has all the index sizes from the header
+		cur = copy.copy(self._lazy_cur)
+		cur.pos = self._lazy_pending[name]
+		parser = {n: p for n, p, _ in PMX_SECTIONS}[name]
+		if name == "verts" and self._lazy_columnar:
+			parser = parse_pmx_vertices_columnar
+		if name == "materials":
+			tex_cur = copy.copy(self._lazy_cur)
+			tex_cur.pos = self._lazy_tex_offset
+			return parser(cur, parse_pmx_textures(tex_cur))
+		return parser(cur)
+	def _lazy_done(self, name: str):
+		self._lazy_pending.pop(name, None)
+		if not self._lazy_pending:
+			# everything is decoded, so let go of the raw file
+			self._lazy_cur = None
+	def __getattr__(self, name):
+		# only called when the normal attribute lookup fails, so, for sections that haven't been decoded yet
+		pending = self.__dict__.get("_lazy_pending")
+		if not pending or name not in pending or name == "verts":
+			raise AttributeError("'%s' object has no attribute '%s'" % (self.__class__.__name__, name))
+		val = self._lazy_decode(name)
+		setattr(self, name, val)
+		return val
+	def __setattr__(self, name, value):
+		super().__setattr__(name, value)
+		# assigning to a section that hasn't been decoded yet means it never needs to be decoded
+		if self.__dict__.get("_lazy_pending"):
+			self._lazy_done(name)
+	@property
+	def verts(self) -> List[pmxstruct.PmxVertex]:
+		if "verts" in self._lazy_pending:
+			self.verts = self._lazy_decode("verts")
+		return pmxstruct.Pmx.verts.fget(self)
+	@verts.setter
+	def verts(self, newverts):
+		pmxstruct.Pmx.verts.fset(self, newverts)
+	@property
+	def vert_columns(self) -> Union[pmxstruct.PmxVertexColumns, None]:
+		if self._lazy_columnar and "verts" in self._lazy_pending:
+			self.verts = self._lazy_decode("verts")
+		return pmxstruct.Pmx.vert_columns.fget(self)
+	def __eq__(self, other) -> bool:
+		# a LazyPmx is equal to a normal Pmx that holds the same data
+		if not isinstance(other, pmxstruct.Pmx): return False
+		return self.list() == other.list()
+	def pending_sections(self) -> List[str]:
+		"""
+		:return: names of the sections that have not been decoded yet
+		"""
+		return list(self._lazy_pending.keys())
+
+
+def read_pmx_lazy(pmx_filename: str, moreinfo=False, columnar=False) -> pmxstruct.Pmx:
+	"""
+	Read a PMX file from disk, but only decode each section when it is first used. The file is scanned once to find
+	where each section begins, which is much faster than decoding it, because the scan only reads the few counts and
+	flags that determine how big things are. Scripts that only look at a few sections (like bones & morphs, or
+	materials) can use this instead of read_pmx() to skip decoding the vertices and faces entirely.
+	The whole file is held in memory until every section has been decoded. It is copied into memory rather than
+	memory-mapped, so that the file can still be overwritten while the Pmx object exists.
+	:param pmx_filename: filepath to read
+	:param moreinfo: if True, print some extra info
+	:param columnar: if True, decode the vertices into numpy arrays instead of PmxVertex objects, see read_pmx()
+	:return: LazyPmx object, which can be used anywhere that a Pmx object can
+	"""
 	pmx_filename_clean = core.filepath_splitdir(pmx_filename)[1]
 	# assumes the calling function already verified correct file extension
 	core.MY_PRINT_FUNC("Begin reading PMX file '%s'" % pmx_filename_clean)
 	pmx_bytes = io.read_binfile_to_bytes(pmx_filename)
 	core.MY_PRINT_FUNC("...total size   = %s" % core.prettyprint_file_size(len(pmx_bytes)))
-	core.MY_PRINT_FUNC("Begin parsing PMX file '%s'" % pmx_filename_clean)
-	pack.reset_unpack()
+	cur = PmxCursor(pmx_bytes, moreinfo=moreinfo)
+	A = parse_pmx_header(cur)
+	if moreinfo: core.MY_PRINT_FUNC("...PMX version  = v%s" % str(A.ver))
+	core.MY_PRINT_FUNC("...model name   = JP:'%s' / EN:'%s'" % (A.name_jp, A.name_en))
+	if columnar and np is None:
+		core.MY_PRINT_FUNC("Warning: columnar PMX parsing needs the 'numpy' library, falling back to the normal method")
+		columnar = False
+	offsets = scan_pmx_sections(cur, A.ver)
+	core.MY_PRINT_FUNC("Done indexing PMX file '%s'" % pmx_filename_clean)
+	return LazyPmx(A, cur, offsets, columnar=columnar)
+
+
+def parse_pmx(pmx_bytes: Union[bytearray, memoryview], moreinfo=False, columnar=False) -> pmxstruct.Pmx:
+	"""
+	Parse an entire PMX file that is already in memory (or memory-mapped) into a Pmx object.
+	Everything in the returned object is copied out of pmx_bytes, so pmx_bytes can be released afterwards.
+	:param pmx_bytes: bytearray, bytes, or memoryview holding the whole PMX file
+	:param moreinfo: if True, print some extra info
+	:param columnar: if True, decode the vertices into numpy arrays instead of PmxVertex objects
+	:return: Pmx object
+	"""
+	# all parsing state lives in this cursor, nothing is stored in globals
+	cur = PmxCursor(pmx_bytes, moreinfo=moreinfo)
 	core.print_progress_oneline(0)
-	A = parse_pmx_header(pmx_bytes)
-	if PMX_MOREINFO: core.MY_PRINT_FUNC("...PMX version  = v%s" % str(A.ver))
+	A = parse_pmx_header(cur)
+	if moreinfo: core.MY_PRINT_FUNC("...PMX version  = v%s" % str(A.ver))
 	core.MY_PRINT_FUNC("...model name   = JP:'%s' / EN:'%s'" % (A.name_jp, A.name_en))
-	B = parse_pmx_vertices(pmx_bytes)
-	C = parse_pmx_surfaces(pmx_bytes)
-	tex_list = parse_pmx_textures(pmx_bytes)
-	E = parse_pmx_materials(pmx_bytes, tex_list)
-	F = parse_pmx_bones(pmx_bytes)
-	G = parse_pmx_morphs(pmx_bytes)
-	H = parse_pmx_dispframes(pmx_bytes)
-	I = parse_pmx_rigidbodies(pmx_bytes)
-	J = parse_pmx_joints(pmx_bytes)
+	if columnar and np is None:
+		core.MY_PRINT_FUNC("Warning: columnar PMX parsing needs the 'numpy' library, falling back to the normal method")
+		columnar = False
+	if columnar:
+		B = parse_pmx_vertices_columnar(cur)
+	else:
+		B = parse_pmx_vertices(cur)
+	C = parse_pmx_surfaces(cur)
+	tex_list = parse_pmx_textures(cur)
+	E = parse_pmx_materials(cur, tex_list)
+	F = parse_pmx_bones(cur)
+	G = parse_pmx_morphs(cur)
+	H = parse_pmx_dispframes(cur)
+	I = parse_pmx_rigidbodies(cur)
+	J = parse_pmx_joints(cur)
 	if A.ver == 2.1:
 		# if version==2.1, parse soft bodies
-		K = parse_pmx_softbodies(pmx_bytes)
+		K = parse_pmx_softbodies(cur)
 	else:
 		# otherwise, dont
 		K = []
 	
-	bytes_remain = len(pmx_bytes) - pack.UNPACKER_READFROM_BYTE
+	bytes_remain = cur.remaining()
 	if bytes_remain != 0:
 		core.MY_PRINT_FUNC("Warning: finished parsing but %d bytes are left over at the tail!" % bytes_remain)
 		core.MY_PRINT_FUNC("The file may be corrupt or maybe it contains unknown/unsupported data formats")
-		core.MY_PRINT_FUNC(pmx_bytes[pack.UNPACKER_READFROM_BYTE:])
-	core.MY_PRINT_FUNC("Done parsing PMX file '%s'" % pmx_filename_clean)
+		core.MY_PRINT_FUNC(bytes(pmx_bytes[cur.pos:]))
 	retme = pmxstruct.Pmx(header=A,
 						  verts=B,
 						  faces=C,
@@ -1261,6 +1837,8 @@ def read_pmx(pmx_filename: str, moreinfo=False) -> pmxstruct.Pmx:
 
 
 def write_pmx(pmx_filename: str, pmx: pmxstruct.Pmx, moreinfo=False) -> None:
+	# NOTE: the encode_pmx_* functions keep the string encoding (pack.set_encoding) and the index sizes (IDX_VERT etc)
+	# in module globals while writing, so only one PMX can be written at a time per process! reading is not limited.
 	global PMX_MOREINFO
 	PMX_MOREINFO = moreinfo
 	pmx_filename_clean = core.filepath_splitdir(pmx_filename)[1]
@@ -1293,7 +1871,8 @@ def write_pmx(pmx_filename: str, pmx: pmxstruct.Pmx, moreinfo=False) -> None:
 	core.print_progress_oneline(0)
 	lookahead, tex_list = encode_pmx_lookahead(pmx)
 	output_bytes += encode_pmx_header(pmx.header, lookahead)
-	output_bytes += encode_pmx_vertices(pmx.verts)
+	# if the vertices are still in columnar form, write them straight from the columns
+	output_bytes += encode_pmx_vertices(pmx.vert_columns if pmx.vert_columns is not None else pmx.verts)
 	output_bytes += encode_pmx_surfaces(pmx.faces)
 	output_bytes += encode_pmx_textures(tex_list)
 	output_bytes += encode_pmx_materials(pmx.materials, tex_list)
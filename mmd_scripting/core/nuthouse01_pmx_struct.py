@@ -1,9 +1,10 @@
 import abc
 import copy
 import enum
+import gc
 import sys
 import traceback
-from typing import List, Union, Set
+from typing import Iterable, List, Set, Tuple, Union
 
 import mmd_scripting.core.nuthouse01_core as core
 
@@ -11,10 +12,10 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.02 - 7/30/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
-__all__ = ['JointType', 'MaterialFlags', 'MorphPanel', 'MorphType', 'Pmx', 'PmxBone', 'PmxBoneIkLink', 'PmxFrame',
+__all__ = ['JointType', 'MaterialFlags', 'MorphPanel', 'MorphType', 'Pmx', 'PmxBone', 'PmxBoneIkLink', 'PmxChangeJournal', 'PmxFrame',
 		   'PmxFrameItem', 'PmxHeader', 'PmxJoint', 'PmxMaterial', 'PmxMorph', 'PmxMorphItemBone', 'PmxMorphItemFlip',
 		   'PmxMorphItemGroup', 'PmxMorphItemImpulse', 'PmxMorphItemMaterial', 'PmxMorphItemUV', 'PmxMorphItemVertex',
-		   'PmxRigidBody', 'PmxSoftBody', 'PmxVertex', 'RigidBodyPhysMode', 'RigidBodyShape', 'SphMode', 'WeightMode']
+		   'PmxRigidBody', 'PmxSoftBody', 'PmxVertex', 'PmxVertexColumns', 'RigidBodyPhysMode', 'RigidBodyShape', 'SphMode', 'WeightMode']
 
 ############################################################################################
 ######## IMPORTANT NOTES ###################################################################
@@ -339,6 +340,90 @@ class PmxVertex(_BasePmx):
 			for vec4 in self.addl_vec4s:
 				assert is_good_vector(4, vec4)
 
+# how many boneidx-weight pairs each WeightMode holds, indexed by the WeightMode value
+_WEIGHTMODE_NUM_PAIRS = (1, 2, 4, 2, 4)
+
+class PmxVertexColumns:
+	"""
+	Alternate storage for the entire vertex section, where each field is one numpy array with one row per vertex.
+	This is only created by the parser when it is asked to read vertices in "columnar" mode, and it is converted into
+	a normal list of PmxVertex objects the first time that anything touches "Pmx.verts".
+	Requires numpy.
+	"""
+	def __init__(self,
+				 pos,			# (N,3) float32
+				 norm,			# (N,3) float32
+				 uv,			# (N,2) float32
+				 edgescale,		# (N,) float32
+				 weighttype,	# (N,) int8, WeightMode values
+				 weight_bone,	# (N,4) int32, unused slots are 0
+				 weight_value,	# (N,4) float64, unused slots are 0.0
+				 weight_sdef,	# (N,3,3) float32, all 0.0 for non-SDEF vertices
+				 addl_vec4s,	# (N,K,4) float32, K is usually 0
+				 ):
+		self.pos = pos
+		self.norm = norm
+		self.uv = uv
+		self.edgescale = edgescale
+		self.weighttype = weighttype
+		self.weight_bone = weight_bone
+		self.weight_value = weight_value
+		self.weight_sdef = weight_sdef
+		self.addl_vec4s = addl_vec4s
+	def __len__(self) -> int:
+		return len(self.weighttype)
+	def used_weight_slots(self):
+		"""
+		Which of the 4 boneidx-weight slots each vertex actually uses, based on its weighttype. The unused slots are
+		just padding and should never be remapped or read.
+		:return: (N,4) bool array
+		"""
+		import numpy as np
+		num_pairs = np.array(_WEIGHTMODE_NUM_PAIRS, dtype=np.int64)[self.weighttype]
+		return np.arange(4) < num_pairs[:, None]
+	def compact(self, keep) -> None:
+		"""
+		Delete vertices in-place, same as core.my_list_compact() does for a list of PmxVertex objects.
+		:param keep: (N,) bool array or list of bools, True for the vertices to keep
+		"""
+		for name in ("pos", "norm", "uv", "edgescale", "weighttype", "weight_bone", "weight_value", "weight_sdef", "addl_vec4s"):
+			setattr(self, name, getattr(self, name)[keep])
+	def to_vertices(self) -> List[PmxVertex]:
+		"""
+		Build the list of PmxVertex objects that the legacy parser would have returned for the same data.
+		:return: list of PmxVertex objects
+		"""
+		# this creates millions of small lists, and the garbage collector would otherwise repeatedly scan them all for
+		# reference cycles while they are being built even though they cannot possibly contain any
+		gc_was_enabled = gc.isenabled()
+		gc.disable()
+		try:
+			return self._to_vertices()
+		finally:
+			if gc_was_enabled: gc.enable()
+	def _to_vertices(self) -> List[PmxVertex]:
+		# tolist() turns everything into native python ints & floats in one shot, which is much faster than indexing
+		pos = self.pos.tolist()
+		norm = self.norm.tolist()
+		uv = self.uv.tolist()
+		edgescale = self.edgescale.tolist()
+		weighttype = self.weighttype.tolist()
+		weight_bone = self.weight_bone.tolist()
+		weight_value = self.weight_value.tolist()
+		weight_sdef = self.weight_sdef.tolist()
+		addl_vec4s = self.addl_vec4s.tolist()
+		modes = list(WeightMode)
+		retme = []
+		for d in range(len(weighttype)):
+			wt = weighttype[d]
+			bones = weight_bone[d]
+			values = weight_value[d]
+			weight = [[bones[z], values[z]] for z in range(_WEIGHTMODE_NUM_PAIRS[wt])]
+			sdef = weight_sdef[d] if wt == WeightMode.SDEF.value else []
+			retme.append(PmxVertex(pos=pos[d], norm=norm[d], uv=uv[d], edgescale=edgescale[d],
+								   weighttype=modes[wt], weight=weight, weight_sdef=sdef, addl_vec4s=addl_vec4s[d]))
+		return retme
+
 # face is just a list of ints, no struct needed
 
 # tex is just a string, no struct needed
@@ -1059,6 +1144,67 @@ class PmxSoftBody(_BasePmx):
 		pass
 
 
+class PmxChangeJournal:
+	"""
+	Keeps track of which sections of a Pmx object have been changed, so that operations can tell whether anything
+	they depend on is different from the last time they ran. Every Pmx object has one of these as "pmx.journal".
+	Nothing here is automatic, whoever changes a section must call mark_changed() for it! The cleanup passes run by
+	"model_overall_cleanup" do this.
+	NOTE: this never decides by itself that an operation can be skipped. An operation only counts as clean if it was
+	marked clean, which means it already ran (or a memo from a previous run says it would do nothing).
+	"model_overall_cleanup" only uses it to carry such a memo forward, see REMEMBER_CLEAN_MODELS there.
+	"""
+	# names of all the sections, same as the names of the Pmx members
+	SECTIONS = ("header", "verts", "faces", "materials", "bones", "morphs", "frames", "rigidbodies", "joints",
+				"softbodies")
+	def __init__(self):
+		# number of times each section has been marked as changed
+		self._versions = dict.fromkeys(self.SECTIONS, 0)
+		# name -> (sections, versions of those sections at the time it was marked clean)
+		self._clean = {}
+	def mark_changed(self, sections: Iterable[str]) -> None:
+		"""
+		Record that these sections have been changed.
+		:param sections: list of section names
+		"""
+		for sec in sections:
+			self._versions[sec] += 1
+	def versions(self, sections: Iterable[str]) -> Tuple[int, ...]:
+		"""
+		:param sections: list of section names
+		:return: tuple with the current version number of each section
+		"""
+		return tuple(self._versions[sec] for sec in sections)
+	def changed_sections(self) -> List[str]:
+		"""
+		:return: list of the names of all sections that have been changed since the journal was created
+		"""
+		return [sec for sec in self.SECTIONS if self._versions[sec] != 0]
+	def mark_clean(self, name: str, sections: Iterable[str]) -> None:
+		"""
+		Record that the operation called "name", which only looks at these sections, has nothing left to do.
+		This stays true until one of the sections is changed.
+		:param name: any string that identifies the operation
+		:param sections: list of section names that the operation looks at
+		"""
+		sections = tuple(sections)
+		self._clean[name] = (sections, self.versions(sections))
+	def is_clean(self, name: str) -> bool:
+		"""
+		:param name: string that identifies the operation
+		:return: True if it was marked clean and none of its sections have changed since then
+		"""
+		try:
+			sections, versions = self._clean[name]
+		except KeyError:
+			return False
+		return self.versions(sections) == versions
+	def clean_names(self) -> List[str]:
+		"""
+		:return: list of every operation name that is currently clean
+		"""
+		return [name for name in self._clean if self.is_clean(name)]
+
 class Pmx(_BasePmx):
 	# [A, B, C, D, E, F, G, H, I, J, K]
 	def __init__(self,
@@ -1078,6 +1224,9 @@ class Pmx(_BasePmx):
 			assert header.ver == 2.0
 			sbodies = []
 		self.header = header
+		# verts can be given as a PmxVertexColumns, see the "verts" property below
+		self._verts = None
+		self._vert_columns = None
 		self.verts = verts
 		self.faces = faces
 		# self.textures = texes
@@ -1088,6 +1237,31 @@ class Pmx(_BasePmx):
 		self.rigidbodies = rbodies
 		self.joints = joints
 		self.softbodies = sbodies
+		# record of which sections have been changed, see PmxChangeJournal
+		self.journal = PmxChangeJournal()
+	@property
+	def verts(self) -> List[PmxVertex]:
+		# if the vertices are still stored as columns, build the PmxVertex objects now, the first time they are needed
+		# after this point the objects are the only copy of the data, the columns are discarded
+		if self._vert_columns is not None:
+			self._verts = self._vert_columns.to_vertices()
+			self._vert_columns = None
+		return self._verts
+	@verts.setter
+	def verts(self, newverts):
+		if isinstance(newverts, PmxVertexColumns):
+			self._verts = None
+			self._vert_columns = newverts
+		else:
+			self._verts = newverts
+			self._vert_columns = None
+	@property
+	def vert_columns(self) -> Union[PmxVertexColumns, None]:
+		"""
+		The PmxVertexColumns holding the vertex data, if the vertices have not yet been converted into PmxVertex
+		objects. Otherwise None. Reading this never triggers the conversion.
+		"""
+		return self._vert_columns
 	def list(self) -> list:
 		return [self.header.list(),						#0
 				[i.list() for i in self.verts],			#1
@@ -1105,11 +1279,24 @@ class Pmx(_BasePmx):
 		# header: PmxHeader object
 		assert isinstance(self.header, PmxHeader)
 		assert self.header.validate()
-		# verts: list of PmxVertex objects
-		assert isinstance(self.verts, (list,tuple))
-		for v in self.verts:
-			assert isinstance(v, PmxVertex)
-			assert v.validate(parentlist=self.verts)
+		# verts: list of PmxVertex objects, or PmxVertexColumns that came straight from the parser
+		if self._vert_columns is not None:
+			# don't convert them just to check them, verify the array shapes instead
+			c = self._vert_columns
+			n = len(c)
+			assert c.pos.shape == (n, 3)
+			assert c.norm.shape == (n, 3)
+			assert c.uv.shape == (n, 2)
+			assert c.edgescale.shape == (n,)
+			assert c.weight_bone.shape == (n, 4)
+			assert c.weight_value.shape == (n, 4)
+			assert c.weight_sdef.shape == (n, 3, 3)
+			assert c.addl_vec4s.shape[0] == n
+		else:
+			assert isinstance(self.verts, (list,tuple))
+			for v in self.verts:
+				assert isinstance(v, PmxVertex)
+				assert v.validate(parentlist=self.verts)
 		# faces: list of faces, where each face is a list of 3 ints (vertex references)
 		assert isinstance(self.faces, (list,tuple))
 		for f in self.faces:
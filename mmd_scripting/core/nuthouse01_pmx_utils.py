@@ -1,8 +1,14 @@
-from typing import List, TypeVar, Set, Tuple
+import itertools
+from typing import Dict, Iterable, List, Optional, TypeVar, Set, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 8/22/2021"
 
 ################################################################################
@@ -102,6 +108,83 @@ def newval_from_rangemap(v: INT_OR_INTLIST, range_map: Tuple[List[int], List[int
 		raise ValueError("error: newval_from_rangemap() called with '%s' arg, must be int or list/tuple" % v.__class__.__name__)
 
 
+def build_remap_lut(old_len: int, dellist: List[int], range_map: Tuple[List[int], List[int]]) -> List[int]:
+	"""
+	Given a rangemap from delme_list_to_rangemap(), build a dense lookup table of what each index will become:
+	lut[old] = new, or -1 if old is one of the indices being deleted. Gives the same answers as newval_from_rangemap()
+	but each lookup is a plain list index instead of a binary search, which matters when remapping every reference
+	in a big model. The table has one extra -1 on the end, so lut[-1] == -1 and "no reference" stays "no reference".
+
+	:param old_len: length of the list that the indices refer to, BEFORE anything is deleted
+	:param dellist: list of ints being deleted, MUST be in sorted order! can be empty
+	:param range_map: result from delme_list_to_rangemap(), or any other list-of-starts/list-of-offsets pair
+	:return: list of ints, length old_len + 1
+	"""
+	list_of_starts, list_of_offsets = range_map
+	if np is not None:
+		idx = np.arange(old_len, dtype=np.int64)
+		# searchsorted 'right' is the same as bisect_right, position 0 means no offset
+		pos = np.searchsorted(np.array(list_of_starts, dtype=np.int64), idx, side="right")
+		offsets = np.concatenate(([0], np.array(list_of_offsets, dtype=np.int64)))
+		lut = idx + offsets[pos]
+		lut[np.array(dellist, dtype=np.int64)] = -1
+		return lut.tolist() + [-1]
+	# without numpy, walk along the indices and the rangemap at the same time
+	lut = []
+	offset = 0
+	nextstart = 0
+	for i in range(old_len):
+		while nextstart < len(list_of_starts) and list_of_starts[nextstart] <= i:
+			offset = list_of_offsets[nextstart]
+			nextstart += 1
+		lut.append(i + offset)
+	for i in dellist:
+		lut[i] = -1
+	lut.append(-1)
+	return lut
+
+
+def remap_with_lut(lut: List[int], v: int, range_map: Tuple[List[int], List[int]]) -> int:
+	"""
+	Look up one index in a table from build_remap_lut(). Some models contain references that point past the end of
+	the list they refer to; those aren't in the table, so they get the same answer newval_from_rangemap() would give
+	instead of raising IndexError (or silently wrapping around, for negative indices).
+
+	:param lut: result from build_remap_lut()
+	:param v: int index to remap
+	:param range_map: the same rangemap that was used to build the table
+	:return: int
+	"""
+	if -1 <= v < len(lut) - 1:
+		return lut[v]
+	return newval_from_rangemap(v, range_map)
+
+
+def remap_array_with_lut(lut: List[int], arr, range_map: Tuple[List[int], List[int]]):
+	"""
+	Same as remap_with_lut() but for every element of an array of ints at once. Requires numpy.
+
+	:param lut: result from build_remap_lut()
+	:param arr: numpy array of ints, any shape
+	:param range_map: the same rangemap that was used to build the table
+	:return: new numpy int64 array, same shape as arr
+	"""
+	lut_np = np.asarray(lut, dtype=np.int64)
+	arr = np.asarray(arr, dtype=np.int64)
+	inside = (arr >= -1) & (arr < len(lut) - 1)
+	if inside.all():
+		return lut_np[arr]
+	# out-of-range references: negative ones are unchanged, ones past the end get the offset of whatever range they fall in
+	list_of_starts, list_of_offsets = range_map
+	ret = arr.copy()
+	ret[inside] = lut_np[arr[inside]]
+	above = arr >= len(lut) - 1
+	pos = np.searchsorted(np.array(list_of_starts, dtype=np.int64), arr[above], side="right")
+	offsets = np.concatenate(([0], np.array(list_of_offsets, dtype=np.int64)))
+	ret[above] = arr[above] + offsets[pos]
+	return ret
+
+
 def bone_get_ancestors(bones: List[pmxstruct.PmxBone], idx: int) -> Set[int]:
 	"""
 	Walk parent to parent to parent, return the set of all ancestors of the initial bone.
@@ -120,6 +203,173 @@ def bone_get_ancestors(bones: List[pmxstruct.PmxBone], idx: int) -> Set[int]:
 	return retme
 
 
+class BoneGraph:
+	"""
+	Index of all the relationships between bones: parents/children, partial-inherit sources, IK groups, and names.
+	Build it once from a list of bones and then ask it questions, instead of walking the bone list over and over.
+	This does not watch the bones for changes! If bones are added/removed/re-parented, build a new one.
+	
+	The parent tree is numbered in depth-first order (an "Euler tour"), so "is A an ancestor of B" is just a
+	comparison and the descendants of a bone are one contiguous slice. Bones that are part of a parent-loop (which
+	is broken, but can happen) can't be numbered like that, so questions about them fall back to walking the parents.
+	"""
+	def __init__(self, bones: List[pmxstruct.PmxBone]):
+		"""
+		:param bones: list of PmxBone objects, taken from Pmx.bones.
+		"""
+		numbones = len(bones)
+		self.numbones = numbones
+		def valid(idx):
+			return idx if (idx is not None and 0 <= idx < numbones) else -1
+		# parent of each bone, -1 if none
+		self.parent = [valid(b.parent_idx) for b in bones]
+		# direct children of each bone, in index order
+		self.children = [[] for _ in bones]  # type: List[List[int]]
+		for d,par in enumerate(self.parent):
+			if par != -1:
+				self.children[par].append(d)
+		# partial-inherit source of each bone, -1 if it doesn't actually inherit anything
+		self.inherit_parent = [valid(b.inherit_parent_idx) if ((b.inherit_rot or b.inherit_trans) and b.inherit_ratio != 0) else -1
+							   for b in bones]
+		self.inherit_children = [[] for _ in bones]  # type: List[List[int]]
+		for d,src in enumerate(self.inherit_parent):
+			if src != -1:
+				self.inherit_children[src].append(d)
+		# IK groups: each IK bone + its target + all its links are one group. key is the IK bone idx.
+		self.ik_groups = {}  # type: Dict[int, Set[int]]
+		# for each bone, the keys (IK bone idxs) of every IK group it belongs to
+		self.ik_groups_of = [[] for _ in bones]  # type: List[List[int]]
+		# for each bone, the IK bone(s) that move it (as a target or a link). usually 0 or 1, but feet have 2
+		self.ik_masters = [set() for _ in bones]  # type: List[Set[int]]
+		for d,bone in enumerate(bones):
+			if bone.has_ik:
+				group = {d}
+				controlled = [valid(bone.ik_target_idx)] + [valid(link.idx) for link in bone.ik_links]
+				for c in controlled:
+					if c != -1:
+						group.add(c)
+						self.ik_masters[c].add(d)
+				for member in group:
+					self.ik_groups_of[member].append(d)
+				self.ik_groups[d] = group
+		# name lookup, if there are duplicate names the first one wins (same as core.my_list_search)
+		self.name_jp_to_idx = {}  # type: Dict[str, int]
+		self.name_en_to_idx = {}  # type: Dict[str, int]
+		for d,bone in enumerate(bones):
+			self.name_jp_to_idx.setdefault(bone.name_jp, d)
+			self.name_en_to_idx.setdefault(bone.name_en, d)
+		
+		# number the tree in depth-first order, starting from every bone that has no parent
+		# _tour_in[b] is when b is visited, _tour_out[b] is 1 past the last of its descendants, -1 if never reached
+		self._tour_in = [-1] * numbones
+		self._tour_out = [-1] * numbones
+		self._tour_order = []  # type: List[int]
+		for root in range(numbones):
+			if self.parent[root] != -1: continue
+			# each stack item is (bone, is this the exit visit)
+			stack = [(root, False)]
+			while stack:
+				b, is_exit = stack.pop()
+				if is_exit:
+					self._tour_out[b] = len(self._tour_order)
+					continue
+				self._tour_in[b] = len(self._tour_order)
+				self._tour_order.append(b)
+				stack.append((b, True))
+				# push children in reverse so they are visited in index order
+				stack.extend((c, False) for c in reversed(self.children[b]))
+	
+	def is_ancestor(self, ancestor: int, idx: int) -> bool:
+		"""
+		:param ancestor: bone index
+		:param idx: bone index
+		:return: True if "ancestor" is the parent, or parent's parent, or etc, of "idx". a bone is not its own ancestor
+		(unless it is part of a parent-loop).
+		"""
+		if self._tour_in[idx] != -1:
+			return self._tour_in[ancestor] < self._tour_in[idx] < self._tour_out[ancestor]
+		return ancestor in self.ancestors(idx)
+	
+	def ancestors(self, idx: int) -> List[int]:
+		"""
+		Walk parent to parent to parent. Does not care about "partial inherit" stuff.
+		:param idx: bone index to start from. NOT INCLUDED within return value (unless part of a parent-loop).
+		:return: list of ancestor indices, nearest first.
+		"""
+		retme = []
+		seen = set()
+		idx = self.parent[idx]
+		while idx != -1 and idx not in seen:
+			retme.append(idx)
+			seen.add(idx)
+			idx = self.parent[idx]
+		return retme
+	
+	def descendants(self, idx: int) -> List[int]:
+		"""
+		:param idx: bone index to start from. NOT INCLUDED within return value (unless part of a parent-loop).
+		:return: list of every bone that has "idx" as an ancestor, i.e. children & children's children & etc.
+		"""
+		if self._tour_in[idx] != -1:
+			return self._tour_order[self._tour_in[idx] + 1: self._tour_out[idx]]
+		# a bone in a parent-loop, or hanging off of one: nothing is numbered, so collect them the slow way
+		retme = []
+		queue = [idx]
+		seen = set()
+		while queue:
+			b = queue.pop()
+			for c in self.children[b]:
+				if c not in seen:
+					seen.add(c)
+					retme.append(c)
+					queue.append(c)
+		return sorted(retme)
+	
+	def depends_on(self, idx: int) -> List[int]:
+		"""
+		:param idx: bone index
+		:return: the bones that "idx" directly needs in order to move correctly: its parent, its partial-inherit
+		source, and all other members of any IK group it is part of.
+		"""
+		retme = []
+		if self.parent[idx] != -1:
+			retme.append(self.parent[idx])
+		if self.inherit_parent[idx] != -1:
+			retme.append(self.inherit_parent[idx])
+		for g in self.ik_groups_of[idx]:
+			retme.extend(self.ik_groups[g])
+		return retme
+	
+	def dependency_closure(self, start: Iterable[int], already_known: Optional[Set[int]]=None) -> Set[int]:
+		"""
+		Starting from some bones, collect every bone they depend on, and everything those depend on, etc.
+		See depends_on().
+		:param start: bone indices to start from, included in the return value. -1 is ignored.
+		:param already_known: optional set of bones that already had their dependencies collected, they are skipped.
+		:return: set of bone indices, does not include anything from already_known unless it was also in start.
+		"""
+		if already_known is None:
+			already_known = set()
+		retme = set()
+		stack = [b for b in start if b != -1]
+		while stack:
+			b = stack.pop()
+			if b in retme or b in already_known:
+				continue
+			retme.add(b)
+			stack.extend(self.depends_on(b))
+		return retme
+	
+	def get_idx(self, name: str) -> Optional[int]:
+		"""
+		:param name: JP or EN name of a bone, JP names are checked first.
+		:return: bone index, or None if no bone has that name.
+		"""
+		if name in self.name_jp_to_idx:
+			return self.name_jp_to_idx[name]
+		return self.name_en_to_idx.get(name)
+
+
 def insert_single_bone(pmx: pmxstruct.Pmx, newbone: pmxstruct.PmxBone, newindex: int):
 	"""
 	Wrapper function to make inserting bones simpler.
@@ -172,97 +422,94 @@ def bone_delete_and_remap(pmx: pmxstruct.Pmx, bone_dellist: List[int], bone_shif
 	:param bone_dellist: list of ints to delete, MUST be in sorted order!
 	:param bone_shiftmap: created by delme_list_to_rangemap() before calling
 	"""
+	# build the old->new table once, then each reference is just a list lookup
+	lut = build_remap_lut(len(pmx.bones), bone_dellist, bone_shiftmap)
+	bone_delset = set(bone_dellist)
 	
 	core.print_progress_oneline(0 / 5)
 	# VERTICES:
 	# just remap the bones that have weight
 	# any references to bones being deleted will definitely have 0 weight, and therefore it doesn't matter what they reference afterwards
-	for d, vert in enumerate(pmx.verts):
-		for pair in vert.weight:
-			pair[0] = newval_from_rangemap(int(pair[0]), bone_shiftmap)
+	cols = pmx.vert_columns
+	if cols is not None:
+		# if the vertices are still columns, remap the whole weight_bone array at once and don't build the vertex objects
+		# the unused slots are padding, leave them alone
+		used = cols.used_weight_slots()
+		cols.weight_bone[used] = remap_array_with_lut(lut, cols.weight_bone[used], bone_shiftmap)
+	else:
+		num_bones = len(pmx.bones)
+		for vert in pmx.verts:
+			for pair in vert.weight:
+				b = int(pair[0])
+				pair[0] = lut[b] if -1 <= b < num_bones else newval_from_rangemap(b, bone_shiftmap)
 	# done with verts
 	
 	core.print_progress_oneline(1 / 5)
 	# MORPHS:
-	for d, morph in enumerate(pmx.morphs):
+	for morph in pmx.morphs:
 		# only operate on bone morphs
 		if morph.morphtype != pmxstruct.MorphType.BONE: continue
 		# first, it is plausible that bone morphs could reference otherwise unused bones, so I should check for and delete those
-		i = 0
-		while i < len(morph.items):
-			it = morph.items[i]
+		core.my_list_compact(morph.items, lambda it: it.bone_idx not in bone_delset)
+		# then remap whatever is left
+		for it in morph.items:
 			it: pmxstruct.PmxMorphItemBone
-			# if the bone being manipulated is in the list of bones being deleted, delete it here too. otherwise remap.
-			if core.binary_search_isin(it.bone_idx, bone_dellist):
-				morph.items.pop(i)
-			else:
-				it.bone_idx = newval_from_rangemap(it.bone_idx, bone_shiftmap)
-				i += 1
+			it.bone_idx = remap_with_lut(lut, it.bone_idx, bone_shiftmap)
 	# done with morphs
 	
 	core.print_progress_oneline(2 / 5)
 	# DISPLAY FRAMES
-	for d, frame in enumerate(pmx.frames):
-		i = 0
-		while i < len(frame.items):
-			item = frame.items[i]
-			# if this item is a morph, skip it
-			if item.is_morph:
-				i += 1
-			else:
-				# if this is one of the bones being deleted, delete it here too. otherwise remap.
-				if core.binary_search_isin(item.idx, bone_dellist):
-					frame.items.pop(i)
-				else:
-					item.idx = newval_from_rangemap(item.idx, bone_shiftmap)
-					i += 1
+	for frame in pmx.frames:
+		# if this is one of the bones being deleted, delete it here too. otherwise remap. morph items are left alone.
+		core.my_list_compact(frame.items, lambda item: item.is_morph or item.idx not in bone_delset)
+		for item in frame.items:
+			if not item.is_morph:
+				item.idx = remap_with_lut(lut, item.idx, bone_shiftmap)
 	# done with frames
 	
 	core.print_progress_oneline(3 / 5)
 	# RIGIDBODY
-	for d, body in enumerate(pmx.rigidbodies):
+	for body in pmx.rigidbodies:
 		# if bone is being used by a rigidbody, set that reference to -1. otherwise, remap.
-		if core.binary_search_isin(body.bone_idx, bone_dellist):
-			body.bone_idx = -1
-		else:
-			body.bone_idx = newval_from_rangemap(body.bone_idx, bone_shiftmap)
+		# the table already holds -1 for the deleted bones
+		body.bone_idx = remap_with_lut(lut, body.bone_idx, bone_shiftmap)
 	# done with bodies
 	
 	core.print_progress_oneline(4 / 5)
 	# BONES: point-at target, true parent, external parent, partial append, ik stuff
-	for d, bone in enumerate(pmx.bones):
+	for bone in pmx.bones:
 		# point-at link:
 		if bone.tail_usebonelink:
-			if core.binary_search_isin(bone.tail, bone_dellist):
+			if bone.tail in bone_delset:
 				# if pointing at a bone that will be deleted, instead change to offset with offset 0,0,0
 				bone.tail_usebonelink = False
 				bone.tail = [0, 0, 0]
 			else:
 				# otherwise, remap
-				bone.tail = newval_from_rangemap(bone.tail, bone_shiftmap)
+				bone.tail = remap_with_lut(lut, bone.tail, bone_shiftmap)
 		# other 4 categories only need remapping
 		# true parent:
-		bone.parent_idx = newval_from_rangemap(bone.parent_idx, bone_shiftmap)
+		bone.parent_idx = remap_with_lut(lut, bone.parent_idx, bone_shiftmap)
 		# partial append:
 		if (bone.inherit_rot or bone.inherit_trans) and bone.inherit_parent_idx != -1:
-			if core.binary_search_isin(bone.inherit_parent_idx, bone_dellist):
+			if bone.inherit_parent_idx in bone_delset:
 				# if a bone is getting partial append from a bone getting deleted, break that relationship
 				# shouldn't be possible but whatever i'll support the case
 				bone.inherit_rot = False
 				bone.inherit_trans = False
 				bone.inherit_parent_idx = -1
 			else:
-				bone.inherit_parent_idx = newval_from_rangemap(bone.inherit_parent_idx, bone_shiftmap)
+				bone.inherit_parent_idx = remap_with_lut(lut, bone.inherit_parent_idx, bone_shiftmap)
 		# ik stuff:
 		if bone.has_ik:
-			bone.ik_target_idx = newval_from_rangemap(bone.ik_target_idx, bone_shiftmap)
+			bone.ik_target_idx = remap_with_lut(lut, bone.ik_target_idx, bone_shiftmap)
 			for link in bone.ik_links:
-				link.idx = newval_from_rangemap(link.idx, bone_shiftmap)
+				link.idx = remap_with_lut(lut, link.idx, bone_shiftmap)
 	# done with bones
 	
 	# acutally delete the bones
-	for f in reversed(bone_dellist):
-		pmx.bones.pop(f)
+	if bone_delset:
+		core.my_list_compact(pmx.bones, [d not in bone_delset for d in range(len(pmx.bones))])
 
 	return
 
@@ -275,40 +522,31 @@ def morph_delete_and_remap(pmx: pmxstruct.Pmx, morph_dellist: List[int], morph_s
 	:param morph_dellist: list of ints to delete, MUST be in sorted order!
 	:param morph_shiftmap: created by delme_list_to_rangemap() before calling
 	"""
+	# the table must be built from the list length BEFORE anything is deleted
+	lut = build_remap_lut(len(pmx.morphs), morph_dellist, morph_shiftmap)
+	morph_delset = set(morph_dellist)
+	
 	# actually delete the morphs from the list
-	for f in reversed(morph_dellist):
-		pmx.morphs.pop(f)
+	if morph_delset:
+		core.my_list_compact(pmx.morphs, [d not in morph_delset for d in range(len(pmx.morphs))])
 	
 	# frames:
-	for d, frame in enumerate(pmx.frames):
-		i = 0
-		while i < len(frame.items):
-			item = frame.items[i]
-			# if this item is a bone, skip it
-			if not item.is_morph:
-				i += 1
-			else:
-				# if this is one of the morphs being deleted, delete it here too. otherwise remap.
-				if core.binary_search_isin(item.idx, morph_dellist):
-					frame.items.pop(i)
-				else:
-					item.idx = newval_from_rangemap(item.idx, morph_shiftmap)
-					i += 1
+	for frame in pmx.frames:
+		# if this is one of the morphs being deleted, delete it here too. otherwise remap. bone items are left alone.
+		core.my_list_compact(frame.items, lambda item: not item.is_morph or item.idx not in morph_delset)
+		for item in frame.items:
+			if item.is_morph:
+				item.idx = remap_with_lut(lut, item.idx, morph_shiftmap)
 	
 	# group/flip morphs:
-	for d, morph in enumerate(pmx.morphs):
+	for morph in pmx.morphs:
 		# group/flip = 0/9
 		if morph.morphtype not in (pmxstruct.MorphType.GROUP, pmxstruct.MorphType.FLIP): continue
-		i = 0
-		while i < len(morph.items):
-			it = morph.items[i]
-			it : pmxstruct.PmxMorphItemGroup
-			# if this is one of the morphs being deleted, delete it here too. otherwise remap.
-			if core.binary_search_isin(it.morph_idx, morph_dellist):
-				morph.items.pop(i)
-			else:
-				it.morph_idx = newval_from_rangemap(it.morph_idx, morph_shiftmap)
-				i += 1
+		# if this is one of the morphs being deleted, delete it here too. otherwise remap.
+		core.my_list_compact(morph.items, lambda it: it.morph_idx not in morph_delset)
+		for it in morph.items:
+			it: pmxstruct.PmxMorphItemGroup
+			it.morph_idx = remap_with_lut(lut, it.morph_idx, morph_shiftmap)
 	return
 
 def delete_faces(pmx: pmxstruct.Pmx, faces_to_remove: List[int]) -> None:
@@ -343,8 +581,9 @@ def delete_faces(pmx: pmxstruct.Pmx, faces_to_remove: List[int]) -> None:
 		prev_delface_idx = delface_idx
 	
 	# now, delete the acutal faces
-	for f in reversed(faces_to_remove):
-		pmx.faces.pop(f)
+	# rebuild the list in one pass, popping them one at a time from a huge list is very slow
+	delete_set = set(faces_to_remove)
+	pmx.faces[:] = [face for f, face in enumerate(pmx.faces) if f not in delete_set]
 	return
 
 
@@ -358,31 +597,34 @@ def vert_delete_and_remap(pmx: pmxstruct.Pmx, vert_dellist: List[int], vert_shif
 	:param vert_dellist: list of ints to delete, MUST be in sorted order!
 	:param vert_shiftmap: created by delme_list_to_rangemap() before calling
 	"""
-
 	# need to update places that reference vertices: faces, morphs, softbody
-	# first get the total # of iterations I need to do, for progress purposes: #faces + sum of len of all UV and vert morphs
-	totalwork = len(pmx.faces) + sum([len(m.items) for m in pmx.morphs if (m.morphtype in (pmxstruct.MorphType.VERTEX,
-																						   pmxstruct.MorphType.UV,
-																						   pmxstruct.MorphType.UV_EXT1,
-																						   pmxstruct.MorphType.UV_EXT2,
-																						   pmxstruct.MorphType.UV_EXT3,
-																						   pmxstruct.MorphType.UV_EXT4))])
+	# if the vertices are still columns, don't build the vertex objects just to count them
+	cols = pmx.vert_columns
+	num_verts = len(cols) if cols is not None else len(pmx.verts)
+	lut = build_remap_lut(num_verts, vert_dellist, vert_shiftmap)
+	vert_delset = set(vert_dellist)
 	
+	core.print_progress_oneline(0 / 3)
 	# faces:
-	d = 0
-	for d, face in enumerate(pmx.faces):
-		# vertices in a face are not guaranteed sorted, and sorting them is a Very Bad Idea
-		# therefore they must be remapped individually
-		face[0] = newval_from_rangemap(face[0], vert_shiftmap)
-		face[1] = newval_from_rangemap(face[1], vert_shiftmap)
-		face[2] = newval_from_rangemap(face[2], vert_shiftmap)
-		# display progress printouts
-		core.print_progress_oneline(d / totalwork)
+	# vertices in a face are not guaranteed sorted, and sorting them is a Very Bad Idea
+	# therefore they must be remapped individually, which is exactly what the lookup table is good for
+	if np is not None and pmx.faces:
+		# with numpy, remap all the face corners at once as one flat array
+		corners = np.fromiter(itertools.chain.from_iterable(pmx.faces), dtype=np.int64, count=3 * len(pmx.faces))
+		corners = remap_array_with_lut(lut, corners, vert_shiftmap).tolist()
+		# write back into the existing face lists, making 600k new lists is slower than this
+		for d, face in enumerate(pmx.faces):
+			face[:] = corners[3*d:3*d+3]
+	else:
+		for face in pmx.faces:
+			face[0] = remap_with_lut(lut, face[0], vert_shiftmap)
+			face[1] = remap_with_lut(lut, face[1], vert_shiftmap)
+			face[2] = remap_with_lut(lut, face[2], vert_shiftmap)
 	
 	# core.MY_PRINT_FUNC("Done updating vertex references in faces")
 	
+	core.print_progress_oneline(1 / 3)
 	# morphs:
-	orphan_vertex_references = 0
 	for morph in pmx.morphs:
 		# if not a vertex morph or UV morph, skip it
 		if not morph.morphtype in (pmxstruct.MorphType.VERTEX,
@@ -391,82 +633,43 @@ def vert_delete_and_remap(pmx: pmxstruct.Pmx, vert_dellist: List[int], vert_shif
 								   pmxstruct.MorphType.UV_EXT2,
 								   pmxstruct.MorphType.UV_EXT3,
 								   pmxstruct.MorphType.UV_EXT4): continue
-		lenbefore = len(morph.items)
 		# it is plausible that vertex/uv morphs could reference orphan vertices, so I should check for and delete those
-		i = 0
-		while i < len(morph.items):
-			# if the vertex being manipulated is in the list of verts being deleted,
-			if core.binary_search_isin(morph.items[i].vert_idx, vert_dellist):
-				# delete it here too
-				morph.items.pop(i)
-				orphan_vertex_references += 1
-			else:
-				# otherwise, remap it
-				# but don't remap it here, wait until I'm done deleting vertices and then tackle them all at once
-				i += 1
-		
+		core.my_list_compact(morph.items, lambda it: it.vert_idx not in vert_delset)
 		# morphs usually contain vertexes in sorted order, but not guaranteed!!! MAKE it sorted, nobody will mind
 		morph.items.sort(key=lambda x: x.vert_idx)
-		
-		# separate the vertices from the morph entries into a list of their own, for more efficient remapping
-		vertlist = [x.vert_idx for x in morph.items]
 		# remap
-		remappedlist = newval_from_rangemap(vertlist, vert_shiftmap)
-		# write the remapped values back into where they came from
-		for x, newval in zip(morph.items, remappedlist):
-			x.vert_idx = newval
-		# display progress printouts
-		d += lenbefore
-		core.print_progress_oneline(d / totalwork)
+		for it in morph.items:
+			it.vert_idx = remap_with_lut(lut, it.vert_idx, vert_shiftmap)
 	
 	# core.MY_PRINT_FUNC("Done updating vertex references in morphs")
 	
+	core.print_progress_oneline(2 / 3)
 	# softbody: probably not relevant but eh
 	for soft in pmx.softbodies:
 		# anchors
 		# first, delete any references to delme verts in the anchors
-		i = 0
-		while i < len(soft.anchors_list):
-			# if the vertex referenced is in the list of verts being deleted,
-			if core.binary_search_isin(soft.anchors_list[i][1], vert_dellist):
-				# delete it here too
-				soft.anchors_list.pop(i)
-			else:
-				# otherwise, remap it
-				# but don't remap it here, wait until I'm done deleting vertices and then tackle them all at once
-				i += 1
-		
+		core.my_list_compact(soft.anchors_list, lambda x: x[1] not in vert_delset)
 		#  MAKE it sorted, nobody will mind
 		soft.anchors_list.sort(key=lambda x: x[1])
-		# extract the vert indices into a list of their town
-		anchorlist = [x[1] for x in soft.anchors_list]
 		# remap
-		newanchorlist = newval_from_rangemap(anchorlist, vert_shiftmap)
-		# write the remapped values back into where they came from
-		for x, newval in zip(soft.anchors_list, newanchorlist):
-			x[1] = newval
+		for x in soft.anchors_list:
+			x[1] = remap_with_lut(lut, x[1], vert_shiftmap)
 		
 		# vertex pins
 		# first, delete any references to delme verts
-		i = 0
-		while i < len(soft.vertex_pin_list):
-			# if the vertex referenced is in the list of verts being deleted,
-			if core.binary_search_isin(soft.vertex_pin_list[i], vert_dellist):
-				# delete it here too
-				soft.vertex_pin_list.pop(i)
-			else:
-				# otherwise, remap it
-				# but don't remap it here, wait until I'm done deleting vertices and then tackle them all at once
-				i += 1
+		core.my_list_compact(soft.vertex_pin_list, lambda x: x not in vert_delset)
 		#  MAKE it sorted, nobody will mind
-		soft.anchors_list.sort()
+		soft.vertex_pin_list.sort()
 		# remap
-		soft.vertex_pin_list = newval_from_rangemap(soft.vertex_pin_list, vert_shiftmap)
+		soft.vertex_pin_list = [remap_with_lut(lut, x, vert_shiftmap) for x in soft.vertex_pin_list]
 	# done with softbodies!
 	
 	# now, finally, actually delete the vertices from the vertex list
-	vert_dellist.reverse()
-	for f in vert_dellist:
-		pmx.verts.pop(f)
+	if vert_delset:
+		keep = [d not in vert_delset for d in range(num_verts)]
+		if cols is not None:
+			cols.compact(keep)
+		else:
+			core.my_list_compact(pmx.verts, keep)
 		
 	return
\ No newline at end of file
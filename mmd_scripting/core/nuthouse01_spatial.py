@@ -0,0 +1,297 @@
+import bisect
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+
+_SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 8/22/2021"
+
+################################################################################
+# this file defines a spatial index for quickly finding the vertices nearest to a point
+
+# when picking a cell size automatically, keep shrinking the cells until there are at most this many points per
+# occupied cell on average. model vertices lie on surfaces not in volumes so a plain "volume / count" guess is too big
+_TARGET_POINTS_PER_CELL = 4
+_MAX_CELL_SIZE_ATTEMPTS = 8
+
+
+class SpatialGrid:
+	"""
+	Uniform grid hash over a set of 3d points. Each point is put into the cube-shaped cell that contains it, and
+	queries only look at the cells near the query point instead of every point.
+	All query results are lists of (distance, id) tuples sorted by distance. An id is the position of the point in the
+	list it was built from, unless a separate list of ids was given. Ties are sorted by position in that list.
+	"""
+	def __init__(self, points: Sequence[Sequence[float]], ids: Sequence[int]=None, cell_size: float=None):
+		"""
+		:param points: list of [x,y,z] positions
+		:param ids: optional, list of what to report for each point, same length as points. default 0 thru N-1.
+		:param cell_size: optional, length of each side of a cell. if not given, a decent size is chosen.
+		"""
+		self.points = [(float(p[0]), float(p[1]), float(p[2])) for p in points]
+		if ids is None:
+			self.ids = list(range(len(self.points)))
+		else:
+			if len(ids) != len(self.points):
+				core.MY_PRINT_FUNC("ERROR: given %d ids for %d points" % (len(ids), len(self.points)))
+				raise ValueError("ids and points must be the same length")
+			self.ids = list(ids)
+		if cell_size is not None and not cell_size > 0:
+			core.MY_PRINT_FUNC("ERROR: cell size must be positive, got %s" % str(cell_size))
+			raise ValueError("cell_size must be positive")
+
+		self.cells = {}  # type: Dict[Tuple[int,int,int], List[int]]
+		if cell_size is not None:
+			self.cell_size = cell_size
+			self._fill()
+		else:
+			self.cell_size = self._initial_cell_size()
+			for _ in range(_MAX_CELL_SIZE_ATTEMPTS):
+				self._fill()
+				if len(self.points) <= _TARGET_POINTS_PER_CELL * len(self.cells):
+					break
+				self.cell_size /= 2
+
+		# the range of occupied cells, so that searches never walk thru cells that can't hold anything
+		if self.cells:
+			self.lo = tuple(min(key[a] for key in self.cells) for a in range(3))
+			self.hi = tuple(max(key[a] for key in self.cells) for a in range(3))
+		else:
+			self.lo = self.hi = (0, 0, 0)
+
+	@classmethod
+	def from_pmx_verts(cls, verts: List[pmxstruct.PmxVertex], cell_size: float=None) -> 'SpatialGrid':
+		"""
+		Build from the vertices of a PMX. The ids are the vertex indices.
+
+		:param verts: list of PmxVertex objects, probably pmx.verts
+		:param cell_size: optional, see __init__
+		:return: SpatialGrid
+		"""
+		return cls([v.pos for v in verts], cell_size=cell_size)
+
+	@classmethod
+	def from_vertex_csv(cls, rows: List[list], cell_size: float=None) -> 'SpatialGrid':
+		"""
+		Build from the rows of a PMXE vertex CSV, skipping any rows that are not vertices. The ids are the row indices.
+
+		:param rows: list of CSV rows, probably from io.read_file_to_csvlist()
+		:param cell_size: optional, see __init__
+		:return: SpatialGrid
+		"""
+		# note: in CSV, 2-3-4 = pos X-Y-Z
+		rowidx = [d for d, row in enumerate(rows) if row and row[0] == core.pmxe_vertex_csv_tag]
+		return cls([rows[d][2:5] for d in rowidx], ids=rowidx, cell_size=cell_size)
+
+	def __len__(self) -> int:
+		return len(self.points)
+
+	def _initial_cell_size(self) -> float:
+		# the size that would give about one point per cell if the points filled their bounding box evenly
+		if not self.points:
+			return 1.0
+		extent = [max(p[a] for p in self.points) - min(p[a] for p in self.points) for a in range(3)]
+		volume = 1.0
+		for e in extent:
+			if e > 0: volume *= e
+		size = (volume / len(self.points)) ** (1/3)
+		return size if size > 0 else 1.0
+
+	def _key(self, point: Sequence[float]) -> Tuple[int,int,int]:
+		c = self.cell_size
+		return math.floor(point[0] / c), math.floor(point[1] / c), math.floor(point[2] / c)
+
+	def _fill(self) -> None:
+		self.cells = {}
+		for d, p in enumerate(self.points):
+			key = self._key(p)
+			cell = self.cells.get(key)
+			if cell is None:
+				self.cells[key] = [d]
+			else:
+				cell.append(d)
+
+	def _shell(self, center: Tuple[int,int,int], r: int) -> Iterable[List[int]]:
+		"""
+		Yield the contents of each occupied cell that is exactly r cells away from the center cell (the surface of a
+		cube, not a sphere). Only cells within the range of occupied cells are visited.
+		"""
+		ci, cj, ck = center
+		lo, hi = self.lo, self.hi
+		cells = self.cells
+		for i in range(max(ci - r, lo[0]), min(ci + r, hi[0]) + 1):
+			i_edge = abs(i - ci) == r
+			for j in range(max(cj - r, lo[1]), min(cj + r, hi[1]) + 1):
+				if i_edge or abs(j - cj) == r:
+					# on a face of the cube, the whole column is part of the shell
+					krange = range(max(ck - r, lo[2]), min(ck + r, hi[2]) + 1)
+				else:
+					# inside the cube, only the two ends of the column are part of the shell
+					krange = [k for k in ((ck - r, ck + r) if r else (ck,)) if lo[2] <= k <= hi[2]]
+				for k in krange:
+					cell = cells.get((i, j, k))
+					if cell is not None:
+						yield cell
+
+	def _rings_to_reach_data(self, center: Tuple[int,int,int]) -> int:
+		# how many shells away from the center the range of occupied cells starts, shells before this are all empty
+		return max(0, max(max(self.lo[a] - center[a], center[a] - self.hi[a]) for a in range(3)))
+
+	def _rings_to_cover_data(self, center: Tuple[int,int,int]) -> int:
+		# how many shells away from the center the range of occupied cells ends, shells after this are all empty
+		return max(max(self.hi[a] - center[a], center[a] - self.lo[a]) for a in range(3))
+
+	def _shell_points(self, center: Tuple[int,int,int], r: int, shells: Dict[int, List[int]]) -> List[int]:
+		"""
+		All the point idxs in the shell r cells away from the center cell, as one list. Remembered in shells, so that
+		queries from points in the same cell can share the cell lookups.
+		"""
+		found = shells.get(r)
+		if found is None:
+			found = []
+			for cell in self._shell(center, r):
+				found += cell
+			shells[r] = found
+		return found
+
+	def _query_knn_in(self, point: Sequence[float], k: int, center: Tuple[int,int,int],
+					  shells: Dict[int, List[int]]) -> List[Tuple[float,int]]:
+		# query_knn(), but the center cell is already known and shells is shared with other points in that cell
+		px, py, pz = point
+		points = self.points
+		c = self.cell_size
+		ci, cj, ck = center
+		# best is kept sorted by (squared distance, point idx), at most k long
+		best = []
+		worst = math.inf
+		r = self._rings_to_reach_data(center)
+		last = self._rings_to_cover_data(center)
+		while r <= last:
+			for d in self._shell_points(center, r, shells):
+				q = points[d]
+				dx = q[0] - px; dy = q[1] - py; dz = q[2] - pz
+				d2 = dx*dx + dy*dy + dz*dz
+				if d2 > worst: continue
+				entry = (d2, d)
+				if len(best) < k:
+					bisect.insort(best, entry)
+				elif entry < best[-1]:
+					best.pop()
+					bisect.insort(best, entry)
+				else:
+					continue
+				if len(best) == k:
+					worst = best[-1][0]
+			# any point in a further shell is outside the cube of cells searched so far, stop if everything i have
+			# is closer than the nearest face of that cube
+			# (strictly closer, so that a point at exactly the same distance with a lower idx can't be missed)
+			margin = min(px - (ci - r) * c, (ci + r + 1) * c - px,
+						 py - (cj - r) * c, (cj + r + 1) * c - py,
+						 pz - (ck - r) * c, (ck + r + 1) * c - pz)
+			if worst < margin * margin:
+				break
+			r += 1
+		return [(math.sqrt(d2), self.ids[d]) for d2, d in best]
+
+	def _query_radius_in(self, point: Sequence[float], radius: float, center: Tuple[int,int,int],
+						 shells: Dict[int, List[int]]) -> List[Tuple[float,int]]:
+		# query_radius(), but the center cell is already known and shells is shared with other points in that cell
+		px, py, pz = point
+		points = self.points
+		r2 = radius * radius
+		found = []
+		# a point within the radius can be at most this many cells away
+		last = min(math.floor(radius / self.cell_size) + 1, self._rings_to_cover_data(center))
+		for r in range(self._rings_to_reach_data(center), last + 1):
+			for d in self._shell_points(center, r, shells):
+				q = points[d]
+				dx = q[0] - px; dy = q[1] - py; dz = q[2] - pz
+				d2 = dx*dx + dy*dy + dz*dz
+				if d2 <= r2:
+					found.append((d2, d))
+		found.sort()
+		return [(math.sqrt(d2), self.ids[d]) for d2, d in found]
+
+	def _group_by_cell(self, points: Iterable[Sequence[float]]) -> Tuple[List[Sequence[float]], Dict[Tuple[int,int,int], List[int]]]:
+		# list of the given points, and dict from each cell to the positions (in that list) of the points inside it
+		points = list(points)
+		groups = {}  # type: Dict[Tuple[int,int,int], List[int]]
+		for d, p in enumerate(points):
+			key = self._key(p)
+			group = groups.get(key)
+			if group is None:
+				groups[key] = [d]
+			else:
+				group.append(d)
+		return points, groups
+
+	def query_knn(self, point: Sequence[float], k: int=1) -> List[Tuple[float,int]]:
+		"""
+		Find the k points nearest to the given point.
+
+		:param point: [x,y,z] position
+		:param k: how many to find
+		:return: list of (distance, id) tuples sorted by distance, length is k or the total number of points if fewer
+		"""
+		if k <= 0 or not self.points:
+			return []
+		return self._query_knn_in(point, k, self._key(point), {})
+
+	def query_radius(self, point: Sequence[float], radius: float) -> List[Tuple[float,int]]:
+		"""
+		Find all points within the given distance of the given point.
+
+		:param point: [x,y,z] position
+		:param radius: max distance, inclusive
+		:return: list of (distance, id) tuples sorted by distance
+		"""
+		if radius < 0 or not self.points:
+			return []
+		return self._query_radius_in(point, radius, self._key(point), {})
+
+	def query_knn_many(self, points: Iterable[Sequence[float]], k: int=1) -> List[List[Tuple[float,int]]]:
+		"""
+		Batched version of query_knn(). The query points are grouped by which cell they fall in, and each group
+		walks the nearby cells only once, instead of once per query point.
+
+		:param points: list of [x,y,z] positions
+		:param k: how many to find for each point
+		:return: list of results from query_knn(), one per given point
+		"""
+		points, groups = self._group_by_cell(points)
+		if k <= 0 or not self.points:
+			return [[] for _ in points]
+		results = [None] * len(points)  # type: List[List[Tuple[float,int]]]
+		for center, group in groups.items():
+			shells = {}
+			for d in group:
+				results[d] = self._query_knn_in(points[d], k, center, shells)
+		return results
+
+	def query_radius_many(self, points: Iterable[Sequence[float]], radius: float) -> List[List[Tuple[float,int]]]:
+		"""
+		Batched version of query_radius(). The query points are grouped by which cell they fall in, and each group
+		walks the nearby cells only once, instead of once per query point.
+
+		:param points: list of [x,y,z] positions
+		:param radius: max distance, inclusive
+		:return: list of results from query_radius(), one per given point
+		"""
+		points, groups = self._group_by_cell(points)
+		if radius < 0 or not self.points:
+			return [[] for _ in points]
+		results = [None] * len(points)  # type: List[List[Tuple[float,int]]]
+		for center, group in groups.items():
+			shells = {}
+			for d in group:
+				results[d] = self._query_radius_in(points[d], radius, center, shells)
+		return results
+
+	def nearest(self, point: Sequence[float]) -> Optional[Tuple[float,int]]:
+		"""
+		:param point: [x,y,z] position
+		:return: (distance, id) tuple of the single nearest point, or None if there are no points
+		"""
+		result = self.query_knn(point, 1)
+		return result[0] if result else None
@@ -1,13 +1,18 @@
 import math
 import struct
 import time
-from typing import List
+from typing import List, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_io as io
 import mmd_scripting.core.nuthouse01_packer as pack
 import mmd_scripting.core.nuthouse01_vmd_struct as vmdstruct
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
@@ -38,14 +43,15 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # FUNCTIONS & STRUCTURE:
 #
 # read_vmd()
-# 	core.read_binfile_to_bytes()
-# 	parse_vmd_header()
-# 	parse_vmd_boneframe()
-# 	parse_vmd_morphframe()
-# 	parse_vmd_camframe()
-# 	parse_vmd_lightframe()
-# 	parse_vmd_shadowframe()
-# 	parse_vmd_ikdispframe()
+# 	io.open_binfile_mmap()
+# 	parse_vmd()
+# 		parse_vmd_header()
+# 		parse_vmd_boneframe()
+# 		parse_vmd_morphframe()
+# 		parse_vmd_camframe()
+# 		parse_vmd_lightframe()
+# 		parse_vmd_shadowframe()
+# 		parse_vmd_ikdispframe()
 #
 # write_vmd()
 # 	encode_vmd_header()
@@ -96,18 +102,28 @@ fmt_shadowframe = "I b f"
 fmt_ikdispframe = "I ? I"
 fmt_ikframe = "?"
 
+# size in bytes of one frame in each section that has fixed-size frames, used to skip over sections without reading them
+# (names are always 15 bytes, ikdisp frames are variable-size but they are the last section so they never need skipping)
+VMD_SECTION_FRAME_SIZE = {
+	"boneframes":   15 + struct.calcsize("<" + fmt_boneframe_no_interpcurve + fmt_boneframe_interpcurve_oneline * 4),
+	"morphframes":  15 + struct.calcsize("<" + fmt_morphframe),
+	"camframes":    struct.calcsize("<" + fmt_camframe),
+	"lightframes":  struct.calcsize("<" + fmt_lightframe),
+	"shadowframes": struct.calcsize("<" + fmt_shadowframe),
+}
+
 
 
 ########################################################################################################################
 # pipeline functions for READING
 ########################################################################################################################
 
-def parse_vmd_header(raw:bytearray, moreinfo:bool) -> vmdstruct.VmdHeader:
+def parse_vmd_header(cur:pack.BinaryCursor, moreinfo:bool) -> vmdstruct.VmdHeader:
 	############################
 	# unpack the header, get file version and model name
 	# version only affects the length of the model name text field, but i'll return it anyway
 	try:
-		header = pack.my_string_unpack(raw, L=30)
+		header = cur.read_vmd_string(30)
 	except Exception as e:
 		core.MY_PRINT_FUNC(e.__class__.__name__, e)
 		core.MY_PRINT_FUNC("section=header")
@@ -131,7 +147,7 @@ def parse_vmd_header(raw:bytearray, moreinfo:bool) -> vmdstruct.VmdHeader:
 		raise RuntimeError("ERR: found unsupported file version identifier string, '%s'" % header)
 	
 	try:
-		modelname = pack.my_string_unpack(raw, L=namelength)
+		modelname = cur.read_vmd_string(namelength)
 	except Exception as e:
 		core.MY_PRINT_FUNC(e.__class__.__name__, e)
 		core.MY_PRINT_FUNC("section=modelname")
@@ -142,27 +158,27 @@ def parse_vmd_header(raw:bytearray, moreinfo:bool) -> vmdstruct.VmdHeader:
 	
 	return vmdstruct.VmdHeader(version=version, modelname=modelname)
 
-def parse_vmd_boneframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdBoneFrame]:
+def parse_vmd_boneframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdBoneFrame]:
 	# get all the bone-frames, store in a list of lists
 	boneframe_list = []
 	# verify that there is enough file left to read a single number
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected boneframe_ct field but file ended unexpectedly! Assuming 0 boneframes and continuing...")
 		return boneframe_list
 
 	############################
 	# get the number of bone-frames
-	boneframe_ct = pack.my_unpack(fmt_number, raw)
+	boneframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of boneframes          = %d" % boneframe_ct)
 	for z in range(boneframe_ct):
 		try:
 			# unpack the bone-frame into variables
-			bname_str = pack.my_string_unpack(raw, L=15)
-			(f, xp, yp, zp, xrot_q, yrot_q, zrot_q, wrot_q) = pack.my_unpack(fmt_boneframe_no_interpcurve, raw)
+			bname_str = cur.read_vmd_string(15)
+			(f, xp, yp, zp, xrot_q, yrot_q, zrot_q, wrot_q) = cur.unpack(fmt_boneframe_no_interpcurve)
 			# break inter_curve into its individual pieces, knowing that the 3rd and 4th bytes in line1 are overwritten with phys
 			# therefore we need to get their data from line2 which is left-shifted by 1 byte, but otherwise a copy
 			(x_ax, y_ax, phys1, phys2, x_ay, y_ay, z_ay, r_ay, x_bx, y_bx, z_bx, r_bx, x_by, y_by, z_by, r_by,
-			 z_ax, r_ax) = pack.my_unpack(fmt_boneframe_interpcurve, raw)
+			 z_ax, r_ax) = cur.unpack(fmt_boneframe_interpcurve)
 			# convert the quaternion angles to euler angles
 			(xrot, yrot, zrot) = core.quaternion_to_euler([wrot_q, xrot_q, yrot_q, zrot_q])
 			# interpret the physics enable/disable bytes
@@ -189,7 +205,7 @@ def parse_vmd_boneframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdBoneF
 			)
 			boneframe_list.append(this_boneframe)
 			# display progress printouts
-			core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+			core.print_progress_oneline(cur.progress())
 		except Exception as e:
 			core.MY_PRINT_FUNC(e.__class__.__name__, e)
 			core.MY_PRINT_FUNC("frame=", z)
@@ -200,27 +216,27 @@ def parse_vmd_boneframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdBoneF
 	
 	return boneframe_list
 
-def parse_vmd_morphframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdMorphFrame]:
+def parse_vmd_morphframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdMorphFrame]:
 	# get all the morph-frames, store in a list of lists
 	morphframe_list = []
 	# is there enough file left to read a single number?
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected morphframe_ct field but file ended unexpectedly! Assuming 0 morphframes and continuing...")
 		return morphframe_list
 	
 	############################
 	# get the number of morph frames
-	morphframe_ct = pack.my_unpack(fmt_number, raw)
+	morphframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of morphframes         = %d" % morphframe_ct)
 	for z in range(morphframe_ct):
 		try:
 			# unpack the morphframe
-			mname_str = pack.my_string_unpack(raw, L=15)
-			(f, v) = pack.my_unpack(fmt_morphframe, raw)
+			mname_str = cur.read_vmd_string(15)
+			(f, v) = cur.unpack(fmt_morphframe)
 			morphframe_list.append(vmdstruct.VmdMorphFrame(name=mname_str, f=f, val=v))
 			
 			# display progress printouts
-			core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+			core.print_progress_oneline(cur.progress())
 		except Exception as e:
 			core.MY_PRINT_FUNC(e.__class__.__name__, e)
 			core.MY_PRINT_FUNC("frame=", z)
@@ -231,15 +247,15 @@ def parse_vmd_morphframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdMorp
 	
 	return morphframe_list
 
-def parse_vmd_camframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdCamFrame]:
+def parse_vmd_camframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdCamFrame]:
 	camframe_list = []
 	# is there enough file left to read a single number?
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected camframe_ct field but file ended unexpectedly! Assuming 0 camframes and continuing...")
 		return camframe_list
 	############################
 	# get the number of cam frames
-	camframe_ct = pack.my_unpack(fmt_number, raw)
+	camframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of camframes           = %d" % camframe_ct)
 	for z in range(camframe_ct):
 		try:
@@ -247,7 +263,7 @@ def parse_vmd_camframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdCamFra
 			(f, d, xp, yp, zp, xr, yr, zr,
 			 x_ax, x_bx, x_ay, x_by, y_ax, y_bx, y_ay, y_by, z_ax, z_bx, z_ay, z_by, r_ax, r_bx, r_ay, r_by,
 			 dist_ax, dist_bx, dist_ay, dist_by, ang_ax, ang_bx, ang_ay, ang_by,
-			 fov, per) = pack.my_unpack(fmt_camframe, raw)
+			 fov, per) = cur.unpack(fmt_camframe)
 			
 			rot_degrees = [math.degrees(j) for j in (xr,yr,zr)]  # angle comes in as radians, convert radians to degrees
 			this_camframe = vmdstruct.VmdCamFrame(f=f,
@@ -265,7 +281,7 @@ def parse_vmd_camframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdCamFra
 												  )
 			camframe_list.append(this_camframe)
 			# display progress printouts
-			core.print_progress_oneline(pack.UNPACKER_READFROM_BYTE / len(raw))
+			core.print_progress_oneline(cur.progress())
 		except Exception as e:
 			core.MY_PRINT_FUNC(e.__class__.__name__, e)
 			core.MY_PRINT_FUNC("frame=", z)
@@ -276,19 +292,19 @@ def parse_vmd_camframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdCamFra
 
 	return camframe_list
 
-def parse_vmd_lightframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdLightFrame]:
+def parse_vmd_lightframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdLightFrame]:
 	lightframe_list = []
 	# is there enough file left to read a single number?
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected lightframe_ct field but file ended unexpectedly! Assuming 0 lightframes and continuing...")
 		return lightframe_list
 	############################
 	# if it exists, get the number of lightframes
-	lightframe_ct = pack.my_unpack(fmt_number, raw)
+	lightframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of lightframes         = %d" % lightframe_ct)
 	for i in range(lightframe_ct):
 		try:
-			(f, r, g, b, x, y, z) = pack.my_unpack(fmt_lightframe, raw)
+			(f, r, g, b, x, y, z) = cur.unpack(fmt_lightframe)
 			# the r g b actually come back as floats [0.0 - 1.0]
 			lightframe_list.append(vmdstruct.VmdLightFrame(f=f,
 												 color=[r,g,b],
@@ -303,20 +319,20 @@ def parse_vmd_lightframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdLigh
 
 	return lightframe_list
 
-def parse_vmd_shadowframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdShadowFrame]:
+def parse_vmd_shadowframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdShadowFrame]:
 	shadowframe_list = []
 	# is there enough file left to read a single number?
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected shadowframe_ct field but file ended unexpectedly! Assuming 0 shadowframes and continuing...")
 		return shadowframe_list
 
 	############################
 	# if it exists, get the number of shadowframes
-	shadowframe_ct = pack.my_unpack(fmt_number, raw)
+	shadowframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of shadowframes        = %d" % shadowframe_ct)
 	for i in range(shadowframe_ct):
 		try:
-			(f, m, v) = pack.my_unpack(fmt_shadowframe, raw)
+			(f, m, v) = cur.unpack(fmt_shadowframe)
 			v = round(10000 - (v * 100000))
 			# stored as 0.0 to 0.1 ??? why would it use this range!? also its range-inverted
 			# [0,9999] -> [0.1, 0.0]
@@ -331,24 +347,24 @@ def parse_vmd_shadowframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdSha
 			raise RuntimeError()
 	return shadowframe_list
 
-def parse_vmd_ikdispframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdIkdispFrame]:
+def parse_vmd_ikdispframe(cur:pack.BinaryCursor, moreinfo:bool) -> List[vmdstruct.VmdIkdispFrame]:
 	ikdispframe_list = []
 	# is there enough file left to read a single number?
-	if (len(raw) - pack.UNPACKER_READFROM_BYTE) < struct.calcsize(fmt_number):
+	if cur.remaining() < struct.calcsize(fmt_number):
 		core.MY_PRINT_FUNC("Warning: expected ikdispframe_ct field but file ended unexpectedly! Assuming 0 ikdispframes and continuing...")
 		return ikdispframe_list
 
 	############################
 	# if it exists, get the number of ikdisp frames
-	ikdispframe_ct = pack.my_unpack(fmt_number, raw)
+	ikdispframe_ct = cur.unpack(fmt_number)
 	if moreinfo: core.MY_PRINT_FUNC("...# of ik/disp frames      = %d" % ikdispframe_ct)
 	for i in range(ikdispframe_ct):
 		try:
-			(f, disp, numbones) = pack.my_unpack(fmt_ikdispframe, raw)
+			(f, disp, numbones) = cur.unpack(fmt_ikdispframe)
 			ikbones = []
 			for j in range(numbones):
-				ikname_str = pack.my_string_unpack(raw, L=20)
-				enable = pack.my_unpack(fmt_ikframe, raw)
+				ikname_str = cur.read_vmd_string(20)
+				enable = cur.unpack(fmt_ikframe)
 				ikbones.append(vmdstruct.VmdIkbone(name=ikname_str, enable=enable))
 			ikdispframe_list.append(vmdstruct.VmdIkdispFrame(f=f, disp=disp, ikbones=ikbones))
 		except Exception as e:
@@ -360,6 +376,116 @@ def parse_vmd_ikdispframe(raw:bytearray, moreinfo:bool) -> List[vmdstruct.VmdIkd
 			raise RuntimeError()
 	return ikdispframe_list
 
+# numpy layouts of one boneframe/morphframe record, used by the columnar parsing/encoding
+# they must match the formats above, the names are always 15 bytes
+def _boneframe_dtype():
+	return np.dtype([("name", "u1", (15,)), ("f", "<u4"), ("pos", "<f4", (3,)), ("quat", "<f4", (4,)), ("interp", "i1", (64,))])
+def _morphframe_dtype():
+	return np.dtype([("name", "u1", (15,)), ("f", "<u4"), ("val", "<f4")])
+
+def _fix_nonfinite(arr, section: str) -> None:
+	"""
+	Columnar equivalent of the NaN/INF replacement that my_unpack does, modifies the float array in-place.
+	:param arr: numpy float array
+	:param section: name of the section, only used for the warning printout
+	"""
+	bad = ~np.isfinite(arr)
+	if bad.any():
+		core.MY_PRINT_FUNC("Warning: found %d NaN/INF in place of floats in the %s, replaced with 0.0 or +/- 999999.0" % (np.count_nonzero(bad), section))
+		np.nan_to_num(arr, copy=False, nan=0.0, posinf=999999.0, neginf=-999999.0)
+
+def _decode_name_column(cur: pack.BinaryCursor, raw_names) -> Tuple[List[str], "np.ndarray"]:
+	"""
+	Decode a column of fixed-length null-terminated names, decoding each unique name only once.
+	:param cur: BinaryCursor, provides the encoding and records any names that failed to decode
+	:param raw_names: (N,L) uint8 array, the raw name bytes
+	:return: tuple(list of unique names, (N,) int32 array of indices into that list)
+	"""
+	# blank out everything after the first null byte, it's just garbage that MMD leaves behind
+	after_null = np.cumsum(raw_names == 0, axis=1) > 0
+	clean = np.where(after_null, 0, raw_names).astype(np.uint8)
+	keys = clean.view("S%d" % raw_names.shape[1]).ravel()
+	uniq, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+	names = []
+	for b, c in zip(uniq.tolist(), counts.tolist()):
+		name, failed = pack._decode_bytes_with_escape(b, cur.encoding)
+		if failed:
+			cur.failed_decodes[name] += c
+		names.append(name)
+	return names, inverse.reshape(-1).astype(np.int32)
+
+def _read_records(cur: pack.BinaryCursor, dtype, count: int, section: str):
+	# read all the records of one section with one numpy call, and copy them out of the file buffer
+	try:
+		recs = np.frombuffer(cur.data, dtype=dtype, count=count, offset=cur.pos).copy()
+	except ValueError as e:
+		core.MY_PRINT_FUNC(e.__class__.__name__, e)
+		core.MY_PRINT_FUNC("totalframes=", count)
+		core.MY_PRINT_FUNC("section=%s" % section)
+		core.MY_PRINT_FUNC("Err: something went wrong while parsing, file is probably corrupt/malformed")
+		raise
+	cur.pos += count * dtype.itemsize
+	return recs
+
+def parse_vmd_boneframe_table(cur:pack.BinaryCursor, moreinfo:bool) -> vmdstruct.VmdBoneFrameTable:
+	# this reads exactly the same data as parse_vmd_boneframe(), but into a few numpy arrays instead of VmdBoneFrame
+	# objects. the quaternions are not converted to euler angles until they are needed.
+	dtype = _boneframe_dtype()
+	# verify that there is enough file left to read a single number
+	if cur.remaining() < struct.calcsize(fmt_number):
+		core.MY_PRINT_FUNC("Warning: expected boneframe_ct field but file ended unexpectedly! Assuming 0 boneframes and continuing...")
+		boneframe_ct = 0
+	else:
+		boneframe_ct = cur.unpack(fmt_number)
+	if moreinfo: core.MY_PRINT_FUNC("...# of boneframes          = %d" % boneframe_ct)
+	recs = _read_records(cur, dtype, boneframe_ct, "boneframe")
+	names, name_id = _decode_name_column(cur, recs["name"])
+	pos = recs["pos"].copy()
+	quat = recs["quat"].copy()
+	_fix_nonfinite(pos, "boneframes")
+	_fix_nonfinite(quat, "boneframes")
+	table = vmdstruct.VmdBoneFrameTable(names=names, name_id=name_id, f=recs["f"].astype(np.int64), pos=pos,
+										quat=quat, interp=recs["interp"].copy())
+	_, unusual = table.phys_off_unusual()
+	if unusual.any():
+		core.MY_PRINT_FUNC("Warning: found unusual values where I expected to find physics enable/disable on %d frames! Assuming this means physics off" % np.count_nonzero(unusual))
+	# display progress printouts
+	core.print_progress_oneline(cur.progress())
+	return table
+
+def parse_vmd_morphframe_table(cur:pack.BinaryCursor, moreinfo:bool) -> vmdstruct.VmdMorphFrameTable:
+	# this reads exactly the same data as parse_vmd_morphframe(), but into a few numpy arrays
+	dtype = _morphframe_dtype()
+	# verify that there is enough file left to read a single number
+	if cur.remaining() < struct.calcsize(fmt_number):
+		core.MY_PRINT_FUNC("Warning: expected morphframe_ct field but file ended unexpectedly! Assuming 0 morphframes and continuing...")
+		morphframe_ct = 0
+	else:
+		morphframe_ct = cur.unpack(fmt_number)
+	if moreinfo: core.MY_PRINT_FUNC("...# of morphframes         = %d" % morphframe_ct)
+	recs = _read_records(cur, dtype, morphframe_ct, "morphframe")
+	names, name_id = _decode_name_column(cur, recs["name"])
+	val = recs["val"].copy()
+	_fix_nonfinite(val, "morphframes")
+	# display progress printouts
+	core.print_progress_oneline(cur.progress())
+	return vmdstruct.VmdMorphFrameTable(names=names, name_id=name_id, f=recs["f"].astype(np.int64), val=val)
+
+def skip_vmd_section(cur:pack.BinaryCursor, section:str) -> None:
+	"""
+	Step the cursor over one entire section of fixed-size frames without decoding any of it. Because the VMD file is
+	memory-mapped when reading, the bytes that are skipped are never even loaded from disk.
+	
+	:param cur: BinaryCursor positioned at the start of the section (the frame count)
+	:param section: name of the section, one of the keys of VMD_SECTION_FRAME_SIZE
+	"""
+	# is there enough file left to read a single number?
+	if cur.remaining() < struct.calcsize(fmt_number):
+		return
+	frame_ct = cur.unpack(fmt_number)
+	cur.pos = min(cur.pos + (frame_ct * VMD_SECTION_FRAME_SIZE[section]), len(cur.data))
+	return
+
 ########################################################################################################################
 # pipeline functions for WRITING
 ########################################################################################################################
@@ -371,11 +497,11 @@ def encode_vmd_header(nice: vmdstruct.VmdHeader, moreinfo:bool) -> bytearray:
 	# header data
 	# first, version: if ver==1, then use "Vocaloid Motion Data file", if ver==2, then use "Vocaloid Motion Data 0002"
 	if nice.version == 2:
-		output += pack.my_string_pack("Vocaloid Motion Data 0002", L=30)
-		output += pack.my_string_pack(nice.modelname, L=20)
+		output += pack.my_string_pack("Vocaloid Motion Data 0002", L=30, encoding="shift_jis")
+		output += pack.my_string_pack(nice.modelname, L=20, encoding="shift_jis")
 	elif nice.version == 1:
-		output += pack.my_string_pack("Vocaloid Motion Data file", L=30)
-		output += pack.my_string_pack(nice.modelname, L=10)
+		output += pack.my_string_pack("Vocaloid Motion Data file", L=30, encoding="shift_jis")
+		output += pack.my_string_pack(nice.modelname, L=10, encoding="shift_jis")
 	else:
 		raise RuntimeError("ERR: unsupported VMD version value", nice.version)
 	
@@ -404,7 +530,7 @@ def encode_vmd_boneframe(nice:List[vmdstruct.VmdBoneFrame], moreinfo:bool) -> by
 		interp_list = x_ax, y_ax, z_ax, r_ax, x_ay, y_ay, z_ay, r_ay, x_bx, y_bx, z_bx, r_bx, x_by, y_by, z_by, r_by
 		
 		try:
-			output += pack.my_string_pack(frame.name, L=15)
+			output += pack.my_string_pack(frame.name, L=15, encoding="shift_jis")
 			# now encode/pack/append the non-interp, non-phys portion
 			output += pack.my_pack(fmt_boneframe_no_interpcurve, [frame.f, *frame.pos, *quat])
 			# pack this one line of interpolation data, DO NOT APPEND ONTO OUTPUT YET!
@@ -433,6 +559,47 @@ def encode_vmd_boneframe(nice:List[vmdstruct.VmdBoneFrame], moreinfo:bool) -> by
 
 	return output
 
+def _encode_name_column(table: vmdstruct.VmdFrameTable, L: int):
+	# encode each unique name only once, then pick out the right one for each frame
+	if len(table.names) == 0:
+		return np.zeros((0, L), dtype=np.uint8)
+	encoded = np.frombuffer(b"".join(bytes(pack.my_string_pack(n, L=L, encoding="shift_jis")) for n in table.names), dtype=np.uint8)
+	return encoded.reshape(-1, L)[table.name_id]
+
+def _check_frame_numbers(table: vmdstruct.VmdFrameTable, section: str) -> None:
+	if len(table) and (table.f.min() < 0 or table.f.max() > 0xFFFFFFFF):
+		core.MY_PRINT_FUNC("section=%s" % section)
+		core.MY_PRINT_FUNC("Err: frame number out of range, must be 0 to %d" % 0xFFFFFFFF)
+		raise ValueError("frame number out of range in %s" % section)
+
+def encode_vmd_boneframe_table(table: vmdstruct.VmdBoneFrameTable, moreinfo:bool) -> bytearray:
+	# bulk version of encode_vmd_boneframe(), builds all the records with a few numpy operations
+	# the quaternions are written exactly as they are stored, without going to euler angles and back
+	if moreinfo: core.MY_PRINT_FUNC("...# of boneframes          = %d" % len(table))
+	_check_frame_numbers(table, "boneframe")
+	recs = np.zeros(len(table), dtype=_boneframe_dtype())
+	recs["name"] = _encode_name_column(table, 15)
+	recs["f"] = table.f
+	recs["pos"] = table.pos
+	recs["quat"] = table.quat
+	recs["interp"] = table.encoded_interp()
+	output = bytearray(pack.my_pack(fmt_number, len(table)))
+	output += recs.tobytes()
+	core.print_progress_oneline(ENCODE_PERCENT_BONE)
+	return output
+
+def encode_vmd_morphframe_table(table: vmdstruct.VmdMorphFrameTable, moreinfo:bool) -> bytearray:
+	# bulk version of encode_vmd_morphframe()
+	if moreinfo: core.MY_PRINT_FUNC("...# of morphframes         = %d" % len(table))
+	_check_frame_numbers(table, "morphframe")
+	recs = np.zeros(len(table), dtype=_morphframe_dtype())
+	recs["name"] = _encode_name_column(table, 15)
+	recs["f"] = table.f
+	recs["val"] = table.val
+	output = bytearray(pack.my_pack(fmt_number, len(table)))
+	output += recs.tobytes()
+	return output
+
 def encode_vmd_morphframe(nice:List[vmdstruct.VmdMorphFrame], moreinfo:bool) -> bytearray:
 	output = bytearray()
 	###########################################
@@ -443,7 +610,7 @@ def encode_vmd_morphframe(nice:List[vmdstruct.VmdMorphFrame], moreinfo:bool) ->
 	# then, all the actual frames
 	for i, frame in enumerate(nice):
 		try:
-			output += pack.my_string_pack(frame.name, L=15)
+			output += pack.my_string_pack(frame.name, L=15, encoding="shift_jis")
 			output += pack.my_pack(fmt_morphframe, [frame.f, frame.val])
 		except Exception as e:
 			core.MY_PRINT_FUNC(e.__class__.__name__, e)
@@ -550,7 +717,7 @@ def encode_vmd_ikdispframe(nice:List[vmdstruct.VmdIkdispFrame], moreinfo:bool) -
 			output += pack.my_pack(fmt_ikdispframe, [frame.f, frame.disp, len(frame.ikbones)])
 			# for each ikbone listed in the template:
 			for z in frame.ikbones:
-				output += pack.my_string_pack(z.name, L=20)
+				output += pack.my_string_pack(z.name, L=20, encoding="shift_jis")
 				output += pack.my_pack(fmt_ikframe, z.enable)
 		except Exception as e:
 			core.MY_PRINT_FUNC(e.__class__.__name__, e)
@@ -567,16 +734,56 @@ def encode_vmd_ikdispframe(nice:List[vmdstruct.VmdIkdispFrame], moreinfo:bool) -
 # primary functions: read_vmd() and write_vmd()
 ########################################################################################################################
 
-def read_vmd(vmd_filename: str, moreinfo=False) -> vmdstruct.Vmd:
+def read_vmd(vmd_filename: str, moreinfo=False, sections=None, columnar=False) -> vmdstruct.Vmd:
+	"""
+	Read a VMD file from disk and parse it into a Vmd object.
+	The file is memory-mapped and parsed in place, it is never copied into memory as a whole.
+	
+	:param vmd_filename: filepath to read
+	:param moreinfo: if True, print some extra info
+	:param sections: optional, iterable of section names ("boneframes", "morphframes", "camframes", etc). if given,
+	only those sections are parsed and the others are left as empty lists. sections that aren't wanted are skipped
+	without being read from disk, and nothing after the last wanted section is read at all.
+	:param columnar: if True and numpy is installed, the boneframes and morphframes are decoded in bulk into
+	VmdFrameTable objects, which is MUCH faster for big motions. They are automatically converted to frame objects the
+	first time that "Vmd.boneframes" or "Vmd.morphframes" is used, so scripts that don't know about this don't need
+	to change.
+	:return: Vmd object
+	"""
 	vmd_filename_clean = core.filepath_splitdir(vmd_filename)[1]
-	# creates object 	(header, boneframe_list, morphframe_list, camframe_list, lightframe_list, shadowframe_list, ikdispframe_list)
 	# assumes the calling function already verified correct file extension
 	core.MY_PRINT_FUNC("Begin reading VMD file '%s'" % vmd_filename_clean)
-	vmd_bytes = io.read_binfile_to_bytes(vmd_filename)
-	core.MY_PRINT_FUNC("...total size   = %s" % core.prettyprint_file_size(len(vmd_bytes)))
-	core.MY_PRINT_FUNC("Begin parsing VMD file '%s'" % vmd_filename_clean)
-	pack.reset_unpack()
-	pack.set_encoding("shift_jis")
+	with io.open_binfile_mmap(vmd_filename) as vmd_bytes:
+		core.MY_PRINT_FUNC("...total size   = %s" % core.prettyprint_file_size(len(vmd_bytes)))
+		core.MY_PRINT_FUNC("Begin parsing VMD file '%s'" % vmd_filename_clean)
+		vmd = parse_vmd(vmd_bytes, moreinfo=moreinfo, sections=sections, columnar=columnar)
+	core.MY_PRINT_FUNC("Done parsing VMD file '%s'" % vmd_filename_clean)
+	return vmd
+
+def read_vmd_header(vmd_filename: str) -> vmdstruct.VmdHeader:
+	"""
+	Read ONLY the header of a VMD file: the version and the model name. The file is memory-mapped, so the rest of it
+	is never loaded from disk.
+	
+	:param vmd_filename: filepath to read
+	:return: VmdHeader object
+	"""
+	with io.open_binfile_mmap(vmd_filename, quiet=True) as vmd_bytes:
+		return parse_vmd_header(pack.BinaryCursor(vmd_bytes, encoding="shift_jis"), False)
+
+def parse_vmd(vmd_bytes, moreinfo=False, sections=None, columnar=False) -> vmdstruct.Vmd:
+	"""
+	Parse a VMD file that is already in memory (or memory-mapped) into a Vmd object.
+	Everything in the returned object is copied out of vmd_bytes, so vmd_bytes can be released afterwards.
+	
+	:param vmd_bytes: bytearray, bytes, or memoryview holding the whole VMD file
+	:param moreinfo: if True, print some extra info
+	:param sections: optional, iterable of section names to parse, see read_vmd()
+	:param columnar: if True, decode the boneframes and morphframes into VmdFrameTable objects, see read_vmd()
+	:return: Vmd object
+	"""
+	# all parsing state lives in this cursor, nothing is stored in globals
+	cur = pack.BinaryCursor(vmd_bytes, encoding="shift_jis")
 	
 	# !!!! this does eliminate all the garbage data MMD used to pack strings so this isnt 100% reversable !!!
 	# read the bytes object and return all the data from teh VMD broken up into a list of lists
@@ -584,20 +791,44 @@ def read_vmd(vmd_filename: str, moreinfo=False) -> vmdstruct.Vmd:
 	# (quaternion to euler, radians to degrees, floats to ints, etc)
 	# also generate the bonedict and morphdict
 	
+	section_parsers = [("boneframes",   parse_vmd_boneframe),
+					   ("morphframes",  parse_vmd_morphframe),
+					   ("camframes",    parse_vmd_camframe),
+					   ("lightframes",  parse_vmd_lightframe),
+					   ("shadowframes", parse_vmd_shadowframe),
+					   ("ikdispframes", parse_vmd_ikdispframe)]
+	if columnar and np is None:
+		core.MY_PRINT_FUNC("Warning: columnar VMD parsing needs the 'numpy' library, falling back to the normal method")
+		columnar = False
+	if columnar:
+		section_parsers[0] = ("boneframes", parse_vmd_boneframe_table)
+		section_parsers[1] = ("morphframes", parse_vmd_morphframe_table)
+	if sections is None:
+		wanted = [name for name, _ in section_parsers]
+	else:
+		wanted = list(sections)
+		for name in wanted:
+			if name not in dict(section_parsers):
+				core.MY_PRINT_FUNC("Err: unknown VMD section name '%s', must be one of %s" % (name, [n for n,_ in section_parsers]))
+				raise ValueError("unknown VMD section name '%s'" % name)
+	
 	core.print_progress_oneline(0)
-	A = parse_vmd_header(vmd_bytes, moreinfo)
-	B = parse_vmd_boneframe(vmd_bytes, moreinfo)
-	C = parse_vmd_morphframe(vmd_bytes, moreinfo)
-	D = parse_vmd_camframe(vmd_bytes, moreinfo)
-	E = parse_vmd_lightframe(vmd_bytes, moreinfo)
-	F = parse_vmd_shadowframe(vmd_bytes, moreinfo)
-	G = parse_vmd_ikdispframe(vmd_bytes, moreinfo)
-	if moreinfo: pack.print_failed_decodes()
+	A = parse_vmd_header(cur, moreinfo)
+	results = {}
+	for name, parser in section_parsers:
+		if len(results) == len(set(wanted)):
+			# got everything that was asked for, don't bother with the rest of the file
+			break
+		if name in wanted:
+			results[name] = parser(cur, moreinfo)
+		else:
+			skip_vmd_section(cur, name)
+	if moreinfo: cur.print_failed_decodes()
 	
-	bytes_remain = len(vmd_bytes) - pack.UNPACKER_READFROM_BYTE
-	if bytes_remain != 0:
+	bytes_remain = cur.remaining()
+	if len(results) == len(section_parsers) and bytes_remain != 0:
 		# padding with my SIGNATURE is acceptable, anything else is strange
-		leftover = vmd_bytes[pack.UNPACKER_READFROM_BYTE:]
+		leftover = bytes(vmd_bytes[cur.pos:])
 		if leftover == bytes(SIGNATURE, encoding="shift_jis"):
 			core.MY_PRINT_FUNC("...note: this VMD file was previously modified with this tool!")
 		else:
@@ -605,21 +836,21 @@ def read_vmd(vmd_filename: str, moreinfo=False) -> vmdstruct.Vmd:
 			core.MY_PRINT_FUNC("The file may be corrupt or maybe it contains unknown/unsupported data formats")
 			core.MY_PRINT_FUNC(leftover)
 	
-	core.MY_PRINT_FUNC("Done parsing VMD file '%s'" % vmd_filename_clean)
-	
-	vmd = vmdstruct.Vmd(A, B, C, D, E, F, G)
+	vmd = vmdstruct.Vmd(A, *[results.get(name, []) for name, _ in section_parsers])
 	# this is where sorting happens, if it happens
 	if GUARANTEE_FRAMES_SORTED:
-		# bones & morphs: primarily sorted by NAME, with FRAME# as tiebreaker. the second sort is the primary one.
-		vmd.boneframes.sort(key=lambda x: x.f)  # frame#
-		vmd.boneframes.sort(key=lambda x: x.name)  # name
-		vmd.morphframes.sort(key=lambda x: x.f)
-		vmd.morphframes.sort(key=lambda x: x.name)
-		# all of these only sort by frame number.
-		vmd.camframes.sort(key=lambda x: x.f)  # frame#
-		vmd.lightframes.sort(key=lambda x: x.f)
-		vmd.shadowframes.sort(key=lambda x: x.f)
-		vmd.ikdispframes.sort(key=lambda x: x.f)
+		# bones & morphs: sorted by NAME, with FRAME# as tiebreaker. everything else is only sorted by frame number.
+		# each list is sorted only once, and it remembers that it is sorted so write_vmd() won't need to sort it again
+		if vmd.bone_table is not None:
+			vmd.boneframes = vmd.bone_table.take(vmd.bone_table.sort_order())
+		else:
+			vmd.boneframes.sort_frames()
+		if vmd.morph_table is not None:
+			vmd.morphframes = vmd.morph_table.take(vmd.morph_table.sort_order())
+		else:
+			vmd.morphframes.sort_frames()
+		for frames in (vmd.camframes, vmd.lightframes, vmd.shadowframes, vmd.ikdispframes):
+			frames.sort_frames()
 	return vmd
 
 def write_vmd(vmd_filename: str, vmd: vmdstruct.Vmd, moreinfo=False):
@@ -631,27 +862,35 @@ def write_vmd(vmd_filename: str, vmd: vmdstruct.Vmd, moreinfo=False):
 	
 	# assumes the calling function already verified correct file extension
 	core.MY_PRINT_FUNC("Begin encoding VMD file '%s'" % vmd_filename_clean)
-	pack.set_encoding("shift_jis")
+	# the strings are all encoded with an explicit "shift_jis", so this doesn't depend on pack.set_encoding()
 	
 	core.print_progress_oneline(0)
+	# if the bones/morphs are still in table form, encode them straight from the tables
+	bones = vmd.bone_table if vmd.bone_table is not None else vmd.boneframes
+	morphs = vmd.morph_table if vmd.morph_table is not None else vmd.morphframes
+	others = [vmd.camframes, vmd.lightframes, vmd.shadowframes, vmd.ikdispframes]
 	# this is where sorting happens, if it happens
+	# the frames are written in sorted order but the input Vmd object is not changed
 	if GUARANTEE_FRAMES_SORTED:
-		# bones & morphs: primarily sorted by NAME, with FRAME# as tiebreaker. the second sort is the primary one.
-		vmd.boneframes.sort(key=lambda x: x.f)  # frame#
-		vmd.boneframes.sort(key=lambda x: x.name)  # name
-		vmd.morphframes.sort(key=lambda x: x.f)
-		vmd.morphframes.sort(key=lambda x: x.name)
-		# all of these only sort by frame number.
-		vmd.camframes.sort(key=lambda x: x.f)  # frame#
-		vmd.lightframes.sort(key=lambda x: x.f)
-		vmd.shadowframes.sort(key=lambda x: x.f)
-		vmd.ikdispframes.sort(key=lambda x: x.f)
+		# bones & morphs: sorted by NAME, with FRAME# as tiebreaker. everything else is only sorted by frame number.
+		# if the frame lists already know their sorted order (because of read_vmd() or an earlier write) it is reused,
+		# after a quick check that it is still correct
+		if isinstance(bones, vmdstruct.VmdBoneFrameTable):
+			bones = bones.take(bones.sort_order())
+		else:
+			bones = bones.sorted_frames()
+		if isinstance(morphs, vmdstruct.VmdMorphFrameTable):
+			morphs = morphs.take(morphs.sort_order())
+		else:
+			morphs = morphs.sorted_frames()
+		others = [frames.sorted_frames() for frames in others]
+	camframes, lightframes, shadowframes, ikdispframes = others
 	
 	global ENCODE_PERCENT_BONE
 	global ENCODE_PERCENT_MORPH
 	# cam is not included cuz a file contains only bone+morph OR cam
-	total_bone = len(vmd.boneframes) * ENCODE_FACTOR_BONE
-	total_morph = len(vmd.morphframes) * ENCODE_FACTOR_MORPH
+	total_bone = len(bones) * ENCODE_FACTOR_BONE
+	total_morph = len(morphs) * ENCODE_FACTOR_MORPH
 	ALLENCODE = total_bone + total_morph
 	if ALLENCODE == 0: ALLENCODE = 1  # just a bandaid to avoid zero-div error when writing empty VMD
 	ENCODE_PERCENT_BONE = total_bone / ALLENCODE
@@ -662,12 +901,18 @@ def write_vmd(vmd_filename: str, vmd: vmdstruct.Vmd, moreinfo=False):
 	output_bytes = bytearray()
 	
 	output_bytes += encode_vmd_header(vmd.header, moreinfo)
-	output_bytes += encode_vmd_boneframe(vmd.boneframes, moreinfo)
-	output_bytes += encode_vmd_morphframe(vmd.morphframes, moreinfo)
-	output_bytes += encode_vmd_camframe(vmd.camframes, moreinfo)
-	output_bytes += encode_vmd_lightframe(vmd.lightframes, moreinfo)
-	output_bytes += encode_vmd_shadowframe(vmd.shadowframes, moreinfo)
-	output_bytes += encode_vmd_ikdispframe(vmd.ikdispframes, moreinfo)
+	if isinstance(bones, vmdstruct.VmdBoneFrameTable):
+		output_bytes += encode_vmd_boneframe_table(bones, moreinfo)
+	else:
+		output_bytes += encode_vmd_boneframe(bones, moreinfo)
+	if isinstance(morphs, vmdstruct.VmdMorphFrameTable):
+		output_bytes += encode_vmd_morphframe_table(morphs, moreinfo)
+	else:
+		output_bytes += encode_vmd_morphframe(morphs, moreinfo)
+	output_bytes += encode_vmd_camframe(camframes, moreinfo)
+	output_bytes += encode_vmd_lightframe(lightframes, moreinfo)
+	output_bytes += encode_vmd_shadowframe(shadowframes, moreinfo)
+	output_bytes += encode_vmd_ikdispframe(ikdispframes, moreinfo)
 	
 	# done encoding!!
 	
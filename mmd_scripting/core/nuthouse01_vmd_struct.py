@@ -1,18 +1,25 @@
 import abc
 import copy
 import enum
+import gc
+import math
 import sys
 import traceback
 from typing import List, Union
 
 import mmd_scripting.core.nuthouse01_core as core
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
-__all__ = ['ShadowMode', 'Vmd', 'VmdBoneFrame', 'VmdCamFrame', 'VmdHeader', 'VmdIkbone', 'VmdIkdispFrame',
-		   'VmdLightFrame', 'VmdMorphFrame', 'VmdShadowFrame']
+__all__ = ['ShadowMode', 'Vmd', 'VmdBoneFrame', 'VmdBoneFrameTable', 'VmdCamFrame', 'VmdFrameList', 'VmdFrameTable',
+		   'VmdHeader', 'VmdIkbone', 'VmdIkdispFrame', 'VmdLightFrame', 'VmdMorphFrame', 'VmdMorphFrameTable', 'VmdShadowFrame']
 
 # this is an abstract base class that all the PMX classes inherit
 # this lets them all get the __str__ method and forces them all to implement list()
@@ -216,6 +223,255 @@ class VmdMorphFrame(_BaseVmd):
 		# val: the value of the morph, float, normally 0 to 1 but can technically be anything
 		assert isinstance(self.val, (int,float))
 
+def quaternion_to_euler_array(quat):
+	"""
+	Vectorized version of core.quaternion_to_euler(), does the exact same math on every row at once.
+	Requires numpy.
+	
+	:param quat: (N,4) float array, W X Y Z quaternions
+	:return: (N,3) float64 array, X Y Z angles in degrees
+	"""
+	quat = np.asarray(quat, dtype=np.float64)
+	w, x, y, z = quat[:, 0], quat[:, 1], quat[:, 2], quat[:, 3]
+	# pitch (y-axis rotation)
+	pitch = -np.arctan2(2 * ((w * y) + (x * z)), 1 - (2 * ((x ** 2) + (y ** 2))))
+	# yaw (z-axis rotation)
+	yaw = np.arctan2(2 * ((-w * z) - (x * y)), 1 - (2 * ((x ** 2) + (z ** 2))))
+	# roll (x-axis rotation), use 90 degrees if out of range
+	sinp = 2 * ((z * y) - (w * x))
+	roll = -np.arcsin(np.clip(sinp, -1.0, 1.0))
+	roll[sinp >= 1.0] = -math.pi / 2
+	roll[sinp <= -1.0] = math.pi / 2
+	# fixing the x rotation, part 1
+	fix = (x ** 2 > 0.5) | (w < 0)
+	roll = np.where(fix & (x < 0), -math.pi - roll, roll)
+	roll = np.where(fix & ~(x < 0), (math.pi * np.copysign(1, w)) - roll, roll)
+	# fixing the x rotation, part 2
+	roll = np.where(roll > (math.pi / 2), math.pi - roll, np.where(roll < -(math.pi / 2), -math.pi - roll, roll))
+	return np.degrees(np.stack([roll, pitch, yaw], axis=1))
+
+def euler_to_quaternion_array(euler):
+	"""
+	Vectorized version of core.euler_to_quaternion(), does the exact same math on every row at once.
+	Requires numpy.
+	
+	:param euler: (N,3) float array, X Y Z angles in degrees
+	:return: (N,4) float64 array, W X Y Z quaternions
+	"""
+	half = np.radians(np.asarray(euler, dtype=np.float64)) * 0.5
+	sx, sy, sz = np.sin(half[:, 0]), np.sin(half[:, 1]), np.sin(half[:, 2])
+	cx, cy, cz = np.cos(half[:, 0]), np.cos(half[:, 1]), np.cos(half[:, 2])
+	w = (cz * cy * cx) + (sz * sy * sx)
+	x = (cz * cy * sx) + (sz * sy * cx)
+	y = (sz * cy * sx) - (cz * sy * cx)
+	z = (cz * sy * sx) - (sz * cy * cx)
+	return np.stack([w, x, y, z], axis=1)
+
+# the boneframe interpolation block is 64 bytes: 4 copies of the same 16 bytes, each shifted left by 1 more byte.
+# bytes 2 and 3 of the first copy are overwritten by the physics on/off flag, so their true values are read from the
+# second copy instead. this is where the "one line" of 16 interpolation values lives within the block:
+# x_ax, y_ax, z_ax, r_ax, x_ay, y_ay, z_ay, r_ay, x_bx, y_bx, z_bx, r_bx, x_by, y_by, z_by, r_by
+_INTERP_ONELINE_IDX = [0, 1, 17, 18] + list(range(4, 16))
+
+class VmdFrameTable(abc.ABC):
+	"""
+	Alternate storage for an entire boneframe or morphframe section, where each field is one numpy array with one row
+	per frame. Each unique name is stored once in "names" and every frame refers to its name by index with "name_id".
+	This is only created by the parser when it is asked to read frames in "columnar" mode, and it is converted into a
+	normal list of frame objects the first time that anything touches "Vmd.boneframes" or "Vmd.morphframes".
+	Requires numpy.
+	"""
+	# names of the per-frame array fields, set by each subclass
+	_fields = ("name_id", "f")
+	def __init__(self,
+				 names: List[str],	# list of unique names
+				 name_id,			# (N,) int32, index into names
+				 f,					# (N,) int64, frame number
+				 ):
+		self.names = names
+		self.name_id = name_id
+		self.f = f
+	def __len__(self) -> int:
+		return len(self.f)
+	def frame_names(self) -> List[str]:
+		"""
+		:return: list with the name of each frame
+		"""
+		names = self.names
+		return [names[i] for i in self.name_id.tolist()]
+	def sort_order(self):
+		"""
+		Find the order that sorts the frames by name and then by frame number, the same order that read_vmd/write_vmd
+		use when GUARANTEE_FRAMES_SORTED is on. The sort is stable.
+		:return: (N,) int array of frame indices, pass it to take()
+		"""
+		# rank of each name when the names are sorted as strings
+		rank = np.empty(len(self.names), dtype=np.int64)
+		rank[sorted(range(len(self.names)), key=self.names.__getitem__)] = np.arange(len(self.names))
+		return np.lexsort((self.f, rank[self.name_id]))
+	def take(self, order):
+		"""
+		Create a new table holding the frames at the given indices, in that order. Use this to sort or filter.
+		:param order: numpy int array or bool mask of frames to keep
+		:return: new table of the same type, the name list is shared
+		"""
+		kwargs = {k: getattr(self, k)[order] for k in self._fields}
+		return self.__class__(names=self.names, **kwargs)
+	def to_frames(self) -> list:
+		"""
+		Build the list of frame objects that the normal parser would have returned for the same data.
+		:return: list of VmdBoneFrame or VmdMorphFrame objects
+		"""
+		# this creates millions of small lists, and the garbage collector would otherwise repeatedly scan them all for
+		# reference cycles while they are being built even though they cannot possibly contain any
+		gc_was_enabled = gc.isenabled()
+		gc.disable()
+		try:
+			return self._to_frames()
+		finally:
+			if gc_was_enabled: gc.enable()
+	@abc.abstractmethod
+	def _to_frames(self) -> list: pass
+	@staticmethod
+	def _build_name_table(frames: list):
+		# unique names in order of first appearance, and the index of each frame's name
+		lookup = {}
+		ids = [lookup.setdefault(frame.name, len(lookup)) for frame in frames]
+		return list(lookup.keys()), np.array(ids, dtype=np.int32)
+
+class VmdBoneFrameTable(VmdFrameTable):
+	"""
+	VmdFrameTable for boneframes. The rotation is kept as the raw quaternion from the file and is only converted to
+	euler angles when asked, and the interpolation block is kept as the raw 64 bytes from the file.
+	"""
+	_fields = ("name_id", "f", "pos", "quat", "interp")
+	def __init__(self,
+				 names: List[str],	# list of unique names
+				 name_id,			# (N,) int32, index into names
+				 f,					# (N,) int64, frame number
+				 pos,				# (N,3) float32, X Y Z
+				 quat,				# (N,4) float32, X Y Z W quaternion, in the order it is stored in the file
+				 interp,			# (N,64) int8, raw interpolation block including the physics on/off bytes
+				 ):
+		super().__init__(names, name_id, f)
+		self.pos = pos
+		self.quat = quat
+		self.interp = interp
+	def rot_euler(self):
+		"""
+		:return: (N,3) float64 array, the rotation of each frame as X Y Z euler angles in degrees, same as VmdBoneFrame.rot
+		"""
+		return quaternion_to_euler_array(self.quat[:, [3, 0, 1, 2]])
+	def set_rot_euler(self, euler) -> None:
+		"""
+		Overwrite the rotation of every frame.
+		:param euler: (N,3) float array, X Y Z euler angles in degrees
+		"""
+		self.quat = euler_to_quaternion_array(euler)[:, [1, 2, 3, 0]].astype(np.float32)
+	def interp_oneline(self):
+		"""
+		:return: (N,16) int8 array, the 16 interpolation values of each frame (see _INTERP_ONELINE_IDX for order)
+		"""
+		return self.interp[:, _INTERP_ONELINE_IDX]
+	def phys_off_unusual(self):
+		"""
+		Interpret the physics on/off bytes of each frame, the same way the normal parser does.
+		:return: tuple(phys_off, unusual): both (N,) bool arrays, "unusual" marks frames with unrecognized values which
+		are treated as physics off
+		"""
+		phys = self.interp[:, 2:4]
+		oneline = self.interp[:, 17:19]
+		off = (phys[:, 0] == 99) & (phys[:, 1] == 15)
+		on = np.all(phys == oneline, axis=1) | np.all(phys == 0, axis=1)
+		unusual = ~(off | on)
+		return ~on, unusual
+	def encoded_interp(self):
+		"""
+		Rebuild the 64-byte interpolation blocks the same way that write_vmd does for VmdBoneFrame objects: the 4
+		shifted copies of the 16 values, with the physics flag written over bytes 2 and 3.
+		:return: (N,64) int8 array
+		"""
+		line = self.interp_oneline()
+		out = np.zeros((len(self), 64), dtype=np.int8)
+		out[:, 0:16] = line
+		out[:, 16:31] = line[:, 1:]
+		out[:, 32:46] = line[:, 2:]
+		out[:, 48:61] = line[:, 3:]
+		phys_off, _ = self.phys_off_unusual()
+		out[:, 2] = np.where(phys_off, 99, 0)
+		out[:, 3] = np.where(phys_off, 15, 0)
+		return out
+	def _to_frames(self) -> List[VmdBoneFrame]:
+		# tolist() turns everything into native python ints & floats in one shot, which is much faster than indexing
+		names = self.frame_names()
+		f = self.f.tolist()
+		pos = self.pos.tolist()
+		rot = self.rot_euler().tolist()
+		phys_off = self.phys_off_unusual()[0].tolist()
+		line = self.interp_oneline().tolist()
+		retme = []
+		for d in range(len(f)):
+			l = line[d]
+			retme.append(VmdBoneFrame(name=names[d], f=f[d], pos=pos[d], rot=rot[d], phys_off=phys_off[d],
+									  interp_x=[l[0], l[4], l[8], l[12]],
+									  interp_y=[l[1], l[5], l[9], l[13]],
+									  interp_z=[l[2], l[6], l[10], l[14]],
+									  interp_r=[l[3], l[7], l[11], l[15]]))
+		return retme
+	@classmethod
+	def from_frames(cls, frames: List[VmdBoneFrame]) -> 'VmdBoneFrameTable':
+		"""
+		Build a table from a list of VmdBoneFrame objects.
+		:param frames: list of VmdBoneFrame objects
+		:return: VmdBoneFrameTable
+		"""
+		names, name_id = cls._build_name_table(frames)
+		line = np.array([[*fr.interp_x, *fr.interp_y, *fr.interp_z, *fr.interp_r] for fr in frames], dtype=np.int8).reshape(-1, 4, 4)
+		# reorder from [channel][point] to the oneline order, which is [point][channel]
+		line = line.transpose(0, 2, 1).reshape(-1, 16)
+		interp = np.zeros((len(frames), 64), dtype=np.int8)
+		interp[:, _INTERP_ONELINE_IDX] = line
+		phys_off = np.array([bool(fr.phys_off) for fr in frames], dtype=bool)
+		interp[:, 2] = np.where(phys_off, 99, 0)
+		interp[:, 3] = np.where(phys_off, 15, 0)
+		retme = cls(names=names, name_id=name_id,
+					f=np.array([fr.f for fr in frames], dtype=np.int64),
+					pos=np.array([fr.pos for fr in frames], dtype=np.float32).reshape(-1, 3),
+					quat=np.zeros((len(frames), 4), dtype=np.float32),
+					interp=interp)
+		retme.set_rot_euler(np.array([fr.rot for fr in frames], dtype=np.float64).reshape(-1, 3))
+		return retme
+
+class VmdMorphFrameTable(VmdFrameTable):
+	"""
+	VmdFrameTable for morphframes.
+	"""
+	_fields = ("name_id", "f", "val")
+	def __init__(self,
+				 names: List[str],	# list of unique names
+				 name_id,			# (N,) int32, index into names
+				 f,					# (N,) int64, frame number
+				 val,				# (N,) float32, morph value
+				 ):
+		super().__init__(names, name_id, f)
+		self.val = val
+	def _to_frames(self) -> List[VmdMorphFrame]:
+		names = self.frame_names()
+		f = self.f.tolist()
+		val = self.val.tolist()
+		return [VmdMorphFrame(name=names[d], f=f[d], val=val[d]) for d in range(len(f))]
+	@classmethod
+	def from_frames(cls, frames: List[VmdMorphFrame]) -> 'VmdMorphFrameTable':
+		"""
+		Build a table from a list of VmdMorphFrame objects.
+		:param frames: list of VmdMorphFrame objects
+		:return: VmdMorphFrameTable
+		"""
+		names, name_id = cls._build_name_table(frames)
+		return cls(names=names, name_id=name_id,
+				   f=np.array([fr.f for fr in frames], dtype=np.int64),
+				   val=np.array([fr.val for fr in frames], dtype=np.float32))
+
 class VmdCamFrame(_BaseVmd):
 	def __init__(self,
 				 f: int,
@@ -410,7 +666,113 @@ class VmdIkdispFrame(_BaseVmd):
 			assert a.validate(parentlist=self.ikbones)
 
 
+def _wrapped_mutator(name):
+	# build a method that does the normal list operation and then marks the list as changed
+	listfunc = getattr(list, name)
+	def mutator(self, *args, **kwargs):
+		ret = listfunc(self, *args, **kwargs)
+		self._version += 1
+		return ret
+	mutator.__name__ = name
+	mutator.__doc__ = listfunc.__doc__
+	return mutator
+
+class VmdFrameList(list):
+	"""
+	A normal list of frame objects that also remembers the order that sorts it, the same order that read_vmd/write_vmd
+	use when GUARANTEE_FRAMES_SORTED is on: boneframes & morphframes are sorted by name and then by frame number,
+	everything else is sorted only by frame number. The Vmd object stores all of its frame lists as these.
+	The sort order is computed once and then reused until the list is changed by any list operation (append, del,
+	slice assignment, sort, etc). Changing the name or frame number of a frame that is already inside the list can't be
+	seen by the list, so before the remembered order is reused it is checked with one quick pass over the frames, and
+	if it is no longer sorted it is recomputed. (invalidate_sort_cache() still works, but is not required.)
+	NOTE: assigning a plain list to a Vmd frame list member (ex: "vmd.boneframes = mylist") stores a COPY of it as a
+	VmdFrameList, so changing "mylist" afterwards does not change the Vmd object.
+	"""
+	def __init__(self, *args):
+		super().__init__(*args)
+		# incremented whenever the contents change
+		self._version = 0
+		# (version, order) pair, only valid if the version still matches
+		self._order_cache = None
+	# every list operation that changes the contents
+	append = _wrapped_mutator("append")
+	extend = _wrapped_mutator("extend")
+	insert = _wrapped_mutator("insert")
+	remove = _wrapped_mutator("remove")
+	pop = _wrapped_mutator("pop")
+	clear = _wrapped_mutator("clear")
+	reverse = _wrapped_mutator("reverse")
+	sort = _wrapped_mutator("sort")
+	__setitem__ = _wrapped_mutator("__setitem__")
+	__delitem__ = _wrapped_mutator("__delitem__")
+	__iadd__ = _wrapped_mutator("__iadd__")
+	__imul__ = _wrapped_mutator("__imul__")
+	def __reduce__(self):
+		# the default list pickling appends the items before __init__ has run, rebuild it from a plain list instead.
+		# the sort cache isn't saved, it's cheap to recompute
+		return self.__class__, (list(self),)
+	def invalidate_sort_cache(self) -> None:
+		""" Forget the cached sort order, it will be recomputed the next time it is needed. """
+		self._order_cache = None
+	def sorted_order(self) -> List[int]:
+		"""
+		Find the order that sorts the frames. The sort is stable.
+		:return: list of frame indices, in sorted order. Do not modify it, it is cached.
+		"""
+		if self and isinstance(self[0], (VmdBoneFrame, VmdMorphFrame)):
+			keys = [(frame.name, frame.f) for frame in self]
+		else:
+			keys = [frame.f for frame in self]
+		if self._order_cache is not None and self._order_cache[0] == self._version:
+			# the frames themselves might have been changed in-place since this was computed, so check that it still
+			# sorts them (ties must still be in index order, same as a stable sort would give). this is much cheaper
+			# than sorting again.
+			order = self._order_cache[1]
+			if all(keys[a] < keys[b] or (keys[a] == keys[b] and a < b) for a, b in zip(order, order[1:])):
+				return order
+		order = sorted(range(len(keys)), key=keys.__getitem__)
+		self._order_cache = (self._version, order)
+		return order
+	def sorted_frames(self) -> list:
+		"""
+		:return: new plain list of the same frame objects, in sorted order. This list is not changed.
+		"""
+		return [self[i] for i in self.sorted_order()]
+	def sort_frames(self) -> None:
+		"""
+		Sort this list in-place into the sorted order, and remember that it is now sorted.
+		"""
+		order = self.sorted_order()
+		list.__setitem__(self, slice(None), [self[i] for i in order])
+		self._version += 1
+		self._order_cache = (self._version, list(range(len(self))))
+	def _set_sorted_order(self, order: List[int]) -> None:
+		# remember an order that was computed elsewhere, used when converting a VmdFrameTable
+		self._order_cache = (self._version, order)
+
+class _FrameListAttr:
+	# descriptor for the frame-list members of Vmd: whatever list is assigned gets stored as a VmdFrameList
+	def __set_name__(self, owner, name):
+		self.attr = "_" + name
+	def __get__(self, instance, owner=None):
+		if instance is None: return self
+		return getattr(instance, self.attr)
+	def __set__(self, instance, newframes):
+		setattr(instance, self.attr, _as_framelist(newframes))
+
+def _as_framelist(frames) -> VmdFrameList:
+	# wrap a list of frames as a VmdFrameList, unless it already is one
+	# NOTE: this makes a new list, so changing the original list afterwards will not affect the Vmd object
+	if isinstance(frames, VmdFrameList): return frames
+	return VmdFrameList(frames)
+
 class Vmd(_BaseVmd):
+	# all frame lists are stored as VmdFrameList, so they can remember their sorted order
+	camframes = _FrameListAttr()
+	lightframes = _FrameListAttr()
+	shadowframes = _FrameListAttr()
+	ikdispframes = _FrameListAttr()
 	def __init__(self,
 				 header: VmdHeader,
 				 boneframes: List[VmdBoneFrame],
@@ -424,12 +786,78 @@ class Vmd(_BaseVmd):
 		# self.version = version
 		# self.modelname = modelname
 		self.header = 		header
+		# boneframes and morphframes can be given as a VmdFrameTable, see the properties below
+		self._boneframes = None
+		self._bone_table = None
+		self._morphframes = None
+		self._morph_table = None
 		self.boneframes = 	boneframes
 		self.morphframes = 	morphframes
 		self.camframes = 	camframes
 		self.lightframes = 	lightframes
 		self.shadowframes = shadowframes
 		self.ikdispframes = ikdispframes
+	@staticmethod
+	def _table_to_framelist(table: VmdFrameTable) -> VmdFrameList:
+		# the table can find its sorted order much faster than the list can, so hand that over too
+		frames = VmdFrameList(table.to_frames())
+		frames._set_sorted_order(table.sort_order().tolist())
+		return frames
+	@property
+	def boneframes(self) -> VmdFrameList:
+		# if the frames are still stored as a table, build the VmdBoneFrame objects now, the first time they are needed
+		# after this point the objects are the only copy of the data, the table is discarded
+		if self._bone_table is not None:
+			self._boneframes = self._table_to_framelist(self._bone_table)
+			self._bone_table = None
+		return self._boneframes
+	@boneframes.setter
+	def boneframes(self, newframes):
+		# NOTE: a plain list is copied into a new VmdFrameList, later changes to the original list are not seen here
+		if isinstance(newframes, VmdBoneFrameTable):
+			self._boneframes = None
+			self._bone_table = newframes
+		else:
+			self._boneframes = _as_framelist(newframes)
+			self._bone_table = None
+	@property
+	def bone_table(self) -> Union[VmdBoneFrameTable, None]:
+		"""
+		The VmdBoneFrameTable holding the boneframe data, if the frames have not yet been converted into VmdBoneFrame
+		objects. Otherwise None. Reading this never triggers the conversion.
+		"""
+		return self._bone_table
+	@property
+	def morphframes(self) -> VmdFrameList:
+		# same as boneframes
+		if self._morph_table is not None:
+			self._morphframes = self._table_to_framelist(self._morph_table)
+			self._morph_table = None
+		return self._morphframes
+	@morphframes.setter
+	def morphframes(self, newframes):
+		if isinstance(newframes, VmdMorphFrameTable):
+			self._morphframes = None
+			self._morph_table = newframes
+		else:
+			self._morphframes = _as_framelist(newframes)
+			self._morph_table = None
+	@property
+	def morph_table(self) -> Union[VmdMorphFrameTable, None]:
+		"""
+		The VmdMorphFrameTable holding the morphframe data, if the frames have not yet been converted into
+		VmdMorphFrame objects. Otherwise None. Reading this never triggers the conversion.
+		"""
+		return self._morph_table
+	def invalidate_sort_cache(self) -> None:
+		"""
+		Forget the cached sort order of every frame list. This is never required, the cached order is always checked
+		before it is used, but it skips that check after changing the name or frame number of many frames in-place.
+		"""
+		for frames in (self._boneframes, self._morphframes, self.camframes, self.lightframes, self.shadowframes,
+					   self.ikdispframes):
+			if frames is not None:
+				frames.invalidate_sort_cache()
 	def list(self) -> list:
 		return [self.header.list(),
 				[i.list() for i in self.boneframes],
@@ -442,16 +870,33 @@ class Vmd(_BaseVmd):
 	def _validate(self, parentlist=None):
 		# header
 		assert isinstance(self.header, VmdHeader)
-		# boneframes
-		assert isinstance(self.boneframes, (list,tuple))
-		for a in self.boneframes:
-			assert isinstance(a, VmdBoneFrame)
-			assert a.validate(parentlist=self.boneframes)
-		# morphframes
-		assert isinstance(self.morphframes, (list,tuple))
-		for a in self.morphframes:
-			assert isinstance(a, VmdMorphFrame)
-			assert a.validate(parentlist=self.morphframes)
+		# boneframes: list of VmdBoneFrame objects, or VmdBoneFrameTable that came straight from the parser
+		if self._bone_table is not None:
+			# don't convert them just to check them, verify the array shapes instead
+			t = self._bone_table
+			n = len(t)
+			assert t.name_id.shape == (n,)
+			assert t.pos.shape == (n, 3)
+			assert t.quat.shape == (n, 4)
+			assert t.interp.shape == (n, 64)
+			assert n == 0 or (0 <= t.name_id.min() and t.name_id.max() < len(t.names))
+		else:
+			assert isinstance(self.boneframes, (list,tuple))
+			for a in self.boneframes:
+				assert isinstance(a, VmdBoneFrame)
+				assert a.validate(parentlist=self.boneframes)
+		# morphframes: list of VmdMorphFrame objects, or VmdMorphFrameTable that came straight from the parser
+		if self._morph_table is not None:
+			t = self._morph_table
+			n = len(t)
+			assert t.name_id.shape == (n,)
+			assert t.val.shape == (n,)
+			assert n == 0 or (0 <= t.name_id.min() and t.name_id.max() < len(t.names))
+		else:
+			assert isinstance(self.morphframes, (list,tuple))
+			for a in self.morphframes:
+				assert isinstance(a, VmdMorphFrame)
+				assert a.validate(parentlist=self.morphframes)
 		# camframes
 		assert isinstance(self.camframes, (list,tuple))
 		for a in self.camframes:
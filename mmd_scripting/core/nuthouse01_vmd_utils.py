@@ -1,4 +1,8 @@
-from typing import List, TypeVar, Dict, Iterable, Tuple
+import concurrent.futures
+import contextlib
+import time
+from io import StringIO
+from typing import Any, Callable, List, TypeVar, Dict, Iterable, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_vmd_struct as vmdstruct
@@ -96,16 +100,17 @@ def dictify_framelist(frames: List[BONEFRAME_OR_MORPHFRAME]) -> Dict[str, List[B
 	:param frames: list of all boneframes in the vmd
 	:return: dict with keys being bonenames and values being list of frames for that bone in sorted order
 	"""
-	# first, split into sublists
-	retdict = {}
-	for t in frames:
-		try:
-			retdict[t.name].append(t)
-		except KeyError:
-			retdict[t.name] = [t]
-	# then, guarantee each sublist is in sorted order, sorted by frame number
-	for sublist in retdict.values():
-		sublist.sort(key=lambda x: x.f)
+	# the keys are in order of first appearance in the input list
+	retdict = {name: [] for name in dict.fromkeys(t.name for t in frames)}
+	# then walk the frames in name-then-framenumber order, so each sublist is built already sorted by frame number
+	# if this list came from a Vmd object then it probably already knows its sorted order, and doesn't need to re-sort
+	# (the remembered order is checked first, in case the names or frame numbers were changed in-place)
+	if isinstance(frames, vmdstruct.VmdFrameList):
+		ordered = frames.sorted_frames()
+	else:
+		ordered = sorted(frames, key=lambda x: (x.name, x.f))
+	for t in ordered:
+		retdict[t.name].append(t)
 	# return it
 	return retdict
 
@@ -190,6 +195,67 @@ def remove_redundant_frames(framelist: List[vmdstruct.VmdBoneFrame], moreinfo=Fa
 	return ultimate_outlist
 
 
+def _interpolate_boneframes(name: str,
+							beforeframe: vmdstruct.VmdBoneFrame,
+							afterframe: vmdstruct.VmdBoneFrame,
+							framenums: List[int]) -> List[vmdstruct.VmdBoneFrame]:
+	"""
+	Create new boneframes at the given framenums by interpolating between two existing boneframes.
+	Newly-created keyframes have basic linear interpolation.
+	
+	:param name: bone name for the new frames
+	:param beforeframe: the existing frame before all of the framenums
+	:param afterframe: the existing frame after all of the framenums, its interpolation curves are used
+	:param framenums: list of the frame numbers to create frames at, in order
+	:return: list of new VmdBoneFrame obj, one per framenum
+	"""
+	# calcualte teh [0.0 - 1.0] value of where between before & after each desired framenum lands
+	percentages = [(framenum - beforeframe.f) / (afterframe.f - beforeframe.f) for framenum in framenums]
+	# NOTE: remember, the interpolation in frame i is for the transition from i-1 to i
+	# extract the bezier interpolation params & get the bezier curves for them
+	x_ax, x_ay, x_bx, x_by = afterframe.interp_x
+	y_ax, y_ay, y_bx, y_by = afterframe.interp_y
+	z_ax, z_ay, z_bx, z_by = afterframe.interp_z
+	r_ax, r_ay, r_bx, r_by = afterframe.interp_r
+	xyz_bez = [core.get_bezier((x_ax, x_ay), (x_bx, x_by)),
+			   core.get_bezier((y_ax, y_ay), (y_bx, y_by)),
+			   core.get_bezier((z_ax, z_ay), (z_bx, z_by)),]
+	rot_bez = core.get_bezier((r_ax, r_ay), (r_bx, r_by))
+	
+	# for each of the 3 position components,
+	output_pos = [[0.0, 0.0, 0.0] for _ in framenums]
+	for J in range(3):
+		# first: shortcut check! if before = after then dont bother
+		if beforeframe.pos[J] == afterframe.pos[J]:
+			for pos in output_pos:
+				pos[J] = beforeframe.pos[J]
+		else:
+			# if they are different then i do need to interpolate :(
+			# push percentages into the bezier, get new percentages out
+			bez_percentages = xyz_bez[J].approximate_many(percentages)
+			for pos, bez_percentage in zip(output_pos, bez_percentages):
+				# linear interpolate bezier percentage with linear map
+				pos[J] = core.linear_map(0, beforeframe.pos[J], 1, afterframe.pos[J], bez_percentage)
+	
+	# for the rotation component,
+	# first, shortcut check! if before == after then dont bother
+	if beforeframe.rot == afterframe.rot:
+		output_rot = [beforeframe.rot.copy() for _ in framenums]
+	else:
+		# push percentages into bezier, get new percentages out
+		bez_percentages = rot_bez.approximate_many(percentages)
+		# convert to quats, perform slerp, and go back to euler
+		quat_before = core.euler_to_quaternion(beforeframe.rot)
+		quat_after = core.euler_to_quaternion(afterframe.rot)
+		output_rot = [list(core.quaternion_to_euler(core.my_slerp(quat_before, quat_after, bez_percentage)))
+					  for bez_percentage in bez_percentages]
+	
+	# build new boneframes from the available info
+	# omit the interp data, it doesnt matter
+	return [vmdstruct.VmdBoneFrame(name=name, f=framenum, pos=pos, rot=rot, phys_off=beforeframe.phys_off)
+			for framenum, pos, rot in zip(framenums, output_pos, output_rot)]
+
+
 def fill_missing_boneframes(boneframe_dict: Dict[str, List[vmdstruct.VmdBoneFrame]],
 							moreinfo: bool,
 							relevant_frames=None,
@@ -227,6 +293,9 @@ def fill_missing_boneframes(boneframe_dict: Dict[str, List[vmdstruct.VmdBoneFram
 		# start a list of frames generated by interpolation
 		new_bonelist = []
 		i = 0
+		# the framenums that fall between bonelist[i-1] and bonelist[i], they are all interpolated at once when the
+		# walk reaches bonelist[i]
+		gap_framenums = []
 		# approach: walk the relevant_framenums list and bonelist in parallel?
 		for framenum in relevant_framenums:
 			if framenum < bonelist[0].f:  # if the desired framenum is lower than the earliest framenum,
@@ -242,66 +311,18 @@ def fill_missing_boneframes(boneframe_dict: Dict[str, List[vmdstruct.VmdBoneFram
 				newframe.f = framenum
 				new_bonelist.append(newframe)
 			elif framenum == bonelist[i].f:  # if the desired framenum matches the framenum of the next/current frame,
+				# first create the frames in between the previous frame & this one, if there are any
+				if gap_framenums:
+					num_interpolate += len(gap_framenums)
+					new_bonelist.extend(_interpolate_boneframes(key, bonelist[i-1], bonelist[i], gap_framenums))
+					gap_framenums = []
 				# then keep it!
 				new_bonelist.append(bonelist[i])
 				# only increment i when i find a match in the existing frames
 				i += 1
 			else:
 				# otherwise, then i need to create a new frame from interpolating...
-				num_interpolate += 1
-				# NOTE: remember, the interpolation in frame i is for the transition from i-1 to i
-				afterframe = bonelist[i]
-				beforeframe = bonelist[i-1]
-				# calcualte teh [0.0 - 1.0] value of where between before & after the desired framenum lands
-				percentage = (framenum - beforeframe.f) / (afterframe.f - beforeframe.f)
-				# extract the bezier interpolation params
-				x_ax, x_ay, x_bx, x_by = afterframe.interp_x
-				y_ax, y_ay, y_bx, y_by = afterframe.interp_y
-				z_ax, z_ay, z_bx, z_by = afterframe.interp_z
-				r_ax, r_ay, r_bx, r_by = afterframe.interp_r
-				# build bezier curves from them
-				xyz_bez = [core.MyBezier((x_ax, x_ay), (x_bx, x_by)),
-						   core.MyBezier((y_ax, y_ay), (y_bx, y_by)),
-						   core.MyBezier((z_ax, z_ay), (z_bx, z_by)),]
-				rot_bez = core.MyBezier((r_ax, r_ay), (r_bx, r_by))
-				# for each of the 3 position components,
-				output_pos = [0.0, 0.0, 0.0]
-				for J in range(3):
-					# first: shortcut check! if before = after then dont bother
-					if beforeframe.pos[J] == afterframe.pos[J]:
-						output_pos[J] = beforeframe.pos[J]
-					else:
-						# if they are different then i do need to interpolate :(
-						# push percentage into the bezier, get new percentage out
-						bez_percentage = xyz_bez[J].approximate(percentage)
-						# linear interpolate bezier percentage with linear map
-						new_xyz = core.linear_map(0, beforeframe.pos[J], 1, afterframe.pos[J], bez_percentage)
-						# save the result
-						output_pos[J] = new_xyz
-				# for the rotation component,
-				# first, shortcut check! if before == after then dont bother
-				if beforeframe.rot == afterframe.rot:
-					euler_slerp = beforeframe.rot.copy()
-				else:
-					# push percentage into bezier, get new percentage out
-					bez_percentage = rot_bez.approximate(percentage)
-					# convert to quats, perform slerp, and go back to euler
-					quat_before = core.euler_to_quaternion(beforeframe.rot)
-					quat_after = core.euler_to_quaternion(afterframe.rot)
-					quat_slerp = core.my_slerp(quat_before, quat_after, bez_percentage)
-					euler_slerp = core.quaternion_to_euler(quat_slerp)
-					euler_slerp = list(euler_slerp)
-				
-				# build a new boneframe from the available info
-				new_boneframe = vmdstruct.VmdBoneFrame(
-					name=key,
-					f=framenum,
-					pos=output_pos,
-					rot=euler_slerp,
-					phys_off=beforeframe.phys_off,
-					# omit the interp data, it doesnt matter
-				)
-				new_bonelist.append(new_boneframe)
+				gap_framenums.append(framenum)
 		# now that i am done building a new complete bonelist, replace the old one with the new one
 		# boneframe_dict[key] = new_bonelist
 		new_boneframe_dict[key] = new_bonelist
@@ -470,16 +491,16 @@ def _fill_missing_boneframes_new(framelist: List[VMD_BONEMORPHCAM_FRAME],
 					x_ax, x_ay, x_bx, x_by = afterframe.interp_x
 					y_ax, y_ay, y_bx, y_by = afterframe.interp_y
 					z_ax, z_ay, z_bx, z_by = afterframe.interp_z
-					bez_xyz = [core.MyBezier((x_ax, x_ay), (x_bx, x_by)),
-							   core.MyBezier((y_ax, y_ay), (y_bx, y_by)),
-							   core.MyBezier((z_ax, z_ay), (z_bx, z_by))]
+					bez_xyz = [core.get_bezier((x_ax, x_ay), (x_bx, x_by)),
+							   core.get_bezier((y_ax, y_ay), (y_bx, y_by)),
+							   core.get_bezier((z_ax, z_ay), (z_bx, z_by))]
 					r_ax, r_ay, r_bx, r_by = afterframe.interp_r
-					bez_rot = core.MyBezier((r_ax, r_ay), (r_bx, r_by))
+					bez_rot = core.get_bezier((r_ax, r_ay), (r_bx, r_by))
 				if frametype == CAM:
 					dist_ax, dist_ay, dist_bx, dist_by = afterframe.interp_dist
-					bez_dist = core.MyBezier((dist_ax, dist_ay), (dist_bx, dist_by))
+					bez_dist = core.get_bezier((dist_ax, dist_ay), (dist_bx, dist_by))
 					fov_ax, fov_ay, fov_bx, fov_by = afterframe.interp_fov
-					bez_fov = core.MyBezier((fov_ax, fov_ay), (fov_bx, fov_by))
+					bez_fov = core.get_bezier((fov_ax, fov_ay), (fov_bx, fov_by))
 					# for cam only, check and warn if there is large rotation!
 					delta = [abs(b - a) for b, a in zip(beforeframe.rot, afterframe.rot)]
 					if max(delta) > 160:
@@ -591,3 +612,94 @@ def _fill_missing_boneframes_new(framelist: List[VMD_BONEMORPHCAM_FRAME],
 	
 	# stats
 	return new_framelist, (num_interpolate, num_prepend, num_append)
+
+
+def _run_one_track(func: Callable, name: str, frames: list, args: tuple, capture: bool) -> Tuple[Any, str, float]:
+	# runs one track & times it. when capturing, everything it prints (with MY_PRINT_FUNC or with plain print) is
+	# kept instead of printed, so that the printouts from tracks running at the same time don't get mixed together
+	start = time.perf_counter()
+	if not capture:
+		result = func(name, frames, *args)
+		return result, "", time.perf_counter() - start
+	buffer = StringIO()
+	saved_print_func = core.MY_PRINT_FUNC
+	def capturing_print_func(*a, is_progress=False):
+		# progress printouts are meaningless once they are replayed later, drop them
+		if not is_progress:
+			print(*a)
+	core.MY_PRINT_FUNC = capturing_print_func
+	try:
+		with contextlib.redirect_stdout(buffer):
+			result = func(name, frames, *args)
+	finally:
+		core.MY_PRINT_FUNC = saved_print_func
+	return result, buffer.getvalue(), time.perf_counter() - start
+
+
+def run_per_track(func: Callable[..., Any],
+				  tracks: Dict[str, list],
+				  args: tuple=(),
+				  max_workers=1,
+				  moreinfo=False) -> Dict[str, Any]:
+	"""
+	Run func(name, frames, *args) once for each track (the framelist of one bone/morph/etc, probably from
+	dictify_framelist()) and collect the results. The tracks can be processed several at a time in separate processes.
+	The longest tracks are started first, and each process takes the next track as soon as it is free, so one long
+	track doesn't leave the other processes waiting at the end.
+	No matter how many processes are used, the results & the printouts from func are in the same order as the input.
+	When using separate processes, func must be a module-level function and everything it needs must be picklable,
+	and any changes it makes to the frames or to global variables happen in the other process and are lost.
+	
+	:param func: function to run on each track, receives the track name, the track framelist, then the args
+	:param tracks: dict with keys being track names and values being the list of frames for that track
+	:param args: optional, extra args to pass to func after name and frames
+	:param max_workers: how many processes to use, if None use one per CPU core, if 1 run in this process
+	:param moreinfo: if true, print how long each track took
+	:return: dict with the same keys in the same order as tracks, and values being whatever func returned
+	"""
+	names = list(tracks.keys())
+	results = [None] * len(names)
+	timings = [0.0] * len(names)
+	total_len = sum(len(f) for f in tracks.values())
+	done_len = 0
+	start_total = time.perf_counter()
+	if max_workers == 1 or len(names) <= 1:
+		# don't bother creating any processes, just do them one at a time
+		for d, name in enumerate(names):
+			results[d], _, timings[d] = _run_one_track(func, name, tracks[name], args, False)
+			done_len += len(tracks[name])
+			if total_len:
+				core.print_progress_oneline(done_len / total_len)
+	else:
+		# longest first, ties stay in input order
+		order = sorted(range(len(names)), key=lambda d: -len(tracks[names[d]]))
+		printouts = [None] * len(names)
+		next_to_print = 0
+		with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+			future_to_idx = {executor.submit(_run_one_track, func, names[d], tracks[names[d]], args, True): d
+							 for d in order}
+			try:
+				for future in concurrent.futures.as_completed(future_to_idx):
+					d = future_to_idx[future]
+					results[d], printouts[d], timings[d] = future.result()
+					done_len += len(tracks[names[d]])
+					# replay the printouts of every track that is finished & has nothing unfinished before it
+					while next_to_print < len(names) and printouts[next_to_print] is not None:
+						for line in printouts[next_to_print].splitlines():
+							core.MY_PRINT_FUNC(line)
+						next_to_print += 1
+					if total_len:
+						core.print_progress_oneline(done_len / total_len)
+			except BaseException:
+				# one failed (or ctrl+c), don't bother starting any of the tracks that are still waiting
+				for future in future_to_idx:
+					future.cancel()
+				raise
+	
+	if moreinfo:
+		total_time = time.perf_counter() - start_total
+		core.MY_PRINT_FUNC("Processed %d tracks in %.1f sec (%.1f sec of work), slowest first:" % (
+			len(names), total_time, sum(timings)))
+		for d in sorted(range(len(names)), key=lambda d: -timings[d]):
+			core.MY_PRINT_FUNC("    '%s': %d frames, %.2f sec" % (names[d], len(tracks[names[d]]), timings[d]))
+	return dict(zip(names, results))
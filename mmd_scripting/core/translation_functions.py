@@ -1,6 +1,10 @@
+import contextlib
 import re
-from time import time
-from typing import TypeVar, List, Tuple, Dict
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+from typing import Callable, TypeVar, List, Tuple, Dict, Iterable, Optional
 
 import googletrans
 
@@ -40,18 +44,69 @@ USE_SUBASSEMBLE_IDEA = True
 # or sometimes they lose newlines during translation
 # more lines per request = riskier, but uses less of your transaction budget
 TRANSLATE_MAX_LINES_PER_REQUEST = 15
-# how many requests are permitted per timeframe, to avoid the lockout
-# true limit is ~100 so enforce limit of 90 just to be safe
-TRANSLATE_BUDGET_MAX_REQUESTS = 90
-# how long (hours) is the timeframe to protect
-# true timeframe is ~1 hr so enforce limit of ~1.2hr just to be safe
-TRANSLATE_BUDGET_TIMEFRAME = 1.0
+# the translate budget is a token bucket, to avoid the lockout: at most this many requests can be made all at once,
+# and after that the budget slowly refills until it is full again after TRANSLATE_BUDGET_TIMEFRAME hours.
+# so within any one hour, at most MAX + (MAX / TIMEFRAME) requests can be made.
+# true limit is ~100 per hour, these values allow at most 90 per hour just to be safe
+TRANSLATE_BUDGET_MAX_REQUESTS = 60
+# how long (hours) it takes for the budget to go from empty to full
+TRANSLATE_BUDGET_TIMEFRAME = 2.0
+# how many requests can be waiting on Google at the same time
+TRANSLATE_MAX_CONCURRENT_REQUESTS = 4
+# no matter how many are running at once, don't start more than this many requests per second
+TRANSLATE_MAX_REQUESTS_PER_SECOND = 2.0
+# if a request fails, try it again this many times before giving up. each retry also spends from the translate budget.
+TRANSLATE_MAX_RETRIES = 2
+# how long (seconds) to wait before the first retry, this doubles each time
+TRANSLATE_RETRY_DELAY = 2.0
+
+
+# if true, every chunk that Google translates is remembered in a small SQLite database, and any chunk that was
+# translated before is taken from there instead of asking Google again. this saves a lot of the translate budget.
+USE_TRANSLATION_MEMORY = True
+# path of the translation memory database. if None, use the default file in the persistent storage folder.
+# the file can be copied to another computer, or merged into another one with merge_translation_memory()
+TRANSLATION_MEMORY_FILE = None
+# how many chunks to look up with each SQL query, sqlite has a limit on the number of parameters per query
+_TRANSLATION_MEMORY_BATCH = 500
 
 
-# everything is fine, just set up the normal way
 # i used to have a bunch of try-except to catch import errors and support if googletrans is not installed,
 # but now it's part of my provided "RUN THIS TO INSTALL.bat" so it should always be present
-jp_to_en_google = googletrans.Translator()
+# the requests are sent from several threads at once, and googletrans doesn't say whether one Translator can safely be
+# used by several threads at the same time, so each thread gets its own
+_google_translators = threading.local()
+
+def _get_google_translator() -> googletrans.Translator:
+	# get the Translator that belongs to the current thread, creating it if needed
+	translator = getattr(_google_translators, "translator", None)
+	if translator is None:
+		translator = googletrans.Translator()
+		_google_translators.translator = translator
+	return translator
+
+def _googletrans_backend(jp_str: str, src: str) -> str:
+	# the default translate backend: send it to Google
+	jp_to_en_google = _get_google_translator()
+	if src == "auto":
+		r = jp_to_en_google.translate(jp_str, dest="en")  # auto
+	else:
+		r = jp_to_en_google.translate(jp_str, dest="en", src=src)  # jap
+	return r.text
+
+# the function that does the actual internet translating, see set_translate_backend()
+_translate_backend = _googletrans_backend
+
+def set_translate_backend(backend: Optional[Callable[[str, str], str]]) -> None:
+	"""
+	Replace the thing that actually translates text, for example with a local stub for testing or some other service.
+	The backend gets one newline-joined packet of text and the source language ("auto" or "ja"), and must return the
+	english text with the same number of lines.
+	
+	:param backend: function (text, src) -> str, or None to go back to using Google
+	"""
+	global _translate_backend
+	_translate_backend = _googletrans_backend if backend is None else backend
 
 
 # type hint for functions that accept string-or-listofstring and return whatever they got in
@@ -208,25 +263,88 @@ def pre_translate(in_list: STR_OR_STRLIST) -> Tuple[STR_OR_STRLIST, STR_OR_STRLI
 	else:			return indent_list, body_list, suffix_list	# otherwise return as a list
 
 
-def piecewise_translate(in_list: STR_OR_STRLIST, in_dict: Dict[str,str], join_with_space=True) -> STR_OR_STRLIST:
+# compiled matchers for the dicts that piecewise_translate() has used recently, key is id() of the dict
+_PIECEWISE_MATCHER_CACHE = {}
+_PIECEWISE_MATCHER_CACHE_MAX = 8
+
+def _get_piecewise_matcher(in_dict: Dict[str,str]) -> dict:
+	"""
+	Get a trie of the keys of in_dict, building it only if this dict hasn't been seen before or its keys have changed.
+	Each node is a dict from a char to the next node. If a key ends at a node, then that node also maps None to the
+	position of that key within in_dict. The values are not stored here, they are looked up from the dict every time.
+	
+	:param in_dict: dict of mappings from JP substrings to EN substrings
+	:return: the root node of the trie
+	"""
+	keys = list(in_dict.keys())
+	cached = _PIECEWISE_MATCHER_CACHE.get(id(in_dict))
+	if cached is not None and cached[0] == keys:
+		return cached[1]
+	root = {}
+	for rank, key in enumerate(keys):
+		node = root
+		for c in key:
+			node = node.setdefault(c, {})
+		node[None] = rank
+	# forget the oldest one if there are too many
+	if len(_PIECEWISE_MATCHER_CACHE) >= _PIECEWISE_MATCHER_CACHE_MAX:
+		del _PIECEWISE_MATCHER_CACHE[next(iter(_PIECEWISE_MATCHER_CACHE))]
+	_PIECEWISE_MATCHER_CACHE[id(in_dict)] = (keys, root)
+	return root
+
+def _piecewise_match(matcher: dict, out: str, i: int, skip_rank=-1) -> int:
+	"""
+	Find which key of the dict matches the string starting from position i. If several keys match, return whichever
+	one comes first in the dict, same as checking each key in order with str.startswith().
+	
+	:param matcher: trie from _get_piecewise_matcher()
+	:param out: string to search in
+	:param i: position within the string to start at
+	:param skip_rank: optional, position within the dict of a key to ignore
+	:return: length of the matching key, or -1 if nothing matches
+	"""
+	best_rank = matcher.get(None)
+	if best_rank == skip_rank: best_rank = None
+	best_len = -1 if best_rank is None else 0
+	node = matcher
+	for j in range(i, len(out)):
+		node = node.get(out[j])
+		if node is None:
+			break
+		rank = node.get(None)
+		if rank is not None and rank != skip_rank and (best_rank is None or rank < best_rank):
+			best_rank = rank
+			best_len = j + 1 - i
+	return best_len
+
+def piecewise_translate(in_list: STR_OR_STRLIST, in_dict: Dict[str,str], join_with_space=True, exclude_key: str=None) -> STR_OR_STRLIST:
 	"""
 	Apply piecewise translation to inputs when given a mapping dict.
 	Mapping dict will usually be the builtin comprehensive 'words_dict' or some results found from Google Translate.
 	From each position in the string(ordered), check each map entry(ordered). Dict should have keys ordered from longest
 	to shortest to avoid "undershadowing" problem.
+	The keys are compiled into a trie (cached for next time) so that checking every map entry is one quick walk.
 	Always returns what it produces, even if not a complete translation. Outer layers are responsible for checking if
 	the translation is "complete" before using it.
 	
 	:param in_list: list of JP strings, or a single JP string
 	:param in_dict: dict of mappings from JP substrings to EN substrings
 	:param join_with_space: optional, default true. if true, when substituting substrings, put spaces before/after.
+	:param exclude_key: optional, act like this key is not in the dict. faster than removing it & putting it back.
 	:return: list of resulting strings, or a single resulting string
 	"""
 	input_is_str = isinstance(in_list, str)
 	if input_is_str: in_list = [in_list]  # force it to be a list anyway so I don't have to change my structure
 	outlist = []  # list to build & return
 	
-	dictitems = list(in_dict.items())
+	matcher = _get_piecewise_matcher(in_dict)
+	skip_rank = -1
+	if exclude_key is not None:
+		# find where it is in the dict by walking the trie
+		node = matcher
+		for c in exclude_key:
+			node = node.get(c, {})
+		skip_rank = node.get(None, -1)
 	
 	joinchar = " " if join_with_space else ""
 	
@@ -238,24 +356,23 @@ def piecewise_translate(in_list: STR_OR_STRLIST, in_dict: Dict[str,str], join_wi
 		# NEW ARCHITECTURE: starting from each char, try to match against the contents of the dict. longest items are first!
 		i = 0
 		while i < len(out):  # starting from each char of the string,
-			found_match = False
-			for (key, val) in dictitems:  # try to find anything in the dict to match against,
-				if out.startswith(key, i):  # and if something is found starting from 'i',
-					found_match = True
-					# i am going to replace it key->val, but first maybe insert space before or after or both.
-					# note: letter/number are the ONLY things that use joinchar. all punctuation and all JP stuff do not use joinchar.
-					# if 'begin-1' is a valid index and the char at that index is letter/number, then PREPEND a space
-					before_space = joinchar if i != 0 and is_alphanumeric(out[i-1]) else ""
-					# if "begin+len(key)" is a valid index and the char at that index is letter/number, then APPEND a space
-					after_space = joinchar if i+len(key) < len(out) and is_alphanumeric(out[i+len(key)]) else ""
-					# now JOINCHAR is added, so now i substitute it
-					out = out[0:i] + before_space + val + after_space + out[i+len(key):]
-					# i don't need to examine or try to replace on any of these chars, so skip ahead a bit
-					i += len(val) + int(bool(before_space)) + int(bool(after_space))
-					# nothing else will match here, since I just replaced the thing, so break out of iterating on dict keys
-					break
-			if found_match is False:
+			keylen = _piecewise_match(matcher, out, i, skip_rank)  # try to find anything in the dict to match against,
+			if keylen == -1:
 				i += 1
+				continue
+			# and if something is found starting from 'i',
+			key = out[i:i+keylen]
+			val = in_dict[key]
+			# i am going to replace it key->val, but first maybe insert space before or after or both.
+			# note: letter/number are the ONLY things that use joinchar. all punctuation and all JP stuff do not use joinchar.
+			# if 'begin-1' is a valid index and the char at that index is letter/number, then PREPEND a space
+			before_space = joinchar if i != 0 and is_alphanumeric(out[i-1]) else ""
+			# if "begin+len(key)" is a valid index and the char at that index is letter/number, then APPEND a space
+			after_space = joinchar if i+len(key) < len(out) and is_alphanumeric(out[i+len(key)]) else ""
+			# now JOINCHAR is added, so now i substitute it
+			out = out[0:i] + before_space + val + after_space + out[i+len(key):]
+			# i don't need to examine or try to replace on any of these chars, so skip ahead a bit
+			i += len(val) + int(bool(before_space)) + int(bool(after_space))
 		# once all uses of all keys have been replaced, then append the result
 		outlist.append(out)
 	
@@ -319,63 +436,53 @@ def local_translate(in_list: STR_OR_STRLIST) -> STR_OR_STRLIST:
 def _check_translate_budget(num_proposed: int) -> bool:
 	"""
 	Goal: block translations that would trigger the lockout.
-	Create & maintain a persistent file that contains timestamps and # of requests, to know if my proposed number will
-	exceed the budget. If it would still be under budget, then update the log assuming that the proposed requests will
-	happen. options: TRANSLATE_BUDGET_MAX_REQUESTS, TRANSLATE_BUDGET_TIMEFRAME
+	The budget is a TokenBucket that is saved in the persistent storage, so it is shared by every run of every script.
+	If there is enough budget for the proposed number of requests, spend it. options: TRANSLATE_BUDGET_MAX_REQUESTS,
+	TRANSLATE_BUDGET_TIMEFRAME
 	
 	:param num_proposed: number of times I want to contact the google API
 	:return: bool True = go ahead, False = stop
 	"""
-	# get the log of past translation requests
-	# formatted as list of (timestamp, numrequests) sub-lists
-	record = io.get_persistent_storage_json('googletrans-request-history')
-	# if it doesn't exist in the json, then init it as empty list
-	if record is None:
-		record = []
+	# get the budget, decide, and update it, all as one transaction so that another process can't spend the same
+	# budget at the same time. stored as [tokens, timestamp].
+	# the messages are only printed after the transaction is done, so the store isn't locked while printing
+	decision = []
+	printouts = []
+	def decide_and_update(record):
+		bucket = _translate_budget_from_record(record)
+		printouts.append("... you have {} / {} translation requests available, they refill over {:.4} hrs...".format(
+			int(bucket.available()), int(TRANSLATE_BUDGET_MAX_REQUESTS), TRANSLATE_BUDGET_TIMEFRAME))
+		# make the decision
+		if num_proposed > TRANSLATE_BUDGET_MAX_REQUESTS:
+			printouts.append("BUDGET: you cannot make this many requests all at once")
+			decision.append(False)
+		elif bucket.try_take(num_proposed):
+			# this many translations is OK! go ahead!
+			decision.append(True)
+		else:
+			# cannot do the translate, this would exceed the budget
+			# bonus value: how long until the bucket refills enough that i can do this? convert seconds to minutes
+			waittime = round(bucket.wait_time(num_proposed) / 60)
+			printouts.append("BUDGET: you must wait %d minutes before you can do %d more translation requests with Google" % (waittime, num_proposed))
+			decision.append(False)
+		return [bucket.tokens, bucket.stamp]
 	
-	# get teh timestamp for now
+	io.update_persistent_storage_json('googletrans-request-history', decide_and_update)
+	for line in printouts:
+		core.MY_PRINT_FUNC(line)
+	return decision[0]
+
+
+def _translate_budget_from_record(record) -> "TokenBucket":
+	# turn whatever is saved in the persistent storage into a TokenBucket
+	rate = TRANSLATE_BUDGET_MAX_REQUESTS / (TRANSLATE_BUDGET_TIMEFRAME * 60 * 60)
+	if record and isinstance(record[0], (int, float)):
+		return TokenBucket(TRANSLATE_BUDGET_MAX_REQUESTS, rate, tokens=record[0], stamp=record[1])
+	# otherwise it doesn't exist yet, or it's the old format: a list of (timestamp, numrequests) sub-lists.
+	# convert the old format by spending whatever was used within the last timeframe
 	now = time()
-	# walk backward so i can pop things safely, discard all request records that are older than <timeframe>
-	for i in reversed(range(len(record))):
-		entry = record[i]
-		if (now - entry[0]) > (TRANSLATE_BUDGET_TIMEFRAME * 60 * 60):
-			# print("debug: discard", record[i])
-			record.pop(i)
-	
-	# then interpret the file: how many requests happened in the past <timeframe> ?
-	requests_in_timeframe = sum([entry[1] for entry in record])
-	core.MY_PRINT_FUNC("... you have used {} / {} translation requests within the last {:.4} hrs...".format(
-		int(requests_in_timeframe), int(TRANSLATE_BUDGET_MAX_REQUESTS), TRANSLATE_BUDGET_TIMEFRAME))
-	# make the decision
-	if (requests_in_timeframe + num_proposed) <= TRANSLATE_BUDGET_MAX_REQUESTS:
-		# this many translations is OK! go ahead!
-		# write this transaction into the record
-		newentry = [now, num_proposed]
-		record.append(newentry)
-		# write the record to file
-		io.write_persistent_storage_json('googletrans-request-history', record)
-		return True
-	else:
-		# cannot do the translate, this would exceed the budget
-		# bonus value: how long until enough records expire that i can do this?
-		if num_proposed >= TRANSLATE_BUDGET_MAX_REQUESTS:
-			core.MY_PRINT_FUNC("BUDGET: you cannot make this many requests all at once")
-		else:
-			to_be_popped = 0
-			idx = 0
-			for idx in range(len(record)):
-				to_be_popped += record[idx][1]
-				# how many entries do i need to hypothetically pop before it would free enough space for the
-				# proposed amount to be accepted?
-				if (requests_in_timeframe + num_proposed - to_be_popped) <= TRANSLATE_BUDGET_MAX_REQUESTS:
-					break
-			# when idx'th item becomes too old, then the current proposed number will be okay
-			waittime = record[idx][0] + (TRANSLATE_BUDGET_TIMEFRAME * 60 * 60) - now
-			# convert seconds to minutes
-			waittime = round(waittime / 60)
-			core.MY_PRINT_FUNC("BUDGET: you must wait %d minutes before you can do %d more translation requests with Google" % (waittime, num_proposed))
-		
-		return False
+	recent = sum(entry[1] for entry in (record or []) if (now - entry[0]) <= (TRANSLATE_BUDGET_TIMEFRAME * 60 * 60))
+	return TokenBucket(TRANSLATE_BUDGET_MAX_REQUESTS, rate, tokens=TRANSLATE_BUDGET_MAX_REQUESTS - recent, stamp=now)
 
 
 def _packetize_translate_requests(jp_list: List[str]) -> List[str]:
@@ -410,48 +517,241 @@ def _unpacketize_translate_requests(list_after: List[str]) -> List[str]:
 	return retme
 
 
-def _single_google_translate(jp_str: str, autodetect_language=True) -> str:
+class TokenBucket:
+	"""
+	Rate limiter. The bucket holds up to "capacity" tokens and gains "rate" tokens per second, each request spends one
+	token. So it allows short bursts of up to "capacity" requests, but on average only "rate" requests per second.
+	Safe to share between threads. Used both for pacing the requests within one run, and for the translate budget that
+	is saved between runs (see _check_translate_budget()).
+	"""
+	def __init__(self, capacity: float, rate: float, tokens: float=None, stamp: float=None):
+		"""
+		:param capacity: max number of tokens
+		:param rate: tokens gained per second
+		:param tokens: optional, how many tokens it had at time "stamp". if not given, start full.
+		:param stamp: optional, time.time() when it had that many tokens. if not given, now.
+		"""
+		self.capacity = capacity
+		self.rate = rate
+		self.tokens = capacity if tokens is None else min(capacity, tokens)
+		self.stamp = time() if stamp is None else stamp
+		self._lock = threading.Lock()
+	
+	def _refill(self) -> None:
+		now = time()
+		# (if the clock went backwards, don't take any tokens away)
+		self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.stamp) * self.rate)
+		self.stamp = now
+	
+	def available(self) -> float:
+		"""
+		:return: how many tokens are available right now
+		"""
+		with self._lock:
+			self._refill()
+			return self.tokens
+	
+	def try_take(self, n: float=1) -> bool:
+		"""
+		Spend n tokens if that many are available right now, without waiting.
+		
+		:param n: number of tokens to spend
+		:return: True if they were spent, False if there weren't enough
+		"""
+		with self._lock:
+			self._refill()
+			if self.tokens >= n:
+				self.tokens -= n
+				return True
+			return False
+	
+	def wait_time(self, n: float=1) -> float:
+		"""
+		:param n: number of tokens wanted
+		:return: seconds until that many tokens will be available, 0 if they are available now
+		"""
+		with self._lock:
+			self._refill()
+			return max(0.0, (n - self.tokens) / self.rate)
+	
+	def take(self, n: float=1) -> None:
+		"""
+		Spend n tokens, first waiting until that many are available.
+		
+		:param n: number of tokens to spend, must not be more than the capacity
+		"""
+		if n > self.capacity:
+			raise ValueError("cannot take %s tokens from a bucket with capacity %s" % (n, self.capacity))
+		while True:
+			with self._lock:
+				self._refill()
+				if self.tokens >= n:
+					self.tokens -= n
+					return
+				wait = (n - self.tokens) / self.rate
+			sleep(wait)
+
+
+# paces the requests that _dispatch_translate_requests() sends, created when first needed
+_request_pacer = None
+
+def _dispatch_translate_requests(packets: List[str], autodetect_language=True, backend=None) -> List[str]:
+	"""
+	Send all the packets to Google at once, up to TRANSLATE_MAX_CONCURRENT_REQUESTS at the same time and at most
+	TRANSLATE_MAX_REQUESTS_PER_SECOND. Each failed request is retried up to TRANSLATE_MAX_RETRIES times, if any
+	request still fails then the exception is raised from here.
+	
+	:param packets: list of newline-joined JP strings from _packetize_translate_requests()
+	:param autodetect_language: if true, let Google decide the input language. if False, assert that the input is JP
+	:param backend: optional, translate backend to use instead of the one from set_translate_backend()
+	:return: list of results, in the same order as the packets
+	"""
+	global _request_pacer
+	if _request_pacer is None or (_request_pacer.capacity, _request_pacer.rate) != \
+			(TRANSLATE_MAX_CONCURRENT_REQUESTS, TRANSLATE_MAX_REQUESTS_PER_SECOND):
+		_request_pacer = TokenBucket(TRANSLATE_MAX_CONCURRENT_REQUESTS, TRANSLATE_MAX_REQUESTS_PER_SECOND)
+	if not packets:
+		return []
+	done = [0]
+	lock = threading.Lock()
+	def one_request(packet: str) -> str:
+		r = _single_google_translate(packet, autodetect_language, backend, pacer=_request_pacer)
+		with lock:
+			done[0] += 1
+			core.print_progress_oneline(done[0] / len(packets))
+		return r
+	with ThreadPoolExecutor(max_workers=TRANSLATE_MAX_CONCURRENT_REQUESTS) as pool:
+		# map() gives back results in the same order as the inputs, and re-raises the first exception
+		return list(pool.map(one_request, packets))
+
+
+def _single_google_translate(jp_str: str, autodetect_language=True, backend=None, pacer: TokenBucket=None) -> str:
 	"""
 	Actually send a single string to Google API for translation, unless internet trans is disabled.
+	If it fails, wait and try again, up to TRANSLATE_MAX_RETRIES times. Each retry is also paid for out of the
+	translate budget, and if the budget is used up then it gives up.
 	
 	:param jp_str: JP string to be translated
 	:param autodetect_language: if true, let Google decide the input language. if False, assert that the input is JP
+	:param backend: optional, translate backend to use instead of the one from set_translate_backend()
+	:param pacer: optional, TokenBucket to take a token from before each attempt
 	:return: usually english-translated result
 	"""
+	attempt = 0
+	while True:
+		if pacer is not None:
+			pacer.take()
+		try:
+			# acutally send a single string to Google (or whatever the backend is) for translation
+			return (backend or _translate_backend)(jp_str, "auto" if autodetect_language else "ja")
+		except Exception as e:
+			if attempt < TRANSLATE_MAX_RETRIES and _check_translate_budget(1):
+				core.MY_PRINT_FUNC(e.__class__.__name__, e)
+				core.MY_PRINT_FUNC("... translate request failed, trying again...")
+				sleep(TRANSLATE_RETRY_DELAY * (2 ** attempt))
+				attempt += 1
+				continue
+			core.MY_PRINT_FUNC(e.__class__.__name__, e)
+			if isinstance(e, ConnectionError):
+				core.MY_PRINT_FUNC("Check your internet connection?")
+				raise
+			if hasattr(e, "doc"):
+				core.MY_PRINT_FUNC("Response from Google:")
+				core.MY_PRINT_FUNC(e.doc.split("\n")[7])
+				core.MY_PRINT_FUNC(e.doc.split("\n")[9])
+			core.MY_PRINT_FUNC("Google API has rejected the translate request")
+			core.MY_PRINT_FUNC("This is probably due to too many translate requests too quickly")
+			core.MY_PRINT_FUNC("Strangely, this lockout does NOT prevent you from using Google Translate thru your web browser. So go use that instead.")
+			core.MY_PRINT_FUNC("Get a VPN or try again in about 1 day (TODO: CONFIRM LOCKOUT TIME)")
+			raise
+
+
+def _open_translation_memory() -> sqlite3.Connection:
+	# open the database, and create the table if this is a new file
+	path = TRANSLATION_MEMORY_FILE or io.get_translation_memory_path()
+	conn = sqlite3.connect(path, timeout=30)
+	conn.execute("CREATE TABLE IF NOT EXISTS translations ("
+				 "jp TEXT NOT NULL, src TEXT NOT NULL, en TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (jp, src))")
+	return conn
+
+
+def translation_memory_lookup(jp_list: List[str], src: str) -> Dict[str,str]:
+	"""
+	Find which of these JP chunks have already been translated before. Does nothing if USE_TRANSLATION_MEMORY is false.
+	
+	:param jp_list: list of JP chunks
+	:param src: source language the chunks were translated as, "auto" or "ja"
+	:return: dict of JP chunk -> EN translation, for only the chunks that were found
+	"""
+	if not USE_TRANSLATION_MEMORY or not jp_list:
+		return {}
+	found = {}
 	try:
-		# acutally send a single string to Google for translation
-		if autodetect_language:
-			r = jp_to_en_google.translate(jp_str, dest="en")  # auto
-		else:
-			r = jp_to_en_google.translate(jp_str, dest="en", src="ja")  # jap
-		return r.text
-	except ConnectionError as e:
+		with contextlib.closing(_open_translation_memory()) as conn:
+			for start in range(0, len(jp_list), _TRANSLATION_MEMORY_BATCH):
+				batch = jp_list[start:start + _TRANSLATION_MEMORY_BATCH]
+				query = "SELECT jp, en FROM translations WHERE src = ? AND jp IN (%s)" % ",".join("?" * len(batch))
+				found.update(conn.execute(query, [src] + batch).fetchall())
+	except sqlite3.Error as e:
+		# if the memory is broken, just do without it
 		core.MY_PRINT_FUNC(e.__class__.__name__, e)
-		core.MY_PRINT_FUNC("Check your internet connection?")
-		raise
-	except Exception as e:
+		core.MY_PRINT_FUNC("WARNING: cannot read the translation memory, ignoring it")
+		return {}
+	return found
+
+
+def translation_memory_store(pairs: Iterable[Tuple[str,str]], src: str) -> None:
+	"""
+	Remember these translations for next time. Does nothing if USE_TRANSLATION_MEMORY is false.
+	
+	:param pairs: iterable of (JP chunk, EN translation) pairs
+	:param src: source language the chunks were translated as, "auto" or "ja"
+	"""
+	if not USE_TRANSLATION_MEMORY:
+		return
+	now = time()
+	rows = [(jp, src, en, now) for jp, en in pairs]
+	if not rows:
+		return
+	try:
+		with contextlib.closing(_open_translation_memory()) as conn:
+			with conn:
+				conn.executemany("INSERT OR REPLACE INTO translations (jp, src, en, created) VALUES (?,?,?,?)", rows)
+	except sqlite3.Error as e:
 		core.MY_PRINT_FUNC(e.__class__.__name__, e)
-		if hasattr(e, "doc"):
-			core.MY_PRINT_FUNC("Response from Google:")
-			core.MY_PRINT_FUNC(e.doc.split("\n")[7])
-			core.MY_PRINT_FUNC(e.doc.split("\n")[9])
-		core.MY_PRINT_FUNC("Google API has rejected the translate request")
-		core.MY_PRINT_FUNC("This is probably due to too many translate requests too quickly")
-		core.MY_PRINT_FUNC("Strangely, this lockout does NOT prevent you from using Google Translate thru your web browser. So go use that instead.")
-		core.MY_PRINT_FUNC("Get a VPN or try again in about 1 day (TODO: CONFIRM LOCKOUT TIME)")
-		raise
+		core.MY_PRINT_FUNC("WARNING: cannot write to the translation memory, these results will not be remembered")
+
+
+def merge_translation_memory(other_path: str) -> int:
+	"""
+	Copy all the translations from another translation memory file (maybe from another computer) into this one.
+	If both have a translation for the same chunk, the one already in this file is kept.
+	
+	:param other_path: path to another translation memory database file
+	:return: number of new translations added
+	"""
+	with contextlib.closing(_open_translation_memory()) as conn:
+		conn.execute("ATTACH DATABASE ? AS other", (other_path,))
+		with conn:
+			cur = conn.execute("INSERT OR IGNORE INTO translations (jp, src, en, created) "
+							   "SELECT jp, src, en, created FROM other.translations")
+			added = cur.rowcount
+		conn.execute("DETACH DATABASE other")
+	return added
 
 
-def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_only_kanji=True) -> STR_OR_STRLIST:
+def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_only_kanji=True, backend=None) -> STR_OR_STRLIST:
 	"""
 	Take a list of strings & get them all translated by asking Google.
 	If chunks_only_kanji=True, only attempt to translate actual katakana or w/e, prevent non-ASCII non-JP stuff
 	like ▲ ★ 〇 from going to google. If chunks_only_kanji=False, attempt to translate everything that isn't ASCII
 	(might cause language autodetect to malfunction tho!)
+	Each unique JP chunk is only sent once, no matter how many of the strings it is part of.
 
 	:param in_list: list of JP or partially JP strings
 	:param autodetect_language: if true, let Google decide the input language. if False, assert that the input is JP
 	:param chunks_only_kanji: True=chunks are "is_jp", False=chunks are "not is_latin"
+	:param backend: optional, translate backend to use instead of the one from set_translate_backend()
 	:return: list of strings probably pure EN, but sometimes odd unicode symbols show up
 	"""
 	input_is_str = isinstance(in_list, str)
@@ -505,29 +805,46 @@ def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_o
 			# this will be added to the dict way later
 			localtrans_dict[chunk] = trans
 	
+	# 3b. chunks that Google has translated before don't need to be sent again
+	src = "auto" if autodetect_language else "ja"
+	memory_dict = translation_memory_lookup(jp_chunks, src)
+	if memory_dict:
+		core.MY_PRINT_FUNC("... found %d / %d chunks in the translation memory..." % (len(memory_dict), len(jp_chunks)))
+		jp_chunks = [chunk for chunk in jp_chunks if chunk not in memory_dict]
+	
 	# 4. packetize them into fewer requests (and if auto, choose whether to use chunks or not)
 	jp_chunks_packets = _packetize_translate_requests(jp_chunks)
 	jp_bodies_packets = _packetize_translate_requests(bodies)
 	
 	# 5. check the translate budget to see if I can afford this
+	# if everything was in the translation memory then Google isn't needed at all
 	num_calls = len(jp_chunks_packets)
 	
-	if not DISABLE_INTERNET_TRANSLATE and _check_translate_budget(num_calls):
-		core.MY_PRINT_FUNC("... making %d requests to Google Translate web API..." % num_calls)
+	if (num_calls == 0 and memory_dict) or (not DISABLE_INTERNET_TRANSLATE and _check_translate_budget(num_calls)):
+		if num_calls:
+			core.MY_PRINT_FUNC("... making %d requests to Google Translate web API..." % num_calls)
 		
 		# 6. send chunks to Google
-		results_packets = []
-
 		print("#items=", len(in_list), "#chunks=", len(jp_chunks), "#requests=", len(jp_chunks_packets))
-		for d, packet in enumerate(jp_chunks_packets):
-			core.print_progress_oneline(d / len(jp_chunks_packets))
-			r = _single_google_translate(packet, autodetect_language)
-			results_packets.append(r)
+		results_packets = _dispatch_translate_requests(jp_chunks_packets, autodetect_language, backend)
+		
+		# 6b. remember the new translations
+		# only when Google gave back the same number of lines as it was sent, otherwise I can't tell what goes with what
+		# also don't remember anything that Google couldn't translate, so it gets another try next time
+		new_memory = []
+		for packet, result in zip(jp_chunks_packets, results_packets):
+			packet_chunks = packet.split("\n")
+			packet_results = result.split("\n")
+			if len(packet_chunks) == len(packet_results):
+				new_memory.extend((jp, en) for jp, en in zip(packet_chunks, packet_results) if not is_jp(en))
+		translation_memory_store(new_memory, src)
 		
 		# 7. assemble Google responses & re-associate with the chunks
 		# order of inputs "jp_chunks" matches order of outputs "results"
 		results = _unpacketize_translate_requests(results_packets)  # unpack
 		map_jp_to_google = list(zip(jp_chunks, results))
+		# the results from the translation memory are used the same as the results that just came from Google
+		map_jp_to_google.extend(memory_dict.items())
 		google_dict = dict(map_jp_to_google)  # build dict
 
 		#########################
@@ -558,10 +875,9 @@ def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_o
 			num_google = 0
 			num_subassemble = 0
 			for this_jp_chunk, this_google_result in map_jp_to_google:
-				# remove this specific chunk + its translation from the dict
-				google_plus_words.pop(this_jp_chunk)
-				# attempt piecewise translate for this chunk
-				chunk_piecewise_subassemble = piecewise_translate(this_jp_chunk, google_plus_words)
+				# attempt piecewise translate for this chunk, without this specific chunk + its translation
+				# (this does not change the keys of the dict, so piecewise_translate can keep using the same trie)
+				chunk_piecewise_subassemble = piecewise_translate(this_jp_chunk, google_plus_words, exclude_key=this_jp_chunk)
 				# IS THIS SUCCESSFUL?
 				if is_jp(chunk_piecewise_subassemble):
 					# no, this is not successful... I do not have all the individual pieces that make up this word
@@ -575,8 +891,8 @@ def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_o
 					if DEBUG:
 						print("jp_chunk = '%s', google = '%s', subassemble = '%s'" %
 							  (this_jp_chunk, this_google_result, chunk_piecewise_subassemble))
-				# sort it again
-				google_plus_words = translation_dictionaries.sort_dict_with_longest_keys_first(google_plus_words)
+				# no need to sort it again, the keys are still the same. and when the keys are sorted longest-first,
+				# the order of the keys that are the same length doesn't affect the piecewise result.
 			
 			if DEBUG:
 				print("stats: num_google = %d, num_subassemble = %d" % (num_google, num_subassemble))
@@ -601,7 +917,15 @@ def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_o
 		# no need to print failing statement, the "check translate budget" function already does
 		# don't quit early, run thru the same full structure & eventually return a copy of the JP names
 		core.MY_PRINT_FUNC("While Google Translate is disabled, just using best-effort (incomplete) local translate")
-		bodies_best_effort = piecewise_translate(bodies, translation_dictionaries.words_dict)
+		# the chunks that were found in the translation memory can still be used, only the rest stay untranslated
+		if memory_dict:
+			memory_plus_words = dict(memory_dict)
+			memory_plus_words.update(translation_dictionaries.words_dict)
+			memory_plus_words.update(localtrans_dict)
+			memory_plus_words = translation_dictionaries.sort_dict_with_longest_keys_first(memory_plus_words)
+			bodies_best_effort = piecewise_translate(bodies, memory_plus_words)
+		else:
+			bodies_best_effort = piecewise_translate(bodies, translation_dictionaries.words_dict)
 		outlist_final = [i + b + s for i, b, s in zip(indents, bodies_best_effort, suffixes)]
 	
 	# return
@@ -610,4 +934,59 @@ def google_translate(in_list: STR_OR_STRLIST, autodetect_language=True, chunks_o
 	else:
 		return outlist_final  # otherwise return as a list
 	
-	
\ No newline at end of file
+	
+
+
+class TranslateScheduler:
+	"""
+	Gather up strings to translate from many places (for example, all the models in a batch) and translate them all
+	together with google_translate(). That way each unique JP chunk is only sent to Google once, even if it shows up
+	in many models, and all the requests go out at the same time.
+	Call add() for each list of strings, then run() once, then get each list of results with results().
+	"""
+	def __init__(self, autodetect_language=True, chunks_only_kanji=True, backend=None):
+		"""
+		:param autodetect_language: same as google_translate()
+		:param chunks_only_kanji: same as google_translate()
+		:param backend: optional, translate backend to use instead of the one from set_translate_backend()
+		"""
+		self.autodetect_language = autodetect_language
+		self.chunks_only_kanji = chunks_only_kanji
+		self.backend = backend
+		self._inputs = []
+		self._outputs = None
+	
+	def add(self, in_list: List[str]) -> int:
+		"""
+		:param in_list: list of JP or partially JP strings
+		:return: ticket number, to get the results with results()
+		"""
+		if self._outputs is not None:
+			raise RuntimeError("TranslateScheduler.add() called after run()")
+		self._inputs.append(list(in_list))
+		return len(self._inputs) - 1
+	
+	def run(self) -> None:
+		"""
+		Translate everything that was added. Raises whatever google_translate() raises.
+		"""
+		everything = [s for in_list in self._inputs for s in in_list]
+		if everything:
+			translated = google_translate(everything, self.autodetect_language, self.chunks_only_kanji, self.backend)
+		else:
+			translated = []
+		# cut the results back up into the same lists they came from
+		self._outputs = []
+		start = 0
+		for in_list in self._inputs:
+			self._outputs.append(translated[start:start + len(in_list)])
+			start += len(in_list)
+	
+	def results(self, ticket: int) -> List[str]:
+		"""
+		:param ticket: ticket number from add()
+		:return: list of translated strings, same order as the list given to add()
+		"""
+		if self._outputs is None:
+			raise RuntimeError("TranslateScheduler.results() called before run()")
+		return self._outputs[ticket]
\ No newline at end of file
@@ -6,6 +6,9 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.00 - 6/10/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("materials", "morphs")
+PASS_WRITES = ("materials", "morphs")
+
 
 
 # just take a wild guess what this field controls
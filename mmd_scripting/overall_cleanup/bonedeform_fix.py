@@ -1,11 +1,17 @@
+from typing import Iterable, List, Tuple
+
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+from mmd_scripting.core.nuthouse01_pmx_utils import BoneGraph
 
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.01 - 7/12/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("bones",)
+PASS_WRITES = ("bones",)
+
 
 # i can't figure out how to make this work sensibly.
 RESPECT_DEFORM_AFTER_PHYS = False
@@ -21,8 +27,7 @@ Specifically this looks at parents, parial-inherit, and IK target/chains, and en
 iotext = '''Inputs:  PMX file "[model].pmx"\nOutputs: PMX file "[model]_bonedeform.pmx"
 '''
 
-MAX_LOOPS = 1000
-DEFORM_AFTER_PHYS_OFFSET = MAX_LOOPS * 2
+DEFORM_AFTER_PHYS_OFFSET = 2000
 
 def showhelp():
 	# print info to explain the purpose of this file
@@ -37,6 +42,100 @@ def showprompt():
 	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=True)
 	return pmx, input_filename_pmx
 
+def build_deform_graph(pmx: pmxstruct.Pmx) -> List[List[Tuple[int, int]]]:
+	"""
+	Build the graph of which bones must deform after which other bones. A bone deforms after another bone if it has
+	a higher deform layer, or the same deform layer and a higher index. So each edge says "bone B must have deform
+	layer >= bone A + weight", where weight is 1 if B comes before A in the list, and 0 if B comes after A.
+	Edges come from parents, partial-inherit sources, and IK targets/links. Also, anything that inherits from a bone
+	in an IK chain must deform after that chain's IK bone(s), unless it is part of the same IK group.
+	
+	:param pmx: PMX object
+	:return: for each bone, list of (downstream bone idx, weight) pairs
+	"""
+	graph = BoneGraph(pmx.bones)
+	# it is possible for a bone to be controlled by multiple IK masters, actually every foot bone of every model is this way
+	ikmasters = graph.ik_masters
+	
+	edges = [[] for _ in pmx.bones]
+	def add_edge(me_idx, parent_idx):
+		if parent_idx == -1:
+			return
+		sources = [parent_idx]
+		# anything that inherits from an IKCHAIN bone has to deform after that bone's ik master(s), EXCEPT for bones
+		# actually in that ik group (me is the ikmaster or me shares an ikmaster with parent)
+		if ikmasters[parent_idx]:
+			if not (me_idx in ikmasters[parent_idx] or ikmasters[me_idx].intersection(ikmasters[parent_idx])):
+				# the masters deform after the parent anyway, so it's enough to deform after all the masters
+				sources = ikmasters[parent_idx]
+		for src in sources:
+			# a bone is always considered to deform after itself
+			if src != me_idx:
+				edges[src].append((me_idx, 1 if me_idx < src else 0))
+	
+	for d in range(len(pmx.bones)):
+		# each bone must deform after its parent
+		add_edge(d, graph.parent[d])
+		# each bone must deform after its partial inherit source, if it uses it
+		add_edge(d, graph.inherit_parent[d])
+	# each ik bone must deform after its target and IK chain
+	for ikbone, group in graph.ik_groups.items():
+		for member in group:
+			add_edge(ikbone, member)
+	return edges
+
+
+def find_cycles(edges: List[List[Tuple[int, int]]], nodes: Iterable[int]) -> List[List[int]]:
+	"""
+	Find the groups of bones that are in recursive relationships, i.e. the strongly connected components of the
+	graph that have more than one member. Iterative Tarjan's algorithm, limited to the given subset of nodes.
+	
+	:param edges: graph from build_deform_graph()
+	:param nodes: the bones to search among, should be every bone that the topological sort could not place
+	:return: list of cycles, each cycle is a sorted list of bone idxs
+	"""
+	nodes = set(nodes)
+	index = {}
+	lowlink = {}
+	stack = []
+	onstack = set()
+	cycles = []
+	counter = 0
+	for root in sorted(nodes):
+		if root in index: continue
+		# each work item is (node, position in its edge list)
+		work = [(root, 0)]
+		index[root] = lowlink[root] = counter; counter += 1
+		stack.append(root); onstack.add(root)
+		while work:
+			node, pos = work[-1]
+			if pos < len(edges[node]):
+				work[-1] = (node, pos + 1)
+				nxt = edges[node][pos][0]
+				if nxt not in nodes: continue
+				if nxt not in index:
+					index[nxt] = lowlink[nxt] = counter; counter += 1
+					stack.append(nxt); onstack.add(nxt)
+					work.append((nxt, 0))
+				elif nxt in onstack:
+					lowlink[node] = min(lowlink[node], index[nxt])
+				continue
+			# done with all edges of this node
+			work.pop()
+			if work:
+				parent = work[-1][0]
+				lowlink[parent] = min(lowlink[parent], lowlink[node])
+			if lowlink[node] == index[node]:
+				component = []
+				while True:
+					x = stack.pop(); onstack.discard(x)
+					component.append(x)
+					if x == node: break
+				if len(component) > 1:
+					cycles.append(sorted(component))
+	return cycles
+
+
 def bonedeform_fix(pmx: pmxstruct.Pmx, moreinfo=False):
 	# make a parallel list of the deform layers for each bone so I can work there
 	# if I encounter a recursive relationship I will have not touched the acutal PMX and can err and return it unchanged
@@ -48,78 +147,24 @@ def bonedeform_fix(pmx: pmxstruct.Pmx, moreinfo=False):
 			if bone.deform_after_phys:
 				deforms[d] += DEFORM_AFTER_PHYS_OFFSET
 	
-	# make a list of the "ik master" for each bone
-	# it is possible for a bone to be controlled by multiple IK masters, actually every foot bone of every model is this way
-	ikmasters = [set() for _ in pmx.bones]
-	
-	for d,bone in enumerate(pmx.bones):
-		# find IK bones
-		if bone.has_ik:
-			# target uses me as master
-			ikmasters[bone.ik_target_idx].add(d)
-			for link in bone.ik_links:
-				# links use me as master
-				ikmasters[link.idx].add(d)
-	
-	modified_bones = set()
-	
-	# ASK: does "me" deform after "parent"?
-	def good_deform_relationship(me_idx, parent_idx):
-		# anything that inherits from an IKCHAIN bone has to be >= that bone's ik master, EXCEPT for bones actually in that ik group
-		# if parent has a master AND (parent master != my master): parent=max(parent,master), but need to expand this for sets:
-		# if parent has a master AND no overlap between my master and parent master: parent=max(parent,master)=master cuz master >= parent
-		# else: parent=parent
-		if ikmasters[parent_idx]:
-			# is me in the IK group of the parent? me is the ikmaster or me shares an ikmaster with parent
-			# if this IS in the ik group then DON'T overwrite parent_idx
-			if not (me_idx in ikmasters[parent_idx] or ikmasters[me_idx].intersection(ikmasters[parent_idx])):
-				l = list(ikmasters[parent_idx]) # turn set into list
-				l.sort() # sort by bone order, tiebreaker
-				l.sort(key=lambda x: deforms[x]) # sort by deform level, primary sort
-				parent_idx = l[-1] # this means the parent is the last-deforming master of any masters of the bone
-		
-		# "after" means idx>source and layer >= source or idx<source and layer > source
-		# note: if somehow me_idx == parent_idx this returns true to prevent infinite looping
-		if me_idx < parent_idx:
-			if deforms[me_idx] > deforms[parent_idx]:
-				return True
-		else: # if me_idx >= parent_idx
-			if deforms[me_idx] >= deforms[parent_idx]:
-				return True
-		return False
-	
-	# loop until nothing changes, or until 1000 iterations (indicates recursive relationship)
-	loops = 0
-	while loops < MAX_LOOPS:
-		loops += 1
-		has_changed = False
-		for d,bone in enumerate(pmx.bones):
-			# decide if this bone has a good deform layer!
-			is_good = True
-			# each bone must deform after its parent
-			if bone.parent_idx != -1: # -1 is not a valid parent to check
-				is_good &= good_deform_relationship(d, bone.parent_idx)
-			# each bone must deform after its partial inherit source, if it uses it
-			if (bone.inherit_trans or bone.inherit_rot) and bone.inherit_ratio != 0 and bone.inherit_parent_idx != -1:
-				is_good &= good_deform_relationship(d, bone.inherit_parent_idx)
-			# each ik bone must deform after its target and IK chain
-			if bone.has_ik:
-				# target
-				is_good &= good_deform_relationship(d, bone.ik_target_idx)
-				for link in bone.ik_links:
-					# links
-					is_good &= good_deform_relationship(d, link.idx)
-			# if the relationship is NOT good, then raise the deform layer of this bone
-			if not is_good:
-				has_changed = True
-				modified_bones.add(d)
-				deforms[d] += 1
-			pass  # end for-loop
-		
-		# this is the while-loop exit condition
-		if not has_changed:
-			break
-		pass  # end while-loop
+	# the smallest deform layers that satisfy every edge are the longest paths thru the graph, and because every
+	# cycle would need infinite layers, any cycle is a recursive relationship
+	# visit the bones in topological order (Kahn's algorithm) & raise each bone to the max that its edges require
+	edges = build_deform_graph(pmx)
+	indegree = [0] * len(pmx.bones)
+	for outs in edges:
+		for dst, _ in outs:
+			indegree[dst] += 1
+	ready = [d for d,ct in enumerate(indegree) if ct == 0]
+	num_visited = 0
+	while ready:
+		src = ready.pop()
+		num_visited += 1
+		for dst, weight in edges[src]:
+			deforms[dst] = max(deforms[dst], deforms[src] + weight)
+			indegree[dst] -= 1
+			if indegree[dst] == 0:
+				ready.append(dst)
 	
 	if RESPECT_DEFORM_AFTER_PHYS:
 		# undo the "deform before phys" offset
@@ -127,26 +172,27 @@ def bonedeform_fix(pmx: pmxstruct.Pmx, moreinfo=False):
 			if bone.deform_after_phys:
 				deforms[d] -= DEFORM_AFTER_PHYS_OFFSET
 
-	# did it break because of recursion error?
-	if loops == MAX_LOOPS:
+	# did it stop early because of a recursion error?
+	if num_visited != len(pmx.bones):
 		# if yes, warn & return without changes
 		core.MY_PRINT_FUNC("ERROR: recursive inheritance relationship among bones!! You must manually investigate and resolve this issue.")
-		suspects = [i for i,de in enumerate(deforms) if de > 50]
-		core.MY_PRINT_FUNC("Suspicious bones: " + str(suspects))
+		for cycle in find_cycles(edges, [d for d,ct in enumerate(indegree) if ct != 0]):
+			core.MY_PRINT_FUNC("These bones depend on eachother in a loop: " +
+							   ", ".join("#%d JP='%s'" % (d, pmx.bones[d].name_jp) for d in cycle))
 		core.MY_PRINT_FUNC("Bone deform order not changed")
 		return pmx, False
 	
+	deforms_orig = [p.deform_layer for p in pmx.bones]
+	modified_bones = [d for d, (o, n) in enumerate(zip(deforms_orig, deforms)) if o != n]
 	if not modified_bones:
 		core.MY_PRINT_FUNC("No changes are required")
 		return pmx, False
 	
 	# if something did change,
 	if moreinfo:
-		deforms_orig = [p.deform_layer for p in pmx.bones]
-		for d, (o, n) in enumerate(zip(deforms_orig, deforms)):
-			if o != n:
-				core.MY_PRINT_FUNC("bone #{:<3} JP='{}' / EN='{}', deform: {} --> {}".format(
-					d, pmx.bones[d].name_jp, pmx.bones[d].name_en, o, n))
+		for d in modified_bones:
+			core.MY_PRINT_FUNC("bone #{:<3} JP='{}' / EN='{}', deform: {} --> {}".format(
+				d, pmx.bones[d].name_jp, pmx.bones[d].name_en, deforms_orig[d], deforms[d]))
 
 	
 	core.MY_PRINT_FUNC("Modified deform order for {} / {} = {:.1%} bones".format(
@@ -6,6 +6,9 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.00 - 6/10/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("frames", "bones", "morphs")
+PASS_WRITES = ("frames",)
+
 
 # "全ての親": "motherbone",
 # "操作中心": "view cnt",
@@ -113,34 +116,34 @@ def dispframe_fix(pmx: pmxstruct.Pmx, moreinfo=False):
 	# delete bones that are in the panels more than once
 	# remove all morphs that are group 0
 	for d,frame in enumerate(pmx.frames):  # for each display group,
-		i = 0
-		while i < len(frame.items):  # for each item in that display group,
-			item = frame.items[i]
+		keep = []  # parallel to frame.items, whether to keep each item
+		for item in frame.items:  # for each item in that display group,
 			if item.is_morph:  # if it is a morph
 				# look up the morph
 				morph = pmx.morphs[item.idx]
 				# figure out what panel of this morph is
 				# if it has an invalid panel #, discard it
 				if morph.panel == pmxstruct.MorphPanel.HIDDEN:
-					frame.items.pop(i)
+					keep.append(False)
 					hidden_morphs_removed += 1
 				# if this is valid but already in the set of used morphs, discard it
 				elif item.idx in displayed_morphs:
-					frame.items.pop(i)
+					keep.append(False)
 					duplicate_entries_removed += 1
 				# otherwise, add it to set of used morphs
 				else:
 					displayed_morphs.add(item.idx)
-					i += 1
+					keep.append(True)
 			else:  # if it is a bone
 				# if this is already in the set of used bones, delete it
 				if item.idx in displayed_bones:
-					frame.items.pop(i)
+					keep.append(False)
 					duplicate_entries_removed += 1
 				# otherwise, add it to set of used bones
 				else:
 					displayed_bones.add(item.idx)
-					i += 1
+					keep.append(True)
+		core.my_list_compact(frame.items, keep)
 	
 	if hidden_morphs_removed:
 		core.MY_PRINT_FUNC("removed %d hidden morphs (cause of crashes)" % hidden_morphs_removed)
@@ -180,35 +183,25 @@ def dispframe_fix(pmx: pmxstruct.Pmx, moreinfo=False):
 	# check if there are too many morphs among all frames... if so, trim and remake "displayed morphs"
 	# morphs can theoretically be in any frame, they SHOULD only be in the "expressions" frame but people mess things up
 	total_num_morphs = 0
+	def keep_item(item):
+		# if this is a bone, keep it
+		if not item.is_morph:
+			return True
+		# if it is a morph, count it
+		nonlocal total_num_morphs
+		total_num_morphs += 1
+		# if i have already counted too many morphs, remove it
+		return total_num_morphs <= MAX_MORPHS_IN_DISPLAY
 	for frame in pmx.frames:
-		i = 0
-		while i < len(frame.items):
-			# if this is a bone, skip it
-			if not frame.items[i].is_morph:
-				i += 1
-			else:
-				# if it is a morph, count it
-				total_num_morphs += 1
-				# if i have already counted too many morphs, pop it
-				if total_num_morphs > MAX_MORPHS_IN_DISPLAY:
-					frame.items.pop(i)
-				else:
-					i += 1
+		core.my_list_compact(frame.items, keep_item)
 	num_morphs_over_limit = max(total_num_morphs - MAX_MORPHS_IN_DISPLAY, 0)
 	if num_morphs_over_limit:
 		core.MY_PRINT_FUNC("removed %d morphs to stay under the %d morph limit (cause of crashes)" % (num_morphs_over_limit, MAX_MORPHS_IN_DISPLAY))
 		core.MY_PRINT_FUNC("!!! Warning: do not add the remaining morphs to the display group! MMD will crash!")
 		
 	# delete any groups that are empty
-	i = 0
-	while i < len(pmx.frames):
-		frame = pmx.frames[i]
-		# if it is empty AND it is not "special" then delete it
-		if len(frame.items) == 0 and not frame.is_special:
-			pmx.frames.pop(i)
-			empty_groups_removed += 1
-		else:
-			i += 1
+	# if it is empty AND it is not "special" then delete it
+	empty_groups_removed = core.my_list_compact(pmx.frames, lambda frame: len(frame.items) != 0 or frame.is_special)
 	if empty_groups_removed and moreinfo:
 		core.MY_PRINT_FUNC("removed %d empty groups" % empty_groups_removed)
 		
@@ -1,12 +1,23 @@
+import itertools
+from typing import List
+
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
 from mmd_scripting.core.nuthouse01_pmx_utils import delme_list_to_rangemap, morph_delete_and_remap
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 8/22/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("morphs",)
+PASS_WRITES = ("morphs", "frames")
+
 
 
 # just take a wild guess what this field controls
@@ -61,6 +72,18 @@ def showprompt():
 	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=True)
 	return pmx, input_filename_pmx
 
+def _winnow_keep_mask(items: List[pmxstruct.PmxMorphItemVertex]) -> List[bool]:
+	# for each vertex morph item, decide if it is worth keeping or deleting
+	# it is deleted if the euclidian distance it moves is less than the threshold
+	if np is None or not items:
+		return [not (core.my_euclidian_distance(vert.move) < WINNOW_THRESHOLD) for vert in items]
+	# pulling the numbers out of the objects is the slow part, fromiter on a flat chain is the fastest way to do that
+	moves = np.fromiter(itertools.chain.from_iterable([vert.move for vert in items]), dtype=np.float64, count=3 * len(items))
+	moves = moves.reshape(-1, 3)
+	# add the squares in the same order as my_euclidian_distance so the result is exactly the same
+	length = np.sqrt((moves[:,0] * moves[:,0] + moves[:,1] * moves[:,1]) + moves[:,2] * moves[:,2])
+	return (~(length < WINNOW_THRESHOLD)).tolist()
+
 def morph_winnow(pmx: pmxstruct.Pmx, moreinfo=False):
 	total_num_verts = 0
 	total_vert_dropped = 0
@@ -74,21 +97,9 @@ def morph_winnow(pmx: pmxstruct.Pmx, moreinfo=False):
 		if morph.morphtype != pmxstruct.MorphType.VERTEX: continue
 		# if it has one of the special AutoLuminous morph names, then skip it
 		if morph.name_jp in IGNORE_THESE_MORPHS: continue
-		# for each vert in this vertex morph:
-		i = 0
-		this_vert_dropped = 0  # lines dropped from this morph
 		total_num_verts += len(morph.items)
-		while i < len(morph.items):
-			vert = morph.items[i]
-			vert:pmxstruct.PmxMorphItemVertex
-			# determine if it is worth keeping or deleting
-			# first, calculate euclidian distance
-			length = core.my_euclidian_distance(vert.move)
-			if length < WINNOW_THRESHOLD:
-				morph.items.pop(i)
-				this_vert_dropped += 1
-			else:
-				i += 1
+		# remove each vert in this vertex morph that moves less than the threshold
+		this_vert_dropped = core.my_list_compact(morph.items, _winnow_keep_mask(morph.items))
 		if len(morph.items) == 0:
 			# mark newly-emptied vertex morphs for later removal
 			morphs_now_empty.append(d)
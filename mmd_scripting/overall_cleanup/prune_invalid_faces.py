@@ -1,14 +1,22 @@
-import copy
+from typing import Dict, List, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
 from mmd_scripting.core.nuthouse01_pmx_utils import delete_faces
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.5.08 - 6/3/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("faces", "materials")
+PASS_WRITES = ("faces", "materials")
+
 
 
 helptext = '''====================
@@ -35,97 +43,134 @@ def showprompt():
 	return pmx, input_filename_pmx
 
 
-def prune_invalid_faces(pmx: pmxstruct.Pmx, moreinfo=False):
-	#############################
-	# ready for logic
-	
-	faces_to_remove = []
-	# identify faces which need removing
+def _canonical_face(face) -> tuple:
+	# the order of the vertices within the face are what matters, but they can start from any of the 3 points
+	# ABC === BCA === CAB, but ABC != CBA because that is the mirror image (facing the other way)
+	# so rotate it so that the lowest index is always first
+	i = face.index(min(face))
+	return tuple(face[i:] + face[:i])
+
+
+def find_bad_faces_python(pmx: pmxstruct.Pmx) -> Tuple[List[int], Dict[int, int], List[int], int]:
+	"""
+	Pure-Python version of find_bad_faces(), used when numpy is not available.
+	"""
+	invalid_faces = []
+	dupe_faces = []
+	dupes_per_mat = {}
+	survivors = set()
+	cross_dupes = 0
+	# faces not covered by any material are not checked for dupes within materials, but still count for the others
+	mat_of_face = []
+	for d,mat in enumerate(pmx.materials):
+		mat_of_face += [d] * mat.faces_ct
+	seen_in_mat = set()
 	for i,face in enumerate(pmx.faces):
 		# valid faces are defined by 3 unique vertices, if the vertices are not unique then the face is invalid
 		if 3 != len(set(face)):
-			faces_to_remove.append(i)
+			invalid_faces.append(i)
+			continue
+		key = _canonical_face(face)
+		d = mat_of_face[i] if i < len(mat_of_face) else None
+		if d is not None:
+			if (d, key) in seen_in_mat:
+				dupe_faces.append(i)
+				dupes_per_mat[d] = dupes_per_mat.get(d, 0) + 1
+				continue
+			seen_in_mat.add((d, key))
+		# this face is staying, if some other staying face already looks like it then it's a cross-material dupe
+		if key in survivors:
+			cross_dupes += 1
+		else:
+			survivors.add(key)
+	return invalid_faces, dupes_per_mat, dupe_faces, cross_dupes
+
+
+def find_bad_faces(pmx: pmxstruct.Pmx) -> Tuple[List[int], Dict[int, int], List[int], int]:
+	"""
+	Find all faces that are invalid (don't use 3 different vertices), and all faces that are exact duplicates of an
+	earlier face in the same material. Faces are the same if they use the same vertices in the same winding order,
+	the starting vertex doesn't matter, but mirrored faces (same vertices, opposite winding) are different.
+	Also count faces that are duplicates of faces in other materials, but these are not marked for deletion.
+	Uses numpy if it is available.
+	
+	:param pmx: PMX object
+	:return: sorted list of invalid face idxs, dict of material idx to # of dupes in that material, sorted list of
+	duplicate face idxs, # of faces that duplicate a face in a different material
+	"""
+	if np is None or not pmx.faces:
+		return find_bad_faces_python(pmx)
+	faces = np.array(pmx.faces, dtype=np.int64).reshape(-1, 3)
+	numfaces = len(faces)
+	# valid faces are defined by 3 unique vertices, if the vertices are not unique then the face is invalid
+	is_invalid = (faces[:,0] == faces[:,1]) | (faces[:,1] == faces[:,2]) | (faces[:,0] == faces[:,2])
+	# rotate each face so the lowest index is first, this doesn't change the winding order
+	first = np.argmin(faces, axis=1)
+	rot = (first[:,None] + np.arange(3)) % 3
+	canon = np.take_along_axis(faces, rot, axis=1)
+	# which material each face belongs to, faces not covered by any material each get their own fake material
+	mat_counts = np.array([mat.faces_ct for mat in pmx.materials], dtype=np.int64)
+	mat_of_face = np.repeat(np.arange(len(mat_counts)), mat_counts)[:numfaces]
+	extra = numfaces - len(mat_of_face)
+	if extra > 0:
+		mat_of_face = np.concatenate([mat_of_face, np.arange(len(mat_counts), len(mat_counts) + extra)])
+	
+	# squash each face into one int so sorting is cheap, this works as long as there are fewer than 2 million verts
+	# otherwise sort by each column of the face separately (lexsort wants the least important key first)
+	if canon.max() < (1 << 21):
+		keycols = [(canon[:,0] << 42) | (canon[:,1] << 21) | canon[:,2]]
+	else:
+		keycols = [canon[:,2], canon[:,1], canon[:,0]]
+	
+	# sort the valid faces by material then by vertices, so identical faces in the same material are adjacent
+	# lexsort is stable so within each run of identical faces the earliest face comes first and is the one kept
+	valid_idx = np.flatnonzero(~is_invalid)
+	order = valid_idx[np.lexsort([k[valid_idx] for k in keycols] + [mat_of_face[valid_idx]])]
+	same_as_prev = np.zeros(len(order), dtype=bool)
+	same_as_prev[1:] = (mat_of_face[order[1:]] == mat_of_face[order[:-1]])
+	for k in keycols:
+		same_as_prev[1:] &= (k[order[1:]] == k[order[:-1]])
+	dupe_faces = np.sort(order[same_as_prev])
+	dupe_mat_ct = np.bincount(mat_of_face[dupe_faces], minlength=len(mat_counts))[:len(mat_counts)]
+	dupes_per_mat = {int(d): int(ct) for d, ct in enumerate(dupe_mat_ct) if ct}
+	
+	# among the faces that survive, count how many are repeats of something earlier regardless of material
+	survivors = order[~same_as_prev]
+	order2 = survivors[np.lexsort([k[survivors] for k in keycols])]
+	same_as_prev2 = np.ones(max(len(order2) - 1, 0), dtype=bool)
+	for k in keycols:
+		same_as_prev2 &= (k[order2[1:]] == k[order2[:-1]])
+	cross_dupes = int(np.count_nonzero(same_as_prev2))
+	return np.flatnonzero(is_invalid).tolist(), dupes_per_mat, dupe_faces.tolist(), cross_dupes
+
+
+def prune_invalid_faces(pmx: pmxstruct.Pmx, moreinfo=False):
+	#############################
+	# ready for logic
 	
-	numinvalid = len(faces_to_remove)
 	prevtotal = len(pmx.faces)
+	invalid_faces, dupes_per_mat, dupe_faces, otherdupes = find_bad_faces(pmx)
+	numinvalid = len(invalid_faces)
+	numdupes = len(dupe_faces)
 	
+	# do the actual face deletion, all at once
+	faces_to_remove = sorted(invalid_faces + dupe_faces)
 	if faces_to_remove:
-		# do the actual face deletion
 		delete_faces(pmx, faces_to_remove)
-		
+	
 	if numinvalid != 0:
 		core.MY_PRINT_FUNC("Found & deleted {} / {} = {:.1%} faces for being invalid".format(
 			numinvalid, prevtotal, numinvalid / prevtotal))
 	
-	#################
-	# NEW: delete duplicate faces within materials
-	
-	# first iter over all faces and comparable hashes from each
-	# PROBLEM: faces from the same vertices but reversed are considered different faces, so sorting is not a valid way to differentiate
-	# the order of the vertices within the face are what matters, but they can start from any of the 3 points
-	# ABC === BCA === CAB
-	# create a copy list and rotate all teh copies so that the lowest index is always first (do not modify vertex order of original!)
-	facescopy = copy.deepcopy(pmx.faces)
-	donothing = lambda x: x							# if i==0, don't change it
-	headtotail = lambda x: x.append(x.pop(0))		# if i==1, pop the head & move it to the tail
-	tailtohead = lambda x: x.insert(0, x.pop(2))	# if i==2, pop the tail & move it to the head
-	opdict = {0: donothing, 1: headtotail, 2: tailtohead} # dict of functions
-	for f in facescopy:
-		# for each face, find the index of the minimum vert within the face
-		i = f.index(min(f))
-		# this can be extremely slow, for maximum efficiency use dict-lambda trick instead of if-else chain.
-		# return value isn't used, the pop/append operate on the list reference
-		opdict[i](f)
-		# now the faces have been rotated in-place and will be saved to file
-	
-	# now the faces have been rotated so that dupes will align perfectly but mirrors will stay different!!
-	# turn each face into a sorted tuple and then hash it, numbers easier to store & compare
-	hashfaces = [hash(tuple(f)) for f in facescopy]
-	# now make a new list where this hashed value is attached to the index of the corresponding face
-	f_all_idx = list(range(len(facescopy)))
-	hashfaces_idx = list(zip(hashfaces, f_all_idx))
-	# for each material unit, sort & find dupes
-	startidx = 0
-	all_dupefaces = []
-	for d,mat in enumerate(pmx.materials):
-		numfaces = mat.faces_ct
-		this_dupefaces = []
-		# if there is 1 or 0 faces then there cannot be any dupes, so skip
-		if numfaces < 2: continue
-		# get the faces for this material & sort by hash so same faces are adjacent
-		matfaces = hashfaces_idx[startidx : startidx+numfaces]
-		matfaces.sort(key=core.get1st)
-		for i in range(1,numfaces):
-			# if face i is the same as face i-1,
-			if matfaces[i][0] == matfaces[i-1][0]:
-				# then save the index of this face
-				this_dupefaces.append(matfaces[i][1])
-		# always inc startidx after each material
-		startidx += numfaces
-		# accumulate the dupefaces between each material
-		if this_dupefaces:
-			all_dupefaces += this_dupefaces
-			if moreinfo:
-				core.MY_PRINT_FUNC("mat #{:<3} JP='{}' / EN='{}', found {} duplicates".format(
-					d, mat.name_jp, mat.name_en, len(this_dupefaces)))
-	# this must be in ascending sorted order
-	all_dupefaces.sort()
-	numdupes = len(all_dupefaces)
-	
-	# do the actual face deletion
-	if all_dupefaces:
-		delete_faces(pmx, all_dupefaces)
-	
+	if moreinfo:
+		for d, ct in dupes_per_mat.items():
+			mat = pmx.materials[d]
+			core.MY_PRINT_FUNC("mat #{:<3} JP='{}' / EN='{}', found {} duplicates".format(
+				d, mat.name_jp, mat.name_en, ct))
 	if numdupes != 0:
 		core.MY_PRINT_FUNC("Found & deleted {} / {} = {:.1%} faces for being duplicates within material units".format(
 			numdupes, prevtotal, numdupes / prevtotal))
-		
-	# now find how many duplicates there are spanning material units
-	# first delete the dupes we know about from the hash-list
-	for f in reversed(all_dupefaces):
-		hashfaces.pop(f)
-	# then cast hash-list as a set to eliminate dupes and compare sizes to count how many remain
-	otherdupes = len(hashfaces) - len(set(hashfaces))
+	
 	if otherdupes != 0:
 		core.MY_PRINT_FUNC("Warning: Found {} faces which are duplicates spanning material units, did not delete".format(otherdupes))
 	
@@ -4,12 +4,15 @@ from typing import List
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
-from mmd_scripting.core.nuthouse01_pmx_utils import delete_multiple_bones, delme_list_to_rangemap
+from mmd_scripting.core.nuthouse01_pmx_utils import BoneGraph, delete_multiple_bones, delme_list_to_rangemap
 
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.00 - 6/10/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("bones", "verts", "rigidbodies")
+PASS_WRITES = ("bones", "verts", "morphs", "frames", "rigidbodies")
+
 
 ########################################
 # bones are used when:
@@ -108,69 +111,26 @@ def identify_unused_bones(pmx: pmxstruct.Pmx, moreinfo: bool) -> List[int]:
 	# NOTE: some vertices/rigidbodies depend on "invalid" (-1) bones, clean that up here
 	true_used_bones.discard(-1)
 	
+	# build the index of how all the bones relate to eachother
+	graph = BoneGraph(pmx.bones)
+	
 	# third: mark the "exception" bones as "used" if they are in the model
 	for protect in BONES_TO_PROTECT:
 		# get index from JP name
-		i = core.my_list_search(pmx.bones, lambda x: x.name_jp == protect)
+		i = graph.name_jp_to_idx.get(protect)
 		if i is not None:
 			true_used_bones.add(i)
 	
-	# build ik groups here
-	# IKbone + chain + target are treated as a group... if any 1 is used, all of them are used. build those groups now.
-	ik_groups = [] # list of sets
-	for d,bone in enumerate(pmx.bones):
-		if bone.has_ik:  # if ik enabled for this bone,
-			ik_set = set()
-			ik_set.add(d)  # this bone
-			ik_set.add(bone.ik_target_idx)  # this bone's target
-			for link in bone.ik_links:
-				ik_set.add(link.idx)  # all this bone's IK links
-			ik_groups.append(ik_set)
-	
-	# fourth: NEW APPROACH FOR SOLVING INHERITANCE: RECURSION!
-	# for each bone that we know to be used, run UP the inheritance tree and collect everything that it depends on
-	# recursion inputs: pmx bonelist, ik groups, set of already-known-used, and the bone to start from
-	# bonelist is readonly, ik groups are readonly
-	# set of already-known-used overlaps with set-being-built, probably just use one global ref to save time merging sets
-	# standard way: input is set-of-already-known, return set-built-from-target, that requires merging results after each call tho
-	# BUT each function level adds exactly 1 or 0 bones to the set, therefore can just modify the set that is being passed around
-	
-	def recursive_climb_inherit_tree(target: int, set_being_built):
-		# implicitly inherits variables pmx, ik_groups from outer scope
-		if target in set_being_built or target == -1:
-			# stop condition: if this bone idx is already known to be used, i have already ran recursion from this node. don't do it again.
-			# also abort if the target is -1 which means invalid bone
-			return
-		# if not already in the set, but recursion is being called on this, then this bone is a "parent" of a used bone and should be added.
-		set_being_built.add(target)
-		# now the parents of THIS bone are also used, so recurse into those.
-		bb = pmx.bones[target]
-		# acutal parent
-		recursive_climb_inherit_tree(bb.parent_idx, set_being_built)
-		# partial inherit: if partial rot or partial move, and ratio is nonzero and parent is valid
-		if (bb.inherit_rot or bb.inherit_trans) and bb.inherit_ratio != 0 and bb.inherit_parent_idx != -1:
-			recursive_climb_inherit_tree(bb.inherit_parent_idx, set_being_built)
-		# IK groups: if in an IK group, recurse to all members of that IK group
-		for group in ik_groups:
-			if target in group:
-				for ik_member in group:
-					recursive_climb_inherit_tree(ik_member, set_being_built)
-					
-	parent_used_bones = set()  # true_used_bones + parents + point-at links
-	# now that the recursive function is defined, actually invoke the function from every truly-used bone
-	for tu in true_used_bones:
-		recursive_climb_inherit_tree(tu, parent_used_bones)
+	# fourth: for each bone that we know to be used, run UP the inheritance tree and collect everything that it depends on
+	# parents, partial-inherit sources, and IK groups: IKbone + chain + target are treated as a group... if any 1 is
+	# used, all of them are used.
+	parent_used_bones = graph.dependency_closure(true_used_bones)  # true_used_bones + parents + point-at links
 	
 	# fifth: "tail" or point-at links
 	# propogate DOWN the inheritance tree exactly 1 level, no more.
 	# also get all bones these tails depend on, it shouldn't depend on anything new but it theoretically can.
-	final_used_bones = set()
-	for bidx in parent_used_bones:
-		b = pmx.bones[bidx]
-		# if this bone has a tail,
-		if b.tail_usebonelink:
-			# add it and anything it depends on to the set.
-			recursive_climb_inherit_tree(b.tail, final_used_bones)
+	tails = [pmx.bones[bidx].tail for bidx in parent_used_bones if pmx.bones[bidx].tail_usebonelink]
+	final_used_bones = graph.dependency_closure(tails)
 	# now merge the two sets
 	final_used_bones = final_used_bones.union(parent_used_bones)
 	
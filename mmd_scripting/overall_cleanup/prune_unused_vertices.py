@@ -7,6 +7,9 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 6/10/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("verts", "faces")
+PASS_WRITES = ("verts", "faces", "morphs", "softbodies")
+
 
 
 helptext = '''====================
@@ -1,4 +1,5 @@
-from typing import List
+import contextlib
+from typing import Callable, ContextManager, List, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
@@ -9,6 +10,12 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("header", "materials", "bones", "morphs", "frames")
+PASS_WRITES = ("header", "materials", "bones", "morphs", "frames")
+# the result can depend on Google Translate, so even if a model was already clean last time, it might not be
+# clean next time (if a translation failed)
+PASS_IS_REPEATABLE = False
+
 # this switch will enable extra printouts throughout the script
 DEBUG = False
 
@@ -222,39 +229,52 @@ def _trans_source_google_translate(recordlist: List[StringTranslateRecord]) -> N
 	Modify in-place, no return.
 	:param recordlist: list of all StringTranslateRecord objects
 	"""
+	_trans_source_google_translate_many([recordlist])
+	return
+
+def _trans_source_google_translate_many(recordlists: List[List[StringTranslateRecord]]) -> None:
+	"""
+	Attempt Google translation for several lists of records (probably from several models) at once, so that anything
+	they have in common is only translated once.
+	Modify in-place, no return.
+	:param recordlists: list of lists of StringTranslateRecord objects
+	"""
 	if DISABLE_INTERNET_TRANSLATE: return
 	# if it has succesfully translated from some other source, don't overwrite that result!
-	remainlist = [R for R in recordlist if R.trans_source is None]
-	if DEBUG: print("stage5 google: remaining", len(remainlist))
+	remainlists = [[R for R in recordlist if R.trans_source is None] for recordlist in recordlists]
+	if DEBUG: print("stage5 google: remaining", sum(len(r) for r in remainlists))
 	
-	if not remainlist: return
+	num_remain = sum(len(r) for r in remainlists)
+	if not num_remain: return
 	########
 	# actually do google translate
-	core.MY_PRINT_FUNC("... identified %d items that need Internet translation..." % len(remainlist))
+	core.MY_PRINT_FUNC("... identified %d items that need Internet translation..." % num_remain)
+	scheduler = translation_functions.TranslateScheduler(autodetect_language=GOOGLE_AUTODETECT_LANGUAGE,
+														 chunks_only_kanji=True)
+	tickets = [scheduler.add([R.jp_old for R in remainlist]) for remainlist in remainlists]
 	try:
-		remainlist_strings = [R.jp_old for R in remainlist]
-		google_results = translation_functions.google_translate(remainlist_strings,
-																autodetect_language=GOOGLE_AUTODETECT_LANGUAGE,
-																chunks_only_kanji=True)
+		scheduler.run()
 	except Exception as e:
 		core.MY_PRINT_FUNC(e.__class__.__name__, e)
 		core.MY_PRINT_FUNC("ERROR: Internet translate unexpectedly failed, attempting to recover...")
 		# for each in translate-notdone, set status to fail, set newname to oldname (so it won't change)
-		for item in remainlist:
-			# item.trans_type = "FAIL"
-			item.en_new = item.en_old
-			# fail-state is when a new name has been assigned but type has not been set, this way it is easily overridden
+		for remainlist in remainlists:
+			for item in remainlist:
+				# item.trans_type = "FAIL"
+				item.en_new = item.en_old
+				# fail-state is when a new name has been assigned but type has not been set, this way it is easily overridden
 		return
 
 	# determine if each item passed or not, update the en_new and trans_type fields
-	for item, result in zip(remainlist, google_results):
-		# always (tentatively) accept the google result, pass or fail it's the best i've got
-		item.en_new = result
-		# determine whether it passed or failed for display purposes
-		# failure is usually due to unusual geometric symbols, not due to japanese text, but sometimes it just fucks up
-		# if it fails, leave the type as NONE so it might be overridden by other stages I guess
-		if not translation_functions.needs_translate(result):
-			item.trans_source = "google"
+	for remainlist, ticket in zip(remainlists, tickets):
+		for item, result in zip(remainlist, scheduler.results(ticket)):
+			# always (tentatively) accept the google result, pass or fail it's the best i've got
+			item.en_new = result
+			# determine whether it passed or failed for display purposes
+			# failure is usually due to unusual geometric symbols, not due to japanese text, but sometimes it just fucks up
+			# if it fails, leave the type as NONE so it might be overridden by other stages I guess
+			if not translation_functions.needs_translate(result):
+				item.trans_source = "google"
 	return
 
 def _trans_source_catchall_fail(recordlist: List[StringTranslateRecord]) -> None:
@@ -308,10 +328,45 @@ def showprompt():
 
 
 def translate_to_english(pmx: pmxstruct.Pmx, moreinfo=False):
-	
 	# # step zero: set up the translator thingy
 	# init_googletrans()
 	
+	translate_record_list = _translate_before_google(pmx)
+	_trans_source_google_translate(translate_record_list)  #5
+	return _translate_after_google(pmx, translate_record_list, moreinfo)
+
+def translate_to_english_many(pmx_list: List[pmxstruct.Pmx], moreinfo=False,
+							  model_context: Callable[[int], ContextManager]=None) -> List[Tuple[pmxstruct.Pmx, bool]]:
+	"""
+	Same as running translate_to_english() on each model, except that all of the Google translation is done together.
+	Any JP chunk that shows up in several models is only sent to Google once, and it uses fewer requests overall.
+	
+	:param pmx_list: list of PMX objects, each is modified in-place
+	:param moreinfo: if true, get extra printouts with more info about stuff
+	:param model_context: optional, function that takes the index of a model and returns a context manager. the parts
+	of the work that only involve that one model are done inside it, for example to capture the printouts of each model
+	separately. the Google part is not done inside any of them.
+	:return: list of (pmx, is_changed) for each model, same as translate_to_english() returns
+	"""
+	if model_context is None:
+		model_context = _no_context
+	recordlists = []
+	for d, pmx in enumerate(pmx_list):
+		with model_context(d):
+			recordlists.append(_translate_before_google(pmx))
+	_trans_source_google_translate_many(recordlists)  #5
+	retme = []
+	for d, (pmx, recordlist) in enumerate(zip(pmx_list, recordlists)):
+		with model_context(d):
+			retme.append(_translate_after_google(pmx, recordlist, moreinfo))
+	return retme
+
+@contextlib.contextmanager
+def _no_context(d: int):
+	yield
+
+def _translate_before_google(pmx: pmxstruct.Pmx) -> List[StringTranslateRecord]:
+	# first half of translate_to_english(): all the local translation stages
 	# if JP model name is empty, give it something. same for comment.
 	# if EN model name is empty, copy JP. same for comment.
 	if pmx.header.name_jp == "":
@@ -337,7 +392,11 @@ def translate_to_english(pmx: pmxstruct.Pmx, moreinfo=False):
 	if TRUST_EXISTING_ENGLISH_NAME == 2: _trans_source_EN_already_good(translate_record_list)  #1
 	_trans_source_piecewise_translate(translate_record_list)  #4
 	if TRUST_EXISTING_ENGLISH_NAME == 3: _trans_source_EN_already_good(translate_record_list)  #1
-	_trans_source_google_translate(translate_record_list)  #5
+	# Google goes next, that happens outside this function
+	return translate_record_list
+
+def _translate_after_google(pmx: pmxstruct.Pmx, translate_record_list: List[StringTranslateRecord], moreinfo=False):
+	# second half of translate_to_english(): everything after Google, then apply the results to the model
 	if TRUST_EXISTING_ENGLISH_NAME == 4: _trans_source_EN_already_good(translate_record_list)  #1
 
 	# catchall should always be last tho
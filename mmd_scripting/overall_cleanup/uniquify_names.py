@@ -6,6 +6,9 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.5.03 - 10/10/2020"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("materials", "bones", "morphs", "frames")
+PASS_WRITES = ("materials", "bones", "morphs", "frames")
+
 
 
 # by default, don't unquify empty names, cuz this just turns them into "*1" "*2" "*3" etc
@@ -8,6 +8,9 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.00 - 6/10/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 #####################
 
+PASS_READS = ("verts", "faces", "bones")
+PASS_WRITES = ("verts",)
+
 
 
 helptext = '''====================
@@ -1,81 +1,63 @@
 import mmd_scripting.core.nuthouse01_core as core
-import mmd_scripting.core.nuthouse01_io as io
+import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
+from mmd_scripting.core.nuthouse01_spatial import SpatialGrid
 
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.05 - 12/27/2021"
 
 
-# read two vertex CSVs
+# read two PMX models
 # match up their vertexes by nearest-matching
 # copy UV data then write out
 def main():
-	print("Read two vertex CSVs")
+	print("Read two PMX models")
 	print("Copy the UV data in the 'source' onto the vertices at the corresponding locations in 'destination'")
 	
-	# promt vertex CSV name
-	print("Please enter name of SOURCE vertex CSV:")
-	input_filename_vertex_source = core.prompt_user_filename("CSV file", ".csv")
-	rawlist_vertex_source = io.read_file_to_csvlist(input_filename_vertex_source, use_jis_encoding=True)
+	# prompt PMX name
+	print("Please enter name of SOURCE PMX model file:")
+	input_filename_pmx_source = core.prompt_user_filename("PMX file", ".pmx")
+	pmx_source = pmxlib.read_pmx(input_filename_pmx_source, moreinfo=True)
 	
-	# verify that these are the correct kind of CSVs
-	if rawlist_vertex_source[0] != core.pmxe_vertex_csv_header:
-		core.pause_and_quit("Err: '{}' is not a valid vertex CSV".format(input_filename_vertex_source))
+	# prompt PMX name
+	print("Please enter name of DEST PMX model file:")
+	input_filename_pmx_dest = core.prompt_user_filename("PMX file", ".pmx")
+	pmx_dest = pmxlib.read_pmx(input_filename_pmx_dest, moreinfo=True)
 	
-	# promt vertex CSV name
-	print("Please enter name of DEST vertex CSV:")
-	input_filename_vertex_dest = core.prompt_user_filename("CSV file", ".csv")
-	rawlist_vertex_dest = io.read_file_to_csvlist(input_filename_vertex_dest, use_jis_encoding=True)
-	
-	# verify that these are the correct kind of CSVs
-	if rawlist_vertex_dest[0] != core.pmxe_vertex_csv_header:
-		core.pause_and_quit("Err: '{}' is not a valid vertex CSV".format(input_filename_vertex_dest))
+	if not pmx_source.verts:
+		core.pause_and_quit("Err: '{}' has no vertices".format(input_filename_pmx_source))
 	
 	##########################################################
-	# note: in CSV, 2-3-4 = pos X-Y-Z, 5-6-7 = norm X-Y-Z, 9-10 = U-V
 	print("running...")
 	
+	# index the source verts by position so finding the nearest one doesn't need to look at all of them
+	source_grid = SpatialGrid.from_pmx_verts(pmx_source.verts)
+	
 	stats_nearest_distance_for_all_verts = []
 	
-	for asdf, destvert in enumerate(rawlist_vertex_dest):
-		# if this isn't a vertex, skip it
-		if destvert[0] != core.pmxe_vertex_csv_tag: continue
+	for asdf, destvert in enumerate(pmx_dest.verts):
 		# progress
-		core.print_progress_oneline(asdf / len(rawlist_vertex_dest))
-
-		dest_pos = destvert[2:5]
-		# calculate the dist from this vert to each vert in source list
+		core.print_progress_oneline(asdf / len(pmx_dest.verts))
 		# find the one single vertex that is closest in source!
 		# the vert that is closest, copies its UV data
-		
-		nearest_vert_dist = 1000
-		nearest_vert_uv = []
-		for sourcevert in rawlist_vertex_source:
-			# if this isn't a vertex, skip it
-			if sourcevert[0] != core.pmxe_vertex_csv_tag: continue
-			source_pos = sourcevert[2:5]
-			dist = core.my_euclidian_distance([a-b for a,b in zip(source_pos, dest_pos)])
-			if dist < nearest_vert_dist:
-				nearest_vert_dist = dist
-				nearest_vert_uv = sourcevert[9:11]
-		# now i have found it!
+		nearest_vert_dist, nearest_vert_idx = source_grid.nearest(destvert.pos)
 		# store the distance for stats reasons
 		stats_nearest_distance_for_all_verts.append(nearest_vert_dist)
-		# copy the UV data (modify the dest-list)
-		rawlist_vertex_dest[asdf][9:11] = nearest_vert_uv
+		# copy the UV data (modify the dest model)
+		destvert.uv = list(pmx_source.verts[nearest_vert_idx].uv)
 		pass
 	
 	# stats! how close do the two models align?
-	min_dist = min(stats_nearest_distance_for_all_verts)
-	max_dist = max(stats_nearest_distance_for_all_verts)
-	avg_dist = sum(stats_nearest_distance_for_all_verts) / len(stats_nearest_distance_for_all_verts)
-	print("stats: min_dist = %.8f, max_dist = %.8f, avg_dist = %.8f" % (min_dist, max_dist, avg_dist))
+	if stats_nearest_distance_for_all_verts:
+		min_dist = min(stats_nearest_distance_for_all_verts)
+		max_dist = max(stats_nearest_distance_for_all_verts)
+		avg_dist = sum(stats_nearest_distance_for_all_verts) / len(stats_nearest_distance_for_all_verts)
+		print("stats: min_dist = %.8f, max_dist = %.8f, avg_dist = %.8f" % (min_dist, max_dist, avg_dist))
 	
 	# write out
 	# build the output file name and ensure it is free
-	output_filename = core.filepath_insert_suffix(input_filename_vertex_dest, "_uvpaste")
+	output_filename = core.filepath_insert_suffix(input_filename_pmx_dest, "_uvpaste")
 	output_filename = core.filepath_get_unused_name(output_filename)
 	print("Writing uvpaste result to '" + output_filename + "'...")
-	# export modified CSV
-	io.write_csvlist_to_file(output_filename, rawlist_vertex_dest, use_jis_encoding=True)
+	pmxlib.write_pmx(output_filename, pmx_dest, moreinfo=True)
 	
 	return None
 	
@@ -2,10 +2,12 @@ import os
 
 import mmd_scripting.core.nuthouse01_io as io
 
-# find the persistent json
-persist_path = io._get_persistent_storage_path(io.MY_JSON_NAME)
-# delete it
-try:
-	os.remove(persist_path)
-except FileNotFoundError:
-	pass
+# find the old persistent json, and the key-value store that replaced it (plus the journal files SQLite keeps next to it)
+persist_dir = io._get_persistent_storage_path()
+kv_path = os.path.join(persist_dir, io.MY_KV_STORE_NAME)
+# delete them
+for persist_path in (os.path.join(persist_dir, io.MY_JSON_NAME), kv_path, kv_path + "-wal", kv_path + "-shm", kv_path + "-journal"):
+	try:
+		os.remove(persist_path)
+	except FileNotFoundError:
+		pass
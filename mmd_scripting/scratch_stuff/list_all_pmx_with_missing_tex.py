@@ -69,7 +69,8 @@ def main(moreinfo=False):
 			# 4. read the pmx, gotta store it in the dict like this cuz shut up thats why
 			# dictionary where keys are filename and values are resulting pmx objects
 			all_pmx_obj = {}
-			this_pmx_obj = pmxlib.read_pmx(os.path.join(rootdir, pmx_name), moreinfo=False)
+			# only the materials are needed, so don't bother decoding anything else
+			this_pmx_obj = pmxlib.read_pmx_lazy(os.path.join(rootdir, pmx_name), moreinfo=False)
 			all_pmx_obj[pmx_name] = this_pmx_obj
 			
 			# 5. filter images down to only images underneath the same folder as the pmx
@@ -1,6 +1,7 @@
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+from mmd_scripting.core.nuthouse01_spatial import SpatialGrid
 
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.00 - 6/10/2021"
 
@@ -23,6 +24,9 @@ def main():
 	source_name_pmx = core.prompt_user_filename("PMX file", ".pmx")
 	source_pmx = pmxlib.read_pmx(source_name_pmx, moreinfo=True)
 	
+	# index the dest verts by position so finding the nearby ones doesn't need to look at all of them
+	dest_grid = SpatialGrid.from_pmx_verts(dest_pmx.verts)
+	
 	while True:
 		print("Please enter/paste JP name of morph to transfer:")
 		s = input("name: >")
@@ -51,7 +55,8 @@ def main():
 		# for each vert ref in vertex morph, go to vert in source PMX to get position
 		#
 		print("running...")
-		already_used_verts = set()
+		# vert idx -> the morph item that moves it
+		already_used_verts = {}
 		
 		stats_nearest_distance_for_all_verts = []
 		
@@ -68,23 +73,14 @@ def main():
 			# radius is hardcoded... if no dest vert found within radius, then what? warn & report nearest?
 			# maybe find nearest vertex, and then find all vertices within 110% of that radius?
 			
-			# calculate dist from here to each vert in dest_pmx
-			# find all verts within this dist threshold
-			nearest_vert_dist = 1000
-			short_dist_list = []
-			# first, find every vertex within 0.1 units (just so i have a shorter list to sort)
-			for d,v2 in enumerate(dest_pmx.verts):
-				dist = core.my_euclidian_distance([a-b for a,b in zip(vertpos, v2.pos)])
-				nearest_vert_dist = min(nearest_vert_dist, dist)
-				# dist = core.my_euclidian_distance([vertpos[i] - v2.pos[i] for i in range(3)])
-				if dist < 0.01:
-					short_dist_list.append((dist, d))
+			# find every vertex in dest_pmx within 0.01 units, sorted by distance
+			short_dist_list = [(dist, d) for dist, d in dest_grid.query_radius(vertpos, 0.01) if dist < 0.01]
 			# if nothing is found, then maybe give some insight for why?
 			if not short_dist_list:
+				nearest = dest_grid.nearest(vertpos)
+				nearest_vert_dist = 1000 if nearest is None else min(nearest[0], 1000)
 				print("warning: unable to find any verts within the threshold for source vert ID %d, nearest vert is dist=%f" % (vertid, nearest_vert_dist))
 				continue
-			# then sort this list to find the smallest distance
-			short_dist_list.sort(key=lambda x: x[0])
 			nearest_vert_dist = short_dist_list[0][0]
 			# accumulate for stats before applying wiggle room
 			stats_nearest_distance_for_all_verts.append(nearest_vert_dist)
@@ -104,15 +100,15 @@ def main():
 					# if the vertex has already been used, and the previous match wants to move it by a different amount
 					#  than the current match, then i've got a problem...
 					#  if both matches want to move by the same amount, then stay quiet
-					already_used_morphitem = core.my_list_search(newmorph.items, lambda x: x.vert_idx == v, getitem=True)
+					already_used_morphitem = already_used_verts[v]
 					if already_used_morphitem.move != morphitem.move:
 						print(f'warning: disagreement on how to move vertex {v}')
 				else:
 					# if it was not yet used, then use it!
 					# morphitem.vert_idx === v
 					# copy the way that the source morph wants to move this vert.
-					already_used_verts.add(v)
 					newitem = pmxstruct.PmxMorphItemVertex(vert_idx=v, move=morphitem.move)
+					already_used_verts[v] = newitem
 					newmorph.items.append(newitem)
 			
 			pass  # end of for-each-morphitem loop
@@ -35,7 +35,7 @@ def main(moreinfo=True):
 	# prompt PMX name
 	core.MY_PRINT_FUNC("Please enter name of PMX input file:")
 	input_filename_pmx = core.MY_FILEPROMPT_FUNC("PMX file", ".pmx")
-	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=moreinfo)
+	pmx = pmxlib.read_pmx_lazy(input_filename_pmx, moreinfo=moreinfo)
 	# prompt VMD file name
 	core.MY_PRINT_FUNC("")
 	core.MY_PRINT_FUNC("Please enter name of VMD motion or VPD pose file to check compatability with:")
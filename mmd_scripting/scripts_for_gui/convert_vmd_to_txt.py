@@ -1,3 +1,4 @@
+import shutil
 from typing import List
 
 import mmd_scripting.core.nuthouse01_core as core
@@ -84,6 +85,10 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # now that "model_compatability_check.py" exists, this feature is turned off by default
 PRINT_BONE_MORPH_SUMMARY_FILE = False
 
+# if true, VMD->TXT results are saved in the result cache, so converting the exact same VMD again just copies the
+# saved text file. (TXT->VMD is not cached, it is fast and the text files are usually being hand-edited anyway)
+USE_RESULT_CACHE = True
+
 filestr_txt = ".txt"
 # filestr_txt = ".csv"
 
@@ -576,16 +581,34 @@ def convert_vmd_to_txt(input_filename: str, moreinfo=True):
 	:param input_filename: filepath to input vmd, absolute or relative to CWD
 	:param moreinfo: default false. if true, get extra printouts with more info about stuff.
 	"""
-	# read the entire VMD, all in this one function
-	# also create the bonedict & morphdict
-	vmd_nicelist = vmdlib.read_vmd(input_filename, moreinfo=moreinfo)
-	core.MY_PRINT_FUNC("")
 	# identify an unused filename for writing the output
 	base = core.filepath_splitext(input_filename)[0]
 	base += filestr_txt
 	dumpname = core.filepath_get_unused_name(base)
+	
+	# if this exact VMD was converted before, copy that result instead
+	cache_key = None
+	if USE_RESULT_CACHE:
+		cache_key = io.result_cache_key(io.hash_file(input_filename), _SCRIPT_VERSION, (moreinfo, filestr_txt))
+		cached = io.result_cache_lookup(cache_key)
+		if cached is not None:
+			for line in cached["report"]:
+				core.MY_PRINT_FUNC(line)
+			core.MY_PRINT_FUNC("")
+			core.MY_PRINT_FUNC("This exact VMD was already converted before, copying the saved VMD-as-text file to '%s'"
+							   % core.filepath_splitdir(dumpname)[1])
+			shutil.copyfile(cached["output"], dumpname)
+			return
+	
+	# read the entire VMD, all in this one function
+	# also create the bonedict & morphdict
+	with io.record_printouts() as report:
+		vmd_nicelist = vmdlib.read_vmd(input_filename, moreinfo=moreinfo)
+	core.MY_PRINT_FUNC("")
 	# write the output VMD-as-text file
 	write_vmdtext(dumpname, vmd_nicelist)
+	if USE_RESULT_CACHE:
+		io.result_cache_store(cache_key, dumpname, report)
 	
 	# #####################################
 	# # summary file:
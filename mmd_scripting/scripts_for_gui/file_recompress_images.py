@@ -36,6 +36,10 @@ KNOWN_BAD_FORMATS = ("BGR;15", "BGR;16")
 # if recompression saves less than XXX KB, then don't save the result
 REQUIRED_COMPRESSION_AMOUNT_KB = 100
 
+# if true, every image that gets re-saved as PNG is also saved in the result cache, so when the exact same image is
+# seen again (another copy of the same model, or a second run after aborting) the slow PNG compression is skipped
+USE_RESULT_CACHE = True
+
 # how PIL reads things:
 # PNG, JPEG, BMP, DDS, TIFF, GIF
 IMG_TYPE_TO_EXT = file_sort_textures.IMG_TYPE_TO_EXT
@@ -220,7 +224,18 @@ def main(moreinfo=False):
 				
 			try:
 				# save to tempfilename with png format, use optimize=true
-				im.save(newname_as_png_full, format="PNG", optimize=True)
+				# or if this exact image was re-compressed before, just copy that result
+				cache_key = None
+				cached = None
+				if USE_RESULT_CACHE:
+					cache_key = io.result_cache_key(io.hash_file(abspath), _SCRIPT_VERSION, ("PNG", "optimize"))
+					cached = io.result_cache_lookup(cache_key)
+				if cached is not None:
+					shutil.copyfile(cached["output"], newname_as_png_full)
+				else:
+					im.save(newname_as_png_full, format="PNG", optimize=True)
+					if USE_RESULT_CACHE:
+						io.result_cache_store(cache_key, newname_as_png_full, [])
 			except OSError as e:
 				core.MY_PRINT_FUNC(e.__class__.__name__, e)
 				core.MY_PRINT_FUNC("ERROR2: failed to re-compress image '%s', original not modified" % p.name)
@@ -1,13 +1,19 @@
-from typing import List, Dict
+from typing import List, Dict, Set, Tuple
 
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
 import mmd_scripting.core.nuthouse01_vmd_parser as vmdlib
 import mmd_scripting.core.nuthouse01_vmd_struct as vmdstruct
-from mmd_scripting.core.nuthouse01_pmx_utils import bone_get_ancestors
+from mmd_scripting.core.nuthouse01_kinematics import BatchForwardKinematics, pose_from_boneframes, rotate3d_many
+from mmd_scripting.core.nuthouse01_pmx_utils import BoneGraph
 from mmd_scripting.core.nuthouse01_vmd_utils import remove_redundant_frames, fill_missing_boneframes, dictify_framelist
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v0.6.01 - 7/12/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
 # Special thanks to "tERBO" for making me overhaul & breathe new life into this old, forgotten code!
@@ -76,6 +82,8 @@ def run_forward_kinematics_for_one_timestep(frames: Dict[str, vmdstruct.VmdBoneF
 	# copy of the list to return each time
 	for b in boneorder:
 		b.reset()
+	# lookup from bone index to the ForwardKinematicsBone for that bone
+	idx_to_fkbone = {b.idx: b for b in boneorder}
 	# NOTE: according to previous implementation, i NEED to do this backwards, start from leaves & work inward.
 	# not entirely sure why but i trust my past self.
 	for currbone in reversed(boneorder):
@@ -111,10 +119,7 @@ def run_forward_kinematics_for_one_timestep(frames: Dict[str, vmdstruct.VmdBoneF
 		all_children = []
 		if frame_pos != [0.0, 0.0, 0.0] or frame_rot != [1.0, 0.0, 0.0, 0.0]:
 			# if i am going to do a real change, turn the list of child indices into the actual child objects
-			for child_idx in currbone.descendents:
-				# find the ForwardKinematicsBone that corresponds to this index
-				child = core.my_list_search(boneorder, lambda x: x.idx == child_idx, getitem=True)
-				all_children.append(child)
+			all_children = [idx_to_fkbone[child_idx] for child_idx in currbone.descendents]
 
 		# if there is any amount of position offset,
 		if frame_pos != [0.0, 0.0, 0.0]:
@@ -135,44 +140,29 @@ def run_forward_kinematics_for_one_timestep(frames: Dict[str, vmdstruct.VmdBoneF
 	return boneorder
 
 
-def predetermine_bone_deform_order(bones: List[pmxstruct.PmxBone]) -> List[ForwardKinematicsBone]:
+def predetermine_bone_deform_order(bones: List[pmxstruct.PmxBone], graph: BoneGraph=None) -> List[ForwardKinematicsBone]:
 	"""
 	Predetermine the order that bones should be deformed when doing forward kinematics. Exclusively determined by
 	order within the pmx.bones list, deform layer, and deform_after_phys flag.
 	:param bones: list of bones from pmx object
+	:param graph: optional, BoneGraph built from these bones if one already exists
 	:return: sorted list of names/indices/deform levels
 	"""
-	# all_parents_list: for each bone, walk up parent to parent to parent & find all ancestors of this bone (list of indices)
-	all_parents_list = []
-	for B in range(len(bones)):
-		# start with the index of the current bone, "B", then recurse upward & fill the set
-		this_bone_parents = bone_get_ancestors(bones, B)
-		# convert set to list & append
-		all_parents_list.append(list(this_bone_parents))
-	# all_descendent_list: for each bone, if any other bone sees this bone as it's parent, then that bone is
-	# a child of this one!
-	all_descendent_list = []
-	for B in range(len(bones)):
-		this_bone_descendents = []
-		for D,parents in enumerate(all_parents_list):
-			# bone d sees all "parents" as it's parents/ancestors
-			if B in parents:
-				# if "D" considers "B" to be a parent, then B will consider D to be a child
-				this_bone_descendents.append(D)
-		all_descendent_list.append(this_bone_descendents)
+	if graph is None:
+		graph = BoneGraph(bones)
 	
 	sortme = []
 	for d,bone in enumerate(bones):
 		effective_deform = bone.deform_layer
 		if bone.deform_after_phys:
 			effective_deform += 2000
-		parname = bones[bone.inherit_parent_idx].name_jp if bone.inherit_parent_idx is not None else ""
+		parname = bones[graph.inherit_parent[d]].name_jp if graph.inherit_parent[d] != -1 else ""
 		thing = ForwardKinematicsBone(name=bone.name_jp,
 									  idx=d,
 									  deform=effective_deform,
 									  pos=bone.pos,
-									  descendents=all_descendent_list[d],
-									  ancestors=all_parents_list[d],
+									  descendents=graph.descendants(d),
+									  ancestors=graph.ancestors(d),
 									  has_inherit_rot=bone.inherit_rot,
 									  has_inherit_trans=bone.inherit_trans,
 									  inherit_parent_name=parname,
@@ -185,6 +175,70 @@ def predetermine_bone_deform_order(bones: List[pmxstruct.PmxBone]) -> List[Forwa
 	return sortme
 
 
+def make_ik_frames_batch(pmx_source: pmxstruct.Pmx, graph_source: BoneGraph,
+						 pmx_dest: pmxstruct.Pmx, graph_dest: BoneGraph,
+						 full_boneframe_source_dict: Dict[str, List[vmdstruct.VmdBoneFrame]],
+						 full_boneframe_dest_dict: Dict[str, List[vmdstruct.VmdBoneFrame]],
+						 ik_target_pairs: List[Tuple[str, str]],
+						 framenums: Set[int]) -> List[vmdstruct.VmdBoneFrame]:
+	"""
+	Same result as running run_forward_kinematics_for_one_timestep() on both models for every timestep, but all
+	timesteps are simulated at once. Requires numpy.
+	:param pmx_source: model X, the one the dance works correctly with
+	:param graph_source: BoneGraph of model X
+	:param pmx_dest: model Y, the one to create IK frames for
+	:param graph_dest: BoneGraph of model Y
+	:param full_boneframe_source_dict: frames for model X, every bone must have a frame at every framenum
+	:param full_boneframe_dest_dict: frames for model Y, every bone must have a frame at every framenum
+	:param ik_target_pairs: list of (ik bone name in model Y, target bone name in model X)
+	:param framenums: set of all framenums to simulate
+	:return: list of new VmdBoneFrames for the IK bones
+	"""
+	framenums = sorted(framenums)
+	fk_source = BatchForwardKinematics(pmx_source.bones, graph_source)
+	fk_dest = BatchForwardKinematics(pmx_dest.bones, graph_dest)
+	
+	# sort the pairs into the same order in which the ikbones deform
+	deform_rank = {b: d for d, b in enumerate(fk_dest.deform_order)}
+	ik_target_pairs = sorted(ik_target_pairs, key=lambda pair: deform_rank[graph_dest.name_jp_to_idx[pair[0]]])
+	ik_idxs = [graph_dest.name_jp_to_idx[ik] for ik, _ in ik_target_pairs]
+	target_idxs = [graph_source.name_jp_to_idx[target] for _, target in ik_target_pairs]
+	
+	# every bone that has frames is posed by them, even if there are several bones with the same name
+	def simulate(fk, bones, framedict, result_bones):
+		posed = [d for d, bone in enumerate(bones) if bone.name_jp in framedict]
+		trans, quats = pose_from_boneframes(framedict, [bones[d].name_jp for d in posed], framenums)
+		return fk.solve(posed, trans, quats, result_bones)
+	
+	# first, simulate the source model and find the resulting location of the target bone for every frame
+	core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on SOURCE model..." % len(framenums))
+	target_pos, _ = simulate(fk_source, pmx_source.bones, full_boneframe_source_dict, target_idxs)
+	# second, simulate the destination model and find the "resting position" of each IK bone
+	core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on DESTINATION model..." % len(framenums))
+	ik_pos, ik_rot = simulate(fk_dest, pmx_dest.bones, full_boneframe_dest_dict, ik_idxs)
+	
+	position_deltas = np.zeros_like(ik_pos)
+	for j, ik_idx in enumerate(ik_idxs):
+		# rotate by the opposite of the current rotation amount, around the ik bone
+		opposite = ik_rot[:, j] * np.array([1.0, -1.0, -1.0, -1.0])
+		new_target_pos = rotate3d_many(ik_pos[:, j], opposite, target_pos[:, j])
+		position_deltas[:, j] = new_target_pos - ik_pos[:, j]
+		# now apply the offset (in origin frame, not in rotated frame) to this ik bone and any ik bones that are its children
+		norotate_position_delta = target_pos[:, j] - ik_pos[:, j]
+		descendants = set(graph_dest.descendants(ik_idx))
+		for j2, ik_idx2 in enumerate(ik_idxs):
+			if j2 == j or ik_idx2 in descendants:
+				ik_pos[:, j2] += norotate_position_delta
+	
+	# create new VmdBoneFrames, use default linear interpolation
+	output_vmd_frames = []
+	for framenum, deltas in zip(framenums, position_deltas.tolist()):
+		for (ikbone_name, _), delta in zip(ik_target_pairs, deltas):
+			output_vmd_frames.append(vmdstruct.VmdBoneFrame(name=ikbone_name, f=framenum, pos=delta,
+															rot=[0.0, 0.0, 0.0], phys_off=False))
+	return output_vmd_frames
+
+
 # function that takes a string & returns INDEX if it can match one, or None otherwise
 def get_item_from_string(s: str, pmxlist: List):
 	# search JP names first
@@ -315,8 +369,10 @@ def main(moreinfo=True):
 	# FIRST, do the "predetermine_bone_deform_order" stage for both models
 	# determine the deform order of all bones in the model
 	# result is a list of ForwardKinematicsBone objects with all the info i'm gonna need
-	order_source = predetermine_bone_deform_order(pmx_source.bones)
-	order_dest = predetermine_bone_deform_order(pmx_dest.bones)
+	graph_source = BoneGraph(pmx_source.bones)
+	graph_dest = graph_source if (pmx_dest is pmx_source) else BoneGraph(pmx_dest.bones)
+	order_source = predetermine_bone_deform_order(pmx_source.bones, graph_source)
+	order_dest = predetermine_bone_deform_order(pmx_dest.bones, graph_dest)
 	
 	# SECOND, begin massaging the VMD
 	# remove redundant frames just cuz i can, it might help reduce processing time
@@ -342,30 +398,26 @@ def main(moreinfo=True):
 	relevant_bone_dest_idxs = set()
 	for ikbone_name in ikbone_name_list:
 		# turn ik bone NAME into INDEX
-		ikbone_idx = core.my_list_search(pmx_dest.bones, lambda x: x.name_jp == ikbone_name, getitem=False)
-		# perform recursion & fill the set with INDEXES
-		relevant_bone_dest_idxs.update(bone_get_ancestors(pmx_dest.bones, ikbone_idx))
+		ikbone_idx = graph_dest.name_jp_to_idx[ikbone_name]
+		# fill the set with INDEXES
+		relevant_bone_dest_idxs.update(graph_dest.ancestors(ikbone_idx))
 		relevant_bone_dest_idxs.add(ikbone_idx)
 	# add all the partial-inherit parents for each of these bones, if they exist
 	for idx in list(relevant_bone_dest_idxs):
-		# turn index into object
-		bone = pmx_dest.bones[idx]
-		if (bone.inherit_rot or bone.inherit_trans) and (bone.inherit_ratio != 0):
-			relevant_bone_dest_idxs.add(bone.inherit_parent_idx)
+		if graph_dest.inherit_parent[idx] != -1:
+			relevant_bone_dest_idxs.add(graph_dest.inherit_parent[idx])
 		
 	relevant_bone_source_idxs = set()
 	for targetbone_name in targetbone_name_list:
 		# turn target bone NAME into INDEX
-		targetbone_idx = core.my_list_search(pmx_source.bones, lambda x: x.name_jp == targetbone_name, getitem=False)
-		# perform recursion & fill the set with INDEXES
-		relevant_bone_source_idxs.update(bone_get_ancestors(pmx_source.bones, targetbone_idx))
+		targetbone_idx = graph_source.name_jp_to_idx[targetbone_name]
+		# fill the set with INDEXES
+		relevant_bone_source_idxs.update(graph_source.ancestors(targetbone_idx))
 		relevant_bone_source_idxs.add(targetbone_idx)
 	# add all the partial-inherit parents for each of these bones, if they exist
 	for idx in list(relevant_bone_source_idxs):
-		# turn index into object
-		bone = pmx_source.bones[idx]
-		if (bone.inherit_rot or bone.inherit_trans) and (bone.inherit_ratio != 0):
-			relevant_bone_source_idxs.add(bone.inherit_parent_idx)
+		if graph_source.inherit_parent[idx] != -1:
+			relevant_bone_source_idxs.add(graph_source.inherit_parent[idx])
 	
 	# turn set of ints into set of strings, bone names that will be simulated by forward kinematics
 	relevant_bones_dest = set(pmx_dest.bones[a].name_jp for a in relevant_bone_dest_idxs)
@@ -398,132 +450,142 @@ def main(moreinfo=True):
 	for listofboneframes in boneframe_dest_dict.values():
 		for oneframe in listofboneframes:
 			framenums.add(oneframe.f)
+	if not framenums:
+		core.MY_PRINT_FUNC("No frames to simulate, aborting")
+		return
 	full_boneframe_source_dict = fill_missing_boneframes(boneframe_source_dict, moreinfo, framenums)
 	full_boneframe_dest_dict = fill_missing_boneframes(boneframe_dest_dict, moreinfo, framenums)
 	
-	# "forward kinematics" function shouldn't need any knowledge of what timestep it is computing at
-	# i want to ultimately give the forward-k function a list of boneframes and bonepositions, nothing more
-	# therefore lets invert this dict, so that the primary key is framenum!!
-	# each value is a dict, where the keys are the bone names and the values are the actual frames
-	# invert_boneframe_dict[5][motherbone_name] = VmdBoneFrame object
-	def invert_boneframe_dict(fulldict):
-		invertdict = {}
-		for bonelist in fulldict.values():  # for each key=bonename, get a list of frames
-			for frame in bonelist:  # for each frame,
-				# use its framenum to get the subdict in the inverted dict (so i can insert into the subdict)
-				try:
-					subdict = invertdict[frame.f]
-				except KeyError:
-					# if the dict does not exist, make/set it
-					subdict = dict()
-					invertdict[frame.f] = subdict
-				# write into that dict with the key of bonename
-				subdict[frame.name] = frame
-		return invertdict
-	invert_boneframe_source_dict = invert_boneframe_dict(full_boneframe_source_dict)
-	invert_boneframe_dest_dict = invert_boneframe_dict(full_boneframe_dest_dict)
+	if np is not None:
+		# simulate every timestep at once
+		ik_target_pairs = list(zip(ikbone_name_list, targetbone_name_list))
+		output_vmd_frames = make_ik_frames_batch(pmx_source, graph_source, pmx_dest, graph_dest,
+												 full_boneframe_source_dict, full_boneframe_dest_dict,
+												 ik_target_pairs, framenums)
+	else:
+		# "forward kinematics" function shouldn't need any knowledge of what timestep it is computing at
+		# i want to ultimately give the forward-k function a list of boneframes and bonepositions, nothing more
+		# therefore lets invert this dict, so that the primary key is framenum!!
+		# each value is a dict, where the keys are the bone names and the values are the actual frames
+		# invert_boneframe_dict[5][motherbone_name] = VmdBoneFrame object
+		def invert_boneframe_dict(fulldict):
+			invertdict = {}
+			for bonelist in fulldict.values():  # for each key=bonename, get a list of frames
+				for frame in bonelist:  # for each frame,
+					# use its framenum to get the subdict in the inverted dict (so i can insert into the subdict)
+					try:
+						subdict = invertdict[frame.f]
+					except KeyError:
+						# if the dict does not exist, make/set it
+						subdict = dict()
+						invertdict[frame.f] = subdict
+					# write into that dict with the key of bonename
+					subdict[frame.name] = frame
+			return invertdict
+		invert_boneframe_source_dict = invert_boneframe_dict(full_boneframe_source_dict)
+		invert_boneframe_dest_dict = invert_boneframe_dict(full_boneframe_dest_dict)
 			
-	# # sanity check
-	# # from this reduced dict, determine what framenumbers have frames for any relevant bone
-	# relevant_framenums = set()
-	# for listofboneframes in boneframe_dict.values():
-	# 	framenums_for_this_bone = [b.f for b in listofboneframes]
-	# 	relevant_framenums.update(framenums_for_this_bone)
-	# # turn the relevant_framenums set into a sorted list
-	# relevant_framenums = sorted(list(relevant_framenums))
-	# # verify that it is "rectangular"
-	# assert len(invert_boneframe_dict.keys()) == len(relevant_framenums)
-	# for foo in invert_boneframe_dict.values():
-	# 	assert len(foo) == len(full_boneframe_dict.keys())
+		# # sanity check
+		# # from this reduced dict, determine what framenumbers have frames for any relevant bone
+		# relevant_framenums = set()
+		# for listofboneframes in boneframe_dict.values():
+		# 	framenums_for_this_bone = [b.f for b in listofboneframes]
+		# 	relevant_framenums.update(framenums_for_this_bone)
+		# # turn the relevant_framenums set into a sorted list
+		# relevant_framenums = sorted(list(relevant_framenums))
+		# # verify that it is "rectangular"
+		# assert len(invert_boneframe_dict.keys()) == len(relevant_framenums)
+		# for foo in invert_boneframe_dict.values():
+		# 	assert len(foo) == len(full_boneframe_dict.keys())
 		
-	############################################
-	############################################
-	############################################
-	############################################
+		############################################
+		############################################
+		############################################
+		############################################
 	
-	# before running forward-K, SORT the targetbone_name_list and ikbone_name_list into the same order in which the ikbones deform
-	ikbonename_targetbonename_sorted = []
-	for name in [x.name for x in order_dest]:
-		# fill "ikbonename_targetbonename_sorted" in the order in which the ikbones appear in order_dest
-		try:
-			i = ikbone_name_list.index(name)
-			newthing = (ikbone_name_list[i], # ikbone_name
-						core.my_list_search(pmx_dest.bones, lambda x: x.name_jp == name), # ikbone_idx_in_pmx_dest
-						core.my_list_search(order_dest, lambda x: x.name == name), # ikbone_idx_in_order_dest
-						targetbone_name_list[i], # targetbone_name
-						core.my_list_search(order_source, lambda x: x.name == targetbone_name_list[i]) # targetbone_idx_in_order_source
-						)
-			ikbonename_targetbonename_sorted.append(newthing)
-		except ValueError:
-			# if name not in ikbone_name_list, do nothing
-			pass
+		# before running forward-K, SORT the targetbone_name_list and ikbone_name_list into the same order in which the ikbones deform
+		ikbonename_targetbonename_sorted = []
+		for name in [x.name for x in order_dest]:
+			# fill "ikbonename_targetbonename_sorted" in the order in which the ikbones appear in order_dest
+			try:
+				i = ikbone_name_list.index(name)
+				newthing = (ikbone_name_list[i], # ikbone_name
+							core.my_list_search(pmx_dest.bones, lambda x: x.name_jp == name), # ikbone_idx_in_pmx_dest
+							core.my_list_search(order_dest, lambda x: x.name == name), # ikbone_idx_in_order_dest
+							targetbone_name_list[i], # targetbone_name
+							core.my_list_search(order_source, lambda x: x.name == targetbone_name_list[i]) # targetbone_idx_in_order_source
+							)
+				ikbonename_targetbonename_sorted.append(newthing)
+			except ValueError:
+				# if name not in ikbone_name_list, do nothing
+				pass
 	
-	# now actually run forward-K
-	# first, simulate the source model and find the resulting location of the target bone for every frame
-	core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on SOURCE model..." % len(invert_boneframe_source_dict))
-	target_bone_positions = []
-	# for each relevant framenum,
-	for d,(framenum, frames) in enumerate(invert_boneframe_source_dict.items()):
-		core.print_progress_oneline(d/len(invert_boneframe_source_dict))
-		# run forward kinematics!
-		results = run_forward_kinematics_for_one_timestep(frames, order_source)
-		newlist = []
-		# for each targetbone,
-		for _, _, _, targetbone_name, targetbone_idx_in_order_source in ikbonename_targetbonename_sorted:
-			# where is the absolute position of the target bone?
-			targetbone_result = results[targetbone_idx_in_order_source]
-			newlist.append(targetbone_result.pos.copy())
-		target_bone_positions.append(newlist)
-		pass
-	# now i have the absolute positions for each target bone at each frame
+		# now actually run forward-K
+		# first, simulate the source model and find the resulting location of the target bone for every frame
+		core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on SOURCE model..." % len(invert_boneframe_source_dict))
+		target_bone_positions = []
+		# for each relevant framenum,
+		for d,(framenum, frames) in enumerate(invert_boneframe_source_dict.items()):
+			core.print_progress_oneline(d/len(invert_boneframe_source_dict))
+			# run forward kinematics!
+			results = run_forward_kinematics_for_one_timestep(frames, order_source)
+			newlist = []
+			# for each targetbone,
+			for _, _, _, targetbone_name, targetbone_idx_in_order_source in ikbonename_targetbonename_sorted:
+				# where is the absolute position of the target bone?
+				targetbone_result = results[targetbone_idx_in_order_source]
+				newlist.append(targetbone_result.pos.copy())
+			target_bone_positions.append(newlist)
+			pass
+		# now i have the absolute positions for each target bone at each frame
 	
-	core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on DESTINATION model..." % len(invert_boneframe_dest_dict))
-
-	# second, simulate the destination model and find the "resting position" of each IK bone
-	# then i can figure out how much i need to move that bone to move it from rest to the desired position
-	output_vmd_frames = []
-	for d,(framenum, frames) in enumerate(invert_boneframe_dest_dict.items()):
-		target_bone_positions_for_this_frame = target_bone_positions[d]
-		core.print_progress_oneline(d/len(invert_boneframe_dest_dict))
-		# run forward kinematics!
-		results = run_forward_kinematics_for_one_timestep(frames, order_dest)
-		# for each ikbone,
-		for (ikbone_name, ikbone_idx_in_pmx_dest, ikbone_idx_in_order_dest, _, _), targetbone_position in \
-				zip(ikbonename_targetbonename_sorted, target_bone_positions_for_this_frame):
-			# where is the absolute position of the IK bone?
-			ikbone_result = results[ikbone_idx_in_order_dest]
-			# determine the XYZ change needed to make get teh ik bone from its origin to the target bone (remember to account
-			# for any rotation on the ik bone!)
-			# what i need to do is rotate by the opposite of the current rotation amount.
-			opposite = core.my_quat_conjugate(ikbone_result.rot)
-			# what point do i rotate around? i don't think it really matters, so just rotate around the ik bone
-			new_target_pos = core.rotate3d(ikbone_result.pos, opposite, targetbone_position)
-			# now ikbone_result.pos and new_target_pos should be alinged with the primary X Y Z axes, so just find the difference
-			# final minus initial
-			position_delta = [f - i for f,i in zip(new_target_pos, ikbone_result.pos)]
-			# create a new VmdBoneFrame, use default linear interpolation
-			new_frame = vmdstruct.VmdBoneFrame(name=ikbone_name, f=framenum,
-											   pos=position_delta,
-											   rot=[0.0, 0.0, 0.0],
-											   phys_off=False,
-											   # omit the interpolation
-											   )
-			# append it
-			output_vmd_frames.append(new_frame)
-			# now apply the offset (in origin frame, not in rotated frame) to the "ikbone_result" and any of its descendents
-			# first, modify self:
-			norotate_position_delta = [f - i for f,i in zip(targetbone_position, ikbone_result.pos)]
-			ikbone_result.pos = [p + d for p,d in zip(ikbone_result.pos, norotate_position_delta)]
-			# then, modify any other ik bones that are listed as a child of this
-			for child_idx_in_pmx_dest in ikbone_result.descendents:
-				for (ikbone_name2, ikbone_idx_in_pmx_dest2, ikbone_idx_in_order_dest2, _, _) in ikbonename_targetbonename_sorted:
-					if child_idx_in_pmx_dest == ikbone_idx_in_pmx_dest2:
-						# this is a child!
-						ikbone_result2 = results[ikbone_idx_in_order_dest2]
-						# apply the norotate delta
-						ikbone_result2.pos = [p + d for p, d in zip(ikbone_result2.pos, norotate_position_delta)]
+		core.MY_PRINT_FUNC("...running forward kinematics computation for %d frames on DESTINATION model..." % len(invert_boneframe_dest_dict))
+
+		# second, simulate the destination model and find the "resting position" of each IK bone
+		# then i can figure out how much i need to move that bone to move it from rest to the desired position
+		output_vmd_frames = []
+		for d,(framenum, frames) in enumerate(invert_boneframe_dest_dict.items()):
+			target_bone_positions_for_this_frame = target_bone_positions[d]
+			core.print_progress_oneline(d/len(invert_boneframe_dest_dict))
+			# run forward kinematics!
+			results = run_forward_kinematics_for_one_timestep(frames, order_dest)
+			# for each ikbone,
+			for (ikbone_name, ikbone_idx_in_pmx_dest, ikbone_idx_in_order_dest, _, _), targetbone_position in \
+					zip(ikbonename_targetbonename_sorted, target_bone_positions_for_this_frame):
+				# where is the absolute position of the IK bone?
+				ikbone_result = results[ikbone_idx_in_order_dest]
+				# determine the XYZ change needed to make get teh ik bone from its origin to the target bone (remember to account
+				# for any rotation on the ik bone!)
+				# what i need to do is rotate by the opposite of the current rotation amount.
+				opposite = core.my_quat_conjugate(ikbone_result.rot)
+				# what point do i rotate around? i don't think it really matters, so just rotate around the ik bone
+				new_target_pos = core.rotate3d(ikbone_result.pos, opposite, targetbone_position)
+				# now ikbone_result.pos and new_target_pos should be alinged with the primary X Y Z axes, so just find the difference
+				# final minus initial
+				position_delta = [f - i for f,i in zip(new_target_pos, ikbone_result.pos)]
+				# create a new VmdBoneFrame, use default linear interpolation
+				new_frame = vmdstruct.VmdBoneFrame(name=ikbone_name, f=framenum,
+												   pos=position_delta,
+												   rot=[0.0, 0.0, 0.0],
+												   phys_off=False,
+												   # omit the interpolation
+												   )
+				# append it
+				output_vmd_frames.append(new_frame)
+				# now apply the offset (in origin frame, not in rotated frame) to the "ikbone_result" and any of its descendents
+				# first, modify self:
+				norotate_position_delta = [f - i for f,i in zip(targetbone_position, ikbone_result.pos)]
+				ikbone_result.pos = [p + d for p,d in zip(ikbone_result.pos, norotate_position_delta)]
+				# then, modify any other ik bones that are listed as a child of this
+				for child_idx_in_pmx_dest in ikbone_result.descendents:
+					for (ikbone_name2, ikbone_idx_in_pmx_dest2, ikbone_idx_in_order_dest2, _, _) in ikbonename_targetbonename_sorted:
+						if child_idx_in_pmx_dest == ikbone_idx_in_pmx_dest2:
+							# this is a child!
+							ikbone_result2 = results[ikbone_idx_in_order_dest2]
+							# apply the norotate delta
+							ikbone_result2.pos = [p + d for p, d in zip(ikbone_result2.pos, norotate_position_delta)]
 		
-		pass
+			pass
 
 	############################################
 	############################################
@@ -537,7 +599,7 @@ def main(moreinfo=True):
 		ikbones_enable = []
 		for ikbone_name in ikbone_name_list:
 			ikbones_enable.append(vmdstruct.VmdIkbone(name=ikbone_name, enable=True))
-		earliest_timestep = min(invert_boneframe_dest_dict.keys())
+		earliest_timestep = min(framenums)
 		ikdispframe_list = [vmdstruct.VmdIkdispFrame(f=earliest_timestep, disp=True, ikbones=ikbones_enable)]
 	else:
 		ikdispframe_list = []
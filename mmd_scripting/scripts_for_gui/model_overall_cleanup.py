@@ -1,4 +1,13 @@
+import hashlib
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
 import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_io as io
 import mmd_scripting.core.nuthouse01_packer as pack
 import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
 import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
@@ -22,176 +31,213 @@ _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.03 - 8/9/2021"
 # what is the max # of items to show in the "warnings" section before truncating?
 MAX_WARNING_LIST = 15
 
+# if true, remember which cleanup passes have nothing left to do on each model file that this reads or writes, so that
+# cleaning the exact same file again can skip them. the files are recognized by hashing their contents.
+# note: this memo is the only reason a pass is ever skipped. the first time a file is cleaned, every pass runs.
+REMEMBER_CLEAN_MODELS = True
+# how many model files to remember, the oldest are forgotten first
+REMEMBER_CLEAN_MODELS_MAX = 500
+
+# if true, save the result of cleaning each model in the result cache. cleaning the exact same file again, with the
+# same options, will then just copy the saved result instead of doing all the work again.
+# note: the result is not saved if any pass that sets PASS_IS_REPEATABLE to False (like the Google translate pass)
+# changed the model, because running it again might give a different result
+USE_RESULT_CACHE = True
+
+
+
+# if true, check that each cleanup pass only changed the sections of the model that it lists in PASS_WRITES, and raise
+# an error if it changed anything else. this is very slow, it is only for testing new or modified passes.
+CHECK_PASS_WRITES = False
+
+
+
+# a JP bone/morph name longer than this many bytes will not fit in a VMD file
+VMD_NAME_MAX_BYTES = 15
+
+def analyze_model(pmx: pmxstruct.Pmx, input_filename_pmx: str) -> Dict[str, Any]:
+	"""
+	Find all the problems that scan_for_issues() warns about. This walks each section of the model once, with one
+	_scan_* function per section, and each name is only encoded to shift_jis once even though several checks need it.
+	This doesn't print anything, and doesn't change the encoding used by the packer.
+	
+	:param pmx: PMX object
+	:param input_filename_pmx: the path the model was read from, used to check if it can be encoded in shift_jis
+	:return: dict that can be directly dumped as JSON, each value is a count or a list of the indices of the bad items.
+	"shiftjis_unsupported" is a list of dicts with keys "section", "idx", "name", and "char" (the char that failed).
+	"toolong_bones" and "toolong_morphs" are lists of strings "index[length]".
+	"""
+	encoded = {}
+	badnames = _scan_model_names(pmx, input_filename_pmx, encoded)
+	bad_bones, toolong_bones = _scan_bones(pmx, encoded)
+	bad_morphs, toolong_morphs, appearing_mats = _scan_morphs(pmx, encoded)
+	badnames += bad_bones + bad_morphs
+	shadowy_mats, invisible_mats = _scan_materials(pmx, appearing_mats)
+	boneless_bodies, bonebodies = _scan_rigidbodies(pmx)
+	crashing_joints, linked_bodies = _scan_joints(pmx)
+	return {"shiftjis_unsupported_names": len(badnames),
+			"shiftjis_unsupported": badnames,
+			"toolong_bones": toolong_bones,
+			"toolong_morphs": toolong_morphs,
+			"shadowy_materials": shadowy_mats,
+			"invisible_materials": invisible_mats,
+			"boneless_bodies": boneless_bodies,
+			"jointless_bodies": _unanchored_bodies(len(pmx.rigidbodies), bonebodies, linked_bodies),
+			"crashing_joints": crashing_joints,
+			}
+
+def _encode_shiftjis(name: str, encoded: Dict[str, tuple]) -> tuple:
+	# return (length in bytes, None) if the name can be encoded in shift_jis, (None, first bad char) if it cannot
+	# results are remembered in "encoded" so that each name is only encoded once
+	if name not in encoded:
+		try:
+			encoded[name] = (len(pack.encode_string_with_escape(name, "shift_jis")), None)
+		except UnicodeEncodeError as e:
+			# note: UnicodeEncodeError.reason has been overwritten with the string I was trying to encode
+			encoded[name] = (None, e.reason[e.start:e.end])
+	return encoded[name]
+
+def _check_name(section: str, idx, name: str, encoded: Dict[str, tuple], badnames: List[dict]) -> int:
+	# if the name cannot be encoded, add it to badnames & return None, otherwise return its length in bytes
+	length, badchar = _encode_shiftjis(name, encoded)
+	if badchar is not None:
+		badnames.append({"section": section, "idx": idx, "name": name, "char": badchar})
+	return length
+
+def _scan_model_names(pmx: pmxstruct.Pmx, filepath: str, encoded: Dict[str, tuple]) -> List[dict]:
+	# full absolute file path, and JP model name
+	badnames = []
+	_check_name("filepath", None, filepath, encoded, badnames)
+	_check_name("model", None, pmx.header.name_jp, encoded, badnames)
+	return badnames
+
+def _scan_bones(pmx: pmxstruct.Pmx, encoded: Dict[str, tuple]) -> Tuple[List[dict], List[str]]:
+	# one walk over the bones: names that shift_jis cannot encode, and names that are too long for VMD
+	badnames = []
+	toolong = []
+	for d,b in enumerate(pmx.bones):
+		# bones that are not "enabled" cannot be controlled with keyframes, so dont check them
+		if not b.has_enabled: continue
+		length = _check_name("bone", d, b.name_jp, encoded, badnames)
+		if length is not None and length > VMD_NAME_MAX_BYTES:
+			toolong.append("%d[%d]" % (d, length))
+	return badnames, toolong
+
+def _scan_morphs(pmx: pmxstruct.Pmx, encoded: Dict[str, tuple]) -> Tuple[List[dict], List[str], set]:
+	# one walk over the morphs: names that shift_jis cannot encode, names that are too long for VMD,
+	# and the set of materials that have a material morph that adds opacity to them
+	badnames = []
+	toolong = []
+	appearing_mats = set()
+	for d,m in enumerate(pmx.morphs):
+		if m.morphtype == pmxstruct.MorphType.MATERIAL:
+			for item in m.items:
+				item: pmxstruct.PmxMorphItemMaterial  # pycharm type annotation
+				# does this item add opacity to the material?
+				if item.is_add and item.alpha > 0:
+					appearing_mats.add(item.mat_idx)
+		# morphs that are "hidden" should probably not be directly manipulated by a user, so dont check their names
+		if m.panel == pmxstruct.MorphPanel.HIDDEN: continue
+		length = _check_name("morph", d, m.name_jp, encoded, badnames)
+		if length is not None and length > VMD_NAME_MAX_BYTES:
+			toolong.append("%d[%d]" % (d, length))
+	return badnames, toolong, appearing_mats
+
+def _scan_materials(pmx: pmxstruct.Pmx, appearing_mats: set) -> Tuple[List[int], List[int]]:
+	# one walk over the materials: materials that start transparent but still have edging,
+	# and materials that start transparent and have no morphs to make them visible
+	shadowy = []
+	invisible = []
+	for d,mat in enumerate(pmx.materials):
+		if mat.alpha != 0: continue
+		# if opacity is zero AND edge is enabled AND edge has nonzero opacity AND edge has nonzero size
+		if pmxstruct.MaterialFlags.USE_EDGING in mat.matflags and mat.edgealpha != 0 and mat.edgesize != 0:
+			shadowy.append(d)
+		# if there are no "appear" morphs for a transparent material, then it is permanently hidden
+		if d not in appearing_mats:
+			invisible.append(d)
+	return shadowy, invisible
+
+def _scan_rigidbodies(pmx: pmxstruct.Pmx) -> Tuple[List[int], List[int]]:
+	# one walk over the rigidbodies: bone-type bodies that aren't attached to any bones, and all the bone-type bodies
+	boneless = []
+	bonebodies = []
+	for d,body in enumerate(pmx.rigidbodies):
+		if body.phys_mode == pmxstruct.RigidBodyPhysMode.BONE:
+			bonebodies.append(d)
+			if body.bone_idx == -1:
+				boneless.append(d)
+	return boneless, bonebodies
+
+def _scan_joints(pmx: pmxstruct.Pmx) -> Tuple[List[int], Dict[int, List[int]]]:
+	# one walk over the joints: invalid joints that would crash MMD, and which bodies each valid joint connects
+	crashing = []
+	linked_bodies = defaultdict(list)
+	for d,joint in enumerate(pmx.joints):
+		if joint.rb1_idx == -1 or joint.rb2_idx == -1:
+			crashing.append(d)
+			continue
+		linked_bodies[joint.rb1_idx].append(joint.rb2_idx)
+		linked_bodies[joint.rb2_idx].append(joint.rb1_idx)
+	return crashing, linked_bodies
+
+def _unanchored_bodies(num_bodies: int, bonebodies: List[int], linked_bodies: Dict[int, List[int]]) -> List[int]:
+	# walk outward along the joints from every bone body, everything reached is anchored
+	anchored_bodies = set(bonebodies)
+	stack = list(bonebodies)
+	while stack:
+		for other in linked_bodies[stack.pop()]:
+			if other not in anchored_bodies:
+				anchored_bodies.add(other)
+				stack.append(other)
+	# now, see which body indices are not in the anchored set!
+	return [d for d in range(num_bodies) if d not in anchored_bodies]
+
+def _print_shiftjis_unsupported(badnames: List[dict]) -> None:
+	for bad in badnames:
+		if bad["section"] == "filepath":   core.MY_PRINT_FUNC("Filepath")
+		elif bad["section"] == "model":    core.MY_PRINT_FUNC("Model Name")
+		elif bad["section"] == "bone":     core.MY_PRINT_FUNC("Bone %d" % bad["idx"])
+		else:                              core.MY_PRINT_FUNC("Morph %d" % bad["idx"])
+		core.MY_PRINT_FUNC("%s: '%s' codec cannot encode char '%s' within string '%s'" % (
+			"UnicodeEncodeError", "shift_jis", bad["char"], bad["name"]))
 
+# the find_* functions each do one of the checks from analyze_model(), and only walk the sections that check needs
 
 def find_crashing_joints(pmx: pmxstruct.Pmx) -> list:
 	# check for invalid joints that would crash MMD, this is such a small operation that it shouldn't get its own file
 	# return a list of the joints that are bad
-	retme = []
-	for d,joint in enumerate(pmx.joints):
-		if joint.rb1_idx == -1 or joint.rb2_idx == -1:
-			retme.append(d)
-	return retme
+	return _scan_joints(pmx)[0]
 
 def find_boneless_bonebodies(pmx: pmxstruct.Pmx) -> list:
 	# check for rigidbodies that aren't attached to any bones, this usually doesn't cause crashes but is definitely a mistake
-	retme = []
-	for d,body in enumerate(pmx.rigidbodies):
-		# if this is a bone body
-		if body.phys_mode == pmxstruct.RigidBodyPhysMode.BONE:
-			# if there is no bone associated with it
-			if body.bone_idx == -1:
-				retme.append(d)
-	return retme
+	return _scan_rigidbodies(pmx)[0]
 
 def find_toolong_bonemorph(pmx: pmxstruct.Pmx) -> (list,list):
 	# check for morphs with JP names that are too long and will not be successfully saved/loaded with VMD files
-	# for each morph, convert from string to bytes encoding to determine its length
-	pack.set_encoding("shift_jis")
-	toolong_list_bone = []
-	for d,b in enumerate(pmx.bones):
-		# bones that are not "enabled" cannot be controlled with keyframes, so dont check them
-		if not b.has_enabled: continue
-		try:
-			bb = pack.encode_string_with_escape(b.name_jp)
-			if len(bb) > 15:
-				toolong_list_bone.append("%d[%d]" % (d, len(bb)))
-		except UnicodeEncodeError:
-			# if shift-jis cannot the chars in this name, then report that in find_shiftjis_unsupported_names()
-			pass
-	toolong_list_morph = []
-	for d,m in enumerate(pmx.morphs):
-		# morphs that are "hidden" should probably not be directly manipulated by a user, so dont check them
-		if m.panel == pmxstruct.MorphPanel.HIDDEN: continue
-		try:
-			mb = pack.encode_string_with_escape(m.name_jp)
-			if len(mb) > 15:
-				toolong_list_morph.append("%d[%d]" % (d, len(mb)))
-		except UnicodeEncodeError:
-			# if shift-jis cannot the chars in this name, then report that in find_shiftjis_unsupported_names()
-			pass
-	return toolong_list_bone, toolong_list_morph
+	encoded = {}
+	return _scan_bones(pmx, encoded)[1], _scan_morphs(pmx, encoded)[1]
 
 def find_shiftjis_unsupported_names(pmx: pmxstruct.Pmx, filepath: str) -> int:
 	# checks that bone/morph names can be stored in shift_jis for VMD usage
 	# also check the model name and the filepath
-	pack.set_encoding("shift_jis")
-	failct = 0
-	# print(filepath)
-	# first, full absolute file path:
-	try:
-		_ = pack.encode_string_with_escape(filepath)
-	except UnicodeEncodeError as e:
-		core.MY_PRINT_FUNC("Filepath")
-		# note: UnicodeEncodeError.reason has been overwritten with the string I was trying to encode, other fields unchanged
-		newerrstr = "%s: '%s' codec cannot encode char '%s' within string '%s'" % (
-			e.__class__.__name__, e.encoding, e.reason[e.start:e.end], e.reason)
-		core.MY_PRINT_FUNC(newerrstr)
-		failct += 1
-	# second, JP model name:
-	try:
-		_ = pack.encode_string_with_escape(pmx.header.name_jp)
-	except UnicodeEncodeError as e:
-		core.MY_PRINT_FUNC("Model Name")
-		# note: UnicodeEncodeError.reason has been overwritten with the string I was trying to encode, other fields unchanged
-		newerrstr = "%s: '%s' codec cannot encode char '%s' within string '%s'" % (
-			e.__class__.__name__, e.encoding, e.reason[e.start:e.end], e.reason)
-		core.MY_PRINT_FUNC(newerrstr)
-		failct += 1
-
-	# third, bones
-	for d,b in enumerate(pmx.bones):
-		# bones that are not "enabled" cannot be controlled with keyframes, so dont check them
-		if not b.has_enabled: continue
-		try:
-			_ = pack.encode_string_with_escape(b.name_jp)
-		except UnicodeEncodeError as e:
-			core.MY_PRINT_FUNC("Bone %d" % d)
-			# note: UnicodeEncodeError.reason has been overwritten with the string I was trying to encode, other fields unchanged
-			newerrstr = "%s: '%s' codec cannot encode char '%s' within string '%s'" % (
-				e.__class__.__name__, e.encoding, e.reason[e.start:e.end], e.reason)
-			core.MY_PRINT_FUNC(newerrstr)
-			failct += 1
-	# fourth, morphs
-	for d,m in enumerate(pmx.morphs):
-		# morphs that are "hidden" should probably not be directly manipulated by a user, so dont check them
-		if m.panel == pmxstruct.MorphPanel.HIDDEN: continue
-		try:
-			_ = pack.encode_string_with_escape(m.name_jp)
-		except UnicodeEncodeError as e:
-			core.MY_PRINT_FUNC("Morph %d" % d)
-			# note: UnicodeEncodeError.reason has been overwritten with the string I was trying to encode, other fields unchanged
-			newerrstr = "%s: '%s' codec cannot encode char '%s' within string '%s'" % (
-				e.__class__.__name__, e.encoding, e.reason[e.start:e.end], e.reason)
-			core.MY_PRINT_FUNC(newerrstr)
-			failct += 1
-	return failct
+	encoded = {}
+	badnames = _scan_model_names(pmx, filepath, encoded) + _scan_bones(pmx, encoded)[0] + _scan_morphs(pmx, encoded)[0]
+	_print_shiftjis_unsupported(badnames)
+	return len(badnames)
 
 def find_shadowy_materials(pmx: pmxstruct.Pmx) -> list:
 	# identify materials that start transparent but still have edging
-	retme = []
-	for d,mat in enumerate(pmx.materials):
-		# if opacity is zero AND edge is enabled AND edge has nonzero opacity AND edge has nonzero size
-		if mat.alpha == 0 \
-				and pmxstruct.MaterialFlags.USE_EDGING in mat.matflags \
-				and mat.edgealpha != 0 \
-				and mat.edgesize != 0:
-			retme.append(d)
-	return retme
+	return _scan_materials(pmx, set())[0]
 
 def find_jointless_physbodies(pmx: pmxstruct.Pmx)-> list:
 	# check for rigidbodies with physics enabled that are NOT the dependent-body of any joint
 	# these will just wastefully roll around on the floor draining processing power
-	
-	# NEW IDEA: complete overkill but whatever whos gonna stop me
-	# do a recursive space-filling algorithm starting from each bone body walking along joints
-	# then I can find each body that is bone or linked to bone
-	# which lets me determine which ones are NOT linked!
-	
-	def recursively_walk_along_joints(target: int, known_anchors: set):
-		if target in known_anchors or target == -1:
-			# stop condition: if this RB idx is already known to be anchored, i have already ran recursion from this node. don't do it again.
-			# also abort if the target is -1 which means invalid RB
-			return
-		# if not already in the set, but recursion is being called on this, then this bone is an "anchor" and should be added.
-		known_anchors.add(target)
-		# now, get all joints which include this RB
-		linked_joints = [j for j in pmx.joints if (j.rb1_idx == target) or (j.rb2_idx == target)]
-		for joint in linked_joints:
-			# walk to every body this joint is connected to
-			if joint.rb1_idx != target: recursively_walk_along_joints(joint.rb1_idx, known_anchors)
-			if joint.rb2_idx != target: recursively_walk_along_joints(joint.rb2_idx, known_anchors)
-		return
-	
-	bonebodies = [d for d,body in enumerate(pmx.rigidbodies) if body.phys_mode == pmxstruct.RigidBodyPhysMode.BONE]
-	anchored_bodies = set()
-	for bod in bonebodies:
-		recursively_walk_along_joints(bod, anchored_bodies)
-	# now, see which body indices are not in the anchored set!
-	retme = [i for i in range(len(pmx.rigidbodies)) if i not in anchored_bodies]
-	return retme
+	return _unanchored_bodies(len(pmx.rigidbodies), _scan_rigidbodies(pmx)[1], _scan_joints(pmx)[1])
 	
 def find_always_invisible_materials(pmx: pmxstruct.Pmx) -> list:
 	# identify any materials that start transparent and have no morphs to make them visible
-	retme = []
-	for d,mat in enumerate(pmx.materials):
-		# if opacity is zero,
-		if mat.alpha == 0:
-			# are there any material morphs that add opacity to this material?
-			has_appear_morph = False
-			for morph in pmx.morphs:
-				# ignore any non-material morphs
-				if morph.morphtype != pmxstruct.MorphType.MATERIAL: continue
-				for item in morph.items:
-					item: pmxstruct.PmxMorphItemMaterial  # pycharm type annotation
-					# does this item add opacity to the material in question?
-					if item.mat_idx==d and item.is_add and item.alpha > 0:
-						has_appear_morph = True
-			# if there are no "appear" morphs for this material, then mark it as permanently hidden
-			if not has_appear_morph:
-				retme.append(d)
-	return retme
-
+	return _scan_materials(pmx, _scan_morphs(pmx, {})[2])[1]
 
 
 ########################################################################################################################
@@ -226,63 +272,210 @@ allhelp = [
 helptext = '\n'.join(allhelp)
 
 
-def main(moreinfo=False):
-	# prompt PMX name
-	core.MY_PRINT_FUNC("Please enter name of PMX model file:")
-	input_filename_pmx = core.MY_FILEPROMPT_FUNC("PMX file", ".pmx")
-	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=moreinfo)
+#### how should these operations be ordered?
+# faces before verts, because faces define what verts are used
+# verts before weights, so i operate on fewer vertices & run faster
+# weights before bones, because weights determine what bones are used
+# verts before morph winnow, so i operate on fewer vertices & run faster
+# translate after bones/disp groups/morph winnow because they reduce the # of things to translate
+# uniquify after translate, because translate can map multiple different JP to same EN names
+# alphamorphs after translate, so it uses post-translate names for printing
+# deform order after translate, so it uses post-translate names for printing
+# each pass is (header to print, function), every function takes (pmx, moreinfo) and returns (pmx, is_changed)
+# the module of each function must also define PASS_READS and PASS_WRITES, the names of the Pmx sections that it looks
+# at and the sections that it might change. these are only used with the per-file memo of passes that had nothing to do
+# (see REMEMBER_CLEAN_MODELS): a remembered pass is skipped unless an earlier pass in this run wrote to a section it
+# reads. nothing that happens within one run can make a pass be skipped, without the memo every pass always runs.
+CLEANUP_PASSES = [
+	("Deleting invalid & duplicate faces", prune_invalid_faces.prune_invalid_faces),
+	("Deleting orphaned/unused vertices", prune_unused_vertices.prune_unused_vertices),
+	("Normalizing vertex weights & normals", weight_cleanup.weight_cleanup),
+	("Deleting unused bones", prune_unused_bones.prune_unused_bones),
+	("Pruning imperceptible vertex morphs", morph_winnow.morph_winnow),
+	("Fixing display groups: duplicates, empty groups, missing items", dispframe_fix.dispframe_fix),
+	("Adding missing English names", translate_to_english.translate_to_english),
+	("Ensuring all names in the model are unique", uniquify_names.uniquify_names),
+	("Fixing bone deform order", bonedeform_fix.bonedeform_fix),
+	("Standardizing alphamorphs and accounting for edging", alphamorph_correct.alphamorph_correct),
+]
+
+
+def run_cleanup_passes(pmx: pmxstruct.Pmx, moreinfo=False, known_clean: Iterable[str]=(),
+					   passes: Sequence[Tuple[str, Any]]=None) -> Tuple[pmxstruct.Pmx, List[dict]]:
+	"""
+	Run every pass in CLEANUP_PASSES on the model, in order.
+	"pmx.journal" is only used to carry a memo between runs, it never skips a pass because of anything that happened
+	within this run. The only passes that can be skipped are the ones in "known_clean", i.e. the ones that a previous
+	run on this exact same file found nothing to do. The journal forgets each of those as soon as an earlier pass in
+	this run changes a section that it reads, so it runs after all. Without known_clean, every pass runs.
+	The journal is updated as the passes run, so clean_passes_to_remember() can tell what to remember for next time.
+	
+	:param pmx: PMX object, it is modified in-place
+	:param moreinfo: if true, get extra printouts with more info about stuff
+	:param known_clean: names of passes that are already known to have nothing to do on this model as it is now,
+	probably from get_known_clean_passes(). this applies to all of CLEANUP_PASSES, not just the ones in "passes", so
+	when running the passes in several pieces, only give it to the first piece.
+	:param passes: optional, run only these items of CLEANUP_PASSES instead of all of them
+	:return: the resulting PMX object, and one dict per pass with keys "pass" (function name), "changed" (bool),
+	"skipped" (bool), and "seconds" (float, how long it took)
+	"""
+	journal = pmx.journal
+	for header, passfunc in CLEANUP_PASSES:
+		if passfunc.__name__ in known_clean:
+			journal.mark_clean(passfunc.__name__, _pass_module(passfunc).PASS_READS)
+	results = []
+	for header, passfunc in (CLEANUP_PASSES if passes is None else passes):
+		core.MY_PRINT_FUNC("\n>>>> %s <<<<" % header)
+		module = _pass_module(passfunc)
+		start = time.perf_counter()
+		if journal.is_clean(passfunc.__name__):
+			core.MY_PRINT_FUNC("No changes are required (remembered from the last time this file was cleaned)")
+			results.append({"pass": passfunc.__name__, "changed": False, "skipped": True, "seconds": 0.0})
+			continue
+		if CHECK_PASS_WRITES:
+			before = _snapshot_sections(pmx, module.PASS_WRITES)
+		pmx, is_changed_t = passfunc(pmx, moreinfo)
+		if CHECK_PASS_WRITES:
+			_check_snapshot(pmx, before, passfunc)
+		results.append(record_pass_result(pmx, passfunc, is_changed_t, time.perf_counter() - start))
+	return pmx, results
+
+
+def record_pass_result(pmx: pmxstruct.Pmx, passfunc, is_changed: bool, seconds: float) -> dict:
+	"""
+	Update the journal of the model after running one of the CLEANUP_PASSES on it. run_cleanup_passes() does this, it
+	only needs to be called directly when a pass was run some other way.
+	
+	:param pmx: PMX object that the pass was just run on
+	:param passfunc: the pass function from CLEANUP_PASSES
+	:param is_changed: what the pass returned
+	:param seconds: how long it took
+	:return: dict for this pass, same as the items returned by run_cleanup_passes()
+	"""
+	module = _pass_module(passfunc)
+	if is_changed:
+		pmx.journal.mark_changed(module.PASS_WRITES)
+	else:
+		# it had nothing to do, and that stays true until something it looks at is changed
+		# (if it did change something, don't assume that running it again would do nothing)
+		pmx.journal.mark_clean(passfunc.__name__, module.PASS_READS)
+	return {"pass": passfunc.__name__,
+			"changed": bool(is_changed),
+			"skipped": False,
+			"seconds": seconds}
+
+
+def _pass_module(passfunc):
+	return sys.modules[passfunc.__module__]
+
+
+def _section_repr(pmx: pmxstruct.Pmx, section: str) -> str:
+	# a complete copy of one section as a string, so that changing the model afterward can't change it
+	if section == "header":
+		return repr(pmx.header.list())
+	if section == "faces":
+		return repr(pmx.faces)
+	return repr([item.list() for item in getattr(pmx, section)])
+
+
+def _snapshot_sections(pmx: pmxstruct.Pmx, writes: Iterable[str]) -> Dict[str, str]:
+	# copy every section that the pass says it will NOT change
+	return {sec: _section_repr(pmx, sec) for sec in pmxstruct.PmxChangeJournal.SECTIONS if sec not in writes}
+
+
+def _check_snapshot(pmx: pmxstruct.Pmx, before: Dict[str, str], passfunc) -> None:
+	changed = [sec for sec, old in before.items() if _section_repr(pmx, sec) != old]
+	if changed:
+		core.MY_PRINT_FUNC("ERROR: cleanup pass '%s' changed sections %s that are not in its PASS_WRITES" % (
+			passfunc.__name__, changed))
+		raise RuntimeError("cleanup pass '%s' changed sections not in its PASS_WRITES: %s" % (passfunc.__name__, changed))
+
+
+def _pass_signature(passfunc) -> str:
+	# a pass only counts as the same pass if it has the same script version and all the same options
+	module = _pass_module(passfunc)
+	options = sorted((k, repr(v)) for k, v in vars(module).items()
+					 if k.isupper() and isinstance(v, (bool, int, float, str, list, tuple, dict)))
+	return hashlib.sha1(repr((passfunc.__name__, options)).encode("utf-8")).hexdigest()[:16]
+
+
+def get_known_clean_passes(file_hash: str) -> List[str]:
+	"""
+	Look up which passes were already known to have nothing to do on the model file with this hash.
 	
-	#### how should these operations be ordered?
-	# faces before verts, because faces define what verts are used
-	# verts before weights, so i operate on fewer vertices & run faster
-	# weights before bones, because weights determine what bones are used
-	# verts before morph winnow, so i operate on fewer vertices & run faster
-	# translate after bones/disp groups/morph winnow because they reduce the # of things to translate
-	# uniquify after translate, because translate can map multiple different JP to same EN names
-	# alphamorphs after translate, so it uses post-translate names for printing
-	# deform order after translate, so it uses post-translate names for printing
+	:param file_hash: string from io.hash_file()
+	:return: list of pass function names
+	"""
+	known = io.get_persistent_storage_json("cleanup-known-clean")
+	if not known or file_hash not in known:
+		return []
+	signatures = known[file_hash]
+	return [passfunc.__name__ for _, passfunc in CLEANUP_PASSES
+			if signatures.get(passfunc.__name__) == _pass_signature(passfunc)]
+
+
+def clean_passes_to_remember(pmx: pmxstruct.Pmx) -> List[str]:
+	"""
+	:param pmx: PMX object that has been through run_cleanup_passes()
+	:return: list of the names of passes that have nothing to do on this model as it is now, except for any passes
+	that set PASS_IS_REPEATABLE to False
+	"""
+	clean = pmx.journal.clean_names()
+	return [passfunc.__name__ for _, passfunc in CLEANUP_PASSES
+			if passfunc.__name__ in clean and getattr(_pass_module(passfunc), "PASS_IS_REPEATABLE", True)]
+
+
+def is_result_repeatable(pass_results: List[dict]) -> bool:
+	"""
+	:param pass_results: list of dicts from run_cleanup_passes()
+	:return: False if any pass that sets PASS_IS_REPEATABLE to False changed the model, otherwise True
+	"""
+	repeatable = {passfunc.__name__: getattr(_pass_module(passfunc), "PASS_IS_REPEATABLE", True)
+				  for _, passfunc in CLEANUP_PASSES}
+	return not any(r["changed"] and not repeatable[r["pass"]] for r in pass_results)
+
+
+def remember_clean_passes(file_hash: str, pass_names: List[str]) -> None:
+	"""
+	Save which passes have nothing to do on the model file with this hash, so that cleaning the same file again can
+	skip them. Only the most recent REMEMBER_CLEAN_MODELS_MAX files are remembered.
 	
-	# if ANY stage returns True then it has made changes
-	# final file-write is skipped only if NO stage has made changes
-	is_changed = False
-	core.MY_PRINT_FUNC("\n>>>> Deleting invalid & duplicate faces <<<<")
-	pmx, is_changed_t = prune_invalid_faces.prune_invalid_faces(pmx, moreinfo)
-	is_changed |= is_changed_t	# or-equals: if any component returns true, then ultimately this func returns true
-	core.MY_PRINT_FUNC("\n>>>> Deleting orphaned/unused vertices <<<<")
-	pmx, is_changed_t = prune_unused_vertices.prune_unused_vertices(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Normalizing vertex weights & normals <<<<")
-	pmx, is_changed_t = weight_cleanup.weight_cleanup(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Deleting unused bones <<<<")
-	pmx, is_changed_t = prune_unused_bones.prune_unused_bones(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Pruning imperceptible vertex morphs <<<<")
-	pmx, is_changed_t = morph_winnow.morph_winnow(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Fixing display groups: duplicates, empty groups, missing items <<<<")
-	pmx, is_changed_t = dispframe_fix.dispframe_fix(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Adding missing English names <<<<")
-	pmx, is_changed_t = translate_to_english.translate_to_english(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Ensuring all names in the model are unique <<<<")
-	pmx, is_changed_t = uniquify_names.uniquify_names(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Fixing bone deform order <<<<")
-	pmx, is_changed_t = bonedeform_fix.bonedeform_fix(pmx, moreinfo)
-	is_changed |= is_changed_t
-	core.MY_PRINT_FUNC("\n>>>> Standardizing alphamorphs and accounting for edging <<<<")
-	pmx, is_changed_t = alphamorph_correct.alphamorph_correct(pmx, moreinfo)
-	is_changed |= is_changed_t
+	:param file_hash: string from io.hash_file()
+	:param pass_names: list of pass function names, probably from clean_passes_to_remember()
+	"""
+	signatures = {passfunc.__name__: _pass_signature(passfunc) for _, passfunc in CLEANUP_PASSES
+				  if passfunc.__name__ in pass_names}
+	def add_to_known(known):
+		if not known:
+			known = {}
+		# re-insert it so it becomes the newest entry
+		known.pop(file_hash, None)
+		known[file_hash] = signatures
+		while len(known) > REMEMBER_CLEAN_MODELS_MAX:
+			del known[next(iter(known))]
+		return known
+	# one transaction, so models that are being cleaned by other processes at the same time don't get forgotten
+	io.update_persistent_storage_json("cleanup-known-clean", add_to_known)
+
 
+def scan_for_issues(pmx: pmxstruct.Pmx, input_filename_pmx: str) -> Dict[str, Any]:
+	"""
+	Look for problems that can be detected but not automatically fixed, and print warnings about any that are found.
+	
+	:param pmx: PMX object
+	:param input_filename_pmx: the path the model was read from, used to check if it can be encoded in shift_jis
+	:return: dict from analyze_model()
+	"""
 	core.MY_PRINT_FUNC("")
 	core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
 	core.MY_PRINT_FUNC("++++      Scanning for other potential issues       ++++")
 	core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
 	core.MY_PRINT_FUNC("")
 	
-	num_badnames = find_shiftjis_unsupported_names(pmx, input_filename_pmx)
+	report = analyze_model(pmx, input_filename_pmx)
+	
+	_print_shiftjis_unsupported(report["shiftjis_unsupported"])
+	num_badnames = report["shiftjis_unsupported_names"]
 	if num_badnames:
 		core.MY_PRINT_FUNC("WARNING: found %d JP names that cannot be encoded with SHIFT-JIS, please replace the bad characters in the strings printed above!" % num_badnames)
 		core.MY_PRINT_FUNC("If the filepath contains bad characters, then MMD project files (.pmm .emm) will not properly store/load model data between sessions.")
@@ -296,7 +489,7 @@ def main(moreinfo=False):
 		else:                         asdf += "]"
 		return asdf
 	
-	longbone, longmorph = find_toolong_bonemorph(pmx)
+	longbone, longmorph = report["toolong_bones"], report["toolong_morphs"]
 	# also checks that bone/morph names can be stored in shift_jis for VMD usage
 	if longmorph or longbone:
 		core.MY_PRINT_FUNC("Minor warning: this model contains bones/morphs with JP names that are too long (>15 bytes).")
@@ -309,7 +502,7 @@ def main(moreinfo=False):
 			core.MY_PRINT_FUNC("These %d morphs are too long (index[length]): %s" % (len(longmorph), ss))
 		core.MY_PRINT_FUNC("")
 
-	shadowy_mats = find_shadowy_materials(pmx)
+	shadowy_mats = report["shadowy_materials"]
 	if shadowy_mats:
 		core.MY_PRINT_FUNC("Minor warning: this model contains transparent materials with visible edging.")
 		core.MY_PRINT_FUNC("Edging is visible even if the material is transparent, so this will look like an ugly silhouette.")
@@ -318,7 +511,7 @@ def main(moreinfo=False):
 		core.MY_PRINT_FUNC("These %d materials need edging disabled (index): %s" % (len(shadowy_mats), ss))
 		core.MY_PRINT_FUNC("")
 	
-	invisible_mats = find_always_invisible_materials(pmx)
+	invisible_mats = report["invisible_materials"]
 	if invisible_mats:
 		core.MY_PRINT_FUNC("Minor warning: this model contains transparent materials that never become visible.")
 		core.MY_PRINT_FUNC("These materials are probably just backup geometry or something, and can be safely deleted.")
@@ -326,7 +519,7 @@ def main(moreinfo=False):
 		core.MY_PRINT_FUNC("These %d materials are never visible (index): %s" % (len(invisible_mats), ss))
 		core.MY_PRINT_FUNC("")
 	
-	boneless_bodies = find_boneless_bonebodies(pmx)
+	boneless_bodies = report["boneless_bodies"]
 	if boneless_bodies:
 		core.MY_PRINT_FUNC("WARNING: this model has bone-type rigidbodies that aren't anchored to any bones.")
 		core.MY_PRINT_FUNC("This won't crash MMD but it is probably a mistake that needs corrected.")
@@ -334,7 +527,7 @@ def main(moreinfo=False):
 		core.MY_PRINT_FUNC("These %d bodies are boneless (index): %s" % (len(boneless_bodies), ss))
 		core.MY_PRINT_FUNC("")
 
-	jointless_bodies = find_jointless_physbodies(pmx)
+	jointless_bodies = report["jointless_bodies"]
 	if jointless_bodies:
 		core.MY_PRINT_FUNC("WARNING: this model has physics-type rigidbodies that aren't constrained by joints.")
 		core.MY_PRINT_FUNC("These will just roll around on the floor wasting processing power in MMD.")
@@ -342,7 +535,7 @@ def main(moreinfo=False):
 		core.MY_PRINT_FUNC("These %d bodies are jointless (index): %s" % (len(jointless_bodies), ss))
 		core.MY_PRINT_FUNC("")
 
-	crashing_joints = find_crashing_joints(pmx)
+	crashing_joints = report["crashing_joints"]
 	if crashing_joints:
 		# make the biggest fucking alert i can cuz this is a critical issue
 		core.MY_PRINT_FUNC("! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ! ")
@@ -352,21 +545,75 @@ def main(moreinfo=False):
 		core.MY_PRINT_FUNC("These %d joints are invalid (index): %s" % (len(crashing_joints), crashing_joints))
 		core.MY_PRINT_FUNC("")
 	
+	return report
+
+
+def main(moreinfo=False):
+	# prompt PMX name
+	core.MY_PRINT_FUNC("Please enter name of PMX model file:")
+	input_filename_pmx = core.MY_FILEPROMPT_FUNC("PMX file", ".pmx")
+	input_hash = io.hash_file(input_filename_pmx)
+	
+	# if this exact file was cleaned before with the same options, just reuse that result
+	cache_key = None
+	if USE_RESULT_CACHE:
+		options = [moreinfo] + [_pass_signature(passfunc) for _, passfunc in CLEANUP_PASSES]
+		cache_key = io.result_cache_key(input_hash, _SCRIPT_VERSION, options)
+		cached = io.result_cache_lookup(cache_key)
+		if cached is not None:
+			core.MY_PRINT_FUNC("This exact file was already cleaned before, using the saved result")
+			core.MY_PRINT_FUNC("")
+			for line in cached["report"]:
+				core.MY_PRINT_FUNC(line)
+			if cached["output"] is not None:
+				output_filename_pmx = core.filepath_insert_suffix(input_filename_pmx, "_better")
+				output_filename_pmx = core.filepath_get_unused_name(output_filename_pmx)
+				core.MY_PRINT_FUNC(os.path.abspath(output_filename_pmx))
+				shutil.copyfile(cached["output"], output_filename_pmx)
+			core.MY_PRINT_FUNC("Done!")
+			return None
+	
+	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=moreinfo)
+	
+	# if this exact file was cleaned before, some or all of the passes can be skipped
+	known_clean = []
+	if REMEMBER_CLEAN_MODELS:
+		known_clean = get_known_clean_passes(input_hash)
+	
+	with io.record_printouts() as report:
+		# if ANY stage returns True then it has made changes
+		# final file-write is skipped only if NO stage has made changes
+		pmx, pass_results = run_cleanup_passes(pmx, moreinfo, known_clean)
+		is_changed = any(r["changed"] for r in pass_results)
+		
+		scan_for_issues(pmx, input_filename_pmx)
+		
+		if not is_changed:
+			core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+			core.MY_PRINT_FUNC("++++             No writeback required              ++++")
+			core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+		else:
+			core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+			core.MY_PRINT_FUNC("++++ Done with cleanup, saving improvements to file ++++")
+			core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+	
+	use_result_cache = USE_RESULT_CACHE and is_result_repeatable(pass_results)
 	if not is_changed:
-		core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
-		core.MY_PRINT_FUNC("++++             No writeback required              ++++")
-		core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+		if REMEMBER_CLEAN_MODELS:
+			remember_clean_passes(input_hash, clean_passes_to_remember(pmx))
+		if use_result_cache:
+			io.result_cache_store(cache_key, None, report)
 		core.MY_PRINT_FUNC("Done!")
-		return
+		return None
 	
-	core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
-	core.MY_PRINT_FUNC("++++ Done with cleanup, saving improvements to file ++++")
-	core.MY_PRINT_FUNC("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
-
 	# write out
 	output_filename_pmx = core.filepath_insert_suffix(input_filename_pmx, "_better")
 	output_filename_pmx = core.filepath_get_unused_name(output_filename_pmx)
 	pmxlib.write_pmx(output_filename_pmx, pmx, moreinfo=moreinfo)
+	if REMEMBER_CLEAN_MODELS:
+		remember_clean_passes(io.hash_file(output_filename_pmx), clean_passes_to_remember(pmx))
+	if use_result_cache:
+		io.result_cache_store(cache_key, output_filename_pmx, report)
 	core.MY_PRINT_FUNC("Done!")
 	return None
 
@@ -199,13 +199,14 @@ def main(moreinfo=True):
 				prevframequat = core.euler_to_quaternion(prev.rot)
 				# create a bezier object from the rotation interpolation parameters, for creating intermediate frames
 				r_ax, r_ay, r_bx, r_by = this.interp_r
-				bez = core.MyBezier((r_ax, r_ay), (r_bx, r_by))
+				bez = core.get_bezier((r_ax, r_ay), (r_bx, r_by))
 				# create new frames at these frame numbers, spacing is OVERKEY_FRAME_SPACING
-				for interp_framenum in range(prevframenum + OVERKEY_FRAME_SPACING, thisframenum, OVERKEY_FRAME_SPACING):
-					# calculate the x time percentage from prev frame to this frame
-					x = (interp_framenum - prevframenum) / (thisframenum - prevframenum)
-					# apply the interpolation curve to translate X to Y
-					y = bez.approximate(x)
+				interp_framenums = list(range(prevframenum + OVERKEY_FRAME_SPACING, thisframenum, OVERKEY_FRAME_SPACING))
+				# calculate the x time percentage from prev frame to this frame
+				xs = [(interp_framenum - prevframenum) / (thisframenum - prevframenum) for interp_framenum in interp_framenums]
+				# apply the interpolation curve to translate X to Y
+				ys = bez.approximate_many(xs)
+				for interp_framenum, y in zip(interp_framenums, ys):
 					# interpolate from prev to this by amount Y
 					interp_quat = core.my_slerp(prevframequat, thisframequat, y)
 					# begin building the new frame
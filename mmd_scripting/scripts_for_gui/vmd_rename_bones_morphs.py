@@ -73,6 +73,8 @@ def main(moreinfo=True):
 		if morphframe.name in find_replace_map:
 			num_replaced[morphframe.name] += 1
 			morphframe.name = find_replace_map[morphframe.name]
+	# the names changed so the sorted order that the frame lists remember is no longer correct
+	vmd.invalidate_sort_cache()
 	# now done modifying in-place, report how many i changed
 	num_replaced = list(num_replaced.items())
 	num_replaced.sort(reverse=True, key=core.get2nd)  # sort descending by number replaced
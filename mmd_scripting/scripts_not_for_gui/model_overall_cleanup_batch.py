@@ -0,0 +1,470 @@
+import concurrent.futures
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, Sequence
+
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_io as io
+import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+from mmd_scripting.overall_cleanup import translate_to_english
+from mmd_scripting.scripts_for_gui import model_overall_cleanup
+
+_SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.06 - 3/2/2022"
+# This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
+#####################
+
+
+# how many models to process at the same time, each one in its own process. if None, use one process per CPU core.
+# if 1, everything runs in this process, one model at a time.
+MAX_WORKERS = None
+
+# if true, files whose names already end with the "_better" suffix are not processed again
+SKIP_ALREADY_CLEANED = True
+
+# if false, the translate stage will only use the local translation dictionaries and will not use Google Translate.
+# a big batch can easily use up the whole Google Translate budget, so this is off by default.
+ALLOW_INTERNET_TRANSLATE = False
+# when Google Translate is allowed, the models are cleaned in groups of this many. each group is cleaned by one
+# process, and the translate stage of all the models in a group is done together, so any JP names that they have in
+# common are only sent to Google once. all the models in a group are held in memory at the same time.
+TRANSLATE_GROUP_SIZE = 8
+
+# name of the JSON report file that is written into the current working directory
+REPORT_FILENAME = "overall_cleanup_batch_report.json"
+
+OUTPUT_SUFFIX = "_better"
+
+
+helptext = '''=================================================
+model_overall_cleanup_batch:
+This will run every "model_overall_cleanup" operation on many PMX models at once, without asking any questions.
+Give it a folder (all PMX files in that folder and any subfolders are processed) or a glob pattern like "models/*/*.pmx".
+The models are processed in parallel, and the printouts from each model are collected and saved instead of being
+printed all mixed together. For each model this records how long each step took, what changed, and what problems
+were detected but not fixed.
+
+This can also be run from the command line with the folders/patterns as arguments:
+python model_overall_cleanup_batch.py "C:/mmd/models" "C:/other/*.pmx"
+
+Outputs: PMX file "[model]_better.pmx" for each model that was changed
+         report file "overall_cleanup_batch_report.json"
+'''
+
+
+def find_pmx_files(patterns: Sequence[str]) -> List[str]:
+	"""
+	Turn a list of folders and/or glob patterns into a sorted list of PMX files.
+	A folder means every PMX file within it or any subfolder.
+
+	:param patterns: list of folder paths or glob patterns, relative from CWD or absolute
+	:return: sorted list of absolute file paths, without duplicates
+	"""
+	found = set()
+	for pattern in patterns:
+		if os.path.isdir(pattern):
+			for dirpath, dirnames, filenames in os.walk(pattern):
+				for filename in filenames:
+					found.add(os.path.join(dirpath, filename))
+		else:
+			found.update(glob.glob(pattern, recursive=True))
+	retme = []
+	for f in found:
+		if not f.lower().endswith(".pmx") or not os.path.isfile(f):
+			continue
+		if SKIP_ALREADY_CLEANED and core.filepath_splitext(f)[0].endswith(OUTPUT_SUFFIX):
+			continue
+		retme.append(os.path.abspath(f))
+	retme.sort()
+	return retme
+
+
+class _PrintCapture:
+	"""
+	Replacement for MY_PRINT_FUNC that saves the printouts into a list instead of displaying them.
+	Progress printouts overwrite each other just like they do on the console, so only the last one of any run is kept.
+	This can also stand in for sys.stdout, to catch anything that uses the normal print().
+	"""
+	def __init__(self):
+		self.lines = []
+		self.last_was_progress = False
+		self.partial = ""
+	def __call__(self, *args, is_progress=False):
+		the_string = ' '.join([str(x) for x in args])
+		if self.last_was_progress:
+			self.lines[-1] = the_string
+		else:
+			self.lines.append(the_string)
+		self.last_was_progress = is_progress
+	def write(self, s: str) -> int:
+		# collect text until a whole line is available
+		self.partial += s
+		while "\n" in self.partial:
+			line, self.partial = self.partial.split("\n", 1)
+			self(line)
+		return len(s)
+	def flush(self):
+		pass
+
+
+def _count_items(pmx: pmxstruct.Pmx) -> Dict[str, int]:
+	return {"verts": len(pmx.verts),
+			"faces": len(pmx.faces),
+			"materials": len(pmx.materials),
+			"bones": len(pmx.bones),
+			"morphs": len(pmx.morphs),
+			"frames": len(pmx.frames),
+			"rigidbodies": len(pmx.rigidbodies),
+			"joints": len(pmx.joints),
+			}
+
+
+def _new_record(input_filename_pmx: str) -> Dict[str, Any]:
+	return {"file": input_filename_pmx,
+			"output": None,
+			"changed": False,
+			"error": None,
+			"seconds": {},
+			"passes": {},
+			"counts_before": None,
+			"counts_after": None,
+			"issues": None,
+			"skipped": [],
+			"log": None,
+			}
+
+
+@contextlib.contextmanager
+def _printing_to(capture: _PrintCapture):
+	# send all printouts into "capture" instead of displaying them
+	saved_print_func = core.MY_PRINT_FUNC
+	core.MY_PRINT_FUNC = capture
+	try:
+		with contextlib.redirect_stdout(capture):
+			yield
+	finally:
+		core.MY_PRINT_FUNC = saved_print_func
+
+
+def _record_exception(record: Dict[str, Any], capture: _PrintCapture, e: Exception) -> None:
+	exc_type, exc_value, exc_traceback = sys.exc_info()
+	printme_list = traceback.format_exception(e.__class__, e, exc_traceback)
+	capture("".join(printme_list))
+	record["error"] = "%s: %s" % (e.__class__.__name__, e)
+
+
+def cleanup_one_file(input_filename_pmx: str, moreinfo=False, write_output=True) -> Dict[str, Any]:
+	"""
+	Run the whole overall_cleanup pipeline on one model. All printouts are captured and returned as part of the result,
+	and any exception is caught and recorded, so this is safe to run in a worker process.
+
+	:param input_filename_pmx: path to the PMX file
+	:param moreinfo: if true, get extra printouts with more info about stuff
+	:param write_output: if false, don't write the "_better" file even if the model was changed
+	:return: JSON-friendly dict describing what happened
+	"""
+	record = _new_record(input_filename_pmx)
+	capture = _PrintCapture()
+	core.PROGRESS_LAST_VALUE = 0.0
+	start_total = time.perf_counter()
+	with _printing_to(capture):
+		try:
+			pmx, known_clean = _cleanup_read(record, input_filename_pmx, moreinfo)
+			pmx = _cleanup_run_passes(record, pmx, moreinfo, known_clean)
+			_cleanup_finish(record, pmx, input_filename_pmx, moreinfo, write_output)
+		except Exception as e:
+			_record_exception(record, capture, e)
+	record["seconds"]["total"] = time.perf_counter() - start_total
+	record["log"] = capture.lines
+	return record
+
+
+def cleanup_file_group(pmx_files: Sequence[str], moreinfo=False, write_output=True) -> List[Dict[str, Any]]:
+	"""
+	Same as running cleanup_one_file() on each of the models, except that the translate stage of all of them is done
+	together with translate_to_english_many(). Any JP names that several of the models have in common are only sent to
+	Google once. All of the models are held in memory at the same time.
+	The printouts of the translate stage that aren't about any one model (the Google requests) are added to the log
+	of every model in the group.
+
+	:param pmx_files: list of paths to PMX files
+	:param moreinfo: if true, get extra printouts with more info about stuff
+	:param write_output: if false, don't write the "_better" files even if the models were changed
+	:return: list of JSON-friendly dicts describing what happened, same as cleanup_one_file() returns for each model
+	"""
+	translate_pass = [(header, passfunc) for header, passfunc in model_overall_cleanup.CLEANUP_PASSES
+					  if passfunc is translate_to_english.translate_to_english]
+	split = model_overall_cleanup.CLEANUP_PASSES.index(translate_pass[0])
+	passes_before = model_overall_cleanup.CLEANUP_PASSES[:split]
+	passes_after = model_overall_cleanup.CLEANUP_PASSES[split+1:]
+	
+	records = [_new_record(f) for f in pmx_files]
+	captures = [_PrintCapture() for f in pmx_files]
+	pmx_list = [None] * len(pmx_files)
+	seconds = [0.0] * len(pmx_files)
+	def run_step(d: int, step) -> None:
+		# run one step for one model, unless an earlier step already failed for this model
+		if records[d]["error"] is not None:
+			return
+		core.PROGRESS_LAST_VALUE = 0.0
+		start = time.perf_counter()
+		with _printing_to(captures[d]):
+			try:
+				step()
+			except Exception as e:
+				_record_exception(records[d], captures[d], e)
+		seconds[d] += time.perf_counter() - start
+	
+	# first, everything that comes before the translate stage
+	for d, f in enumerate(pmx_files):
+		def step_before():
+			pmx, known_clean = _cleanup_read(records[d], f, moreinfo)
+			pmx_list[d] = _cleanup_run_passes(records[d], pmx, moreinfo, known_clean, passes_before)
+		run_step(d, step_before)
+	
+	# second, the translate stage: the models that need it are translated together
+	to_translate = []
+	for d in range(len(pmx_files)):
+		if records[d]["error"] is not None:
+			continue
+		if pmx_list[d].journal.is_clean(translate_to_english.translate_to_english.__name__):
+			# the normal way, which will just say that it's being skipped
+			run_step(d, lambda: _cleanup_run_passes(records[d], pmx_list[d], moreinfo, (), translate_pass))
+		else:
+			to_translate.append(d)
+	if to_translate:
+		# where the printouts about the Google requests will go, in each model's log
+		group_log_pos = {}
+		for d in to_translate:
+			with _printing_to(captures[d]):
+				core.MY_PRINT_FUNC("\n>>>> %s <<<<" % translate_pass[0][0])
+				core.MY_PRINT_FUNC("(translated together with %d other models)" % (len(to_translate) - 1))
+			group_log_pos[d] = len(captures[d].lines)
+		group_capture = _PrintCapture()
+		start = time.perf_counter()
+		try:
+			with _printing_to(group_capture):
+				results = translate_to_english.translate_to_english_many(
+					[pmx_list[d] for d in to_translate], moreinfo,
+					model_context=lambda i: _printing_to(captures[to_translate[i]]))
+		except Exception as e:
+			# can't tell which model caused it, so they all failed
+			for d in to_translate:
+				_record_exception(records[d], captures[d], e)
+			results = []
+		elapsed = time.perf_counter() - start
+		for d, (pmx, is_changed) in zip(to_translate, results):
+			captures[d].lines[group_log_pos[d]:group_log_pos[d]] = group_capture.lines
+			r = model_overall_cleanup.record_pass_result(pmx, translate_pass[0][1], is_changed, elapsed)
+			_record_pass_results(records[d], [r])
+			pmx_list[d] = pmx
+			seconds[d] += elapsed
+	
+	# third, everything after the translate stage
+	for d, f in enumerate(pmx_files):
+		def step_after():
+			pmx = _cleanup_run_passes(records[d], pmx_list[d], moreinfo, (), passes_after)
+			_cleanup_finish(records[d], pmx, f, moreinfo, write_output)
+		run_step(d, step_after)
+	
+	for d in range(len(pmx_files)):
+		records[d]["seconds"]["total"] = seconds[d]
+		records[d]["log"] = captures[d].lines
+	return records
+
+
+def _cleanup_read(record: Dict[str, Any], input_filename_pmx: str, moreinfo: bool) -> tuple:
+	# read the model, and find out which passes it is already known not to need
+	start = time.perf_counter()
+	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=moreinfo)
+	record["seconds"]["read"] = time.perf_counter() - start
+	record["counts_before"] = _count_items(pmx)
+
+	known_clean = []
+	if model_overall_cleanup.REMEMBER_CLEAN_MODELS:
+		known_clean = model_overall_cleanup.get_known_clean_passes(io.hash_file(input_filename_pmx))
+	return pmx, known_clean
+
+
+def _cleanup_run_passes(record: Dict[str, Any], pmx: pmxstruct.Pmx, moreinfo: bool, known_clean, passes=None) -> pmxstruct.Pmx:
+	# run some or all of the cleanup passes, and record how it went
+	pmx, pass_results = model_overall_cleanup.run_cleanup_passes(pmx, moreinfo, known_clean, passes)
+	_record_pass_results(record, pass_results)
+	return pmx
+
+
+def _record_pass_results(record: Dict[str, Any], pass_results: List[dict]) -> None:
+	for r in pass_results:
+		record["passes"][r["pass"]] = r["changed"]
+		record["seconds"][r["pass"]] = r["seconds"]
+		if r["skipped"]:
+			record["skipped"].append(r["pass"])
+		if r["changed"]:
+			record["changed"] = True
+
+
+def _cleanup_finish(record: Dict[str, Any], pmx: pmxstruct.Pmx, input_filename_pmx: str, moreinfo: bool, write_output: bool) -> None:
+	# after all the passes: scan for other issues, write the result, and figure out what to remember
+	record["counts_after"] = _count_items(pmx)
+
+	start = time.perf_counter()
+	record["issues"] = model_overall_cleanup.scan_for_issues(pmx, input_filename_pmx)
+	record["seconds"]["scan_for_issues"] = time.perf_counter() - start
+
+	if record["changed"] and write_output:
+		start = time.perf_counter()
+		output_filename_pmx = core.filepath_insert_suffix(input_filename_pmx, OUTPUT_SUFFIX)
+		output_filename_pmx = core.filepath_get_unused_name(output_filename_pmx)
+		pmxlib.write_pmx(output_filename_pmx, pmx, moreinfo=moreinfo)
+		record["output"] = output_filename_pmx
+		record["seconds"]["write"] = time.perf_counter() - start
+
+	if model_overall_cleanup.REMEMBER_CLEAN_MODELS and (record["output"] or not record["changed"]):
+		# the workers only figure out what to remember, the main process does the actual saving so that only one
+		# process is ever writing to the persistent storage file
+		final_file = record["output"] or input_filename_pmx
+		record["remember"] = [io.hash_file(final_file),
+							  model_overall_cleanup.clean_passes_to_remember(pmx)]
+
+
+def _worker_init(allow_internet_translate: bool):
+	# runs once in each worker process before it starts doing any work
+	translate_to_english.DISABLE_INTERNET_TRANSLATE = not allow_internet_translate
+
+
+def _cleanup_job(pmx_files: List[str], moreinfo: bool, write_output: bool) -> List[Dict[str, Any]]:
+	# one unit of work for batch_overall_cleanup(), it runs in a worker process
+	if len(pmx_files) == 1:
+		return [cleanup_one_file(pmx_files[0], moreinfo, write_output)]
+	return cleanup_file_group(pmx_files, moreinfo, write_output)
+
+
+def batch_overall_cleanup(pmx_files: Sequence[str], max_workers=None, moreinfo=False, write_output=True) -> Dict[str, Any]:
+	"""
+	Run the overall_cleanup pipeline on every given model, several at a time in separate processes.
+	Progress is printed as each model finishes, the detailed printouts for each model are returned in the report.
+	If ALLOW_INTERNET_TRANSLATE is true, the models are cleaned in groups of TRANSLATE_GROUP_SIZE, see
+	cleanup_file_group().
+
+	:param pmx_files: list of PMX file paths
+	:param max_workers: how many processes to use, if None use one per CPU core, if 1 run in this process
+	:param moreinfo: if true, get extra printouts with more info about stuff
+	:param write_output: if false, don't write any "_better" files, only build the report
+	:return: JSON-friendly dict with the overall timing and one entry per model, in the same order as the input
+	"""
+	start_total = time.perf_counter()
+	results = [None] * len(pmx_files)
+	# each job is a list of indices into pmx_files, the models in one job are cleaned together by one process
+	if ALLOW_INTERNET_TRANSLATE and TRANSLATE_GROUP_SIZE > 1:
+		jobs = [list(range(start, min(start + TRANSLATE_GROUP_SIZE, len(pmx_files))))
+				for start in range(0, len(pmx_files), TRANSLATE_GROUP_SIZE)]
+	else:
+		jobs = [[d] for d in range(len(pmx_files))]
+	donect = 0
+	if max_workers == 1:
+		# don't bother creating any processes, just do them one job at a time
+		saved_flag = translate_to_english.DISABLE_INTERNET_TRANSLATE
+		_worker_init(ALLOW_INTERNET_TRANSLATE)
+		try:
+			for job in jobs:
+				for d, record in zip(job, _cleanup_job([pmx_files[d] for d in job], moreinfo, write_output)):
+					results[d] = record
+					_finish_one_result(results[d], donect, len(pmx_files))
+					donect += 1
+		finally:
+			translate_to_english.DISABLE_INTERNET_TRANSLATE = saved_flag
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+													initializer=_worker_init,
+													initargs=(ALLOW_INTERNET_TRANSLATE,)) as executor:
+			future_to_job = {executor.submit(_cleanup_job, [pmx_files[d] for d in job], moreinfo, write_output): job
+							 for job in jobs}
+			for future in concurrent.futures.as_completed(future_to_job):
+				job = future_to_job[future]
+				try:
+					records = future.result()
+				except Exception as e:
+					# the cleanup functions catch everything, so this only happens if the worker process itself died
+					records = [{"file": pmx_files[d], "output": None, "changed": False,
+								"error": "%s: %s" % (e.__class__.__name__, e), "log": []} for d in job]
+				for d, record in zip(job, records):
+					results[d] = record
+					_finish_one_result(results[d], donect, len(pmx_files))
+					donect += 1
+
+	return {"version": _SCRIPT_VERSION,
+			"num_files": len(pmx_files),
+			"num_changed": sum(1 for r in results if r["changed"]),
+			"num_errors": sum(1 for r in results if r["error"] is not None),
+			"total_seconds": time.perf_counter() - start_total,
+			"files": results,
+			}
+
+
+def _finish_one_result(record: Dict[str, Any], donect: int, total: int):
+	# save what the worker found out about this model, then print one line about it
+	remember = record.pop("remember", None)
+	if remember is not None:
+		model_overall_cleanup.remember_clean_passes(*remember)
+	if record["error"] is not None:
+		status = "ERROR " + record["error"]
+	elif record["changed"]:
+		status = "changed"
+	else:
+		status = "no changes"
+	core.MY_PRINT_FUNC("%d / %d: %s ... %s" % (donect + 1, total, record["file"], status))
+
+
+def write_report(report: Dict[str, Any]) -> str:
+	"""
+	Write the batch report to a JSON file in the current working directory.
+
+	:param report: dict returned by batch_overall_cleanup()
+	:return: path of the file that was written
+	"""
+	output_filename = core.filepath_get_unused_name(REPORT_FILENAME)
+	io.write_str_to_txtfile(output_filename, json.dumps(report, ensure_ascii=False, indent="\t"))
+	return output_filename
+
+
+def run_batch(patterns: Sequence[str], moreinfo=False) -> None:
+	pmx_files = find_pmx_files(patterns)
+	core.MY_PRINT_FUNC("Found %d PMX files" % len(pmx_files))
+	if not pmx_files:
+		return None
+	report = batch_overall_cleanup(pmx_files, max_workers=MAX_WORKERS, moreinfo=moreinfo)
+	core.MY_PRINT_FUNC("")
+	core.MY_PRINT_FUNC("Processed %d models in %.1f seconds: %d changed, %d failed" % (
+		report["num_files"], report["total_seconds"], report["num_changed"], report["num_errors"]))
+	write_report(report)
+	return None
+
+
+def main(moreinfo=False):
+	core.MY_PRINT_FUNC("Current dir = '%s'" % os.getcwd())
+	core.MY_PRINT_FUNC("Enter the path to a folder containing PMX models, or a glob pattern that matches PMX models:")
+
+	def is_valid_pattern(x: str) -> bool:
+		if os.path.isdir(x) or glob.glob(x, recursive=True):
+			return True
+		core.MY_PRINT_FUNC("Err: nothing matches '%s', did you type it wrong?" % os.path.abspath(x))
+		return False
+	pattern = core.MY_GENERAL_INPUT_FUNC(is_valid_pattern, "Folder or glob pattern")
+	run_batch([pattern], moreinfo=moreinfo)
+	core.MY_PRINT_FUNC("Done!")
+	return None
+
+
+if __name__ == '__main__':
+	core.MY_PRINT_FUNC(_SCRIPT_VERSION)
+	if len(sys.argv) > 1:
+		# headless mode, don't ask any questions and don't wait for ENTER at the end
+		run_batch(sys.argv[1:])
+	else:
+		core.MY_PRINT_FUNC(helptext)
+		core.RUN_WITH_TRACEBACK(main)
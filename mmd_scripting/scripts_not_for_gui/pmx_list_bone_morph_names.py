@@ -21,7 +21,7 @@ def main(moreinfo=True):
 	# prompt PMX name
 	core.MY_PRINT_FUNC("Please enter name of PMX input file:")
 	input_filename_pmx = core.MY_FILEPROMPT_FUNC("PMX file", ".pmx")
-	pmx = pmxlib.read_pmx(input_filename_pmx, moreinfo=moreinfo)
+	pmx = pmxlib.read_pmx_lazy(input_filename_pmx, moreinfo=moreinfo)
 	realbones = pmx.bones		# get bones
 	realmorphs = pmx.morphs		# get morphs
 	modelname_jp = pmx.header.name_jp
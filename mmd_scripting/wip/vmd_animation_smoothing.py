@@ -5,7 +5,7 @@ from typing import Tuple, Optional, Sequence
 # import matplotlib.pyplot as plt
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_vmd_parser as vmdlib
-from mmd_scripting.core.nuthouse01_vmd_utils import dictify_framelist
+from mmd_scripting.core.nuthouse01_vmd_utils import dictify_framelist, run_per_track
 
 _SCRIPT_VERSION = "Script version:  Nuthouse01 - v1.07.04 - 8/19/2021"
 # This code is free to use and re-distribute, but I cannot be held responsible for damages that it may or may not cause.
@@ -69,6 +69,11 @@ CONTROL_POINT_PLACING_METHOD = 1 ###
 CONTROL_POINT_ECCENTRICITY = 0.8 ###
 
 
+# how many bones to find the slopes for at the same time, each one in its own process. if None, use one process per
+# CPU core. if 1, everything runs in this process, one bone at a time. the output is the same either way.
+MAX_WORKERS = None
+
+
 
 
 # my tester guy is useless. i'll have to do it myself.
@@ -572,6 +577,105 @@ def make_point_from_slope(slope: float) -> Tuple[int,int]:
 	return x, y
 
 
+def find_bezier_slopes_for_one_bone(bonename: str, boneframe_list: list) -> list:
+	"""
+	Part 1 of the smoothing, for a single bone (or for the camera). Module-level so that it can be run in another process.
+	
+	:param bonename: name of the bone, or NAME_FOR_CAMFRAMES if these are camframes
+	:param boneframe_list: list of all frames for this bone, sorted by frame number with no duplicate timesteps
+	:return: one entry per frame, each is [depart slopes, approach slopes] with one slope per channel
+	"""
+	global CURRENT_BONENAME
+	CURRENT_BONENAME = bonename  # you're not supposed to pass info via global like this, but idgaf sue me
+	# this will hold all the resulting bezier slopes
+	# each item corresponds to one frame and is stored as:
+	# [approach posx,y,z,rot],[depart posx,y,z,rot]
+	thisbone_bezier_slopes = []
+	
+	# for each sequence of frames on a single bone,
+	for i in range(len(boneframe_list)):
+		
+		thisframe_bezier_approach = []
+		thisframe_bezier_depart = []
+		
+		A = boneframe_list[i-1] if i != 0 else None
+		B = boneframe_list[i]
+		C = boneframe_list[i+1] if i != len(boneframe_list)-1 else None
+		# now i have the 3 frames I want to analyze
+		# need to do the analysis for rotations & for positions
+		
+		# POSITION
+		for j in range(3):
+			A_point = (A.f, A.pos[j]) if (A is not None) else None
+			B_point = (B.f, B.pos[j])
+			C_point = (C.f, C.pos[j]) if (C is not None) else None
+			# stuffed all operations into one function for encapsulation
+			bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
+			# store it
+			thisframe_bezier_approach.append(bez_a)
+			thisframe_bezier_depart.append(bez_d)
+		
+		# ROTATION
+		A_point = (A.f, A.rot) if (A is not None) else None
+		B_point = (B.f, B.rot)
+		C_point = (C.f, C.rot) if (C is not None) else None
+		# stuffed all operations into one function for encapsulation
+		bez_a, bez_d = rotation_calculate_ideal_bezier_slope(A_point, B_point, C_point)
+		# store it
+		thisframe_bezier_approach.append(bez_a)
+		thisframe_bezier_depart.append(bez_d)
+		
+		# CAMFRAME ONLY STUFF
+		if bonename == NAME_FOR_CAMFRAMES:
+			# the typechecker expects boneframes so it gets angry here
+			# distance from camera to position
+			A_point = (A.f, A.dist) if (A is not None) else None
+			B_point = (B.f, B.dist)
+			C_point = (C.f, C.dist) if (C is not None) else None
+			# stuffed all operations into one function for encapsulation
+			bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
+			# store it
+			thisframe_bezier_approach.append(bez_a)
+			thisframe_bezier_depart.append(bez_d)
+			# field of view
+			A_point = (A.f, A.fov) if (A is not None) else None
+			B_point = (B.f, B.fov)
+			C_point = (C.f, C.fov) if (C is not None) else None
+			# stuffed all operations into one function for encapsulation
+			bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
+			# store it
+			thisframe_bezier_approach.append(bez_a)
+			thisframe_bezier_depart.append(bez_d)
+		
+		# next i need to store them in some sensible manner
+		# ..., [approach posx,y,z,rot], [depart posx,y,z,rot], ...
+		thisbone_bezier_slopes.append(thisframe_bezier_approach)
+		thisbone_bezier_slopes.append(thisframe_bezier_depart)
+		pass  # end "for each frame in this bone"
+	# now i have calculated all the desired bezier approach/depart slopes for both rotation and position
+	# next i need to rearrange things slightly
+	
+	# currently the slopes are stored in "approach,depart" pairs associated with a single frame.
+	# but the interpolation curves are stored as "depart, approach" associated with the segment leading up to a frame.
+	# AKA, interpolation info stored with frame i is to interpolate from i-1 to i
+	# therefore there is no place for the slope when interpolating away from the last frame, pop it
+	thisbone_bezier_slopes.pop(-1)
+	# the new list needs to start with 1,1,1,1 to interpolate up to the first frame, insert it
+	if bonename == NAME_FOR_CAMFRAMES:
+		thisbone_bezier_slopes.insert(0, [1]*6)
+	else:
+		thisbone_bezier_slopes.insert(0, [1]*4)
+	# now every pair is a "depart,approach" associated with a single frame
+	final = []
+	for i in range(0, len(thisbone_bezier_slopes), 2):
+		# now store as pairs
+		final.append([thisbone_bezier_slopes[i], thisbone_bezier_slopes[i+1]])
+	
+	assert len(final) == len(boneframe_list)
+	
+	return final
+
+
 def main(moreinfo=True):
 	# TODO: actually load it in MMD and verify that the curves look how they should
 	#  not 100% certain that the order of interpolation values is correct for bone/cam frames
@@ -634,101 +738,10 @@ def main(moreinfo=True):
 	
 	# >>>>>> part 1: identify the desired slope for each metric of each frame
 	core.MY_PRINT_FUNC("Finding smooth approach/depart slopes...")
-	global CURRENT_BONENAME
-	allbone_bezier_slopes = {}
-	for bonename in sorted(boneframe_dict.keys()):
-		CURRENT_BONENAME = bonename  # you're not supposed to pass info via global like this, but idgaf sue me
-		boneframe_list = boneframe_dict[bonename]
-		# this will hold all the resulting bezier slopes
-		# each item corresponds to one frame and is stored as:
-		# [approach posx,y,z,rot],[depart posx,y,z,rot]
-		thisbone_bezier_slopes = []
-		
-		# for each sequence of frames on a single bone,
-		for i in range(len(boneframe_list)):
-			
-			thisframe_bezier_approach = []
-			thisframe_bezier_depart = []
-			
-			A = boneframe_list[i-1] if i != 0 else None
-			B = boneframe_list[i]
-			C = boneframe_list[i+1] if i != len(boneframe_list)-1 else None
-			# now i have the 3 frames I want to analyze
-			# need to do the analysis for rotations & for positions
-			
-			# POSITION
-			for j in range(3):
-				A_point = (A.f, A.pos[j]) if (A is not None) else None
-				B_point = (B.f, B.pos[j])
-				C_point = (C.f, C.pos[j]) if (C is not None) else None
-				# stuffed all operations into one function for encapsulation
-				bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
-				# store it
-				thisframe_bezier_approach.append(bez_a)
-				thisframe_bezier_depart.append(bez_d)
-			
-			# ROTATION
-			A_point = (A.f, A.rot) if (A is not None) else None
-			B_point = (B.f, B.rot)
-			C_point = (C.f, C.rot) if (C is not None) else None
-			# stuffed all operations into one function for encapsulation
-			bez_a, bez_d = rotation_calculate_ideal_bezier_slope(A_point, B_point, C_point)
-			# store it
-			thisframe_bezier_approach.append(bez_a)
-			thisframe_bezier_depart.append(bez_d)
-			
-			# CAMFRAME ONLY STUFF
-			if bonename == NAME_FOR_CAMFRAMES:
-				# the typechecker expects boneframes so it gets angry here
-				# distance from camera to position
-				A_point = (A.f, A.dist) if (A is not None) else None
-				B_point = (B.f, B.dist)
-				C_point = (C.f, C.dist) if (C is not None) else None
-				# stuffed all operations into one function for encapsulation
-				bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
-				# store it
-				thisframe_bezier_approach.append(bez_a)
-				thisframe_bezier_depart.append(bez_d)
-				# field of view
-				A_point = (A.f, A.fov) if (A is not None) else None
-				B_point = (B.f, B.fov)
-				C_point = (C.f, C.fov) if (C is not None) else None
-				# stuffed all operations into one function for encapsulation
-				bez_a, bez_d = scalar_calculate_ideal_bezier_slope(A_point, B_point, C_point)
-				# store it
-				thisframe_bezier_approach.append(bez_a)
-				thisframe_bezier_depart.append(bez_d)
-			
-			# next i need to store them in some sensible manner
-			# ..., [approach posx,y,z,rot], [depart posx,y,z,rot], ...
-			thisbone_bezier_slopes.append(thisframe_bezier_approach)
-			thisbone_bezier_slopes.append(thisframe_bezier_depart)
-			pass  # end "for each frame in this bone"
-		# now i have calculated all the desired bezier approach/depart slopes for both rotation and position
-		# next i need to rearrange things slightly
-		
-		# currently the slopes are stored in "approach,depart" pairs associated with a single frame.
-		# but the interpolation curves are stored as "depart, approach" associated with the segment leading up to a frame.
-		# AKA, interpolation info stored with frame i is to interpolate from i-1 to i
-		# therefore there is no place for the slope when interpolating away from the last frame, pop it
-		thisbone_bezier_slopes.pop(-1)
-		# the new list needs to start with 1,1,1,1 to interpolate up to the first frame, insert it
-		if bonename == NAME_FOR_CAMFRAMES:
-			thisbone_bezier_slopes.insert(0, [1]*6)
-		else:
-			thisbone_bezier_slopes.insert(0, [1]*4)
-		# now every pair is a "depart,approach" associated with a single frame
-		final = []
-		for i in range(0, len(thisbone_bezier_slopes), 2):
-			# now store as pairs
-			final.append([thisbone_bezier_slopes[i], thisbone_bezier_slopes[i+1]])
-		
-		assert len(final) == len(boneframe_list)
-		
-		# save it!
-		allbone_bezier_slopes[bonename] = final
-		pass  # end of "for each bone
-		
+	allbone_bezier_slopes = run_per_track(find_bezier_slopes_for_one_bone,
+										  {bonename: boneframe_dict[bonename] for bonename in sorted(boneframe_dict.keys())},
+										  max_workers=MAX_WORKERS, moreinfo=moreinfo)
+	
 	# >>>>>> part 2: calculate the x/y position of the control points for the curve, based on the slope
 	core.MY_PRINT_FUNC("Calculating control points...")
 	allbone_bezier_points = {}
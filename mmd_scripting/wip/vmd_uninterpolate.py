@@ -2,11 +2,11 @@ import math
 from typing import List, Tuple, Set, Sequence, Callable, Any, Generator
 import time
 
+import mmd_scripting.core.nuthouse01_bezier_fit as bezfit
 import mmd_scripting.core.nuthouse01_core as core
 import mmd_scripting.core.nuthouse01_vmd_parser as vmdlib
 import mmd_scripting.core.nuthouse01_vmd_struct as vmdstruct
 import mmd_scripting.core.nuthouse01_vmd_utils as vmdutil
-from mmd_scripting.vectorpaths_chrisarridge import vectorpaths
 
 import cProfile
 import pstats
@@ -30,6 +30,12 @@ corners.
 Also, it doesn't leverage the fact that the control points must be within
 a specific box; that should reduce the possibility space immensely but I don't
 know how the algorithm could be changed to leverage this.
+UPDATE: vectorpaths has been replaced with nuthouse01_bezier_fit, which only
+searches the integer control points inside the box and measures the exact error
+MMD would produce. It is still a heuristic search: on curves that came from
+real MMD keyframes it recovers the exact curve about 9 times out of 10 and a
+very close one otherwise (see "tests/Core Tests/bezier_fit_test.py"). The rest
+of this script has not been re-tested since.
 
 2. Second, I don't know how to handle everything that the camera VMDs can
 throw at me. I don't know how to detect or handle jump-cuts. Also, camera VMDs
@@ -188,6 +194,11 @@ SIMPLIFY_CAM_FOV = True
 SIMPLIFY_CAM_DIST = True
 SIMPLIFY_CAM_ROTATION = True
 
+# how many bones/morphs to simplify at the same time, each one in its own process. if None, use one process per CPU core.
+# if 1, everything runs in this process, one at a time. the camera is only one track so its channels are split up instead.
+# the output is the same no matter how many processes are used. DEBUG_PLOTS only works with 1.
+MAX_WORKERS = None
+
 # this controls how "straight" a line has to be (in 1d morph-space) to get collapsed
 # higher values = more likely to collapse = fewer frames in result, but greater deviation from original movements
 MORPH_ERROR_THRESHOLD = 0.00001
@@ -201,8 +212,6 @@ BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX = 0.3
 # higher values = more likely to collapse = fewer frames in result, but greater deviation from original movements
 REVERSE_SLERP_TOLERANCE = 0.05
 
-CONTROL_POINT_BOX_THRESHOLD = 1
-
 # # this reduces quality-of-results slightly (by not stripping out every single theoretically collapsable frame)
 # # but, it's needed to prevent O(n^2) compute time from getting out of hand :(
 # BONE_ROTATION_MAX_Z_LOOKAHEAD = 500
@@ -727,66 +736,19 @@ def simplify_morphframes(allmorphlist: List[vmdstruct.VmdMorphFrame]) -> List[vm
 	:param allmorphlist:
 	:return:
 	"""
-	output = []  # this is the list of frames to preserve, the startpoints and endpoints
-	
 	# verify there is no overlapping frames, just in case
 	allmorphlist = vmdutil.assert_no_overlapping_frames(allmorphlist)
 	# sort into dict form to process each morph independently
 	morphdict = vmdutil.dictify_framelist(allmorphlist)
 	
-	num_skipped = 0
-	
 	# print("number of morphs %d" % len(morphdict))
-	# analyze each morph one at a time
-	for morphname, morphlist in morphdict.items():
-		# print("MORPH '%s' LEN %d" % (morphname, len(morphlist)))
-		# make a list of the deltas, for simplicity
-		thisoutput = []
-		# the first frame is always kept. and the last frame is also always kept.
-		# if there is only one frame, or two, then don't even bother walking i guess?
-		if len(morphlist) <= 2:
-			output.extend(morphlist)
-			num_skipped += 1
-			continue
-		
-		# the first frame is always kept.
-		thisoutput.append(morphlist[0])
-		i = 0
-		while i < (len(morphlist)-1):
-			# start walking down this list
-			# assume that i is the start point of a potentially over-keyed section
-			m_this = morphlist[i]
-			m_next = morphlist[i+1]
-			delta_rate = (m_next.val - m_this.val) / (m_next.f - m_this.f)
-			# now, walk forward from here until i "return" a frame that has a different delta
-			z = 0  # to make pycharm shut up
-			for z in range(i+1, len(morphlist)):
-				# if i reach the end of the morphlist, then "return" the final valid index
-				if z == len(morphlist)-1:
-					break
-				z_this = morphlist[z]
-				z_next = morphlist[z + 1]
-				delta_z = (z_next.val - z_this.val) / (z_next.f - z_this.f)
-				if math.isclose(delta_z, delta_rate, abs_tol=MORPH_ERROR_THRESHOLD):
-				# if (delta_rate - MORPH_ERROR_THRESHOLD) < delta_z < (delta_rate + MORPH_ERROR_THRESHOLD):
-					# if this is within the tolerance, then this is continuing the slide and should be skipped over
-					pass
-				else:
-					# if this delta is not within some %tolerance of matching, then this is a break!
-					break
-			# now, z is the index for the end of the sequence
-			# it starts at i and ends at z
-			# i know that i have found a segment endpoint and i can discard everything in between!
-			# no need to preserve 'i', it has already been added
-			thisoutput.append(morphlist[z])
-			# now skip ahead and start walking from z
-			i = z
-		if DEBUG:
-			# when i am done with this morph, how many have i lost?
-			if len(thisoutput) != len(morphlist):
-				print("'%s' : RESULT : keep %d/%d = %.2f%%" % (morphname, len(thisoutput), len(morphlist), 100 * len(thisoutput) / len(morphlist)))
-		
-		output.extend(thisoutput)
+	# analyze each morph independently, maybe several at once
+	resultdict = vmdutil.run_per_track(_simplify_one_morph, morphdict, max_workers=MAX_WORKERS, moreinfo=DEBUG >= 1)
+	# the first frame is always kept. and the last frame is also always kept.
+	# if there is only one frame, or two, then don't even bother walking i guess?
+	num_skipped = sum(1 for morphlist in morphdict.values() if len(morphlist) <= 2)
+	# this is the list of frames to preserve, the startpoints and endpoints
+	output = [frame for thisoutput in resultdict.values() for frame in thisoutput]
 	# FIN
 	print("MORPH RESULTS (inner):")
 	print("    identified %d unique morphs, processed %d" % (len(morphdict), len(morphdict) - num_skipped))
@@ -794,6 +756,59 @@ def simplify_morphframes(allmorphlist: List[vmdstruct.VmdMorphFrame]) -> List[vm
 	
 	return output
 
+def _simplify_one_morph(morphname: str, morphlist: List[vmdstruct.VmdMorphFrame]) -> List[vmdstruct.VmdMorphFrame]:
+	"""
+	Simplify the frames of a single morph. Module-level so that it can be run in another process.
+	
+	:param morphname: str name of the morph, for debug print
+	:param morphlist: list of all morphframes that correspond to this morph, sorted by frame number
+	:return: list of the morphframes that are kept
+	"""
+	# print("MORPH '%s' LEN %d" % (morphname, len(morphlist)))
+	# the first frame is always kept. and the last frame is also always kept.
+	# if there is only one frame, or two, then don't even bother walking i guess?
+	if len(morphlist) <= 2:
+		return list(morphlist)
+	
+	thisoutput = []
+	# the first frame is always kept.
+	thisoutput.append(morphlist[0])
+	i = 0
+	while i < (len(morphlist)-1):
+		# start walking down this list
+		# assume that i is the start point of a potentially over-keyed section
+		m_this = morphlist[i]
+		m_next = morphlist[i+1]
+		delta_rate = (m_next.val - m_this.val) / (m_next.f - m_this.f)
+		# now, walk forward from here until i "return" a frame that has a different delta
+		z = 0  # to make pycharm shut up
+		for z in range(i+1, len(morphlist)):
+			# if i reach the end of the morphlist, then "return" the final valid index
+			if z == len(morphlist)-1:
+				break
+			z_this = morphlist[z]
+			z_next = morphlist[z + 1]
+			delta_z = (z_next.val - z_this.val) / (z_next.f - z_this.f)
+			if math.isclose(delta_z, delta_rate, abs_tol=MORPH_ERROR_THRESHOLD):
+			# if (delta_rate - MORPH_ERROR_THRESHOLD) < delta_z < (delta_rate + MORPH_ERROR_THRESHOLD):
+				# if this is within the tolerance, then this is continuing the slide and should be skipped over
+				pass
+			else:
+				# if this delta is not within some %tolerance of matching, then this is a break!
+				break
+		# now, z is the index for the end of the sequence
+		# it starts at i and ends at z
+		# i know that i have found a segment endpoint and i can discard everything in between!
+		# no need to preserve 'i', it has already been added
+		thisoutput.append(morphlist[z])
+		# now skip ahead and start walking from z
+		i = z
+	if DEBUG:
+		# when i am done with this morph, how many have i lost?
+		if len(thisoutput) != len(morphlist):
+			print("'%s' : RESULT : keep %d/%d = %.2f%%" % (morphname, len(thisoutput), len(morphlist), 100 * len(thisoutput) / len(morphlist)))
+	return thisoutput
+
 def _simplify_boneframes_scalar(bonename: str,
 								bonelist: List[vmdstruct.VmdBoneFrame],
 								chan: str,
@@ -1079,33 +1094,17 @@ def make_beziers_from_datarange(x_points_all: List[float], y_points_all: List[fl
 			x_points = x_points_all[v:w + 1]
 			y_points = y_points_all[v:w + 1]
 			
-			# then run regression to find a reasonable interpolation curve for this stretch
-			# this innately measures both the RMS error and the max error, and i can specify thresholds
-			# if it cannot satisfy those thresholds it will split and try again
-			bezier_list = vectorpaths.fit_cubic_bezier(x_points, y_points,
-													   rms_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS,
-													   max_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX)
+			# then find an MMD interpolation curve for this stretch, it stops searching as soon as it finds one
+			# that satisfies both thresholds. the control points are always integers inside the box.
+			params, rms_error, max_error = bezfit.fit_mmd_bezier(x_points, y_points,
+																  rms_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS,
+																  max_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX)
 			
-			# if it has split, then it's not good for my purposes
-			# note: i modified the code so that if it would split, it returns an empty list instead
-			# TODO: it would be WAY more efficient if i could trust/use the splitting in the algorithm, but it changes
-			#  the location of the endpoints without scaling the error metrics so each split makes it easier to be
-			#  accepted, even without actually fitting any better
-			if len(bezier_list) != 1:
-				continue
-			bez, rms_error, max_error = bezier_list[0]
-
-			# under new sceme, the endpoints are not already at (0,0) and (127,127), so I gotta do that myself
-			px, py = scale_two_lists(bez.px, bez.py, 127)
-
-			# if any control points are not within the box, it's no good
-			# (well, if its only slightly outside the box thats okay, i can clamp it)
-			cpp = (px[1], py[1], px[2], py[2])
-			if not all((0-CONTROL_POINT_BOX_THRESHOLD < p < 127+CONTROL_POINT_BOX_THRESHOLD) for p in cpp):
+			if rms_error > BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS or max_error > BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX:
 				continue
 			
 			# once i find a good interp curve match (if a match is found),
-			found_beziers.append(bez)
+			found_beziers.append((x_points, y_points, params))
 			segment_count += 1
 			keeplist.append(i + w)  # then save this proposed endpoint as a valid endpoint,
 			if DEBUG >= 3:
@@ -1132,9 +1131,11 @@ def make_beziers_from_datarange(x_points_all: List[float], y_points_all: List[fl
 		pass  # end "loop until v == z"
 	if DEBUG >= 3 and DEBUG_PLOTS:
 		# todo: print ALL datapoints and ALL beziers on one graph!
-		for bez in found_beziers:
-			bez.plotcontrol()
-			bez.plot()
+		for x_points, y_points, params in found_beziers:
+			x_curve = [k / 50 for k in range(51)]
+			y_curve = [y_points[0] + (y_points[-1] - y_points[0]) * bezfit.evaluate_mmd_bezier(params, k) for k in x_curve]
+			x_curve = [x_points[0] + (x_points[-1] - x_points[0]) * k for k in x_curve]
+			plt.plot(x_curve, y_curve)
 		plt.plot(x_points_all, y_points_all, 'r+')
 		plt.show(block=True)
 	
@@ -1196,31 +1197,17 @@ def _finally_put_it_all_together(bonelist: List[vmdstruct.VmdBoneFrame], keepset
 		# generate the proper bezier interp curve,
 		for d in range(len(allxally)):
 			x_points, y_points = allxally[d]
-			# todo: make "return_best_onelevel" iterate until the error stops decreasing, even past when it drops under the target
-			bezier_list = vectorpaths.fit_cubic_bezier(x_points, y_points,
-													   rms_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS,
-													   max_err_tol=BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX,
-													   max_reparam_iter=50,
-													   return_best_onelevel=True)
-			
-			a = bezier_list[0]
-			bez, rms_error, max_error = a
+			# no thresholds, so it keeps searching until it finds the best curve it can
+			# the result is already integers [0-127] in the order ax ay bx by
+			params, rms_error, max_error = bezfit.fit_mmd_bezier(x_points, y_points)
 			
 			# if rms_error > BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS or max_error > BEZIER_ERROR_THRESHOLD_BONE_POSITION_MAX:
 			if max_error > BEZIER_ERROR_THRESHOLD_BONE_POSITION_RMS * 2:
 				print("bad fit : i,z=%d,%d, chan=%d : rmserr %f maxerr %f" % (idx_this, idx_next, d, rms_error, max_error))
-				print(bez.p)
-				# bez.plotcontrol()
-				# bez.plot()
+				print(params)
 				# plt.plot(x_points, y_points, 'r+')
 				# plt.show(block=True)
 
-			# under new sceme, the endpoints are not already at (0,0) and (127,127), so I gotta do that myself
-			px, py = scale_two_lists(bez.px, bez.py, 127)
-
-			# clamp all the control points to valid [0-127] range, and also make them be integers
-			cpp = (px[1], py[1], px[2], py[2])  # ax ay bx by
-			params = [round(core.clamp(v, 0, 127)) for v in cpp]
 			all_interp_params.append(params)
 			
 		# for each channel (x/y/z/rot),
@@ -1247,6 +1234,62 @@ def _finally_put_it_all_together(bonelist: List[vmdstruct.VmdBoneFrame], keepset
 	return output
 
 
+def _simplify_one_bone(bonename: str, bonelist: List[vmdstruct.VmdBoneFrame]) -> List[vmdstruct.VmdBoneFrame]:
+	"""
+	Simplify the frames of a single bone. Module-level so that it can be run in another process.
+	
+	:param bonename: str name of the bone, for debug print
+	:param bonelist: list of all boneframes that correspond to this bone, sorted by frame number
+	:return: list of the boneframes that are kept
+	"""
+	# if bonename != "センター":
+	# 	return list(bonelist)
+	# print("BONE '%s' LEN %d" % (bonename, len(bonelist)))
+	if len(bonelist) <= 2:
+		return list(bonelist)
+	
+	# since i need to analyze what's "important" along 4 different channels,
+	# i think it's best to store a set of the indices of the frames that i think are important?
+	keepset = set()
+	
+	# the first frame is always kept.
+	keepset.add(0)
+	
+	#######################################################################################
+	if SIMPLIFY_BONE_POSITION:
+		k = _simplify_boneframes_scalar(bonename, bonelist, "posX", lambda x: x.pos[0], EXPECTED_DELTA_BONE_XPOS)
+		keepset.update(k)
+		k = _simplify_boneframes_scalar(bonename, bonelist, "posY", lambda x: x.pos[1], EXPECTED_DELTA_BONE_YPOS)
+		keepset.update(k)
+		k = _simplify_boneframes_scalar(bonename, bonelist, "posZ", lambda x: x.pos[2], EXPECTED_DELTA_BONE_ZPOS)
+		keepset.update(k)
+		# now i have found every frame# that is important due to position changes
+		if DEBUG and len(keepset) > 2:
+			# if it found only 2, ignore it, cuz that would mean just startpoint and endpoint
+			print(f"'{bonename}' posALL : keep {len(keepset)}/{len(bonelist)}")
+	
+	#######################################################################################
+	# now, i walk along the frames analyzing the ROTATION channel. this is the hard part.
+	if SIMPLIFY_BONE_ROTATION:
+		k = _simplify_boneframes_rotation(bonename, bonelist, EXPECTED_DELTA_BONE_ROTATION_RADIANS)
+		keepset.update(k)
+	
+	#######################################################################################
+	# now done searching for the "important" points, filled "keepset"
+	if DEBUG and len(keepset) > 2:
+		# if it found only 2, dont print cuz that would mean just startpoint and endpoint
+		print("'%s' : RESULT : keep %d/%d = %.2f%%" % (
+			bonename, len(keepset), len(bonelist), 100 * len(keepset) / len(bonelist)))
+	
+	# recap: i have found the minimal set of frames needed to define the motion of this bone,
+	# i.e. the endpoints where a bezier can define the motion between them.
+	# when i unify the sets from each source, i am makign those segments shorter.
+	# if a bezier curve can be fit onto points A thru Z, then it's guaranteed that a bezier curve can
+	# be fit onto points A thru M and separately onto points M thru Z.
+	# i know it's possible, so, thats what i'm doing now.
+	
+	return _finally_put_it_all_together(bonelist, keepset)
+
 def simplify_boneframes(allbonelist: List[vmdstruct.VmdBoneFrame]) -> List[vmdstruct.VmdBoneFrame]:
 	"""
 	dont yet care about phys on/off... but, eventually i should.
@@ -1261,88 +1304,38 @@ def simplify_boneframes(allbonelist: List[vmdstruct.VmdBoneFrame]) -> List[vmdst
 	# sort into dict form to process each morph independently
 	bonedict = vmdutil.dictify_framelist(allbonelist)
 	
-	# for progress printouts
-	totalbonelen = len(allbonelist)
-	sofarbonelen = 0
-	
-	# the final list of all boneframes that i am keeping
-	allbonelist_out = []
-	
-	num_skipped = 0
-	
 	# print("number of bones %d" % len(bonedict))
-	# analyze each morph one at a time
-	for bonename, bonelist in bonedict.items():
-		# if bonename != "センター":
-		# 	continue
-		# if bonename != "上半身":
-		# 	continue
-		# if bonename != "右足ＩＫ" and bonename != "左足ＩＫ" and bonename != "上半身" and bonename != "センター":
-		# 	continue
-		# if bonename != "右足ＩＫ":
-		# 	continue
-		# if bonename != "上半身2":
-		# 	continue
-		# if bonename != "左腕捩":
-		# 	continue
-		# print("BONE '%s' LEN %d" % (bonename, len(bonelist)))
-		sofarbonelen += len(bonelist)
-		core.print_progress_oneline(sofarbonelen / totalbonelen)
-		
-		if len(bonelist) <= 2:
-			allbonelist_out.extend(bonelist)
-			num_skipped += 1
-			continue
-		
-		# since i need to analyze what's "important" along 4 different channels,
-		# i think it's best to store a set of the indices of the frames that i think are important?
-		keepset = set()
-		
-		# the first frame is always kept.
-		keepset.add(0)
-		
-		#######################################################################################
-		if SIMPLIFY_BONE_POSITION:
-			k = _simplify_boneframes_scalar(bonename, bonelist, "posX", lambda x: x.pos[0], EXPECTED_DELTA_BONE_XPOS)
-			keepset.update(k)
-			k = _simplify_boneframes_scalar(bonename, bonelist, "posY", lambda x: x.pos[1], EXPECTED_DELTA_BONE_YPOS)
-			keepset.update(k)
-			k = _simplify_boneframes_scalar(bonename, bonelist, "posZ", lambda x: x.pos[2], EXPECTED_DELTA_BONE_ZPOS)
-			keepset.update(k)
-			# now i have found every frame# that is important due to position changes
-			if DEBUG and len(keepset) > 2:
-				# if it found only 2, ignore it, cuz that would mean just startpoint and endpoint
-				print(f"'{bonename}' posALL : keep {len(keepset)}/{len(bonelist)}")
-		
-		#######################################################################################
-		# now, i walk along the frames analyzing the ROTATION channel. this is the hard part.
-		if SIMPLIFY_BONE_ROTATION:
-			k = _simplify_boneframes_rotation(bonename, bonelist, EXPECTED_DELTA_BONE_ROTATION_RADIANS)
-			keepset.update(k)
-		
-		#######################################################################################
-		# now done searching for the "important" points, filled "keepset"
-		if DEBUG and len(keepset) > 2:
-			# if it found only 2, dont print cuz that would mean just startpoint and endpoint
-			print("'%s' : RESULT : keep %d/%d = %.2f%%" % (
-				bonename, len(keepset), len(bonelist), 100 * len(keepset) / len(bonelist)))
-		
-		# recap: i have found the minimal set of frames needed to define the motion of this bone,
-		# i.e. the endpoints where a bezier can define the motion between them.
-		# when i unify the sets from each source, i am makign those segments shorter.
-		# if a bezier curve can be fit onto points A thru Z, then it's guaranteed that a bezier curve can
-		# be fit onto points A thru M and separately onto points M thru Z.
-		# i know it's possible, so, thats what i'm doing now.
-		
-		r = _finally_put_it_all_together(bonelist, keepset)
-		allbonelist_out.extend(r)
-		pass  # end "for each bonename, bonelist"
+	# analyze each bone independently, maybe several at once
+	resultdict = vmdutil.run_per_track(_simplify_one_bone, bonedict, max_workers=MAX_WORKERS, moreinfo=DEBUG >= 1)
+	num_skipped = sum(1 for bonelist in bonedict.values() if len(bonelist) <= 2)
+	# the final list of all boneframes that i am keeping
+	allbonelist_out = [frame for r in resultdict.values() for frame in r]
 	print("BONE RESULTS (inner):")
 	print("    identified %d unique bones, processed %d" % (len(bonedict), len(bonedict) - num_skipped))
 	print("    keep frames %d/%d = %.2f%%" % (len(allbonelist_out), len(allbonelist), 100 * len(allbonelist_out) / len(allbonelist)))
 
 	return allbonelist_out
 
+def _simplify_one_cam_channel(chan: str, camlist: List[vmdstruct.VmdCamFrame]) -> Set[int]:
+	"""
+	Analyze one channel of the camera. Module-level so that it can be run in another process.
+	
+	:param chan: str label for the channel to analyze, one of posX/posY/posZ/fov/dist/R
+	:param camlist: list of all camframes, sorted by frame number
+	:return: set of ints, referring to indices within camlist that are "important frames"
+	"""
+	if chan == "posX":
+		return _simplify_boneframes_scalar("cam", camlist, "posX", lambda x: x.pos[0], EXPECTED_DELTA_CAM_XPOS)
+	if chan == "posY":
+		return _simplify_boneframes_scalar("cam", camlist, "posY", lambda x: x.pos[1], EXPECTED_DELTA_CAM_YPOS)
+	if chan == "posZ":
+		return _simplify_boneframes_scalar("cam", camlist, "posZ", lambda x: x.pos[2], EXPECTED_DELTA_CAM_ZPOS)
+	if chan == "fov":
+		return _simplify_boneframes_scalar("cam", camlist, "fov", lambda x: x.fov, EXPECTED_DELTA_CAM_FOV)
+	if chan == "dist":
+		return _simplify_boneframes_scalar("cam", camlist, "dist", lambda x: x.dist, EXPECTED_DELTA_CAM_DIST)
+	return _simplify_boneframes_rotation("cam", camlist, EXPECTED_DELTA_CAM_ROTATION_RADIANS)
+
 def simplify_camframes(allcamlist: List[vmdstruct.VmdCamFrame]) -> List[vmdstruct.VmdCamFrame]:
 	"""
 	only care about x/y/z/rotation
@@ -1365,14 +1358,21 @@ def simplify_camframes(allcamlist: List[vmdstruct.VmdCamFrame]) -> List[vmdstruc
 	
 	camlist = allcamlist
 	
+	# the camera is only one track, so analyze each channel independently instead, maybe several at once
+	# rotation goes first because it is the slowest by far
+	channels = []
+	if SIMPLIFY_CAM_ROTATION: channels.append("R")
+	if SIMPLIFY_CAM_POSITION: channels.extend(["posX", "posY", "posZ"])
+	if SIMPLIFY_CAM_FOV: channels.append("fov")
+	if SIMPLIFY_CAM_DIST: channels.append("dist")
+	resultdict = vmdutil.run_per_track(_simplify_one_cam_channel, {chan: camlist for chan in channels},
+									   max_workers=MAX_WORKERS, moreinfo=DEBUG >= 1)
+	
 	#######################################################################################
 	if SIMPLIFY_CAM_POSITION:
-		k = _simplify_boneframes_scalar("cam", camlist, "posX", lambda x: x.pos[0], EXPECTED_DELTA_CAM_XPOS)
-		keepset.update(k)
-		k = _simplify_boneframes_scalar("cam", camlist, "posY", lambda x: x.pos[1], EXPECTED_DELTA_CAM_YPOS)
-		keepset.update(k)
-		k = _simplify_boneframes_scalar("cam", camlist, "posZ", lambda x: x.pos[2], EXPECTED_DELTA_CAM_ZPOS)
-		keepset.update(k)
+		keepset.update(resultdict["posX"])
+		keepset.update(resultdict["posY"])
+		keepset.update(resultdict["posZ"])
 		# now i have found every frame# that is important due to position changes
 		if DEBUG and len(keepset) > 2:
 			# if it found only 2, ignore it, cuz that would mean just startpoint and endpoint
@@ -1380,19 +1380,16 @@ def simplify_camframes(allcamlist: List[vmdstruct.VmdCamFrame]) -> List[vmdstruc
 	
 	#######################################################################################
 	if SIMPLIFY_CAM_FOV:
-		k = _simplify_boneframes_scalar("cam", camlist, "fov", lambda x: x.fov, EXPECTED_DELTA_CAM_FOV)
-		keepset.update(k)
+		keepset.update(resultdict["fov"])
 	
 	#######################################################################################
 	if SIMPLIFY_CAM_DIST:
-		k = _simplify_boneframes_scalar("cam", camlist, "dist", lambda x: x.dist, EXPECTED_DELTA_CAM_DIST)
-		keepset.update(k)
+		keepset.update(resultdict["dist"])
 	
 	#######################################################################################
 	# now, i walk along the frames analyzing the ROTATION channel. this is the hard part.
 	if SIMPLIFY_CAM_ROTATION:
-		k = _simplify_boneframes_rotation("cam", camlist, EXPECTED_DELTA_CAM_ROTATION_RADIANS)
-		keepset.update(k)
+		keepset.update(resultdict["R"])
 	
 	#######################################################################################
 	
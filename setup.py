@@ -14,5 +14,9 @@ setuptools.setup(
     packages=["mmd_scripting"],
     install_requires=[
         'googletrans==3.0.0',
-    ]
+    ],
+    # optional, several scripts run much faster on big models when numpy is installed, but work without it
+    extras_require={
+        'fast': ['numpy'],
+    },
 )
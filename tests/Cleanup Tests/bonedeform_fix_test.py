@@ -0,0 +1,128 @@
+import random
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+from mmd_scripting.overall_cleanup import bonedeform_fix
+from cleanup_pass_writes_test import make_model, make_bone
+
+
+def old_deform_layers(bones):
+    # the iterative solver that bonedeform_fix used before the graph version, kept here to compare against
+    # returns the new deform layers, or None if it gave up because of a recursive relationship
+    MAX_LOOPS = 1000
+    deforms = [b.deform_layer for b in bones]
+    ikmasters = [set() for _ in bones]
+    for d, bone in enumerate(bones):
+        if bone.has_ik:
+            ikmasters[bone.ik_target_idx].add(d)
+            for link in bone.ik_links:
+                ikmasters[link.idx].add(d)
+
+    def good_deform_relationship(me_idx, parent_idx):
+        if ikmasters[parent_idx]:
+            if not (me_idx in ikmasters[parent_idx] or ikmasters[me_idx].intersection(ikmasters[parent_idx])):
+                l = sorted(ikmasters[parent_idx])
+                l.sort(key=lambda x: deforms[x])
+                parent_idx = l[-1]
+        if me_idx < parent_idx:
+            return deforms[me_idx] > deforms[parent_idx]
+        return deforms[me_idx] >= deforms[parent_idx]
+
+    loops = 0
+    while loops < MAX_LOOPS:
+        loops += 1
+        has_changed = False
+        for d, bone in enumerate(bones):
+            is_good = True
+            if bone.parent_idx != -1:
+                is_good &= good_deform_relationship(d, bone.parent_idx)
+            if (bone.inherit_trans or bone.inherit_rot) and bone.inherit_ratio != 0 and bone.inherit_parent_idx != -1:
+                is_good &= good_deform_relationship(d, bone.inherit_parent_idx)
+            if bone.has_ik:
+                is_good &= good_deform_relationship(d, bone.ik_target_idx)
+                for link in bone.ik_links:
+                    is_good &= good_deform_relationship(d, link.idx)
+            if not is_good:
+                has_changed = True
+                deforms[d] += 1
+        if not has_changed:
+            break
+    if loops == MAX_LOOPS:
+        return None
+    return deforms
+
+
+def make_rig(rng, numbones):
+    # each bone depends only on bones that come before it in a shuffled "true" order, so the file order is scrambled
+    # but usually there is no recursion. the IK rules can still sometimes make a loop, which is also worth testing
+    order = list(range(numbones))
+    rng.shuffle(order)
+    bones = [make_bone("b%d" % d, -1) for d in range(numbones)]
+    for pos, d in enumerate(order):
+        bone = bones[d]
+        bone.deform_layer = rng.choice([0, 0, 0, 1, 2])
+        earlier = order[:pos]
+        if earlier and rng.random() < 0.8:
+            bone.parent_idx = rng.choice(earlier)
+        if earlier and rng.random() < 0.3:
+            bone.inherit_rot = True
+            bone.inherit_parent_idx = rng.choice(earlier)
+            bone.inherit_ratio = rng.choice([0.0, 0.5, 1.0])
+        if len(earlier) >= 2 and rng.random() < 0.15:
+            chain = rng.sample(earlier, rng.randrange(2, min(4, len(earlier)) + 1))
+            bone.has_ik = True
+            bone.ik_target_idx = chain[0]
+            bone.ik_numloops = 40
+            bone.ik_angle = 114.5916
+            bone.ik_links = [pmxstruct.PmxBoneIkLink(idx=c) for c in chain[1:]]
+    pmx = make_model()
+    pmx.bones = bones
+    return pmx
+
+
+class BoneDeformFix(unittest.TestCase):
+    def setUp(self):
+        core.MY_PRINT_FUNC = lambda *args, **kwargs: None
+
+    def testSameAsIterativeSolver(self):
+        rng = random.Random(12)
+        num_ok = num_recursive = 0
+        for _ in range(300):
+            pmx = make_rig(rng, rng.randrange(2, 25))
+            before = [b.deform_layer for b in pmx.bones]
+            expected = old_deform_layers(pmx.bones)
+            pmx, is_changed = bonedeform_fix.bonedeform_fix(pmx)
+            after = [b.deform_layer for b in pmx.bones]
+            if expected is None:
+                num_recursive += 1
+                self.assertFalse(is_changed)
+                self.assertEqual(after, before)
+            else:
+                num_ok += 1
+                self.assertEqual(after, expected)
+                self.assertEqual(is_changed, expected != before)
+        # make sure both kinds of rig actually got tested
+        self.assertGreater(num_ok, 100)
+        self.assertGreater(num_recursive, 0)
+
+    def testParentLoop(self):
+        # 0 -> 1 -> 2 -> 0 is a recursive relationship, nothing should change
+        pmx = make_model()
+        pmx.bones = [make_bone("a", 2), make_bone("b", 0), make_bone("c", 1), make_bone("d", 0)]
+        self.assertIsNone(old_deform_layers(pmx.bones))
+        pmx, is_changed = bonedeform_fix.bonedeform_fix(pmx)
+        self.assertFalse(is_changed)
+        self.assertEqual([b.deform_layer for b in pmx.bones], [0, 0, 0, 0])
+        self.assertEqual(bonedeform_fix.find_cycles(bonedeform_fix.build_deform_graph(pmx), range(3)), [[0, 1, 2]])
+
+    def testChildBeforeParent(self):
+        # a bone that comes before its parent in the list must be one layer higher
+        pmx = make_model()
+        pmx.bones = [make_bone("child", 2), make_bone("root", -1), make_bone("parent", 1)]
+        pmx, is_changed = bonedeform_fix.bonedeform_fix(pmx)
+        self.assertTrue(is_changed)
+        self.assertEqual([b.deform_layer for b in pmx.bones], [1, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.scripts_for_gui.model_overall_cleanup as model_overall_cleanup
+from mmd_scripting.overall_cleanup import translate_to_english
+from cleanup_pass_writes_test import make_model
+
+
+ALL_PASSES = [passfunc.__name__ for _, passfunc in model_overall_cleanup.CLEANUP_PASSES]
+
+
+class CleanupMemo(unittest.TestCase):
+    def setUp(self):
+        core.MY_PRINT_FUNC = lambda *args, **kwargs: None
+        translate_to_english.DISABLE_INTERNET_TRANSLATE = True
+
+    def testNothingSkippedWithoutMemo(self):
+        # even on a model that is already clean, nothing within one run makes a pass be skipped
+        pmx, results = model_overall_cleanup.run_cleanup_passes(make_model())
+        pmx.journal = type(pmx.journal)()
+        pmx, results = model_overall_cleanup.run_cleanup_passes(pmx)
+        self.assertFalse(any(r["skipped"] for r in results))
+
+    def testMemoSkipsUntilInputChanges(self):
+        # pretend every pass except the first was remembered as clean: the first pass deletes a duplicate face, so
+        # every pass that reads the faces must run after all, and the rest are skipped
+        known_clean = [name for name in ALL_PASSES if name != "prune_invalid_faces"]
+        pmx, results = model_overall_cleanup.run_cleanup_passes(make_model(), known_clean=known_clean)
+        results = {r["pass"]: r for r in results}
+        self.assertFalse(results["prune_invalid_faces"]["skipped"])
+        self.assertTrue(results["prune_invalid_faces"]["changed"])
+        self.assertFalse(results["prune_unused_vertices"]["skipped"])
+        self.assertFalse(results["weight_cleanup"]["skipped"])
+
+    def testMemoSkipsWhenNothingChanges(self):
+        # same, but without the duplicate face the first pass changes nothing, so every remembered pass is skipped
+        pmx = make_model()
+        pmx.faces.pop()
+        pmx.materials[0].faces_ct = 1
+        known_clean = [name for name in ALL_PASSES if name != "prune_invalid_faces"]
+        pmx, results = model_overall_cleanup.run_cleanup_passes(pmx, known_clean=known_clean)
+        self.assertFalse(results[0]["changed"])
+        self.assertEqual([r["pass"] for r in results if r["skipped"]], known_clean)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+import mmd_scripting.scripts_for_gui.model_overall_cleanup as model_overall_cleanup
+from mmd_scripting.overall_cleanup import translate_to_english
+
+
+def make_vert(x, bone):
+    return pmxstruct.PmxVertex(pos=[x, 0.0, 0.0], norm=[0.0, 0.0, 2.0], uv=[0.0, 0.0], edgescale=1.0,
+                               weighttype=pmxstruct.WeightMode.BDEF2, weight=[[bone, 0.7], [0, 0.6]])
+
+
+def make_bone(name, parent):
+    return pmxstruct.PmxBone(name_jp=name, name_en=name, pos=[0.0, 0.0, 0.0], parent_idx=parent, deform_layer=0,
+                             deform_after_phys=False, has_rotate=True, has_translate=False, has_visible=True,
+                             has_enabled=True, has_ik=False, tail_usebonelink=True, tail=-1, inherit_rot=False,
+                             inherit_trans=False, has_fixedaxis=False, has_localaxis=False, has_externalparent=False)
+
+
+def make_model():
+    # a tiny model with something for most of the passes to fix:
+    # a duplicate face, an unused vertex, unnormalized weights, an unused bone, an imperceptible morph,
+    # a display frame with a duplicate, and duplicate names
+    verts = [make_vert(0.0, 1), make_vert(1.0, 1), make_vert(2.0, 0), make_vert(3.0, 0)]
+    faces = [[0, 1, 2], [0, 1, 2]]
+    mat = pmxstruct.PmxMaterial(name_jp="mat", name_en="mat", diffRGB=[1.0, 1.0, 1.0], specRGB=[0.0, 0.0, 0.0],
+                                ambRGB=[0.5, 0.5, 0.5], alpha=1.0, specpower=5.0, edgeRGB=[0.0, 0.0, 0.0],
+                                edgealpha=1.0, edgesize=1.0, tex_path="", toon_path="", sph_path="",
+                                sph_mode=pmxstruct.SphMode.DISABLE, comment="", faces_ct=2,
+                                matflags=pmxstruct.MaterialFlags.USE_EDGING)
+    bones = [make_bone("center", -1), make_bone("arm", 0), make_bone("arm", 0), make_bone("unused", 0)]
+    morphs = [pmxstruct.PmxMorph(name_jp="tiny", name_en="tiny", panel=pmxstruct.MorphPanel.OTHER,
+                                 morphtype=pmxstruct.MorphType.VERTEX,
+                                 items=[pmxstruct.PmxMorphItemVertex(vert_idx=0, move=[0.000001, 0.0, 0.0])])]
+    frames = [pmxstruct.PmxFrame(name_jp="Root", name_en="Root", is_special=True,
+                                 items=[pmxstruct.PmxFrameItem(is_morph=False, idx=0)]),
+              pmxstruct.PmxFrame(name_jp="arms", name_en="arms", is_special=False,
+                                 items=[pmxstruct.PmxFrameItem(is_morph=False, idx=1),
+                                        pmxstruct.PmxFrameItem(is_morph=False, idx=1)])]
+    header = pmxstruct.PmxHeader(ver=2.0, name_jp="model", name_en="model", comment_jp="comment", comment_en="comment")
+    return pmxstruct.Pmx(header, verts, faces, [mat], bones, morphs, frames, [], [], [])
+
+
+class CleanupPassWrites(unittest.TestCase):
+    def setUp(self):
+        core.MY_PRINT_FUNC = lambda *args, **kwargs: None
+        translate_to_english.DISABLE_INTERNET_TRANSLATE = True
+        model_overall_cleanup.CHECK_PASS_WRITES = True
+
+    def tearDown(self):
+        model_overall_cleanup.CHECK_PASS_WRITES = False
+
+    def testPassesOnlyWriteDeclaredSections(self):
+        # CHECK_PASS_WRITES makes run_cleanup_passes raise if any pass changes a section not in its PASS_WRITES
+        pmx, results = model_overall_cleanup.run_cleanup_passes(make_model())
+        self.assertTrue(any(r["changed"] for r in results))
+        self.assertEqual(len(pmx.faces), 1)
+        self.assertEqual(len(pmx.verts), 3)
+
+    def testUndeclaredWriteIsCaught(self):
+        module = model_overall_cleanup._pass_module(model_overall_cleanup.CLEANUP_PASSES[0][1])
+        old_writes = module.PASS_WRITES
+        # the first pass deletes a duplicate face, so pretend it doesn't write to the faces
+        module.PASS_WRITES = tuple(sec for sec in old_writes if sec != "faces")
+        try:
+            with self.assertRaises(RuntimeError):
+                model_overall_cleanup.run_cleanup_passes(make_model())
+        finally:
+            module.PASS_WRITES = old_writes
+
+
+if __name__ == '__main__':
+    unittest.main()
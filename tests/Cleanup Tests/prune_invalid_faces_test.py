@@ -0,0 +1,65 @@
+import copy
+import random
+import unittest
+from mmd_scripting.overall_cleanup import prune_invalid_faces
+from cleanup_pass_writes_test import make_model
+
+
+def make_faces_model(rng, numfaces, numverts, mat_counts, offset=0):
+    # random faces over only a few verts, so there are plenty of invalid faces, dupes, and mirrored dupes
+    pmx = make_model()
+    pmx.faces = [[offset + rng.randrange(numverts) for _ in range(3)] for _ in range(numfaces)]
+    mats = []
+    for ct in mat_counts:
+        mat = copy.deepcopy(pmx.materials[0])
+        mat.faces_ct = ct
+        mats.append(mat)
+    pmx.materials = mats
+    return pmx
+
+
+@unittest.skipIf(prune_invalid_faces.np is None, "numpy is not installed")
+class FindBadFacesNumpy(unittest.TestCase):
+    def assertSameAsPython(self, pmx):
+        self.assertEqual(prune_invalid_faces.find_bad_faces(pmx),
+                         prune_invalid_faces.find_bad_faces_python(pmx))
+
+    def testRandomFaces(self):
+        rng = random.Random(11)
+        for _ in range(50):
+            numfaces = rng.randrange(1, 200)
+            # split the faces among a few materials
+            cuts = sorted(rng.randrange(numfaces + 1) for _ in range(rng.randrange(1, 5)))
+            mat_counts = [b - a for a, b in zip([0] + cuts, cuts + [numfaces])]
+            self.assertSameAsPython(make_faces_model(rng, numfaces, rng.randrange(3, 8), mat_counts))
+
+    def testFacesNotInAnyMaterial(self):
+        # the materials only cover the first part of the face list
+        rng = random.Random(12)
+        for _ in range(20):
+            numfaces = rng.randrange(10, 100)
+            self.assertSameAsPython(make_faces_model(rng, numfaces, 5, [numfaces // 3, numfaces // 4]))
+
+    def testHugeVertexIndices(self):
+        # indices that don't fit in 21 bits take the per-column sort path
+        rng = random.Random(13)
+        for _ in range(20):
+            numfaces = rng.randrange(10, 100)
+            self.assertSameAsPython(make_faces_model(rng, numfaces, 6, [numfaces // 2, numfaces - numfaces // 2],
+                                                     offset=(1 << 21) - 3))
+
+    def testKnownAnswer(self):
+        rng = random.Random(14)
+        pmx = make_faces_model(rng, 0, 1, [4, 2])
+        # invalid, original, rotated dupe, mirror (not a dupe) | cross-material dupe, dupe within material 1
+        pmx.faces = [[0, 0, 1], [0, 1, 2], [1, 2, 0], [2, 1, 0], [2, 0, 1], [0, 1, 2]]
+        invalid, dupes_per_mat, dupes, cross = prune_invalid_faces.find_bad_faces(pmx)
+        self.assertEqual(invalid, [0])
+        self.assertEqual(dupes, [2, 5])
+        self.assertEqual(dupes_per_mat, {0: 1, 1: 1})
+        self.assertEqual(cross, 1)
+        self.assertSameAsPython(pmx)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.scripts_for_gui.model_overall_cleanup as model_overall_cleanup
+from mmd_scripting.overall_cleanup import translate_to_english
+from cleanup_pass_writes_test import make_model
+
+
+class ResultCacheRepeatable(unittest.TestCase):
+    def setUp(self):
+        core.MY_PRINT_FUNC = lambda *args, **kwargs: None
+        translate_to_english.DISABLE_INTERNET_TRANSLATE = True
+
+    def testRepeatablePassesCanBeCached(self):
+        # everything already has english names, so the translate pass has nothing to do
+        pmx, results = model_overall_cleanup.run_cleanup_passes(make_model())
+        self.assertFalse([r for r in results if r["pass"] == "translate_to_english"][0]["changed"])
+        self.assertTrue(any(r["changed"] for r in results))
+        self.assertTrue(model_overall_cleanup.is_result_repeatable(results))
+
+    def testTranslateChangesAreNotCached(self):
+        pmx = make_model()
+        pmx.bones[0].name_en = ""
+        pmx.bones[0].name_jp = "センター"
+        pmx, results = model_overall_cleanup.run_cleanup_passes(pmx)
+        self.assertTrue([r for r in results if r["pass"] == "translate_to_english"][0]["changed"])
+        self.assertFalse(model_overall_cleanup.is_result_repeatable(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
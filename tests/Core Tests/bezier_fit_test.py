@@ -0,0 +1,55 @@
+import random
+import unittest
+import mmd_scripting.core.nuthouse01_bezier_fit as bezier_fit
+
+
+def sample_curve(params, num_frames, height=100.0):
+    # what the motion looks like on every frame between two keyframes that use this curve
+    xs = list(range(num_frames + 1))
+    ys = [height * bezier_fit.evaluate_mmd_bezier(params, x / num_frames) for x in xs]
+    return xs, ys
+
+
+class FitMMDBezier(unittest.TestCase):
+    def testLinearIsExact(self):
+        xs, ys = sample_curve([20, 20, 107, 107], 30)
+        params, rms_err, max_err = bezier_fit.fit_mmd_bezier(xs, ys)
+        self.assertLess(max_err, 1e-6)
+
+    def testKnownCurvesRoundTrip(self):
+        for params in ([0, 0, 127, 127], [64, 0, 64, 127], [127, 0, 0, 127], [30, 90, 100, 10], [10, 60, 70, 127]):
+            xs, ys = sample_curve(params, 40)
+            fit, rms_err, max_err = bezier_fit.fit_mmd_bezier(xs, ys)
+            self.assertLess(max_err, 1e-6, msg=str(params))
+            # the curve it found must actually reproduce the datapoints
+            _, refit = sample_curve(fit, 40)
+            for a, b in zip(ys, refit):
+                self.assertAlmostEqual(a, b, places=6)
+
+    def testToleranceIsRespected(self):
+        xs, ys = sample_curve([90, 15, 40, 110], 25)
+        params, rms_err, max_err = bezier_fit.fit_mmd_bezier(xs, ys, rms_err_tol=0.5, max_err_tol=1.0)
+        self.assertLessEqual(rms_err, 0.5)
+        self.assertLessEqual(max_err, 1.0)
+
+    def testRandomCurvesMostlyRoundTrip(self):
+        # the search is a heuristic, so it doesn't recover every curve exactly, but it recovers most of them and the
+        # ones it misses are still very close. these are the numbers that the docs refer to.
+        rng = random.Random(0)
+        num_curves = 100
+        num_exact = 0
+        worst = 0.0
+        for i in range(num_curves):
+            params = [rng.randint(0, 127) for _ in range(4)]
+            xs, ys = sample_curve(params, rng.randint(5, 60))
+            fit, rms_err, max_err = bezier_fit.fit_mmd_bezier(xs, ys)
+            if max_err < 1e-6:
+                num_exact += 1
+            worst = max(worst, max_err)
+        self.assertGreaterEqual(num_exact, 90)
+        # out of a height of 100
+        self.assertLess(worst, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
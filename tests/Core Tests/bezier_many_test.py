@@ -0,0 +1,42 @@
+import random
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+
+
+class BezierApproximateMany(unittest.TestCase):
+    def setUp(self):
+        self.real_np = core.np
+
+    def tearDown(self):
+        core.np = self.real_np
+
+    def checkSameAsApproximate(self, rng):
+        for _ in range(100):
+            p1 = (rng.randrange(128), rng.randrange(128))
+            p2 = (rng.randrange(128), rng.randrange(128))
+            bez = core.MyBezier(p1, p2, resolution=rng.choice([2, 10, 50]))
+            # random points, out-of-range points, the ends, and exactly on the precomputed points
+            xs = [rng.random() for _ in range(50)] + [-0.5, 0.0, 1.0, 1.5] + list(bez.xx)
+            rng.shuffle(xs)
+            self.assertEqual(bez.approximate_many(xs), [bez.approximate(x) for x in xs], (p1, p2))
+
+    def testNumpySameAsApproximate(self):
+        if core.np is None:
+            self.skipTest("numpy is not installed")
+        self.checkSameAsApproximate(random.Random(25))
+
+    def testFallbackSameAsApproximate(self):
+        core.np = None
+        self.checkSameAsApproximate(random.Random(26))
+
+    def testEmpty(self):
+        self.assertEqual(core.MyBezier((20, 20), (107, 107)).approximate_many([]), [])
+
+    def testCachedCurveIsShared(self):
+        bez = core.get_bezier([10, 30], [90, 127])
+        self.assertIs(core.get_bezier((10, 30), (90, 127)), bez)
+        self.assertEqual(bez.xx, core.MyBezier((10, 30), (90, 127)).xx)
+
+
+if __name__ == '__main__':
+    unittest.main()
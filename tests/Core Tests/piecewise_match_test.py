@@ -0,0 +1,72 @@
+import random
+import unittest
+import mmd_scripting.core.translation_functions as translation_functions
+
+
+def linear_match(in_dict, out, i, exclude_key=None):
+    # the old way: check every key of the dict in order, the first one that matches wins
+    for key in in_dict:
+        if key != exclude_key and out.startswith(key, i):
+            return len(key)
+    return -1
+
+
+def random_dict(rng):
+    # short keys over a tiny alphabet so lots of them overlap, in random order so shorter keys sometimes come first
+    keys = {"".join(rng.choice("abc") for _ in range(rng.randrange(1, 4))) for _ in range(rng.randrange(1, 12))}
+    keys = sorted(keys)
+    rng.shuffle(keys)
+    return {k: k.upper() for k in keys}
+
+
+class PiecewiseMatch(unittest.TestCase):
+    def testSameAsLinearScan(self):
+        rng = random.Random(17)
+        for _ in range(300):
+            in_dict = random_dict(rng)
+            matcher = translation_functions._get_piecewise_matcher(in_dict)
+            keys = list(in_dict)
+            exclude_key = rng.choice(keys + [None, "zzz"])
+            skip_rank = keys.index(exclude_key) if exclude_key in in_dict else -1
+            out = "".join(rng.choice("abcd") for _ in range(rng.randrange(0, 10)))
+            for i in range(len(out) + 1):
+                self.assertEqual(translation_functions._piecewise_match(matcher, out, i, skip_rank),
+                                 linear_match(in_dict, out, i, exclude_key), (in_dict, out, i, exclude_key))
+
+    def testTranslateSameAsLinearScan(self):
+        rng = random.Random(18)
+        for _ in range(300):
+            in_dict = random_dict(rng)
+            exclude_key = rng.choice(list(in_dict) + [None])
+            # what the old version gave with exclude_key actually removed from the dict
+            smaller = {k: v for k, v in in_dict.items() if k != exclude_key}
+            out = "".join(rng.choice("abc1 ") for _ in range(rng.randrange(1, 12)))
+            got = translation_functions.piecewise_translate(out, in_dict, exclude_key=exclude_key)
+            self.assertEqual(got, translation_functions.piecewise_translate(out, smaller))
+            # and a plain left-to-right scan that replaces whatever matches first
+            i = 0
+            expect = out
+            while i < len(expect):
+                keylen = linear_match(smaller, expect, i)
+                if keylen == -1:
+                    i += 1
+                    continue
+                key = expect[i:i + keylen]
+                before = " " if i != 0 and translation_functions.is_alphanumeric(expect[i - 1]) else ""
+                after = " " if i + keylen < len(expect) and translation_functions.is_alphanumeric(expect[i + keylen]) else ""
+                expect = expect[:i] + before + smaller[key] + after + expect[i + keylen:]
+                i += len(smaller[key]) + len(before) + len(after)
+            self.assertEqual(got, expect if expect.strip() else "JP_NULL")
+
+    def testCacheNoticesChangedKeys(self):
+        in_dict = {"ab": "X"}
+        self.assertEqual(translation_functions.piecewise_translate("abc", in_dict, join_with_space=False), "Xc")
+        # same dict object with different keys, the cached trie must not be reused
+        in_dict["c"] = "Y"
+        self.assertEqual(translation_functions.piecewise_translate("abc", in_dict, join_with_space=False), "XY")
+        del in_dict["ab"]
+        self.assertEqual(translation_functions.piecewise_translate("abc", in_dict, join_with_space=False), "abY")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import random
+import unittest
+import mmd_scripting.core.nuthouse01_pmx_utils as pmxutils
+
+
+def random_dellist(rng, old_len):
+    # mix of single deletions and runs, sometimes touching the start or end of the list
+    return sorted(rng.sample(range(old_len), rng.randrange(old_len + 1)))
+
+
+class RemapWithLut(unittest.TestCase):
+    def setUp(self):
+        self.real_np = pmxutils.np
+
+    def tearDown(self):
+        pmxutils.np = self.real_np
+
+    def checkSameAsRangemap(self, rng):
+        for _ in range(200):
+            old_len = rng.randrange(0, 40)
+            dellist = random_dellist(rng, old_len)
+            range_map = pmxutils.delme_list_to_rangemap(dellist)
+            lut = pmxutils.build_remap_lut(old_len, dellist, range_map)
+            self.assertEqual(len(lut), old_len + 1)
+            # includes "no reference" (-1), other negatives, and references past the end of the list
+            for v in range(-3, old_len + 5):
+                if v in dellist:
+                    self.assertEqual(pmxutils.remap_with_lut(lut, v, range_map), -1)
+                else:
+                    self.assertEqual(pmxutils.remap_with_lut(lut, v, range_map),
+                                     pmxutils.newval_from_rangemap(v, range_map))
+
+    def testNumpyLut(self):
+        if pmxutils.np is None:
+            self.skipTest("numpy is not installed")
+        self.checkSameAsRangemap(random.Random(15))
+
+    def testPythonLut(self):
+        pmxutils.np = None
+        self.checkSameAsRangemap(random.Random(16))
+
+    def testLutBuildersAgree(self):
+        if pmxutils.np is None:
+            self.skipTest("numpy is not installed")
+        rng = random.Random(17)
+        for _ in range(100):
+            old_len = rng.randrange(0, 40)
+            dellist = random_dellist(rng, old_len)
+            range_map = pmxutils.delme_list_to_rangemap(dellist)
+            fast = pmxutils.build_remap_lut(old_len, dellist, range_map)
+            pmxutils.np = None
+            slow = pmxutils.build_remap_lut(old_len, dellist, range_map)
+            pmxutils.np = self.real_np
+            self.assertEqual(fast, slow)
+
+    def testArraySameAsRangemap(self):
+        np = pmxutils.np
+        if np is None:
+            self.skipTest("numpy is not installed")
+        rng = random.Random(18)
+        for _ in range(200):
+            old_len = rng.randrange(1, 40)
+            dellist = random_dellist(rng, old_len)
+            range_map = pmxutils.delme_list_to_rangemap(dellist)
+            lut = pmxutils.build_remap_lut(old_len, dellist, range_map)
+            keep = [v for v in range(-3, old_len + 5) if v not in dellist]
+            # sometimes only in-range references, sometimes some out-of-range ones too
+            if rng.random() < 0.5:
+                keep = [v for v in keep if -1 <= v < old_len]
+            arr = np.array([rng.choice(keep) for _ in range(30)], dtype=np.int64).reshape(10, 3)
+            got = pmxutils.remap_array_with_lut(lut, arr, range_map)
+            self.assertEqual(got.shape, arr.shape)
+            self.assertEqual(got.ravel().tolist(), [pmxutils.newval_from_rangemap(int(v), range_map) for v in arr.ravel()])
+
+
+if __name__ == '__main__':
+    unittest.main()
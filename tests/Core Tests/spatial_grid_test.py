@@ -0,0 +1,68 @@
+import math
+import random
+import unittest
+import mmd_scripting.core.nuthouse01_spatial as spatial
+
+
+def brute_force(points, ids, query):
+    # every point, sorted by (squared distance, position in the list) just like SpatialGrid does
+    px, py, pz = query
+    found = []
+    for d, q in enumerate(points):
+        dx = q[0] - px; dy = q[1] - py; dz = q[2] - pz
+        found.append((dx*dx + dy*dy + dz*dz, d))
+    found.sort()
+    return [(math.sqrt(d2), ids[d], d2) for d2, d in found]
+
+
+def random_points(rng, num):
+    if rng.random() < 0.5:
+        # on a small integer lattice, so there are lots of exact ties and duplicate points
+        return [[float(rng.randrange(-3, 4)) for _ in range(3)] for _ in range(num)]
+    # clustered around a few centers, like model vertices
+    centers = [[rng.uniform(-10, 10) for _ in range(3)] for _ in range(3)]
+    return [[c + rng.gauss(0, 2) for c in rng.choice(centers)] for _ in range(num)]
+
+
+class SpatialGridQueries(unittest.TestCase):
+    def make_grids(self, rng):
+        for _ in range(60):
+            points = random_points(rng, rng.randrange(0, 80))
+            ids = [rng.randrange(1000) for _ in points] if rng.random() < 0.5 else None
+            cell_size = rng.choice([None, 1.0, 3.0, 50.0])
+            grid = spatial.SpatialGrid(points, ids=ids, cell_size=cell_size)
+            queries = random_points(rng, 20) + [[100.0, -100.0, 0.5]]
+            yield points, (ids if ids is not None else list(range(len(points)))), grid, queries
+
+    def testKnnSameAsBruteForce(self):
+        rng = random.Random(21)
+        for points, ids, grid, queries in self.make_grids(rng):
+            k = rng.choice([1, 3, 10, 200])
+            many = grid.query_knn_many(queries, k)
+            self.assertEqual(len(many), len(queries))
+            for q, got_many in zip(queries, many):
+                expect = [(dist, i) for dist, i, _ in brute_force(points, ids, q)[:k]]
+                self.assertEqual(grid.query_knn(q, k), expect)
+                self.assertEqual(got_many, expect)
+
+    def testRadiusSameAsBruteForce(self):
+        rng = random.Random(22)
+        for points, ids, grid, queries in self.make_grids(rng):
+            radius = rng.choice([0.0, 1.0, 2.5, 10.0, 1000.0])
+            many = grid.query_radius_many(iter(queries), radius)
+            self.assertEqual(len(many), len(queries))
+            for q, got_many in zip(queries, many):
+                expect = [(dist, i) for dist, i, d2 in brute_force(points, ids, q) if d2 <= radius * radius]
+                self.assertEqual(grid.query_radius(q, radius), expect)
+                self.assertEqual(got_many, expect)
+
+    def testEmptyQueries(self):
+        grid = spatial.SpatialGrid([[0.0, 0.0, 0.0]])
+        self.assertEqual(grid.query_knn_many([[1.0, 1.0, 1.0]], 0), [[]])
+        self.assertEqual(grid.query_radius_many([[1.0, 1.0, 1.0]], -1.0), [[]])
+        self.assertEqual(spatial.SpatialGrid([]).query_knn_many([[1.0, 1.0, 1.0]] * 2), [[], []])
+        self.assertIsNone(spatial.SpatialGrid([]).nearest([0.0, 0.0, 0.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import mmd_scripting.core.nuthouse01_io as nuthouse01_io
+import mmd_scripting.core.translation_functions as translation_functions
+
+
+class FakeBackend:
+    # stands in for Google: "translates" each line to its length, and remembers everything it was sent
+    def __init__(self, fail_times=0, delay=0.0):
+        self.sent = []
+        self.started = []
+        self.fail_times = fail_times
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, text, src):
+        with self.lock:
+            self.sent.append(text)
+            self.started.append(time.perf_counter())
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("fake failure")
+        if self.delay:
+            time.sleep(random.random() * self.delay)
+        return "\n".join("en%d" % len(line) for line in text.split("\n"))
+
+
+class TranslateDispatch(unittest.TestCase):
+    OPTIONS = ("TRANSLATE_MAX_CONCURRENT_REQUESTS", "TRANSLATE_MAX_REQUESTS_PER_SECOND", "TRANSLATE_MAX_RETRIES",
+               "TRANSLATE_RETRY_DELAY", "TRANSLATE_BUDGET_MAX_REQUESTS", "TRANSLATE_BUDGET_TIMEFRAME",
+               "USE_TRANSLATION_MEMORY", "DISABLE_INTERNET_TRANSLATE")
+
+    def setUp(self):
+        # keep the translate budget in an empty temp folder, and don't let anything reach Google
+        self.tempdir = tempfile.mkdtemp()
+        self.old_path_func = nuthouse01_io._get_persistent_storage_path
+        nuthouse01_io._get_persistent_storage_path = lambda filename="": os.path.join(self.tempdir, filename)
+        self.forgetConnection()
+        self.old_options = {k: getattr(translation_functions, k) for k in self.OPTIONS}
+        translation_functions.TRANSLATE_MAX_REQUESTS_PER_SECOND = 1000.0
+        translation_functions.TRANSLATE_RETRY_DELAY = 0.0
+        translation_functions.USE_TRANSLATION_MEMORY = False
+        translation_functions.DISABLE_INTERNET_TRANSLATE = False
+        self.backend = FakeBackend()
+        translation_functions.set_translate_backend(self.backend)
+
+    def tearDown(self):
+        translation_functions.set_translate_backend(None)
+        for k, v in self.old_options.items():
+            setattr(translation_functions, k, v)
+        self.forgetConnection()
+        nuthouse01_io._get_persistent_storage_path = self.old_path_func
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def forgetConnection(self):
+        if nuthouse01_io._kv_conn is not None:
+            nuthouse01_io._kv_conn.close()
+        nuthouse01_io._kv_conn = None
+        nuthouse01_io._kv_cache.clear()
+
+    def testResultsKeepTheirOrder(self):
+        self.backend.delay = 0.01
+        packets = ["a" * n + "\n" + "b" * (n + 1) for n in range(1, 30)]
+        results = translation_functions._dispatch_translate_requests(packets)
+        self.assertEqual(results, ["en%d\nen%d" % (n, n + 1) for n in range(1, 30)])
+
+    def testRequestsArePaced(self):
+        translation_functions.TRANSLATE_MAX_CONCURRENT_REQUESTS = 2
+        translation_functions.TRANSLATE_MAX_REQUESTS_PER_SECOND = 20.0
+        translation_functions._dispatch_translate_requests(["x%d" % n for n in range(10)])
+        started = sorted(self.backend.started)
+        # the first 2 can go at once, then one every 1/20 seconds
+        for n in range(2, 10):
+            self.assertGreaterEqual(started[n] - started[0], (n - 1) / 20.0 - 0.02)
+
+    def testFailedRequestIsRetried(self):
+        self.backend.fail_times = 2
+        translation_functions.TRANSLATE_MAX_RETRIES = 2
+        results = translation_functions._dispatch_translate_requests(["abc"])
+        self.assertEqual(results, ["en3"])
+        self.assertEqual(len(self.backend.sent), 3)
+
+    def testGiveUpAfterMaxRetries(self):
+        self.backend.fail_times = 3
+        translation_functions.TRANSLATE_MAX_RETRIES = 2
+        with self.assertRaises(RuntimeError):
+            translation_functions._dispatch_translate_requests(["abc"])
+        self.assertEqual(len(self.backend.sent), 3)
+
+    def testBudgetIsATokenBucket(self):
+        translation_functions.TRANSLATE_BUDGET_MAX_REQUESTS = 5
+        translation_functions.TRANSLATE_BUDGET_TIMEFRAME = 1.0
+        self.assertTrue(translation_functions._check_translate_budget(3))
+        self.assertFalse(translation_functions._check_translate_budget(3))
+        self.assertTrue(translation_functions._check_translate_budget(2))
+        # more than the whole bucket is never allowed
+        self.assertFalse(translation_functions._check_translate_budget(6))
+
+    def testBudgetConvertsOldHistory(self):
+        translation_functions.TRANSLATE_BUDGET_MAX_REQUESTS = 10
+        translation_functions.TRANSLATE_BUDGET_TIMEFRAME = 1.0
+        now = time.time()
+        # 8 recent requests count against the budget, the one from 2 hours ago doesn't
+        nuthouse01_io.write_persistent_storage_json("googletrans-request-history", [[now - 7200, 9], [now - 60, 8]])
+        self.assertFalse(translation_functions._check_translate_budget(3))
+        self.assertTrue(translation_functions._check_translate_budget(2))
+
+    def testSchedulerDedupesAcrossLists(self):
+        translation_functions.TRANSLATE_MAX_CONCURRENT_REQUESTS = 4
+        scheduler = translation_functions.TranslateScheduler(autodetect_language=False)
+        t1 = scheduler.add(["鬱麒麟", "顰蹙躊躇"])
+        t2 = scheduler.add(["顰蹙躊躇", "魑魅魍魎"])
+        scheduler.run()
+        self.assertEqual(scheduler.results(t1), ["en3", "en4"])
+        self.assertEqual(scheduler.results(t2), ["en4", "en4"])
+        sent_lines = [line for packet in self.backend.sent for line in packet.split("\n")]
+        self.assertEqual(sorted(sent_lines), sorted(["鬱麒麟", "顰蹙躊躇", "魑魅魍魎"]))
+
+    def testEachThreadHasItsOwnTranslator(self):
+        found = []
+        def get():
+            found.append(translation_functions._get_google_translator())
+        threads = [threading.Thread(target=get) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(id(t) for t in found)), 3)
+        self.assertIs(translation_functions._get_google_translator(), translation_functions._get_google_translator())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import random
+import struct
+import unittest
+import mmd_scripting.core.nuthouse01_core as core
+import mmd_scripting.core.nuthouse01_pmx_parser as pmxlib
+import mmd_scripting.core.nuthouse01_pmx_struct as pmxstruct
+
+NUM_PAIRS = {pmxstruct.WeightMode.BDEF1: 1, pmxstruct.WeightMode.BDEF2: 2, pmxstruct.WeightMode.BDEF4: 4,
+             pmxstruct.WeightMode.SDEF: 2, pmxstruct.WeightMode.QDEF: 4}
+
+
+def encode_one_at_a_time(verts, addl_vec4, idx_bone):
+    # the old encoder: pack each vertex by itself, one after another
+    out = struct.pack("<i", len(verts))
+    for v in verts:
+        mode = v.weighttype
+        w = [list(p) for p in v.weight] + [[0, 0]] * 4
+        if NUM_PAIRS[mode] == 1:
+            weights, fmt = [w[0][0]], "%s" % idx_bone
+        elif NUM_PAIRS[mode] == 2:
+            weights, fmt = [w[0][0], w[1][0], w[0][1]], "2%s f" % idx_bone
+        else:
+            weights, fmt = [w[0][0], w[1][0], w[2][0], w[3][0], w[0][1], w[1][1], w[2][1], w[3][1]], "4%s 4f" % idx_bone
+        if mode is pmxstruct.WeightMode.SDEF:
+            weights += [c for row in v.weight_sdef for c in row]
+            fmt += " 9f"
+        addl = []
+        for z in range(addl_vec4):
+            addl += v.addl_vec4s[z] if z < len(v.addl_vec4s) else [0.0] * 4
+        out += struct.pack("<8f %df b %s f" % (4 * addl_vec4, fmt), *v.pos, *v.norm, *v.uv, *addl, mode.value,
+                           *weights, v.edgescale)
+    return out
+
+
+def random_verts(rng, num, num_addl):
+    verts = []
+    for _ in range(num):
+        mode = rng.choice(list(pmxstruct.WeightMode))
+        # sometimes too few pairs, those get padded with [0,0]
+        weight = [[rng.randrange(100), rng.random()] for _ in range(rng.randrange(NUM_PAIRS[mode] + 1))]
+        sdef = [[rng.uniform(-5, 5) for _ in range(3)] for _ in range(3)] if mode is pmxstruct.WeightMode.SDEF else []
+        verts.append(pmxstruct.PmxVertex(pos=[rng.uniform(-10, 10) for _ in range(3)],
+                                         norm=[rng.uniform(-1, 1) for _ in range(3)],
+                                         uv=[rng.random(), rng.random()], edgescale=rng.random(), weighttype=mode,
+                                         weight=weight, weight_sdef=sdef,
+                                         addl_vec4s=[[rng.random() for _ in range(4)] for _ in range(rng.randrange(num_addl + 2))]))
+    return verts
+
+
+class EncodeVertices(unittest.TestCase):
+    def setUp(self):
+        core.MY_PRINT_FUNC = lambda *args, **kwargs: None
+        self.saved = (pmxlib.np, pmxlib.ADDL_VERTEX_VEC4, pmxlib.IDX_BONE, dict(pmxlib.ENCODE_PERCENTPOINT_WEIGHTS))
+        pmxlib.ENCODE_PERCENTPOINT_WEIGHTS["verts"] = 0
+
+    def tearDown(self):
+        pmxlib.np, pmxlib.ADDL_VERTEX_VEC4, pmxlib.IDX_BONE, weights = self.saved
+        pmxlib.ENCODE_PERCENTPOINT_WEIGHTS.clear()
+        pmxlib.ENCODE_PERCENTPOINT_WEIGHTS.update(weights)
+
+    def checkSameAsOneAtATime(self, rng):
+        for _ in range(30):
+            pmxlib.ADDL_VERTEX_VEC4 = rng.choice([0, 0, 1, 3])
+            pmxlib.IDX_BONE = rng.choice(["b", "h", "i"])
+            verts = random_verts(rng, rng.randrange(0, 200), pmxlib.ADDL_VERTEX_VEC4)
+            expect = encode_one_at_a_time(verts, pmxlib.ADDL_VERTEX_VEC4, pmxlib.IDX_BONE)
+            self.assertEqual(bytes(pmxlib.encode_pmx_vertices(verts)), expect)
+
+    def testNumpySameAsOneAtATime(self):
+        if pmxlib.np is None:
+            self.skipTest("numpy is not installed")
+        self.checkSameAsOneAtATime(random.Random(2))
+
+    def testFallbackSameAsOneAtATime(self):
+        pmxlib.np = None
+        self.checkSameAsOneAtATime(random.Random(3))
+
+    def testBadVertexIsReported(self):
+        rng = random.Random(4)
+        pmxlib.ADDL_VERTEX_VEC4 = 0
+        pmxlib.IDX_BONE = "b"
+        # bone index too big for the index size
+        verts = random_verts(rng, 20, 0)
+        verts[7].weighttype = pmxstruct.WeightMode.BDEF1
+        verts[7].weight = [[300, 1.0]]
+        self.assertRaises(struct.error, pmxlib.encode_pmx_vertices, verts)
+        # one vertex with an extra value & another with a missing one, the totals match but it must still fail
+        verts = random_verts(rng, 20, 0)
+        for v in verts:
+            v.weighttype = pmxstruct.WeightMode.BDEF2
+        verts[3].pos = [0.0, 0.0, 0.0, 0.0]
+        verts[9].pos = [0.0, 0.0]
+        self.assertRaises(struct.error, pmxlib.encode_pmx_vertices, verts)
+
+
+if __name__ == '__main__':
+    unittest.main()
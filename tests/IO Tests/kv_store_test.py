@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import mmd_scripting.core.nuthouse01_io as nuthouse01_io
+
+
+class PersistentKeyValueStore(unittest.TestCase):
+    def setUp(self):
+        # point the persistent storage at an empty temp folder, and forget any connection to the real one
+        self.tempdir = tempfile.mkdtemp()
+        self.old_path_func = nuthouse01_io._get_persistent_storage_path
+        nuthouse01_io._get_persistent_storage_path = lambda filename="": os.path.join(self.tempdir, filename)
+        self.forgetConnection()
+
+    def tearDown(self):
+        self.forgetConnection()
+        nuthouse01_io._get_persistent_storage_path = self.old_path_func
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def forgetConnection(self):
+        if nuthouse01_io._kv_conn is not None:
+            nuthouse01_io._kv_conn.close()
+        nuthouse01_io._kv_conn = None
+        nuthouse01_io._kv_cache.clear()
+
+    def testMissingKeyIsNone(self):
+        self.assertIsNone(nuthouse01_io.get_persistent_storage_json("nothing"))
+
+    def testWriteThenRead(self):
+        value = {"list": [1, 2.5, "三"], "flag": True}
+        nuthouse01_io.write_persistent_storage_json("test", value)
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), value)
+        # it survives closing and reopening the store
+        self.forgetConnection()
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), value)
+
+    def testReadReturnsCopy(self):
+        nuthouse01_io.write_persistent_storage_json("test", [1, 2])
+        nuthouse01_io.get_persistent_storage_json("test").append(3)
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), [1, 2])
+
+    def testUpdate(self):
+        self.assertEqual(nuthouse01_io.update_persistent_storage_json("count", lambda old: (old or 0) + 1), 1)
+        self.assertEqual(nuthouse01_io.update_persistent_storage_json("count", lambda old: (old or 0) + 1), 2)
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("count"), 2)
+
+    def testUpdateRollsBackOnError(self):
+        nuthouse01_io.write_persistent_storage_json("test", "before")
+        def fail(old):
+            raise ValueError("nope")
+        with self.assertRaises(ValueError):
+            nuthouse01_io.update_persistent_storage_json("test", fail)
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), "before")
+
+    def testSeesChangesFromOtherConnections(self):
+        nuthouse01_io.write_persistent_storage_json("test", "mine")
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), "mine")
+        # pretend to be another process writing to the same file
+        other = sqlite3.connect(os.path.join(self.tempdir, nuthouse01_io.MY_KV_STORE_NAME))
+        other.execute("UPDATE kv SET value = ? WHERE key = ?", (json.dumps("theirs"), "test"))
+        other.commit()
+        other.close()
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("test"), "theirs")
+
+    def testImportsLegacyJson(self):
+        with open(os.path.join(self.tempdir, nuthouse01_io.MY_JSON_NAME), "w", encoding="utf-8") as f:
+            json.dump({"old": [1, 2, 3], "other": "value"}, f)
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("old"), [1, 2, 3])
+        self.assertEqual(nuthouse01_io.get_persistent_storage_json("other"), "value")
+
+
+if __name__ == '__main__':
+    unittest.main()